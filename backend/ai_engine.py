@@ -3,23 +3,71 @@ ai_engine.py
 ============
 TEJUSKA Cloud Intelligence
 Agentic AI Engine:
-  - OPTIC: LangChain-powered Text-to-SQL NLP agent.
   - ABACUS: GNN + PPO Reinforcement Learning for autonomous resource optimisation.
+  (OPTIC, the Text-to-SQL agent, lives in optic.py and is served by main.py.)
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+import database
+import metrics
+from model_registry import ModelBundle, ModelRegistry
+from feature_store import COL_COST_PER_HR, FeatureStore
+from resource_graph import ResourceGraphStore
+from gnn_sampling import sampled_scores
+
 logger = logging.getLogger("tejuska.ai_engine")
 
-OPENAI_API_KEY: str = os.environ.get("OPENAI_API_KEY", "")
 DATABASE_URL: str = os.environ.get("DATABASE_URL", "")
+ABACUS_BATCH_CHUNK_SIZE: int = int(os.environ.get("ABACUS_BATCH_CHUNK_SIZE", "4096"))
+# Dedicated inference threads; torch's intra-op pool is sized so that all
+# workers together use roughly one thread per core.
+ABACUS_INFERENCE_WORKERS: int = int(os.environ.get("ABACUS_INFERENCE_WORKERS", "2"))
+ABACUS_TORCH_THREADS: int = int(
+    os.environ.get("ABACUS_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // ABACUS_INFERENCE_WORKERS)))
+)
+# Versioned checkpoints (see model_registry.py / model_export.py). 'auto'
+# prefers TorchScript when present; 'onnx' / 'onnx-int8' serve through onnxruntime.
+ABACUS_MODEL_DIR: str = os.environ.get("ABACUS_MODEL_DIR", "models")
+ABACUS_MODEL_BACKEND: str = os.environ.get("ABACUS_MODEL_BACKEND", "auto")
+# How often each worker checks the ACTIVE pointer for a version activated elsewhere.
+ABACUS_MODEL_POLL_SECONDS: float = float(os.environ.get("ABACUS_MODEL_POLL_SECONDS", "30"))
+# Micro-batching of concurrent single-resource evaluations.
+ABACUS_MICROBATCH_MAX_SIZE: int = int(os.environ.get("ABACUS_MICROBATCH_MAX_SIZE", "256"))
+ABACUS_MICROBATCH_WAIT_MS: float = float(os.environ.get("ABACUS_MICROBATCH_WAIT_MS", "5"))
+# Graphs above this size are scored with neighbour sampling instead of a full pass.
+ABACUS_FULL_GRAPH_MAX_NODES: int = int(os.environ.get("ABACUS_FULL_GRAPH_MAX_NODES", "200000"))
+
+# ABACUS resource feature layout (8 dimensions)
+FEATURE_NAMES: Tuple[str, ...] = (
+    "cpu_util", "mem_util", "net_in", "net_out",
+    "cost_per_hr", "age_days", "tag_prod", "reserved",
+)
+ACTION_LABELS: Tuple[str, str] = ("KEEP", "TERMINATE")
+HOURS_PER_MONTH = 730.0
+
+# One round trip per evaluation, however many TERMINATE recommendations it has.
+_RECORD_RECOMMENDATIONS_SQL = """
+INSERT INTO ai_recommendations (
+    tenant_id, resource_id, recommendation_type, estimated_savings,
+    confidence_score, status, reasoning, model_version, executed_at
+)
+SELECT $1::uuid, r.resource_id, 'Terminate', r.savings, r.confidence,
+       $2, r.reasoning, $3, CASE WHEN $2 = 'executed' THEN NOW() END
+FROM unnest($4::text[], $5::numeric[], $6::numeric[], $7::text[])
+     AS r(resource_id, savings, confidence, reasoning)
+"""
 
 # ---------------------------------------------------------------------------
 # GNN Model Definition (Graph Neural Network for resource graph analysis)
@@ -29,6 +77,8 @@ class ResourceGNN(nn.Module):
     """
     Simple two-layer Graph Convolutional Network.
     Input:  node feature matrix X (shape: N x F)
+            adjacency: dense (N x N), pre-normalised torch.sparse (COO/CSR),
+            or None for unconnected nodes
     Output: per-node termination logits (shape: N x 2)
     """
 
@@ -37,7 +87,18 @@ class ResourceGNN(nn.Module):
         self.fc1 = nn.Linear(in_features, hidden_dim)
         self.fc2 = nn.Linear(hidden_dim, out_classes)
 
-    def forward(self, x: torch.Tensor, adj: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, adj: Optional[torch.Tensor] = None) -> torch.Tensor:
+        # Without an adjacency matrix every node only sees itself (batch scoring).
+        if adj is None:
+            x = F.relu(self.fc1(x))
+            return self.fc2(x)
+
+        # Sparse adjacency is already D^{-1} A (see resource_graph.normalized_adjacency),
+        # so message passing costs O(E) instead of O(N^2).
+        if adj.layout != torch.strided:
+            x = F.relu(self.fc1(adj @ x))
+            return self.fc2(adj @ x)
+
         # Normalised adjacency: D^{-1} A
         degree = adj.sum(dim=1, keepdim=True).clamp(min=1.0)
         adj_norm = adj / degree
@@ -46,6 +107,17 @@ class ResourceGNN(nn.Module):
         x = self.fc2(adj_norm @ x)
         return x
 
+    def forward_blocks(self, x: torch.Tensor, blocks: List[torch.Tensor]) -> torch.Tensor:
+        """
+        Mini-batch forward over sampled message-flow blocks (see gnn_sampling).
+        blocks[0] maps input nodes to layer-1 nodes, blocks[1] maps those to
+        the targets; each block is a normalised sparse (n_dst x n_src) tensor.
+        """
+        if len(blocks) != 2:
+            raise ValueError(f"ResourceGNN has 2 layers; got {len(blocks)} blocks.")
+        x = F.relu(self.fc1(blocks[0] @ x))
+        return self.fc2(blocks[1] @ x)
+
 
 # ---------------------------------------------------------------------------
 # PPO Policy Network (lightweight, single hidden layer)
@@ -72,86 +144,213 @@ class PPOPolicy(nn.Module):
 
 
 # ---------------------------------------------------------------------------
-# AI Engine
+# Inference Executor (keeps PyTorch work off the event loop)
 # ---------------------------------------------------------------------------
 
-class AIEngine:
+class InferenceExecutor:
     """
-    Encapsulates OPTIC (NLP query) and ABACUS (autonomous termination) logic.
+    Runs model calls on a dedicated thread pool so the asyncio event loop
+    keeps serving other requests. PyTorch releases the GIL inside its
+    kernels, so inference and request handling overlap.
+    Exposes queue depth, queue wait and run latency through metrics.
     """
 
-    def __init__(self) -> None:
-        self._gnn    = ResourceGNN()
-        self._policy = PPOPolicy()
-        self._gnn.eval()
-        self._policy.eval()
-        logger.info("AIEngine initialised (GNN + PPO loaded in eval mode).")
+    def __init__(
+        self,
+        workers: int = ABACUS_INFERENCE_WORKERS,
+        torch_threads: int = ABACUS_TORCH_THREADS,
+    ) -> None:
+        # Intra-op threads are process-wide; size them per worker so
+        # concurrent inferences do not oversubscribe the CPU.
+        torch.set_num_threads(torch_threads)
+        self._workers = workers
+        self._torch_threads = torch_threads
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="abacus-inference")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._wait = metrics.LatencyTracker()
+        self._run = metrics.LatencyTracker()
+        self._errors = metrics.Counter()
+        metrics.register("inference_executor", self.metrics)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Execute fn(*args) under torch.no_grad() on an inference thread."""
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def call() -> Any:
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            self._wait.observe((started - submitted) * 1000)
+            try:
+                with torch.no_grad():
+                    return fn(*args)
+            except Exception:
+                self._errors.inc()
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self._run.observe((time.perf_counter() - started) * 1000)
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            queued, running = self._queued, self._running
+        return {
+            "workers": self._workers,
+            "torch_threads": self._torch_threads,
+            "queue_depth": queued,
+            "running": running,
+            "errors": self._errors.value,
+            "queue_wait": self._wait.snapshot(),
+            "run": self._run.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
 
-    # ------------------------------------------------------------------
-    # OPTIC: Text-to-SQL
-    # ------------------------------------------------------------------
 
-    async def translate_and_execute(
-        self, tenant_id: str, query: str
-    ) -> Tuple[str, str]:
-        """
-        Translate a natural-language query to SQL, execute it, and return
-        both the generated SQL and a plain-English answer.
+# ---------------------------------------------------------------------------
+# Micro-batcher (coalesces concurrent single-resource requests)
+# ---------------------------------------------------------------------------
 
-        In production this calls the OpenAI Chat Completions API.
-        The implementation below provides a deterministic stub when no API
-        key is present so that unit tests pass without network access.
-        """
-        if not OPENAI_API_KEY:
-            logger.warning("OPENAI_API_KEY not set; returning stub response.")
-            stub_sql = (
-                "SELECT service_name, SUM(billed_cost) AS total_cost "
-                "FROM consolidated_billing "
-                f"WHERE tenant_id = '{tenant_id}' "
-                "GROUP BY service_name ORDER BY total_cost DESC LIMIT 10;"
-            )
-            stub_answer = (
-                "Your top 10 cloud services by billed cost for this period are listed. "
-                "Connect an OpenAI API key to enable live natural-language answers."
-            )
-            return stub_sql, stub_answer
+class MicroBatcher:
+    """
+    Collects single-resource evaluation requests for up to max_wait_ms or
+    max_batch_size items, scores them with one batched call and resolves
+    each caller's future with its own row.
+
+    Parameters
+    ----------
+    fn             : Coroutine fn(tenant_ids, resource_ids, features) -> List[result],
+                     row-aligned with its inputs; it owns the executor hops.
+    max_batch_size : Dispatch immediately once this many items are waiting.
+    max_wait_ms    : Latency budget; a partial batch is dispatched after this.
+    """
 
-        import openai  # imported lazily to avoid mandatory dep at test time
-        client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+    def __init__(
+        self,
+        fn: Callable[[List[str], List[str], np.ndarray], Awaitable[List[Dict[str, Any]]]],
+        max_batch_size: int = ABACUS_MICROBATCH_MAX_SIZE,
+        max_wait_ms: float = ABACUS_MICROBATCH_WAIT_MS,
+    ) -> None:
+        self._fn = fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, str, np.ndarray, float, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+
+        self._started = time.monotonic()
+        self._batches = metrics.Counter()
+        self._items = metrics.Counter()
+        self._full_dispatches = metrics.Counter()
+        self._wait = metrics.LatencyTracker()
+        self._latency = metrics.LatencyTracker()
+        metrics.register("abacus_microbatcher", self.metrics)
+
+    async def submit(self, tenant_id: str, resource_id: str, features: np.ndarray) -> Dict[str, Any]:
+        """Queue one (8,) feature row and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((tenant_id, resource_id, features, time.perf_counter(), future))
+        if len(self._pending) >= self._max_batch_size:
+            self._full_dispatches.inc()
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: List[Tuple[str, str, np.ndarray, float, asyncio.Future]]) -> None:
+        dispatched = time.perf_counter()
+        for *_, submitted, _ in batch:
+            self._wait.observe((dispatched - submitted) * 1000)
+        self._batches.inc()
+        self._items.inc(len(batch))
+
+        tenant_ids = [item[0] for item in batch]
+        resource_ids = [item[1] for item in batch]
+        features = np.stack([item[2] for item in batch])
+        try:
+            results = await self._fn(tenant_ids, resource_ids, features)
+        except Exception as exc:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        finished = time.perf_counter()
+        for (*_, submitted, future), result in zip(batch, results):
+            self._latency.observe((finished - submitted) * 1000)
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self) -> Dict[str, Any]:
+        batches, items = self._batches.value, self._items.value
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        return {
+            "max_batch_size": self._max_batch_size,
+            "max_wait_ms": self._max_wait * 1000,
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": round(items / batches, 2) if batches else 0.0,
+            "full_batch_dispatches": self._full_dispatches.value,
+            "items_per_second": round(items / uptime, 2),
+            "queue_wait": self._wait.snapshot(),
+            "latency": self._latency.snapshot(),
+        }
 
-        system_prompt = (
-            "You are a FinOps SQL expert. The user will ask a question about cloud costs. "
-            "You will generate a PostgreSQL query against the 'consolidated_billing' table. "
-            "Always filter by tenant_id. Return ONLY the SQL statement, nothing else."
-        )
-        sql_response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"tenant_id='{tenant_id}'. Question: {query}"},
-            ],
-            temperature=0.0,
-            max_tokens=512,
-        )
-        generated_sql: str = sql_response.choices[0].message.content.strip()
 
-        # Convert SQL result to natural language
-        answer_prompt = (
-            "The following SQL was run to answer the user's question. "
-            "Provide a concise, professional plain-English summary of the result. "
-            "If you do not have the actual data, describe what the query will return."
-        )
-        answer_response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": answer_prompt},
-                {"role": "user", "content": f"SQL: {generated_sql}"},
-            ],
-            temperature=0.3,
-            max_tokens=256,
+# ---------------------------------------------------------------------------
+# AI Engine
+# ---------------------------------------------------------------------------
+
+class AIEngine:
+    """
+    Encapsulates ABACUS (autonomous termination) logic.
+    """
+
+    def __init__(self) -> None:
+        self._registry = ModelRegistry(
+            ABACUS_MODEL_DIR,
+            policy_factory=PPOPolicy,
+            gnn_factory=ResourceGNN,
+            feature_schema=FEATURE_NAMES,
+            backend=ABACUS_MODEL_BACKEND,
+            threads=ABACUS_TORCH_THREADS,
+            poll_interval=ABACUS_MODEL_POLL_SECONDS,
         )
-        answer: str = answer_response.choices[0].message.content.strip()
-        return generated_sql, answer
+        self._registry.load_initial()
+        self._features = FeatureStore()
+        self._graphs   = ResourceGraphStore()
+        self._executor = InferenceExecutor()
+        self._batcher  = MicroBatcher(self._score_microbatch)
+        logger.info("AIEngine initialised (GNN + PPO loaded in eval mode).")
+
+    @property
+    def models(self) -> ModelRegistry:
+        """Registry of ABACUS model versions (used by the admin endpoints)."""
+        return self._registry
+
+    def shutdown(self) -> None:
+        """Release the inference threads."""
+        self._executor.shutdown()
 
     # ------------------------------------------------------------------
     # ABACUS: Autonomous Termination
@@ -159,7 +358,7 @@ class AIEngine:
 
     async def evaluate_and_terminate(
         self, tenant_id: str, resource_id: str, dry_run: bool = True
-    ) -> None:
+    ) -> Dict[str, Any]:
         """
         Evaluate whether a cloud resource should be terminated using the
         GNN + PPO pipeline.
@@ -167,32 +366,282 @@ class AIEngine:
         Feature vector (8 dimensions):
           [cpu_util, mem_util, net_in, net_out, cost_per_hr, age_days, tag_prod, reserved]
 
-        In production, these values are fetched from the database / cloud APIs.
-        This implementation uses a deterministic synthetic vector for demonstration.
+        Features come from the FeatureStore (consolidated_billing aggregates).
+        Without a DATABASE_URL a deterministic synthetic vector is used instead.
         """
         logger.info(
             "Evaluating resource=%s for tenant=%s (dry_run=%s)",
             resource_id, tenant_id, dry_run,
         )
 
-        # Build synthetic feature vector (replace with real DB fetch in production)
-        features = np.array(
+        _, features, missing = await self._load_features(tenant_id, [resource_id])
+        if missing:
+            raise LookupError(
+                f"No billing features found for resource={resource_id} tenant={tenant_id}."
+            )
+        result = await self._batcher.submit(tenant_id, resource_id, features[0])
+
+        logger.info(
+            "PPO recommendation for resource=%s: %s (dry_run=%s)",
+            resource_id, result["action"], dry_run,
+        )
+        self._apply_action(tenant_id, resource_id, result["action"], dry_run)
+        await self._record_recommendations(tenant_id, [result], features, dry_run)
+        return result
+
+    async def evaluate_batch(
+        self,
+        tenant_id: str,
+        resource_ids: Optional[List[str]] = None,
+        dry_run: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Score many resources with one batched PPO + GNN pass per chunk.
+
+        Parameters
+        ----------
+        tenant_id    : Tenant that owns the resources.
+        resource_ids : Resources to evaluate. None selects every resource
+                       the tenant has billing rows for.
+        dry_run      : If True, recommendations are returned but not executed.
+
+        Returns
+        -------
+        List[dict]: One entry per resource with action, probability,
+                    value estimate and GNN termination score. Resources
+                    without billing features are skipped.
+        """
+        resource_ids, features, missing = await self._load_features(tenant_id, resource_ids)
+        if missing:
+            logger.warning(
+                "Skipping %d resources without billing features for tenant=%s.",
+                len(missing), tenant_id,
+            )
+        if not resource_ids:
+            return []
+
+        logger.info(
+            "Batch evaluation of %d resources for tenant=%s (dry_run=%s)",
+            len(resource_ids), tenant_id, dry_run,
+        )
+        # Pin the model version for the whole batch so a concurrent hot-swap
+        # cannot mix graph scores and policy outputs from different versions.
+        bundle = self._registry.active
+        gnn_scores = await self._graph_gnn_scores(tenant_id, resource_ids, bundle)
+        results = await self._executor.run(
+            self._score_and_build, resource_ids, features, gnn_scores, bundle
+        )
+
+        terminate_count = 0
+        for result in results:
+            if result["action"] == "TERMINATE":
+                terminate_count += 1
+                if not dry_run:
+                    self._apply_action(tenant_id, result["resource_id"], result["action"], dry_run)
+        await self._record_recommendations(tenant_id, results, features, dry_run)
+        logger.info(
+            "Batch evaluation for tenant=%s complete: %d/%d recommended for termination.",
+            tenant_id, terminate_count, len(results),
+        )
+        return results
+
+    # ------------------------------------------------------------------
+    # ABACUS helpers
+    # ------------------------------------------------------------------
+
+    async def _load_features(
+        self, tenant_id: str, resource_ids: Optional[List[str]]
+    ) -> Tuple[List[str], np.ndarray, List[str]]:
+        """
+        Return (found_ids, (N, 8) float32 feature matrix, missing_ids).
+        resource_ids=None selects every resource of the tenant.
+        """
+        if database.is_configured():
+            return await self._features.get_features(tenant_id, resource_ids)
+        if resource_ids is None:
+            raise EnvironmentError("DATABASE_URL environment variable is not set.")
+
+        logger.warning("DATABASE_URL not set; using synthetic ABACUS features.")
+        synthetic = np.array(
             [0.05, 0.10, 0.002, 0.001, 0.023, 45.0, 0.0, 0.0],
             dtype=np.float32,
         )
-        state_tensor = torch.from_numpy(features).unsqueeze(0)  # shape: (1, 8)
+        return list(resource_ids), np.tile(synthetic, (len(resource_ids), 1)), []
 
-        with torch.no_grad():
-            logits, _ = self._policy(state_tensor)
-            action = int(torch.argmax(logits, dim=-1).item())
+    async def _graph_gnn_scores(
+        self, tenant_id: str, resource_ids: List[str], bundle: ModelBundle
+    ) -> Optional[np.ndarray]:
+        """
+        Run ResourceGNN over the tenant's sparse resource graph and return the
+        termination probability for each requested resource, or None when no
+        database is configured. Graphs larger than ABACUS_FULL_GRAPH_MAX_NODES
+        only score the requested resources, via neighbour-sampled mini-batches
+        over the memory-mapped graph; node i is row i of the live feature
+        matrix, so only the sampled nodes' rows are read and nothing is copied.
+        """
+        if not database.is_configured():
+            return None
 
-        action_label = "TERMINATE" if action == 1 else "KEEP"
-        logger.info(
-            "PPO recommendation for resource=%s: %s (dry_run=%s)",
-            resource_id, action_label, dry_run,
+        tenant = await self._features.view(tenant_id)
+        graph = await self._graphs.get(tenant_id, tenant.resource_ids)
+        features = tenant.matrix
+        targets = np.fromiter((tenant.index[rid] for rid in resource_ids), dtype=np.int64, count=len(resource_ids))
+
+        if graph.num_nodes > ABACUS_FULL_GRAPH_MAX_NODES:
+            return await self._executor.run(
+                sampled_scores, bundle.gnn, graph.indptr, graph.indices, features, targets
+            )
+        return await self._executor.run(
+            self._full_graph_scores, bundle.gnn, features[:graph.num_nodes], graph.adjacency, targets
         )
 
-        if action == 1 and not dry_run:
+    @staticmethod
+    def _full_graph_scores(
+        gnn: torch.nn.Module, features: np.ndarray, adjacency: torch.Tensor, targets: np.ndarray
+    ) -> np.ndarray:
+        """Full-graph GNN pass; returns termination probabilities for targets."""
+        logits = gnn(torch.from_numpy(features), adjacency)
+        return F.softmax(logits, dim=-1)[:, 1].numpy()[targets]
+
+    @staticmethod
+    def _score_batch(
+        bundle: ModelBundle, features: np.ndarray, gnn_scores: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Run PPO and GNN inference over a feature matrix in fixed-size chunks.
+        Precomputed graph-level gnn_scores replace the per-chunk GNN pass.
+        Blocking; call through the InferenceExecutor.
+        Returns arrays of length N: action, probability, value, gnn_score.
+        """
+        n = features.shape[0]
+        actions = np.empty(n, dtype=np.int64)
+        probabilities = np.empty(n, dtype=np.float32)
+        values = np.empty(n, dtype=np.float32)
+        graph_scored = gnn_scores is not None
+        if not graph_scored:
+            gnn_scores = np.empty(n, dtype=np.float32)
+
+        with torch.no_grad():
+            for start in range(0, n, ABACUS_BATCH_CHUNK_SIZE):
+                stop = min(start + ABACUS_BATCH_CHUNK_SIZE, n)
+                state = torch.from_numpy(np.ascontiguousarray(features[start:stop]))
+
+                logits, value = bundle.policy_fn(state)
+                probs = F.softmax(logits, dim=-1)
+                chunk_probs, chunk_actions = probs.max(dim=-1)
+
+                actions[start:stop] = chunk_actions.numpy()
+                probabilities[start:stop] = chunk_probs.numpy()
+                values[start:stop] = value.squeeze(-1).numpy()
+                if not graph_scored:
+                    gnn_probs = F.softmax(bundle.gnn_node_fn(state), dim=-1)
+                    gnn_scores[start:stop] = gnn_probs[:, 1].numpy()
+
+        return {
+            "action": actions,
+            "probability": probabilities,
+            "value": values,
+            "gnn_score": gnn_scores,
+        }
+
+    async def _score_microbatch(
+        self, tenant_ids: List[str], resource_ids: List[str], features: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """
+        Score a micro-batch the way evaluate_batch scores a tenant's batch:
+        graph-level GNN scores per tenant in the batch, then one PPO pass,
+        all with the model version active at dispatch.
+        """
+        bundle = self._registry.active
+        gnn_scores: Optional[np.ndarray] = None
+        if database.is_configured():
+            rows_by_tenant: Dict[str, List[int]] = {}
+            for row, tenant_id in enumerate(tenant_ids):
+                rows_by_tenant.setdefault(tenant_id, []).append(row)
+            tenant_scores = await asyncio.gather(*(
+                self._graph_gnn_scores(tenant_id, [resource_ids[row] for row in rows], bundle)
+                for tenant_id, rows in rows_by_tenant.items()
+            ))
+            gnn_scores = np.empty(len(resource_ids), dtype=np.float32)
+            for rows, scores in zip(rows_by_tenant.values(), tenant_scores):
+                gnn_scores[rows] = scores
+        return await self._executor.run(self._score_and_build, resource_ids, features, gnn_scores, bundle)
+
+    def _score_and_build(
+        self,
+        resource_ids: List[str],
+        features: np.ndarray,
+        gnn_scores: Optional[np.ndarray],
+        bundle: ModelBundle,
+    ) -> List[Dict[str, Any]]:
+        """Score and convert to result dicts in one executor hop."""
+        scores = self._score_batch(bundle, features, gnn_scores)
+        return self._build_results(resource_ids, scores, bundle.version)
+
+    @staticmethod
+    def _build_results(
+        resource_ids: List[str], scores: Dict[str, np.ndarray], model_version: str
+    ) -> List[Dict[str, Any]]:
+        """Convert batched score arrays into per-resource result dicts."""
+        return [
+            {
+                "resource_id": resource_id,
+                "action": ACTION_LABELS[action],
+                "probability": probability,
+                "value": value,
+                "gnn_score": gnn_score,
+                "model_version": model_version,
+            }
+            for resource_id, action, probability, value, gnn_score in zip(
+                resource_ids,
+                scores["action"].tolist(),
+                scores["probability"].tolist(),
+                scores["value"].tolist(),
+                scores["gnn_score"].tolist(),
+            )
+        ]
+
+    async def _record_recommendations(
+        self,
+        tenant_id: str,
+        results: List[Dict[str, Any]],
+        features: np.ndarray,
+        dry_run: bool,
+    ) -> None:
+        """
+        Persist TERMINATE recommendations to ai_recommendations, tagged with
+        the model version that produced them. `features` is row-aligned with
+        `results`. Failures are logged; they never fail the evaluation.
+        """
+        if not database.is_configured():
+            return
+        rows = [i for i, result in enumerate(results) if result["action"] == "TERMINATE"]
+        if not rows:
+            return
+        savings = (features[rows, COL_COST_PER_HR].astype(np.float64) * HOURS_PER_MONTH).round(6)
+        try:
+            pool = await database.get_pool()
+            async with pool.acquire() as conn:
+                await conn.execute(
+                    _RECORD_RECOMMENDATIONS_SQL,
+                    tenant_id,
+                    "pending" if dry_run else "executed",
+                    results[rows[0]]["model_version"],
+                    [results[i]["resource_id"] for i in rows],
+                    savings.tolist(),
+                    [round(results[i]["probability"], 4) for i in rows],
+                    [
+                        f"PPO p={results[i]['probability']:.4f}, GNN score={results[i]['gnn_score']:.4f}"
+                        for i in rows
+                    ],
+                )
+        except Exception as exc:
+            logger.exception("Failed to record recommendations for tenant=%s: %s", tenant_id, exc)
+
+    @staticmethod
+    def _apply_action(tenant_id: str, resource_id: str, action: str, dry_run: bool) -> None:
+        """Execute (or skip) the recommended action for one resource."""
+        if action == "TERMINATE" and not dry_run:
             # In production: call AWS Boto3 / GCP SDK to terminate the resource
             logger.info(
                 "Executing termination of resource=%s for tenant=%s.",
@@ -200,5 +649,5 @@ class AIEngine:
             )
         else:
             logger.info(
-                "No action taken (action=%s, dry_run=%s).", action_label, dry_run
+                "No action taken (action=%s, dry_run=%s).", action, dry_run
             )
@@ -0,0 +1,776 @@
+"""
+analytics_store.py
+==================
+TEJUSKA Cloud Intelligence
+Columnar analytics tier: a Parquet mirror of consolidated_billing queried
+with embedded DuckDB.
+
+Long scans (90-day trends, forecasting inputs, chargeback) read compressed
+columns from local disk instead of competing with OLTP traffic for the
+Postgres row store. The mirror lives under ANALYTICS_STORE_DIR:
+
+  manifest.json                         watermark, columns, live/retired files
+  tenant=<uuid>/month=<YYYY-MM>/*.parquet
+
+AnalyticsStore.sync() appends: it copies rows with ingested_at in
+(watermark, cutoff] out of Postgres one tenant-month at a time (CSV COPY
+staged on disk, converted by DuckDB) into new part files, then advances the
+watermark in the manifest. The cutoff comes from rollups.ingest_horizon(),
+minus a safety lag for writers that bypass it, so no open ingest can still
+add rows below it. The same pass:
+  - rewrites partitions holding rows of billing exports that were reloaded
+    since the last pass (billing_ingestions), which Postgres deleted;
+  - drops months past each tenant's plan retention (partitions.py) and
+    tenants that no longer exist;
+  - merges a partition's files below ANALYTICS_COMPACT_FILE_ROWS once there
+    are ANALYTICS_COMPACT_MIN_FILES of them, so large files are not
+    rewritten every few passes. Output files are sorted by
+    charge_period_start, so range filters skip most row groups.
+Files are never modified in place. Replaced files are retired in the
+manifest and deleted after ANALYTICS_RETIRED_GRACE_SECONDS, so queries that
+started on the previous manifest keep reading them. One process at a time
+syncs a store (file lock); any number may query it.
+
+stream() answers a PostgreSQL statement over consolidated_billing (as
+OPTIC and dashboard.py write them, $1 bound to the tenant): sqlglot
+transpiles it to DuckDB and a temporary consolidated_billing view unions
+the tenant's Parquet files with the raw rows ingested after the watermark,
+minus rows of reloaded exports, so answers match the raw table. Statements
+it cannot answer (other tables, unsupported syntax, a tail larger than
+ANALYTICS_MAX_TAIL_ROWS) raise QuerySourceUnavailable before producing
+rows and run on Postgres instead (optic_sql.QueryExecutor).
+
+Usage (from backend/):
+    python analytics_store.py sync
+    python analytics_store.py query --tenant <uuid> "SELECT ..."
+"""
+
+import os
+import io
+import json
+import time
+import fcntl
+import asyncio
+import logging
+import secrets
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+import database
+import metrics
+import partitions
+import rollups
+from optic_sql import (
+    OPTIC_FETCH_CHUNK_ROWS,
+    QueryExecutionError,
+    QuerySourceUnavailable,
+    QueryTimeoutError,
+)
+
+logger = logging.getLogger("tejuska.analytics_store")
+
+# Empty disables the analytics tier; every statement then runs on Postgres.
+ANALYTICS_STORE_DIR: str = os.environ.get("ANALYTICS_STORE_DIR", "")
+# 0 disables the background sync (e.g. when a cron runs `analytics_store.py sync`).
+ANALYTICS_SYNC_SECONDS: float = float(os.environ.get("ANALYTICS_SYNC_SECONDS", "300"))
+ANALYTICS_SAFETY_LAG_SECONDS: float = float(
+    os.environ.get("ANALYTICS_SAFETY_LAG_SECONDS", str(rollups.ROLLUP_SAFETY_LAG_SECONDS))
+)
+# Rows copied per staging file; larger tenant-months are split by time.
+ANALYTICS_EXPORT_CHUNK_ROWS: int = int(os.environ.get("ANALYTICS_EXPORT_CHUNK_ROWS", "5000000"))
+ANALYTICS_COMPACT_MIN_FILES: int = int(os.environ.get("ANALYTICS_COMPACT_MIN_FILES", "8"))
+ANALYTICS_COMPACT_FILE_ROWS: int = int(os.environ.get("ANALYTICS_COMPACT_FILE_ROWS", "4000000"))
+ANALYTICS_RETIRED_GRACE_SECONDS: float = float(os.environ.get("ANALYTICS_RETIRED_GRACE_SECONDS", "900"))
+# Raw rows past the watermark a query may pull from Postgres before it falls back.
+ANALYTICS_MAX_TAIL_ROWS: int = int(os.environ.get("ANALYTICS_MAX_TAIL_ROWS", "250000"))
+ANALYTICS_STATEMENT_TIMEOUT_MS: int = int(os.environ.get("ANALYTICS_STATEMENT_TIMEOUT_MS", "60000"))
+ANALYTICS_MAX_CONCURRENCY: int = int(os.environ.get("ANALYTICS_MAX_CONCURRENCY", "2"))
+# DuckDB resources; empty / 0 keep DuckDB's defaults (80% of RAM, every core).
+ANALYTICS_MEMORY_LIMIT: str = os.environ.get("ANALYTICS_MEMORY_LIMIT", "")
+ANALYTICS_THREADS: int = int(os.environ.get("ANALYTICS_THREADS", "0"))
+OPTIC_USE_ANALYTICS: bool = os.environ.get("OPTIC_USE_ANALYTICS", "true").lower() == "true"
+
+MIRRORED_TABLE = "consolidated_billing"
+_MANIFEST = "manifest.json"
+_WRITER_LOCK = ".sync.lock"
+_STAGING = ".staging"
+
+_COLUMNS_SQL = """
+SELECT attname, format_type(atttypid, atttypmod) AS type
+FROM pg_attribute
+WHERE attrelid = 'consolidated_billing'::regclass AND attnum > 0 AND NOT attisdropped
+ORDER BY attnum
+"""
+_GROUPS_SQL = """
+SELECT tenant_id::text AS tenant,
+       DATE_TRUNC('month', charge_period_start AT TIME ZONE 'UTC')::date AS month,
+       COUNT(*) AS rows
+FROM consolidated_billing
+WHERE ingested_at > $1 AND ingested_at <= $2
+GROUP BY 1, 2
+"""
+_EXPORT_SQL = (
+    "SELECT {columns} FROM consolidated_billing"
+    " WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3"
+    " AND ingested_at > $4 AND ingested_at <= $5"
+)
+# Exports loaded again since the watermark: Postgres deleted their earlier rows.
+_RELOADED_SQL = """
+SELECT tenant_id::text AS tenant, source_file
+FROM billing_ingestions
+WHERE ingested_at > $1 AND ingested_at <= $2
+"""
+_TENANTS_SQL = "SELECT tenant_id::text AS tenant, plan FROM tenants"
+_TAIL_SQL = "SELECT {columns} FROM consolidated_billing WHERE tenant_id = $1 AND ingested_at > $2 LIMIT $3"
+_TAIL_RELOADED_SQL = "SELECT source_file FROM billing_ingestions WHERE tenant_id = $1 AND ingested_at > $2"
+
+# Postgres type (format_type) -> DuckDB type; anything else is kept as text.
+_DUCKDB_TYPES = {
+    "uuid": "UUID",
+    "timestamp with time zone": "TIMESTAMPTZ",
+    "timestamp without time zone": "TIMESTAMP",
+    "date": "DATE",
+    "text": "VARCHAR",
+    "jsonb": "JSON",
+    "json": "JSON",
+    "boolean": "BOOLEAN",
+    "smallint": "SMALLINT",
+    "integer": "INTEGER",
+    "bigint": "BIGINT",
+    "double precision": "DOUBLE",
+    "real": "REAL",
+}
+
+
+def _duckdb_type(pg_type: str) -> str:
+    if pg_type.startswith("numeric(") or pg_type.startswith("character varying"):
+        return pg_type.replace("numeric", "DECIMAL").replace("character varying", "VARCHAR")
+    return _DUCKDB_TYPES.get(pg_type, "VARCHAR")
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _literal(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _utc(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def partition_dir(tenant: str, month: date) -> str:
+    """Directory of one tenant-month, relative to the store root."""
+    return f"tenant={tenant}/month={month:%Y-%m}"
+
+
+def _partition_of(path: str) -> Tuple[str, date]:
+    tenant, month = path.split("/")[:2]
+    year, number = month.split("=", 1)[1].split("-")
+    return tenant.split("=", 1)[1], date(int(year), int(number), 1)
+
+
+@lru_cache(maxsize=1024)
+def _duckdb_sql(sql: str) -> str:
+    """
+    Transpile a PostgreSQL statement over consolidated_billing to DuckDB.
+    Raises QuerySourceUnavailable for statements reading any other table.
+    """
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except SqlglotError as exc:
+        raise QuerySourceUnavailable(f"unparseable statement: {exc}") from exc
+    ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    for table in tree.find_all(exp.Table):
+        name = table.name.lower()
+        if name in ctes and not table.db:
+            continue
+        if name != MIRRORED_TABLE or table.db not in ("", "public"):
+            raise QuerySourceUnavailable(f"reads {table.sql(dialect='postgres')}")
+        table.set("db", None)
+    try:
+        return tree.sql(dialect="duckdb")
+    except SqlglotError as exc:
+        raise QuerySourceUnavailable(f"cannot transpile: {exc}") from exc
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+class _Manifest:
+    """
+    The store's committed state: the ingested_at watermark, the mirrored
+    columns and every live part file (relative path -> rows). Replaced files
+    wait in retired (path -> retired at, unix seconds) until deleted.
+    """
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None) -> None:
+        data = data or {}
+        watermark = data.get("watermark")
+        self.watermark: Optional[datetime] = datetime.fromisoformat(watermark) if watermark else None
+        self.columns: List[Tuple[str, str]] = [tuple(column) for column in data.get("columns", [])]
+        self.files: Dict[str, int] = dict(data.get("files", {}))
+        self.retired: Dict[str, float] = dict(data.get("retired", {}))
+        self.by_tenant: Dict[str, List[str]] = {}
+        for path in sorted(self.files):
+            self.by_tenant.setdefault(_partition_of(path)[0], []).append(path)
+
+    def partitions(self) -> Dict[Tuple[str, date], List[str]]:
+        grouped: Dict[Tuple[str, date], List[str]] = {}
+        for path in sorted(self.files):
+            grouped.setdefault(_partition_of(path), []).append(path)
+        return grouped
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "columns": [list(column) for column in self.columns],
+            "files": self.files,
+            "retired": self.retired,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class AnalyticsStore:
+    """
+    Parquet mirror of consolidated_billing with a DuckDB query engine.
+
+    Parameters
+    ----------
+    root             : Store directory; empty leaves the store unconfigured.
+    interval_seconds : Background sync period; 0 disables the loop.
+    """
+
+    def __init__(
+        self, root: str = ANALYTICS_STORE_DIR, interval_seconds: float = ANALYTICS_SYNC_SECONDS
+    ) -> None:
+        self._root = os.path.abspath(root) if root else ""
+        self._interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._db: Any = None
+        self._db_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max(1, ANALYTICS_MAX_CONCURRENCY))
+        self._manifest = _Manifest()
+        self._manifest_stamp: Optional[int] = None
+        self._syncs = metrics.LatencyTracker()
+        self._queries = metrics.LatencyTracker()
+        self._rows_exported = metrics.Counter()
+        self._files_compacted = metrics.Counter()
+        self._declined = metrics.Counter()
+        self._failures = metrics.Counter()
+        metrics.register("analytics_store", self.snapshot)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._root)
+
+    async def start(self) -> None:
+        if not self.configured:
+            return
+        if self._interval <= 0:
+            logger.info("Analytics store sync disabled (ANALYTICS_SYNC_SECONDS=0).")
+            return
+        self._task = asyncio.create_task(self._loop(), name="analytics-store-sync")
+        logger.info("Analytics store sync started for %s (every %.0fs).", self._root, self._interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("Analytics store sync stopped.")
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._failures.inc()
+                logger.warning("Analytics store sync failed: %s", exc)
+            await asyncio.sleep(self._interval)
+
+    # ------------------------------------------------------------------
+    # DuckDB and manifest access
+    # ------------------------------------------------------------------
+
+    async def _database(self) -> Any:
+        """The in-process DuckDB database, created on first use."""
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    import duckdb  # optional: only processes that use the store need it
+
+                    config: Dict[str, Any] = {}
+                    if ANALYTICS_MEMORY_LIMIT:
+                        config["memory_limit"] = ANALYTICS_MEMORY_LIMIT
+                    if ANALYTICS_THREADS > 0:
+                        config["threads"] = ANALYTICS_THREADS
+                    db = duckdb.connect(":memory:", config=config)
+                    # Matches the read-only Postgres pool, which buckets by UTC day.
+                    db.execute("SET GLOBAL TimeZone = 'UTC'")
+                    self._db = db
+        return self._db
+
+    def _path(self, relative: str) -> str:
+        return os.path.join(self._root, relative)
+
+    def _load_manifest(self) -> _Manifest:
+        """The committed manifest, re-read only when the file has changed."""
+        try:
+            stamp = os.stat(self._path(_MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return self._manifest
+        if stamp != self._manifest_stamp:
+            with open(self._path(_MANIFEST), encoding="utf-8") as handle:
+                self._manifest = _Manifest(json.load(handle))
+            self._manifest_stamp = stamp
+        return self._manifest
+
+    def _commit(self, manifest: _Manifest) -> None:
+        """Atomically replace the manifest; readers switch on their next query."""
+        temporary = self._path(f"{_MANIFEST}.{secrets.token_hex(4)}")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(manifest.to_json(), handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self._path(_MANIFEST))
+        self._manifest = _Manifest(manifest.to_json())
+        self._manifest_stamp = os.stat(self._path(_MANIFEST)).st_mtime_ns
+
+    # ------------------------------------------------------------------
+    # Sync (export, reloads, retention, compaction)
+    # ------------------------------------------------------------------
+
+    async def sync(self, today: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Run one sync pass. Returns what was exported, rewritten, dropped and
+        compacted; empty when another process is syncing the store or an
+        ingest is still open.
+        """
+        if not self.configured:
+            raise EnvironmentError("ANALYTICS_STORE_DIR environment variable is not set.")
+        os.makedirs(self._path(_STAGING), exist_ok=True)
+        lock = open(self._path(_WRITER_LOCK), "a")
+        try:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {}
+            with self._syncs.time():
+                return await self._sync(today)
+        finally:
+            lock.close()
+
+    async def _sync(self, today: Optional[date]) -> Dict[str, Any]:
+        self._manifest_stamp = None
+        committed = self._load_manifest()
+        manifest = _Manifest(committed.to_json())
+        db = await self._database()
+        report: Dict[str, Any] = {}
+        await asyncio.to_thread(self._remove_orphans, manifest)
+
+        pool = await database.get_pool()
+        async with pool.acquire() as conn:
+            horizon = await rollups.ingest_horizon(conn)
+            if horizon is None:
+                logger.debug("Analytics store sync skipped: an ingest or rollup refresh is running.")
+                return report
+            cutoff = horizon - timedelta(seconds=ANALYTICS_SAFETY_LAG_SECONDS)
+            low = manifest.watermark
+            manifest.columns = [
+                (row["attname"], _duckdb_type(row["type"])) for row in await conn.fetch(_COLUMNS_SQL)
+            ]
+            stale: Dict[str, Set[str]] = {}
+            if low is None or low < cutoff:
+                report["rows_exported"] = await self._export(conn, db, manifest, low, cutoff)
+                if low is not None:
+                    reloaded = await conn.fetch(_RELOADED_SQL, low, cutoff)
+                    stale = await asyncio.to_thread(self._reloaded_files, db, committed, reloaded)
+                manifest.watermark = cutoff
+            tenants = {row["tenant"]: row["plan"] for row in await conn.fetch(_TENANTS_SQL)}
+
+        report["dropped"] = self._apply_retention(manifest, tenants, today)
+        report["compacted"] = await asyncio.to_thread(self._compact, db, manifest, stale, low)
+        now = time.time()
+        expired = [path for path, retired in manifest.retired.items() if now - retired >= ANALYTICS_RETIRED_GRACE_SECONDS]
+        for path in expired:
+            del manifest.retired[path]
+        self._commit(manifest)
+        await asyncio.to_thread(self._unlink, expired)
+        if any(report.values()):
+            logger.info("Analytics store synced to %s: %s", manifest.watermark, report)
+        return report
+
+    async def _export(
+        self, conn: Any, db: Any, manifest: _Manifest, low: Optional[datetime], cutoff: datetime
+    ) -> int:
+        """Append the rows ingested in (low, cutoff] as new part files."""
+        low = low or datetime(1, 1, 1, tzinfo=timezone.utc)
+        columns = ", ".join(_quote(name) for name, _ in manifest.columns)
+        exported = 0
+        for group in await conn.fetch(_GROUPS_SQL, low, cutoff):
+            tenant, month = group["tenant"], group["month"]
+            start, end = _utc(month), _utc(_add_months(month, 1))
+            pieces = max(1, -(-group["rows"] // ANALYTICS_EXPORT_CHUNK_ROWS))
+            step = (end - start) / pieces
+            for index in range(pieces):
+                first, last = start + step * index, (end if index == pieces - 1 else start + step * (index + 1))
+                staging = self._path(os.path.join(_STAGING, f"{secrets.token_hex(8)}.csv"))
+                try:
+                    await conn.copy_from_query(
+                        _EXPORT_SQL.format(columns=columns), tenant, first, last, low, cutoff,
+                        output=staging, format="csv",
+                    )
+                    path, rows = await asyncio.to_thread(
+                        self._write_part, db, manifest.columns, staging, partition_dir(tenant, month)
+                    )
+                finally:
+                    if os.path.exists(staging):
+                        os.remove(staging)
+                if rows:
+                    manifest.files[path] = rows
+                    exported += rows
+        self._rows_exported.inc(exported)
+        return exported
+
+    def _write_part(
+        self, db: Any, columns: Sequence[Tuple[str, str]], staging: str, directory: str
+    ) -> Tuple[str, int]:
+        """Convert one staged CSV COPY to a Parquet part file; returns (path, rows)."""
+        path = f"{directory}/part-{time.time_ns()}-{secrets.token_hex(4)}.parquet"
+        os.makedirs(self._path(directory), exist_ok=True)
+        types = "{" + ", ".join(f"{_literal(name)}: {_literal(kind)}" for name, kind in columns) + "}"
+        cursor = db.cursor()
+        try:
+            rows = cursor.execute(
+                f"COPY (SELECT * FROM read_csv({_literal(staging)}, columns = {types}, header = false,"
+                f" quote = '\"', escape = '\"', allow_quoted_nulls = false) ORDER BY charge_period_start)"
+                f" TO {_literal(self._path(path))} (FORMAT parquet, COMPRESSION zstd)"
+            ).fetchone()[0]
+        finally:
+            cursor.close()
+        if not rows:
+            os.remove(self._path(path))
+        return path, int(rows)
+
+    def _reloaded_files(self, db: Any, manifest: _Manifest, reloaded: Sequence[Any]) -> Dict[str, Set[str]]:
+        """Files of the committed manifest holding rows of reloaded exports -> those exports."""
+        wanted: Dict[str, Set[str]] = {}
+        for row in reloaded:
+            if row["tenant"] in manifest.by_tenant:
+                wanted.setdefault(row["tenant"], set()).add(row["source_file"])
+        found: Dict[str, Set[str]] = {}
+        cursor = db.cursor()
+        try:
+            for tenant, sources in wanted.items():
+                files = ", ".join(_literal(self._path(path)) for path in manifest.by_tenant[tenant])
+                hits = cursor.execute(
+                    f"SELECT DISTINCT filename, source_file"
+                    f" FROM read_parquet([{files}], filename = true, union_by_name = true)"
+                    f" WHERE list_contains($1, source_file)",
+                    [sorted(sources)],
+                ).fetchall()
+                for filename, source in hits:
+                    path = os.path.relpath(filename, self._root).replace(os.sep, "/")
+                    found.setdefault(path, set()).add(source)
+        finally:
+            cursor.close()
+        return found
+
+    def _apply_retention(self, manifest: _Manifest, tenants: Dict[str, str], today: Optional[date]) -> int:
+        """Retire partitions of deleted tenants and of months past the tenant's retention."""
+        per_plan, detach_before = partitions.retention_cutoffs(today)
+        dropped = 0
+        now = time.time()
+        for (tenant, month), files in manifest.partitions().items():
+            if tenant in tenants and month >= per_plan.get(tenants[tenant], detach_before):
+                continue
+            for path in files:
+                del manifest.files[path]
+                manifest.retired[path] = now
+            dropped += 1
+        return dropped
+
+    def _compact(
+        self, db: Any, manifest: _Manifest, stale_files: Dict[str, Set[str]], reloaded_before: Optional[datetime]
+    ) -> int:
+        """
+        Per partition, merge the small files (once there are enough of them)
+        together with any file holding rows of reloaded exports, dropping
+        those exports' rows ingested at or before reloaded_before.
+        """
+        compacted = 0
+        now = time.time()
+        columns = ", ".join(_quote(name) for name, _ in manifest.columns)
+        for partition, live in manifest.partitions().items():
+            small = [path for path in live if manifest.files[path] < ANALYTICS_COMPACT_FILE_ROWS]
+            files = [path for path in live if path in stale_files]
+            if len(small) >= ANALYTICS_COMPACT_MIN_FILES:
+                files = sorted(set(files) | set(small))
+            if not files:
+                continue
+            stale = sorted(set().union(*(stale_files.get(path, set()) for path in files)))
+            directory = partition_dir(*partition)
+            path = f"{directory}/part-{time.time_ns()}-{secrets.token_hex(4)}.parquet"
+            sources = ", ".join(_literal(self._path(name)) for name in files)
+            keep = ""
+            if stale:
+                keep = " WHERE NOT COALESCE(list_contains($1, source_file) AND ingested_at <= $2, false)"
+            cursor = db.cursor()
+            try:
+                rows = cursor.execute(
+                    f"COPY (SELECT {columns} FROM read_parquet([{sources}], union_by_name = true){keep}"
+                    f" ORDER BY charge_period_start)"
+                    f" TO {_literal(self._path(path))} (FORMAT parquet, COMPRESSION zstd)",
+                    [stale, reloaded_before] if stale else None,
+                ).fetchone()[0]
+            finally:
+                cursor.close()
+            for name in files:
+                del manifest.files[name]
+                manifest.retired[name] = now
+            if rows:
+                manifest.files[path] = int(rows)
+            else:
+                os.remove(self._path(path))
+            compacted += 1
+            self._files_compacted.inc(len(files))
+        return compacted
+
+    def _remove_orphans(self, manifest: _Manifest) -> None:
+        """Delete part files a crashed sync wrote but never committed."""
+        known = set(manifest.files) | set(manifest.retired)
+        for directory, _, names in os.walk(self._root):
+            relative = os.path.relpath(directory, self._root).replace(os.sep, "/")
+            if not relative.startswith("tenant="):
+                continue
+            for name in names:
+                if name.endswith(".parquet") and f"{relative}/{name}" not in known:
+                    os.remove(os.path.join(directory, name))
+        for name in os.listdir(self._path(_STAGING)):
+            os.remove(self._path(os.path.join(_STAGING, name)))
+
+    def _unlink(self, paths: Sequence[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(self._path(path))
+            except FileNotFoundError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    async def _tail(
+        self, tenant_id: str, manifest: _Manifest
+    ) -> Tuple[Optional[Any], List[str]]:
+        """
+        Raw rows of the tenant ingested after the watermark (as an Arrow
+        table of text columns) and the exports reloaded since, read from one
+        read-only snapshot.
+        """
+        import asyncpg
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+
+        names = [name for name, _ in manifest.columns]
+        buffer = io.BytesIO()
+        pool = await database.get_readonly_pool()
+        try:
+            async with pool.acquire() as conn:
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    reloaded = [
+                        row["source_file"]
+                        for row in await conn.fetch(_TAIL_RELOADED_SQL, tenant_id, manifest.watermark)
+                    ]
+                    await conn.copy_from_query(
+                        _TAIL_SQL.format(columns=", ".join(_quote(name) for name in names)),
+                        tenant_id, manifest.watermark, ANALYTICS_MAX_TAIL_ROWS + 1,
+                        output=buffer, format="csv",
+                    )
+        except (asyncpg.DataError, ValueError) as exc:
+            raise QuerySourceUnavailable(f"tenant {tenant_id!r}: {exc}") from exc
+        if not buffer.getbuffer().nbytes:
+            return None, reloaded
+        tail = pacsv.read_csv(
+            io.BytesIO(buffer.getvalue()),
+            read_options=pacsv.ReadOptions(column_names=names),
+            convert_options=pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in names},
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        if tail.num_rows > ANALYTICS_MAX_TAIL_ROWS:
+            raise QuerySourceUnavailable(f"more than {ANALYTICS_MAX_TAIL_ROWS} rows past the watermark")
+        return tail, reloaded
+
+    def _view_sql(self, manifest: _Manifest, files: Sequence[str], tail: Any, reloaded: Sequence[str]) -> str:
+        """The consolidated_billing view: Parquet files plus the raw tail, less reloaded exports."""
+        names = [_quote(name) for name, _ in manifest.columns]
+        parts = []
+        if files:
+            sources = ", ".join(_literal(self._path(path)) for path in files)
+            part = f"SELECT {', '.join(names)} FROM read_parquet([{sources}], union_by_name = true)"
+            if reloaded:
+                part += " WHERE source_file IS NULL OR source_file NOT IN (SELECT source_file FROM _reloaded)"
+            parts.append(part)
+        if tail is not None:
+            casts = ", ".join(f"CAST({name} AS {kind}) AS {name}" for name, (_, kind) in zip(names, manifest.columns))
+            parts.append(f"SELECT {casts} FROM _tail")
+        if not parts:
+            casts = ", ".join(f"CAST(NULL AS {kind}) AS {name}" for name, (_, kind) in zip(names, manifest.columns))
+            parts.append(f"SELECT {casts} WHERE false")
+        return f"CREATE OR REPLACE TEMP VIEW {MIRRORED_TABLE} AS {' UNION ALL '.join(parts)}"
+
+    def _open(
+        self, cursor: Any, view: str, tail: Any, reloaded: Sequence[str], statement: str, args: Sequence[Any]
+    ) -> Any:
+        import pyarrow as pa
+
+        if tail is not None:
+            cursor.register("_tail", tail)
+        if reloaded:
+            cursor.register("_reloaded", pa.table({"source_file": pa.array(list(reloaded), pa.string())}))
+        cursor.execute(view)
+        return cursor.execute(statement, list(args)).fetch_record_batch(OPTIC_FETCH_CHUNK_ROWS)
+
+    async def stream(
+        self, tenant_id: str, sql: str, *args: Any, max_rows: int
+    ) -> AsyncIterator[Tuple[List[str], List[Tuple[Any, ...]]]]:
+        """
+        Yield (columns, rows) chunks like optic_sql.QueryExecutor.stream.
+        Raises QuerySourceUnavailable before the first chunk when the store
+        cannot answer the statement, QueryTimeoutError past
+        ANALYTICS_STATEMENT_TIMEOUT_MS and QueryExecutionError otherwise.
+        """
+        if not self.configured:
+            raise QuerySourceUnavailable("no analytics store configured")
+        manifest = self._load_manifest()
+        if manifest.watermark is None:
+            raise QuerySourceUnavailable("the store has not been synced yet")
+        statement = _duckdb_sql(sql)
+        tail, reloaded = await self._tail(tenant_id, manifest)
+        view = self._view_sql(manifest, manifest.by_tenant.get(tenant_id, []), tail, reloaded)
+
+        import duckdb
+
+        db = await self._database()
+        started = time.perf_counter()
+        async with self._slots:
+            cursor = db.cursor()
+            timer = asyncio.get_running_loop().call_later(ANALYTICS_STATEMENT_TIMEOUT_MS / 1000, cursor.interrupt)
+            try:
+                try:
+                    reader = await asyncio.to_thread(self._open, cursor, view, tail, reloaded, statement, args)
+                except duckdb.InterruptException as exc:
+                    raise QueryTimeoutError(
+                        f"Query exceeded the {ANALYTICS_STATEMENT_TIMEOUT_MS} ms analytics timeout."
+                    ) from exc
+                except duckdb.Error as exc:
+                    self._declined.inc()
+                    raise QuerySourceUnavailable(str(exc)) from exc
+                columns = list(reader.schema.names)
+                fetched = 0
+                while fetched < max_rows:
+                    try:
+                        batch = await asyncio.to_thread(_next_batch, reader)
+                    except duckdb.InterruptException as exc:
+                        raise QueryTimeoutError(
+                            f"Query exceeded the {ANALYTICS_STATEMENT_TIMEOUT_MS} ms analytics timeout."
+                        ) from exc
+                    except duckdb.Error as exc:
+                        raise QueryExecutionError(str(exc)) from exc
+                    if batch is None:
+                        break
+                    rows = list(zip(*(column.to_pylist() for column in batch.columns)))[: max_rows - fetched]
+                    if not rows:
+                        continue
+                    fetched += len(rows)
+                    yield columns, rows
+                if not fetched:
+                    yield columns, []
+            finally:
+                timer.cancel()
+                cursor.interrupt()  # stops a fetch still running in its thread if we were cancelled
+                cursor.close()
+                self._queries.observe((time.perf_counter() - started) * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        manifest = self._manifest
+        return {
+            "configured": self.configured,
+            "watermark": manifest.watermark.isoformat() if manifest.watermark else None,
+            "files": len(manifest.files),
+            "rows": sum(manifest.files.values()),
+            "sync": self._syncs.snapshot(),
+            "query": self._queries.snapshot(),
+            "rows_exported": self._rows_exported.value,
+            "files_compacted": self._files_compacted.value,
+            "declined": self._declined.value,
+            "failures": self._failures.value,
+        }
+
+
+def _next_batch(reader: Any) -> Optional[Any]:
+    try:
+        return reader.read_next_batch()
+    except StopIteration:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def _main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sync or query the Parquet analytics store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("sync", help="Export new rows, apply reloads and retention, compact.")
+    query = commands.add_parser("query", help="Run a PostgreSQL statement against the store ($1 = tenant).")
+    query.add_argument("--tenant", required=True)
+    query.add_argument("sql")
+    args = parser.parse_args(argv)
+
+    store = AnalyticsStore(interval_seconds=0)
+    try:
+        if args.command == "sync":
+            print(await store.sync())
+        else:
+            printed = False
+            async for columns, rows in store.stream(args.tenant, args.sql, args.tenant, max_rows=1000):
+                if not printed:
+                    print(columns)
+                    printed = True
+                for row in rows:
+                    print(row)
+    finally:
+        await store.stop()
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
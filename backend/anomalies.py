@@ -0,0 +1,677 @@
+"""
+anomalies.py
+============
+TEJUSKA Cloud Intelligence
+Streaming cost-anomaly detection over newly ingested billing rows.
+
+A series is one (tenant, provider/service, region); a point is its billed
+cost for one UTC day. Each pass reads the ingested_at window (watermark,
+ingest horizon - lag], finds the (tenant, day) pairs it touched and fetches
+those days' current totals from billing_daily_rollup plus its raw tail.
+Points carry absolute day totals rather than deltas, so replaying a window
+after a crash, or a forced reload of an export, never double counts.
+
+Every series holds one open day, the latest seen. A point for the open day
+replaces its total; a later day closes it, folding the closed total into
+the series' statistics, all in constant time:
+  - EWMA mean and variance,
+  - a weekday baseline (EWMA per day of the week),
+  - a robust level and the mean absolute deviation (MAD) of costs around
+    the expected cost, both EWMAs with residuals clipped at _CLIP scales,
+    so one spike neither drags the baseline nor inflates the scale that
+    judges the next.
+Points for days older than the open day are ignored. Days without cost
+are skipped, not counted as zero.
+
+The open day is scored on every update. It is a spike when it exceeds the
+expected cost (weekday baseline, else the robust level) by the tenant's
+configured percentage, by at least ANOMALY_MIN_DELTA, and by ANOMALY_MIN_Z
+robust standard deviations. Spikes are recorded in cost_anomalies; the
+primary key keeps each (series, day) to one alert across restarts. One
+alert per tenant is queued on the notification outbox in the same
+transaction, so a recorded spike is never left unannounced. The watermark
+and the alerted days advance only once that transaction commits; a failed
+pass replays its window and retries its spikes.
+
+State is a set of numpy arrays indexed by series, about 80 bytes a series
+plus the key index, so a million series fit comfortably in memory. It is
+checkpointed with its watermark to ANOMALY_STATE_DIR and reloaded on start.
+One process per state directory runs the detector (file lock), and one
+detector at a time works across nodes (advisory lock).
+
+Usage (from backend/):
+    python anomalies.py detect
+    python anomalies.py inspect
+"""
+
+import os
+import json
+import time
+import fcntl
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+import numpy as np
+
+import database
+import metrics
+import rollups
+from notifications import Notification
+from outbox import NotificationOutbox
+
+logger = logging.getLogger("tejuska.anomalies")
+
+ANOMALY_STATE_DIR: str = os.environ.get("ANOMALY_STATE_DIR", "anomaly_state")
+ANOMALY_POLL_SECONDS: float = float(os.environ.get("ANOMALY_POLL_SECONDS", "60"))
+ANOMALY_CHECKPOINT_SECONDS: float = float(os.environ.get("ANOMALY_CHECKPOINT_SECONDS", "300"))
+ANOMALY_SAFETY_LAG_SECONDS: float = float(os.environ.get("ANOMALY_SAFETY_LAG_SECONDS", "0"))
+# Touched days older than this are not fetched; new series warm up from them.
+ANOMALY_LOOKBACK_DAYS: int = int(os.environ.get("ANOMALY_LOOKBACK_DAYS", "28"))
+# Only days this recent raise alerts (backfills and the first pass stay silent).
+ANOMALY_ALERT_DAYS: int = int(os.environ.get("ANOMALY_ALERT_DAYS", "2"))
+ANOMALY_FETCH_ROWS: int = int(os.environ.get("ANOMALY_FETCH_ROWS", "200000"))
+ANOMALY_EWMA_ALPHA: float = float(os.environ.get("ANOMALY_EWMA_ALPHA", "0.1"))
+ANOMALY_SEASON_ALPHA: float = float(os.environ.get("ANOMALY_SEASON_ALPHA", "0.3"))
+ANOMALY_WARMUP_DAYS: int = int(os.environ.get("ANOMALY_WARMUP_DAYS", "7"))
+ANOMALY_MIN_Z: float = float(os.environ.get("ANOMALY_MIN_Z", "3"))
+ANOMALY_MIN_DELTA: float = float(os.environ.get("ANOMALY_MIN_DELTA", "1"))
+ANOMALY_MAX_ALERT_LINES: int = int(os.environ.get("ANOMALY_MAX_ALERT_LINES", "10"))
+
+SEASON = 7
+_CHECKPOINT = "state.npz"
+_LOCK_FILE = ".lock"
+_LOCK_KEY = 0x616E_6F6D  # pg advisory lock: one detector pass at a time across nodes
+_CODE_BITS = 21          # tenant, service and region codes packed into one int key
+_NO_DAY = -1
+_MAD_TO_SD = 1.4826
+_CLIP = 3.0              # residuals are clipped at this many scales before they update state
+_STATE_FIELDS: Dict[str, Tuple[Any, Tuple[int, ...]]] = {
+    "tenant":      (np.int32, ()),
+    "service":     (np.int32, ()),
+    "region":      (np.int32, ()),
+    "open_day":    (np.int32, ()),     # days since 1970-01-01
+    "open_cost":   (np.float64, ()),
+    "count":       (np.uint16, ()),    # closed days observed (saturating)
+    "mean":        (np.float32, ()),
+    "var":         (np.float32, ()),
+    "loc":         (np.float32, ()),
+    "mad":         (np.float32, ()),
+    "season":      (np.float32, (SEASON,)),
+    "season_n":    (np.uint8, (SEASON,)),
+    "alerted_day": (np.int32, ()),
+}
+
+_WATERMARK = (
+    f"COALESCE((SELECT high_watermark FROM rollup_watermarks WHERE rollup_name = '{rollups.DAILY_ROLLUP}'), "
+    f"'-infinity')"
+)
+# $1/$2: the ingested_at window, $3: the oldest charge day fetched.
+_POINTS_SQL = f"""
+WITH touched AS (
+    SELECT DISTINCT tenant_id, (charge_period_start AT TIME ZONE 'UTC')::date AS usage_date
+    FROM consolidated_billing
+    WHERE ingested_at > $1 AND ingested_at <= $2 AND charge_period_start >= $3
+)
+SELECT s.tenant_id::text AS tenant_id, s.provider_name, s.service_name, s.region, s.usage_date,
+       SUM(s.billed_cost)::float8 AS billed_cost
+FROM (
+    SELECT r.tenant_id, r.provider_name, r.service_name, r.region, r.usage_date, r.billed_cost
+    FROM billing_daily_rollup r
+    JOIN touched t ON t.tenant_id = r.tenant_id AND t.usage_date = r.usage_date
+    UNION ALL
+    SELECT b.tenant_id, b.provider_name, b.service_name, COALESCE(b.region_name, b.region_id, 'unknown'),
+           t.usage_date, b.billed_cost
+    FROM touched t
+    JOIN consolidated_billing b ON b.tenant_id = t.tenant_id
+         AND b.charge_period_start >= t.usage_date::timestamp AT TIME ZONE 'UTC'
+         AND b.charge_period_start < (t.usage_date + 1)::timestamp AT TIME ZONE 'UTC'
+    WHERE b.ingested_at > {_WATERMARK}
+) AS s
+GROUP BY 1, 2, 3, 4, 5
+ORDER BY 5
+"""
+_SETTINGS_SQL = """
+SELECT tenant_id::text AS tenant_id, spike_pct::float8 AS spike_pct, channel, recipient
+FROM anomaly_settings WHERE enabled
+"""
+_RECORD_SQL = """
+INSERT INTO cost_anomalies (tenant_id, provider_name, service_name, region, usage_date,
+                            billed_cost, expected_cost, spike_pct)
+SELECT * FROM unnest($1::uuid[], $2::text[], $3::text[], $4::text[], $5::date[],
+                     $6::numeric[], $7::numeric[], $8::numeric[])
+ON CONFLICT DO NOTHING
+RETURNING tenant_id::text AS tenant_id, provider_name, service_name, region, usage_date,
+          billed_cost::float8 AS billed_cost, expected_cost::float8 AS expected_cost
+"""
+_SAVE_SETTINGS_SQL = """
+INSERT INTO anomaly_settings (tenant_id, spike_pct, channel, recipient, enabled)
+VALUES ($1, $2, $3, $4, $5)
+ON CONFLICT (tenant_id) DO UPDATE
+SET spike_pct = EXCLUDED.spike_pct, channel = EXCLUDED.channel,
+    recipient = EXCLUDED.recipient, enabled = EXCLUDED.enabled
+RETURNING tenant_id::text AS tenant_id, spike_pct::float8 AS spike_pct, channel, recipient, enabled, updated_at
+"""
+_RECENT_SQL = """
+SELECT provider_name, service_name, region, usage_date, billed_cost::float8 AS billed_cost,
+       expected_cost::float8 AS expected_cost, spike_pct::float8 AS spike_pct, detected_at
+FROM cost_anomalies WHERE tenant_id = $1
+ORDER BY detected_at DESC, billed_cost DESC LIMIT $2
+"""
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _day_number(day: date) -> int:
+    return (day - _EPOCH).days
+
+
+def _day(number: int) -> date:
+    return _EPOCH + timedelta(days=int(number))
+
+
+# ---------------------------------------------------------------------------
+# Array-backed series state
+# ---------------------------------------------------------------------------
+
+class SeriesState:
+    """
+    Online statistics for every series, one array row each. Codes for
+    tenants, services and regions are interned; a series is found through
+    one dict lookup on its packed code.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.size = 0
+        self.tenants: List[str] = []
+        self.services: List[Tuple[str, str]] = []
+        self.regions: List[str] = []
+        self._tenant_codes: Dict[str, int] = {}
+        self._service_codes: Dict[Tuple[str, str], int] = {}
+        self._region_codes: Dict[str, int] = {}
+        self._index: Dict[int, int] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        grown = {}
+        for name, (dtype, shape) in _STATE_FIELDS.items():
+            array = np.zeros((capacity,) + shape, dtype=dtype)
+            if name in ("open_day", "alerted_day"):
+                array.fill(_NO_DAY)
+            if name in self._arrays:
+                array[:self.size] = self._arrays[name][:self.size]
+            grown[name] = array
+        self._arrays = grown
+        self.__dict__.update(grown)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._arrays["tenant"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array[:self.size].nbytes for array in self._arrays.values())
+
+    @staticmethod
+    def _intern(value: Any, codes: Dict[Any, int], values: List[Any]) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def indices(self, tenants: Sequence[str], services: Sequence[Tuple[str, str]], regions: Sequence[str]) -> np.ndarray:
+        """Series rows for the given keys, adding rows for keys not seen before."""
+        out = np.empty(len(tenants), dtype=np.int64)
+        new: List[Tuple[int, int, int]] = []
+        for position, (tenant, service, region) in enumerate(zip(tenants, services, regions)):
+            t = self._intern(tenant, self._tenant_codes, self.tenants)
+            s = self._intern(service, self._service_codes, self.services)
+            r = self._intern(region, self._region_codes, self.regions)
+            key = (t << (2 * _CODE_BITS)) | (s << _CODE_BITS) | r
+            row = self._index.get(key)
+            if row is None:
+                row = self._index[key] = self.size + len(new)
+                new.append((t, s, r))
+            out[position] = row
+        if new:
+            if self.size + len(new) > self.capacity:
+                self._allocate(max(2 * self.capacity, self.size + len(new)))
+            codes = np.array(new, dtype=np.int32)
+            span = slice(self.size, self.size + len(new))
+            self.tenant[span], self.service[span], self.region[span] = codes.T
+            self.size += len(new)
+        return out
+
+    def tenant_codes(self, tenant_ids: Sequence[str]) -> Dict[str, int]:
+        return {tenant_id: self._tenant_codes[tenant_id] for tenant_id in tenant_ids if tenant_id in self._tenant_codes}
+
+    def observe(self, rows: np.ndarray, days: np.ndarray, costs: np.ndarray) -> None:
+        """Fold closed day totals into the statistics of distinct series rows."""
+        n = self.count[rows].astype(np.float32)
+        x = costs.astype(np.float32)
+        alpha = np.maximum(ANOMALY_EWMA_ALPHA, 1 / (n + 1)).astype(np.float32)
+        expected, scale = self.expected(rows, days)
+        # Residuals beyond _CLIP scales move the robust statistics as if they were at the bound.
+        bound = np.where((n >= 2) & (scale > 0), _CLIP * scale, np.inf).astype(np.float32)
+
+        delta = x - self.mean[rows]
+        self.mean[rows] += alpha * delta
+        self.var[rows] = (1 - alpha) * (self.var[rows] + alpha * delta * delta)
+
+        residual = np.abs(x - expected)
+        self.mad[rows] = np.where(n == 0, 0, (1 - alpha) * self.mad[rows] + alpha * np.minimum(residual, bound))
+        self.loc[rows] += alpha * np.clip(x - self.loc[rows], -bound, bound)
+
+        slots = days % SEASON
+        seen = self.season_n[rows, slots]
+        season_alpha = np.maximum(ANOMALY_SEASON_ALPHA, 1 / (seen.astype(np.float32) + 1))
+        season = self.season[rows, slots]
+        season_bound = np.where(seen > 0, bound, np.inf)
+        self.season[rows, slots] = season + season_alpha * np.clip(x - season, -season_bound, season_bound)
+        self.season_n[rows, slots] = np.minimum(seen.astype(np.int32) + 1, 255)
+        self.count[rows] = np.minimum(n + 1, np.iinfo(np.uint16).max)
+
+    def expected(self, rows: np.ndarray, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Expected cost for days of rows (weekday baseline once it has two
+        points, else the robust level) and the robust standard deviation of
+        costs around it.
+        """
+        slots = days % SEASON
+        expected = np.where(self.season_n[rows, slots] >= 2, self.season[rows, slots], self.loc[rows])
+        scale = _MAD_TO_SD * self.mad[rows]
+        return expected, np.where(scale > 0, scale, np.sqrt(self.var[rows]))
+
+    def apply(self, rows: np.ndarray, days: np.ndarray, costs: np.ndarray) -> np.ndarray:
+        """
+        Apply day totals for distinct series rows; returns the mask of
+        points that updated an open day (the rest were late and ignored).
+        """
+        open_day = self.open_day[rows]
+        later = days > open_day
+        closing = later & (open_day != _NO_DAY)
+        if closing.any():
+            self.observe(rows[closing], open_day[closing], self.open_cost[rows[closing]])
+        current = days >= open_day
+        self.open_day[rows[later]] = days[later]
+        self.open_cost[rows[current]] = costs[current]
+        return current
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+
+    def save(self, path: str, meta: Dict[str, Any]) -> None:
+        """Write the state and meta to path atomically."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as handle:
+            np.savez(
+                handle,
+                meta=np.array(json.dumps({
+                    **meta, "tenants": self.tenants, "services": self.services, "regions": self.regions,
+                })),
+                **{name: array[:self.size] for name, array in self._arrays.items()},
+            )
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["SeriesState", Dict[str, Any]]:
+        with np.load(path) as saved:
+            meta = json.loads(str(saved["meta"]))
+            size = len(saved["tenant"])
+            state = cls(capacity=max(1024, size))
+            for name in _STATE_FIELDS:
+                state._arrays[name][:size] = saved[name]
+        state.size = size
+        state.tenants = meta.pop("tenants")
+        state.services = [tuple(service) for service in meta.pop("services")]
+        state.regions = meta.pop("regions")
+        state._tenant_codes = {value: code for code, value in enumerate(state.tenants)}
+        state._service_codes = {value: code for code, value in enumerate(state.services)}
+        state._region_codes = {value: code for code, value in enumerate(state.regions)}
+        keys = ((state.tenant[:size].astype(np.int64) << (2 * _CODE_BITS))
+                | (state.service[:size].astype(np.int64) << _CODE_BITS) | state.region[:size])
+        state._index = dict(zip(keys.tolist(), range(size)))
+        return state, meta
+
+
+def _rounds(rows: np.ndarray) -> np.ndarray:
+    """Occurrence number of each row within its series, keeping input order."""
+    order = np.argsort(rows, kind="stable")
+    ordered = rows[order]
+    starts = np.r_[0, np.flatnonzero(ordered[1:] != ordered[:-1]) + 1]
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    out = np.empty(len(rows), dtype=np.int64)
+    out[order] = rank
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Detector
+# ---------------------------------------------------------------------------
+
+class AnomalyDetector:
+    """
+    Consumes newly ingested billing rows, keeps per-series statistics and
+    alerts on spikes.
+
+    Parameters
+    ----------
+    outbox           : Queues alerts; None records anomalies without alerting.
+    state_dir        : Checkpoint directory.
+    interval_seconds : Poll period; 0 disables the background loop.
+    """
+
+    def __init__(
+        self,
+        outbox: Optional[NotificationOutbox] = None,
+        state_dir: str = ANOMALY_STATE_DIR,
+        interval_seconds: float = ANOMALY_POLL_SECONDS,
+    ) -> None:
+        self._outbox = outbox
+        self._dir = os.path.abspath(state_dir)
+        self._interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._lock_handle: Any = None
+        self.state = SeriesState()
+        self.watermark: Optional[datetime] = None
+        self._pending: List[Tuple[int, int, float, float]] = []
+        self._checkpointed = time.monotonic()
+        self._passes = metrics.LatencyTracker()
+        self._points = metrics.Counter()
+        self._late = metrics.Counter()
+        self._anomalies = metrics.Counter()
+        self._alerts = metrics.Counter()
+        self._failures = metrics.Counter()
+        metrics.register("anomalies", self.snapshot)
+
+    async def start(self) -> None:
+        if self._interval <= 0:
+            logger.info("Anomaly detection disabled (ANOMALY_POLL_SECONDS=0).")
+            return
+        os.makedirs(self._dir, exist_ok=True)
+        handle = open(os.path.join(self._dir, _LOCK_FILE), "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            logger.info("Anomaly state in %s is owned by another process; detector not started.", self._dir)
+            return
+        self._lock_handle = handle
+        await asyncio.to_thread(self.restore)
+        self._task = asyncio.create_task(self._loop(), name="anomaly-detector")
+        logger.info("Anomaly detector started (%d series, every %.0fs).", self.state.size, self._interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await asyncio.to_thread(self.checkpoint)
+            logger.info("Anomaly detector stopped.")
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.detect()
+                if time.monotonic() - self._checkpointed >= ANOMALY_CHECKPOINT_SECONDS:
+                    await asyncio.to_thread(self.checkpoint)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._failures.inc()
+                logger.warning("Anomaly detection pass failed: %s", exc)
+            await asyncio.sleep(self._interval)
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+
+    def _checkpoint_path(self) -> str:
+        return os.path.join(self._dir, _CHECKPOINT)
+
+    def restore(self) -> None:
+        """Load the last checkpoint, if any."""
+        if not os.path.exists(self._checkpoint_path()):
+            return
+        self.state, meta = SeriesState.load(self._checkpoint_path())
+        watermark = meta.get("watermark")
+        self.watermark = datetime.fromisoformat(watermark) if watermark else None
+
+    def checkpoint(self) -> None:
+        """Persist the state with the watermark it reflects."""
+        os.makedirs(self._dir, exist_ok=True)
+        self.state.save(self._checkpoint_path(), {
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        })
+        self._checkpointed = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Detection
+    # ------------------------------------------------------------------
+
+    def process(
+        self,
+        tenants: Sequence[str],
+        services: Sequence[Tuple[str, str]],
+        regions: Sequence[str],
+        days: np.ndarray,
+        costs: np.ndarray,
+        spike_pct: Dict[str, float],
+        alert_from: int,
+    ) -> List[Tuple[int, int, float, float]]:
+        """
+        Apply day totals in day order. Returns (series row, day, cost,
+        expected) for points of tenants in spike_pct that are spikes on a day
+        no earlier than alert_from and not yet alerted; detect() marks them
+        alerted once they are recorded.
+        """
+        rows = self.state.indices(tenants, services, regions)
+        rank = _rounds(rows)
+        thresholds = np.full(len(self.state.tenants), np.nan)
+        for tenant_id, code in self.state.tenant_codes(list(spike_pct)).items():
+            thresholds[code] = spike_pct[tenant_id]
+
+        spikes: List[Tuple[int, int, float, float]] = []
+        for round_number in range(int(rank.max(initial=-1)) + 1):
+            chosen = rank == round_number
+            series, day, cost = rows[chosen], days[chosen], costs[chosen]
+            current = self.state.apply(series, day, cost)
+            self._late.inc(int((~current).sum()))
+            scored = current & (day >= alert_from) & (self.state.alerted_day[series] != day)
+            if not scored.any():
+                continue
+            series, day, cost = series[scored], day[scored], cost[scored]
+            expected, scale = self.state.expected(series, day)
+            pct = thresholds[self.state.tenant[series]]
+            with np.errstate(invalid="ignore"):
+                spike = (
+                    (self.state.count[series] >= ANOMALY_WARMUP_DAYS)
+                    & (cost > expected * (1 + pct / 100))
+                    & (cost - expected >= ANOMALY_MIN_DELTA)
+                    & (cost - expected >= ANOMALY_MIN_Z * scale)
+                )
+            spikes.extend(zip(series[spike].tolist(), day[spike].tolist(),
+                              cost[spike].tolist(), expected[spike].astype(float).tolist()))
+        self._points.inc(len(rows))
+        return spikes
+
+    async def detect(self) -> Dict[str, int]:
+        """
+        One pass over rows ingested since the watermark. Returns points and
+        anomalies seen; empty when another detector holds the lock or an
+        ingest is still open.
+        """
+        pool = await database.get_pool()
+        report = {"points": 0, "anomalies": 0}
+        async with pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+                return {}
+            try:
+                horizon = await rollups.ingest_horizon(conn)
+                if horizon is None:
+                    return {}
+                started = time.perf_counter()
+                cutoff = horizon - timedelta(seconds=ANOMALY_SAFETY_LAG_SECONDS)
+                low = self.watermark or datetime.min.replace(tzinfo=timezone.utc)
+                if low >= cutoff:
+                    return report
+                today = cutoff.date()
+                alert_from = _day_number(today) - ANOMALY_ALERT_DAYS + 1
+                settings = {row["tenant_id"]: row for row in await conn.fetch(_SETTINGS_SQL)}
+                spike_pct = {tenant_id: row["spike_pct"] for tenant_id, row in settings.items()}
+                since = datetime.combine(today - timedelta(days=ANOMALY_LOOKBACK_DAYS), datetime.min.time(),
+                                         tzinfo=timezone.utc)
+
+                # Spikes a failed pass found but could not record; days that
+                # pass closed are not scored again when its window replays.
+                spikes = [spike for spike in self._pending
+                          if self.state.tenants[self.state.tenant[spike[0]]] in spike_pct]
+                recorded: List[Any] = []
+                async with conn.transaction():
+                    cursor = await conn.cursor(_POINTS_SQL, low, cutoff, since)
+                    while True:
+                        chunk = await cursor.fetch(ANOMALY_FETCH_ROWS)
+                        if not chunk:
+                            break
+                        report["points"] += len(chunk)
+                        spikes.extend(self.process(
+                            [row["tenant_id"] for row in chunk],
+                            [(row["provider_name"], row["service_name"]) for row in chunk],
+                            [row["region"] for row in chunk],
+                            np.fromiter((_day_number(row["usage_date"]) for row in chunk), np.int32, len(chunk)),
+                            np.fromiter((row["billed_cost"] for row in chunk), np.float64, len(chunk)),
+                            spike_pct, alert_from,
+                        ))
+                    self._pending = spikes
+                    if spikes:
+                        recorded = await self._record(conn, spikes, spike_pct)
+                        await self._alert(conn, recorded, settings)
+                # Only a committed pass moves on: until then the window
+                # replays and its spikes stay unmarked.
+                self.watermark = cutoff
+                if spikes:
+                    self.state.alerted_day[np.array([spike[0] for spike in spikes])] = [spike[1] for spike in spikes]
+                self._pending = []
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+        report["anomalies"] = len(recorded)
+        self._anomalies.inc(len(recorded))
+        self._passes.observe((time.perf_counter() - started) * 1000)
+        return report
+
+    async def _record(self, conn: Any, spikes: List[Tuple[int, int, float, float]],
+                      spike_pct: Dict[str, float]) -> List[Any]:
+        """Insert spikes into cost_anomalies; returns only those not recorded before."""
+        state = self.state
+        columns: List[List[Any]] = [[] for _ in range(8)]
+        for row, day, cost, expected in spikes:
+            tenant_id = state.tenants[state.tenant[row]]
+            provider_name, service_name = state.services[state.service[row]]
+            values = (tenant_id, provider_name, service_name, state.regions[state.region[row]], _day(day),
+                      round(cost, 6), round(expected, 6), spike_pct[tenant_id])
+            for column, value in zip(columns, values):
+                column.append(value)
+        return await conn.fetch(_RECORD_SQL, *columns)
+
+    async def _alert(self, conn: Any, recorded: List[Any], settings: Dict[str, Any]) -> None:
+        """Queue one message per tenant listing its largest new spikes."""
+        if self._outbox is None or not recorded:
+            return
+        by_tenant: Dict[str, List[Any]] = {}
+        for row in recorded:
+            by_tenant.setdefault(row["tenant_id"], []).append(row)
+        alerts: List[Tuple[str, Notification]] = []
+        for tenant_id, rows in by_tenant.items():
+            config = settings[tenant_id]
+            rows.sort(key=lambda row: row["billed_cost"] - row["expected_cost"], reverse=True)
+            lines = [
+                f"- {row['service_name']} ({row['provider_name']}, {row['region']}) on {row['usage_date']}: "
+                f"${row['billed_cost']:,.2f} vs ${row['expected_cost']:,.2f} expected "
+                f"(+{(row['billed_cost'] / row['expected_cost'] - 1) * 100 if row['expected_cost'] > 0 else 100:.0f}%)"
+                for row in rows[:ANOMALY_MAX_ALERT_LINES]
+            ]
+            if len(rows) > ANOMALY_MAX_ALERT_LINES:
+                lines.append(f"... and {len(rows) - ANOMALY_MAX_ALERT_LINES} more.")
+            body = (f"TEJUSKA detected {len(rows)} cost spike(s) above your {config['spike_pct']:g}% threshold:\n"
+                    + "\n".join(lines))
+            alerts.append((tenant_id, Notification(
+                config["channel"], config["recipient"], body,
+                f"TEJUSKA cost anomaly alert ({len(rows)} spike{'s' if len(rows) != 1 else ''})",
+            )))
+        await self._outbox.enqueue(alerts, conn=conn)
+        self._alerts.inc(len(alerts))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "series": self.state.size,
+            "state_mb": round(self.state.nbytes / 2 ** 20, 1),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "pass": self._passes.snapshot(),
+            "points": self._points.value,
+            "late_points": self._late.value,
+            "anomalies": self._anomalies.value,
+            "alerts_queued": self._alerts.value,
+            "failures": self._failures.value,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Settings and history (used by the API)
+# ---------------------------------------------------------------------------
+
+async def save_settings(
+    tenant_id: str, spike_pct: float, channel: str, recipient: str, enabled: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """Create or replace a tenant's alert settings; None when the tenant does not exist."""
+    pool = await database.get_pool()
+    try:
+        row = await pool.fetchrow(_SAVE_SETTINGS_SQL, tenant_id, spike_pct, channel, recipient, enabled)
+    except asyncpg.ForeignKeyViolationError:
+        return None
+    return dict(row)
+
+
+async def recent_anomalies(tenant_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """The tenant's latest recorded spikes, newest first."""
+    pool = await database.get_readonly_pool()
+    return [dict(row) for row in await pool.fetch(_RECENT_SQL, tenant_id, limit)]
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def _main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run or inspect the cost-anomaly detector.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("detect", help="Run one pass from the checkpoint and save it (alerts are recorded, not sent).")
+    commands.add_parser("inspect", help="Print the checkpoint's size and watermark.")
+    args = parser.parse_args(argv)
+
+    detector = AnomalyDetector(interval_seconds=0)
+    detector.restore()
+    if args.command == "inspect":
+        print(detector.snapshot())
+        return
+    try:
+        print(await detector.detect())
+        detector.checkpoint()
+    finally:
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
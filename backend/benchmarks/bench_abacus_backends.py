@@ -0,0 +1,72 @@
+"""
+bench_abacus_backends.py
+========================
+TEJUSKA Cloud Intelligence
+Benchmark: eager vs TorchScript vs ONNX vs int8-quantised ONNX for the
+ABACUS dense scoring path (PPOPolicy + ResourceGNN node scorer).
+
+Artifacts are exported to a temporary directory with model_export, then
+each backend scores random feature batches. Reports median latency per
+call and rows/second.
+
+Usage (from backend/):
+    python benchmarks/bench_abacus_backends.py --batch-sizes 1 64 4096
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_export  # noqa: E402
+from ai_engine import PPOPolicy, ResourceGNN  # noqa: E402
+
+
+def time_backend(policy, scorer, batch_size: int, repeats: int) -> float:
+    x = torch.randn(batch_size, model_export.NUM_FEATURES)
+    samples = []
+    with torch.no_grad():
+        for _ in range(3):  # warm-up
+            policy(x)
+            scorer(x)
+        for _ in range(repeats):
+            started = time.perf_counter()
+            policy(x)
+            scorer(x)
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 4096])
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    policy, gnn = PPOPolicy().eval(), ResourceGNN().eval()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        model_export.export_torchscript(policy, gnn, model_dir)
+        model_export.export_onnx(policy, gnn, model_dir, quantize=True)
+
+        backends = {"eager": (policy, gnn)}
+        for backend in ("torchscript", "onnx", "onnx-int8"):
+            backends[backend] = model_export.load_compiled(model_dir, backend, threads=args.threads)
+
+        print(f"{'backend':<12s} {'batch':>6s} {'median ms':>10s} {'rows/s':>14s}")
+        for batch_size in args.batch_sizes:
+            for name, (policy_fn, scorer_fn) in backends.items():
+                latency = time_backend(policy_fn, scorer_fn, batch_size, args.repeats)
+                print(f"{name:<12s} {batch_size:>6d} {latency:>10.3f} {batch_size / latency * 1000:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+bench_analytics.py
+==================
+TEJUSKA Cloud Intelligence
+Benchmark: dashboard and OPTIC scans on Postgres versus the columnar
+analytics store (analytics_store.py).
+
+Loads --rows synthetic AWS export rows for one tenant through the normal
+ingestion path (the fixture from bench_ingest.py), mirrors them into a
+fresh store under --dir, then times each statement --repeat times on
+Postgres alone and through the store (Parquet plus the unsynced tail),
+checking that both return the same rows. A second load after the sync
+exercises the tail union.
+
+DATABASE_URL must point at a disposable database initialised with
+database/init_db.sql.
+
+Usage (from backend/):
+    python benchmarks/bench_analytics.py --rows 2000000
+    python benchmarks/bench_analytics.py --rows 500000 --tail-rows 50000 --json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import ingestion
+import analytics_store
+from analytics_store import AnalyticsStore
+from bench_ingest import make_fixture
+from optic_sql import QueryExecutor
+
+_TENANT_SQL = """
+INSERT INTO tenants (company_name, domain, admin_email, plan)
+VALUES ('Analytics Bench', 'analytics-bench.tejuska.test', 'finops@analytics-bench.tejuska.test', 'enterprise')
+ON CONFLICT (domain) DO UPDATE SET company_name = EXCLUDED.company_name
+RETURNING tenant_id
+"""
+
+# name -> (statement, window in days); $2/$3 bound the window.
+STATEMENTS = {
+    "daily_trend_90d": ("""
+SELECT (charge_period_start AT TIME ZONE 'UTC')::date AS usage_date, SUM(billed_cost) AS billed_cost
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1 ORDER BY 1
+""", 90),
+    "top_services_30d": ("""
+SELECT service_name, region_id, SUM(billed_cost) AS billed_cost, COUNT(DISTINCT resource_id) AS resources
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1, 2 ORDER BY 3 DESC, 1, 2 LIMIT 20
+""", 30),
+    "cost_by_team_90d": ("""
+SELECT COALESCE(tags ->> 'team', '(untagged)') AS team, SUM(billed_cost) AS billed_cost
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1 ORDER BY 2 DESC, 1
+""", 90),
+    "top_resources_90d": ("""
+SELECT resource_id, SUM(billed_cost) AS billed_cost
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT 50
+""", 90),
+}
+
+
+def _rounded(rows: List[Any]) -> List[tuple]:
+    """Rows with numbers rounded to NUMERIC(18,6), so float sums compare equal."""
+    return [tuple(round(float(v), 6) if isinstance(v, (int, float)) or hasattr(v, "as_tuple") else v
+                  for v in row) for row in rows]
+
+
+async def _time(executor: QueryExecutor, tenant_id: str, sql: str, args: tuple, repeat: int,
+                analytics: bool) -> Dict[str, Any]:
+    timings: List[float] = []
+    rows: List[Any] = []
+    for _ in range(repeat):
+        started, rows = time.perf_counter(), []
+        async for _, chunk in executor.stream(tenant_id, sql, *args, analytics=analytics):
+            rows.extend(chunk)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(timings), 1), "min_ms": round(min(timings), 1),
+            "rows": _rounded(rows)}
+
+
+async def run(args: argparse.Namespace, store_dir: str) -> Dict[str, Any]:
+    pool = await database.get_pool()
+    async with pool.acquire() as conn:
+        tenant_id = str(await conn.fetchval(_TENANT_SQL))
+        await conn.execute("DELETE FROM billing_ingestions WHERE tenant_id = $1", tenant_id)
+        await conn.execute("DELETE FROM consolidated_billing WHERE tenant_id = $1", tenant_id)
+
+    ingestor = ingestion.Ingestor()
+    report: Dict[str, Any] = {"rows": args.rows, "tail_rows": args.tail_rows}
+    path = os.path.join(store_dir, "fixture.csv")
+    make_fixture(path, args.rows, "aws", "csv")
+    await ingestor.ingest_file(tenant_id, path, "aws", source_file="bench-analytics")
+
+    analytics_store.ANALYTICS_SAFETY_LAG_SECONDS = 0
+    store = AnalyticsStore(os.path.join(store_dir, "store"))
+    started = time.perf_counter()
+    sync = await store.sync()
+    report["sync_s"] = round(time.perf_counter() - started, 2)
+    report["sync"] = sync
+    report["store_mb"] = round(sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(os.path.join(store_dir, "store")) for name in names
+    ) / 2 ** 20, 1)
+
+    if args.tail_rows:
+        make_fixture(path, args.tail_rows, "aws", "csv", seed=11)
+        await ingestor.ingest_file(tenant_id, path, "aws", source_file="bench-analytics-tail")
+    os.remove(path)
+
+    postgres, columnar = QueryExecutor(), QueryExecutor(analytics=store, metrics_name="bench_analytics_sql")
+    end = datetime.now(timezone.utc) + timedelta(hours=1)
+    report["statements"] = {}
+    for name, (sql, days) in STATEMENTS.items():
+        bind = (tenant_id, end - timedelta(days=days), end)
+        pg = await _time(postgres, tenant_id, sql, bind, args.repeat, analytics=False)
+        duck = await _time(columnar, tenant_id, sql, bind, args.repeat, analytics=True)
+        report["statements"][name] = {
+            "postgres_ms": pg["median_ms"], "analytics_ms": duck["median_ms"],
+            "speedup": round(pg["median_ms"] / max(duck["median_ms"], 0.1), 1),
+            "same_rows": pg["rows"] == duck["rows"],
+        }
+    report["analytics_fallbacks"] = columnar.snapshot()["analytics_fallbacks"]
+    await store.stop()
+    await database.close_pool()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Postgres versus analytics store scan latency.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows mirrored into Parquet.")
+    parser.add_argument("--tail-rows", type=int, default=20_000, help="Rows loaded after the sync.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="Where the fixture and store are written.")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    if not database.is_configured():
+        sys.exit("DATABASE_URL environment variable is not set.")
+    store_dir = tempfile.mkdtemp(prefix="bench-analytics-", dir=args.dir)
+    try:
+        report = asyncio.run(run(args, store_dir))
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+    print(f"{args.rows:,} rows mirrored in {report['sync_s']}s ({report['store_mb']} MB of Parquet), "
+          f"{args.tail_rows:,} rows left in the tail")
+    for name, result in report["statements"].items():
+        print(f"  {name:<18} postgres {result['postgres_ms']:>8} ms  analytics {result['analytics_ms']:>8} ms  "
+              f"x{result['speedup']:<5} same rows: {result['same_rows']}")
+    print(f"  fallbacks to postgres: {report['analytics_fallbacks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+bench_anomalies.py
+==================
+TEJUSKA Cloud Intelligence
+Benchmark: streaming cost-anomaly detection (anomalies.py).
+
+Generates --series synthetic daily cost series (level, weekly seasonality,
+noise) spread over tenants, services and regions, injects spikes of 1.5x
+to 4x into a --spike-rate share of series-days after the warm-up, and
+streams --days days of points through the detector one day at a time.
+Reports:
+  1. points per second through AnomalyDetector.process(), key lookups
+     included,
+  2. state memory (series arrays) and peak process RSS,
+  3. checkpoint size and save/load time,
+  4. precision and recall on the injected spikes.
+
+No database is needed.
+
+Usage (from backend/):
+    python benchmarks/bench_anomalies.py --series 1000000
+    python benchmarks/bench_anomalies.py --series 100000 --days 42 --json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import anomalies
+from anomalies import AnomalyDetector
+
+SERVICES = [("AWS", f"Service {i:02d}") for i in range(25)] + [("Azure", f"Service {i:02d}") for i in range(25)]
+REGIONS = ["us-east-1", "eu-west-1", "ap-south-1", "us-west-2"]
+PER_TENANT = 100
+
+
+def keys(series: int) -> Tuple[List[str], List[Tuple[str, str]], List[str]]:
+    """Distinct (tenant, service, region) keys, PER_TENANT series a tenant."""
+    ids = np.arange(series)
+    tenants = [f"tenant-{i // PER_TENANT:06d}" for i in ids]
+    services = [SERVICES[i % len(SERVICES)] for i in ids]
+    regions = [REGIONS[(i // len(SERVICES)) % len(REGIONS)] for i in ids]
+    return tenants, services, regions
+
+
+def make_costs(series: int, days: int, spike_rate: float, warmup: int, seed: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """(series, days) costs and the mask of injected spikes."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    base = rng.lognormal(3, 1.5, series)[:, None]
+    weekly = 1 + rng.uniform(0, 0.4, series)[:, None] * np.sin(2 * np.pi * t / 7 + rng.uniform(0, 6, series)[:, None])
+    costs = base * weekly * (1 + rng.normal(0, 0.05, (series, days)))
+    spikes = (rng.random((series, days)) < spike_rate) & (t >= warmup)
+    costs[spikes] *= rng.uniform(1.5, 4, int(spikes.sum()))
+    return np.maximum(costs, 0), spikes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Anomaly detector throughput, memory and accuracy.")
+    parser.add_argument("--series", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--spike-rate", type=float, default=0.001, help="Share of series-days with a spike.")
+    parser.add_argument("--spike-pct", type=float, default=15.0, help="Tenants' configured threshold.")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="Where the checkpoint is written.")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    warmup = anomalies.ANOMALY_WARMUP_DAYS + 7
+    tenants, services, regions = keys(args.series)
+    costs, injected = make_costs(args.series, args.days, args.spike_rate, warmup)
+    spike_pct = {tenant: args.spike_pct for tenant in set(tenants)}
+    state_dir = tempfile.mkdtemp(prefix="bench-anomalies-", dir=args.dir)
+    detector = AnomalyDetector(state_dir=state_dir, interval_seconds=0)
+
+    flagged = np.zeros_like(injected)
+    elapsed = 0.0
+    for day in range(args.days):
+        started = time.perf_counter()
+        found = detector.process(
+            tenants, services, regions, np.full(args.series, day, dtype=np.int32), costs[:, day],
+            spike_pct, alert_from=warmup,
+        )
+        elapsed += time.perf_counter() - started
+        for row, _, _, _ in found:
+            flagged[row, day] = True
+
+    try:
+        started = time.perf_counter()
+        detector.checkpoint()
+        save_s = time.perf_counter() - started
+        checkpoint_mb = os.path.getsize(os.path.join(state_dir, anomalies._CHECKPOINT)) / 2 ** 20
+        started = time.perf_counter()
+        restored = AnomalyDetector(state_dir=state_dir, interval_seconds=0)
+        restored.restore()
+        load_s = time.perf_counter() - started
+        same = all(np.array_equal(restored.state._arrays[name][:args.series], detector.state._arrays[name][:args.series])
+                   for name in anomalies._STATE_FIELDS)
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    hits = int((flagged & injected).sum())
+    report: Dict[str, Any] = {
+        "series": args.series, "days": args.days, "points": args.series * args.days,
+        "points_per_s": round(args.series * args.days / elapsed),
+        "state_mb": round(detector.state.nbytes / 2 ** 20, 1),
+        "bytes_per_series": round(detector.state.nbytes / args.series, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "checkpoint_mb": round(checkpoint_mb, 1),
+        "checkpoint_save_s": round(save_s, 2), "checkpoint_load_s": round(load_s, 2),
+        "checkpoint_round_trip": same,
+        "injected": int(injected.sum()), "flagged": int(flagged.sum()),
+        "precision": round(hits / max(int(flagged.sum()), 1), 3),
+        "recall": round(hits / max(int(injected.sum()), 1), 3),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.series:,} series x {args.days} days ({report['points']:,} points)")
+    print(f"  throughput: {report['points_per_s']:,} points/s")
+    print(f"  state: {report['state_mb']} MB ({report['bytes_per_series']} B/series), "
+          f"peak RSS {report['peak_rss_mb']} MB")
+    print(f"  checkpoint: {report['checkpoint_mb']} MB, save {report['checkpoint_save_s']}s, "
+          f"load {report['checkpoint_load_s']}s, round trip: {same}")
+    print(f"  spikes: {report['injected']:,} injected, {report['flagged']:,} flagged, "
+          f"precision {report['precision']}, recall {report['recall']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+bench_ingest.py
+===============
+TEJUSKA Cloud Intelligence
+Benchmark: billing export ingestion (ingestion.py) on a synthetic fixture.
+
+Writes --rows rows of a provider export (--dialect aws | azure | gcp |
+focus) as CSV, gzip CSV or Parquet, then measures:
+  1. parse + FOCUS mapping + binary COPY encoding alone, reported per CPU
+     second (process time, so pyarrow's worker threads are counted), next
+     to reading the file's record batches alone, which bounds it,
+  2. with DATABASE_URL set, the end-to-end load into consolidated_billing,
+     an unchanged re-delivery (skipped) and a forced reload (replaces the
+     first load). The row count and billed total are checked against the
+     fixture, and the rollups against the raw rows after a refresh.
+
+DATABASE_URL must point at a disposable database initialised with
+database/init_db.sql.
+
+Usage (from backend/):
+    python benchmarks/bench_ingest.py --rows 1000000 --encode-only
+    python benchmarks/bench_ingest.py --rows 2000000 --dialect gcp --format parquet
+    python benchmarks/bench_ingest.py --dialect azure --format csv.gz --json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+import database
+import ingestion
+import rollups
+
+SERVICES = (
+    ("AmazonEC2", "Amazon Elastic Compute Cloud", "Compute"),
+    ("AmazonS3", "Amazon Simple Storage Service", "Storage"),
+    ("AmazonRDS", "Amazon Relational Database Service", "Database"),
+    ("AWSLambda", "AWS Lambda", "Compute"),
+    ("AmazonCloudFront", "Amazon CloudFront", "Networking"),
+)
+REGIONS = ("us-east-1", "us-west-2", "eu-west-1", "ap-south-1")
+TEAMS = ("payments", "search", "platform", "data")
+
+_TENANT_SQL = """
+INSERT INTO tenants (company_name, domain, admin_email, plan)
+VALUES ('Ingest Bench', 'ingest-bench.tejuska.test', 'finops@ingest-bench.tejuska.test', 'enterprise')
+ON CONFLICT (domain) DO UPDATE SET company_name = EXCLUDED.company_name
+RETURNING tenant_id
+"""
+
+
+def _pick(values: Any, index: np.ndarray) -> pa.Array:
+    return pa.array(np.asarray(values, dtype=object)[index], pa.string())
+
+
+def make_fixture(path: str, rows: int, dialect: str, fmt: str, seed: int = 7) -> Decimal:
+    """Write a synthetic export; returns its billed total rounded like NUMERIC(18,6)."""
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(0, 60 * 24, rows)
+    now = np.datetime64("now", "h").astype("datetime64[us]")
+    starts = pa.array(now - hours.astype("timedelta64[h]"), pa.timestamp("us", tz="UTC"))
+    ends = pc.cast(pc.add(pc.cast(starts, pa.int64()), 3_600_000_000), pa.timestamp("us", tz="UTC"))
+    cost = np.round(rng.gamma(0.6, 2.0, rows), 8)
+    service = rng.integers(0, len(SERVICES), rows)
+    region = rng.integers(0, len(REGIONS), rows)
+    team = rng.integers(0, len(TEAMS) + 1, rows)  # the last index leaves the row untagged
+    resources = pc.binary_join_element_wise("i-", pc.cast(pa.array(rng.integers(0, 50_000, rows)), pa.string()), "")
+    team_tag = pa.array(np.where(team < len(TEAMS), np.asarray(TEAMS + ("",), dtype=object)[team], None), pa.string())
+    iso = lambda ts: pc.strftime(ts, "%Y-%m-%dT%H:%M:%SZ")  # noqa: E731
+    month_start = pc.floor_temporal(starts, unit="month")
+
+    if dialect == "aws":
+        line_type = np.where(rng.random(rows) < 0.9, "Usage", "Tax")
+        columns = {
+            "bill/PayerAccountId": pa.array(np.full(rows, "123456789012", dtype=object), pa.string()),
+            "bill/BillingPeriodStartDate": iso(month_start),
+            "lineItem/LineItemType": pa.array(line_type.astype(object), pa.string()),
+            "lineItem/UsageStartDate": iso(starts),
+            "lineItem/UsageEndDate": iso(ends),
+            "lineItem/ProductCode": _pick([s[0] for s in SERVICES], service),
+            "lineItem/ResourceId": resources,
+            "lineItem/UsageAmount": pa.array(np.round(rng.random(rows) * 10, 6)),
+            "lineItem/CurrencyCode": pa.array(np.full(rows, "USD", dtype=object), pa.string()),
+            "lineItem/UnblendedCost": pa.array(cost),
+            "product/ProductName": _pick([s[1] for s in SERVICES], service),
+            "product/productFamily": _pick([s[2] for s in SERVICES], service),
+            "product/region": _pick(REGIONS, region),
+            "pricing/unit": pa.array(np.full(rows, "Hrs", dtype=object), pa.string()),
+            "resourceTags/user:team": team_tag,
+        }
+    elif dialect == "azure":
+        columns = {
+            "BillingAccountId": pa.array(np.full(rows, "8611537", dtype=object), pa.string()),
+            "SubscriptionId": pa.array(np.full(rows, "0f1b0c5e-4b8e-4c1e-9a4f-1c9a1d3f2e11", dtype=object), pa.string()),
+            "Date": pc.strftime(starts, "%m/%d/%Y"),
+            "MeterCategory": _pick([s[1] for s in SERVICES], service),
+            "ServiceFamily": _pick([s[2] for s in SERVICES], service),
+            "ResourceId": resources,
+            "ResourceLocation": _pick(REGIONS, region),
+            "ChargeType": pa.array(np.full(rows, "Usage", dtype=object), pa.string()),
+            "Quantity": pa.array(np.round(rng.random(rows) * 10, 6)),
+            "CostInBillingCurrency": pa.array(cost),
+            "BillingCurrency": pa.array(np.full(rows, "USD", dtype=object), pa.string()),
+            "Tags": pc.if_else(
+                pc.is_null(team_tag), "", pc.binary_join_element_wise('"team": "', team_tag, '"', "")
+            ),
+        }
+    elif dialect == "gcp":
+        labels = pa.ListArray.from_arrays(
+            pa.array(np.concatenate([[0], np.cumsum(team < len(TEAMS))]).astype(np.int32)),
+            pa.StructArray.from_arrays([pa.array(np.full(int((team < len(TEAMS)).sum()), "team", dtype=object)),
+                                        pc.drop_null(team_tag)], names=["key", "value"]),
+        )
+        credit = np.round(-cost * 0.1, 8)
+        columns = {
+            "billing_account_id": pa.array(np.full(rows, "01A2B3-C4D5E6-F7A8B9", dtype=object), pa.string()),
+            "service": pa.StructArray.from_arrays([_pick([s[1] for s in SERVICES], service)], names=["description"]),
+            "sku": pa.StructArray.from_arrays([_pick([s[2] for s in SERVICES], service)], names=["description"]),
+            "usage_start_time": starts,
+            "usage_end_time": ends,
+            "project": pa.StructArray.from_arrays([resources], names=["id"]),
+            "labels": labels,
+            "location": pa.StructArray.from_arrays([_pick(REGIONS, region)], names=["region"]),
+            "cost": pa.array(cost),
+            "currency": pa.array(np.full(rows, "USD", dtype=object), pa.string()),
+            "credits": pa.ListArray.from_arrays(
+                pa.array(np.arange(rows + 1, dtype=np.int32)),
+                pa.StructArray.from_arrays([pa.array(credit)], names=["amount"]),
+            ),
+            "invoice": pa.StructArray.from_arrays([pc.strftime(starts, "%Y%m")], names=["month"]),
+            "cost_type": pa.array(np.full(rows, "regular", dtype=object), pa.string()),
+        }
+    else:
+        columns = {
+            "BillingAccountId": pa.array(np.full(rows, "acct-1", dtype=object), pa.string()),
+            "BillingPeriodStart": iso(month_start),
+            "ChargePeriodStart": iso(starts),
+            "ChargePeriodEnd": iso(ends),
+            "BilledCost": pa.array(cost),
+            "EffectiveCost": pa.array(np.round(cost * 0.8, 8)),
+            "BillingCurrency": pa.array(np.full(rows, "USD", dtype=object), pa.string()),
+            "ProviderName": pa.array(np.full(rows, "AWS", dtype=object), pa.string()),
+            "ServiceName": _pick([s[1] for s in SERVICES], service),
+            "ServiceCategory": _pick([s[2] for s in SERVICES], service),
+            "ResourceId": resources,
+            "RegionId": _pick(REGIONS, region),
+            "ChargeCategory": pa.array(np.full(rows, "Usage", dtype=object), pa.string()),
+            "Tags": pc.if_else(
+                pc.is_null(team_tag), "{}", pc.binary_join_element_wise('{"team":"', team_tag, '"}', "")
+            ),
+        }
+
+    table = pa.table(columns)
+    if fmt == "parquet":
+        pq.write_table(table, path, row_group_size=ingestion.INGEST_BATCH_ROWS)
+    else:
+        while any(pa.types.is_struct(field.type) for field in table.schema):
+            table = table.flatten()
+        table = table.select([name for name, column in zip(table.column_names, table.columns)
+                              if not pa.types.is_list(column.type)])
+        if fmt == "csv.gz":
+            with pa.CompressedOutputStream(path, "gzip") as sink:
+                pacsv.write_csv(table, sink)
+        else:
+            pacsv.write_csv(table, path)
+    return Decimal(int(np.rint(cost * 1_000_000).astype(np.int64).sum())).scaleb(-6)
+
+
+def encode_only(path: str, dialect: str) -> Dict[str, Any]:
+    reader = ingestion.ExportReader(path, dialect)
+    cpu = time.process_time()
+    parsed = sum(batch.num_rows for batch in reader._record_batches())
+    parse_cpu = time.process_time() - cpu
+    wall, cpu = time.perf_counter(), time.process_time()
+    size = sum(len(chunk) for chunk in reader.copy_chunks("00000000-0000-0000-0000-000000000001", path,
+                                                           ingestion._PG_EPOCH))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    rows = reader.stats["rows"]
+    return {
+        "rows": rows,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "rows_per_s": round(rows / wall),
+        "rows_per_cpu_s": round(rows / cpu),
+        "parse_rows_per_cpu_s": round(parsed / parse_cpu),
+        "copy_mb": round(size / 2 ** 20, 1),
+    }
+
+
+async def load(path: str, dialect: str, expected: Decimal) -> Dict[str, Any]:
+    pool = await database.get_pool()
+    async with pool.acquire() as conn:
+        tenant_id = str(await conn.fetchval(_TENANT_SQL))
+        await conn.execute("DELETE FROM billing_ingestions WHERE tenant_id = $1", tenant_id)
+        await conn.execute("DELETE FROM consolidated_billing WHERE tenant_id = $1", tenant_id)
+    ingestor = ingestion.Ingestor()
+    refresher = rollups.RollupRefresher()
+    rollups.ROLLUP_SAFETY_LAG_SECONDS = 0
+    await refresher.rebuild(since=date(2000, 1, 1), tenant_id=tenant_id)  # forget earlier runs
+
+    report: Dict[str, Any] = {}
+    started = time.perf_counter()
+    first = await ingestor.ingest_file(tenant_id, path, dialect, source_file="bench-export")
+    report["load_s"] = round(time.perf_counter() - started, 3)
+    report["load_rows_per_s"] = round(first["rows"] / (time.perf_counter() - started))
+    await refresher.refresh()  # the forced reload below must retract folded rows
+    again = await ingestor.ingest_file(tenant_id, path, dialect, source_file="bench-export")
+    started = time.perf_counter()
+    forced = await ingestor.ingest_file(tenant_id, path, dialect, source_file="bench-export", force=True)
+    report["reload_s"] = round(time.perf_counter() - started, 3)
+    await refresher.refresh()
+
+    async with pool.acquire() as conn:
+        rows, billed = await conn.fetchrow(
+            "SELECT COUNT(*), COALESCE(SUM(billed_cost), 0) FROM consolidated_billing WHERE tenant_id = $1", tenant_id
+        )
+        daily = await conn.fetchval(
+            "SELECT COALESCE(SUM(billed_cost), 0) FROM billing_daily_rollup WHERE tenant_id = $1", tenant_id
+        )
+        tagged = await conn.fetchval(
+            "SELECT COALESCE(SUM(billed_cost), 0) FROM billing_monthly_tag_rollup"
+            " WHERE tenant_id = $1 AND tag_key = $2", tenant_id, rollups.TOTAL_TAG_KEY,
+        )
+    await database.close_pool()
+    report.update({
+        "statuses": [first["status"], again["status"], forced["status"]],
+        "rows_after_reload": rows,
+        "rows_match": rows == first["rows"],
+        "billed_match": billed == expected == Decimal(first["billed_cost"]),
+        "rollups_match": billed == daily == tagged,
+    })
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Billing export ingestion throughput.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dialect", choices=ingestion.DIALECTS, default="aws")
+    parser.add_argument("--format", choices=("csv", "csv.gz", "parquet"), default="csv")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="Where the fixture is written.")
+    parser.add_argument("--encode-only", action="store_true", help="Skip the database.")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    path = os.path.join(args.dir, f"bench-ingest-{args.dialect}-{args.rows}.{args.format}")
+    started = time.perf_counter()
+    expected = make_fixture(path, args.rows, args.dialect, args.format)
+    report: Dict[str, Any] = {
+        "dialect": args.dialect, "format": args.format, "fixture_mb": round(os.path.getsize(path) / 2 ** 20, 1),
+        "fixture_s": round(time.perf_counter() - started, 1), "encode": encode_only(path, args.dialect),
+    }
+    if not args.encode_only:
+        if not database.is_configured():
+            sys.exit("DATABASE_URL environment variable is not set (or pass --encode-only).")
+        report["database"] = asyncio.run(load(path, args.dialect, expected))
+    os.remove(path)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+    encode = report["encode"]
+    print(f"{args.rows:,} {args.dialect} rows as {args.format} ({report['fixture_mb']} MB)")
+    print(f"  parse+map+encode: {encode['wall_s']}s wall, {encode['cpu_s']}s CPU -> "
+          f"{encode['rows_per_cpu_s']:,} rows/CPU-s ({encode['copy_mb']} MB of COPY data)")
+    print(f"  reading record batches alone: {encode['parse_rows_per_cpu_s']:,} rows/CPU-s")
+    if "database" in report:
+        db = report["database"]
+        print(f"  load into Postgres: {db['load_s']}s ({db['load_rows_per_s']:,} rows/s); "
+              f"forced reload {db['reload_s']}s; statuses {db['statuses']}")
+        print(f"  rows match: {db['rows_match']}, billed total match: {db['billed_match']}, "
+              f"rollups match raw: {db['rollups_match']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+bench_llm_client.py
+===================
+TEJUSKA Cloud Intelligence
+Benchmark: shared LLMClient vs. a new AsyncOpenAI client per call, against
+a local OpenAI-compatible stand-in server.
+
+The stand-in serves /v1/chat/completions (plain and streamed) with a fixed
+latency and injects 429 (with Retry-After) and 503 responses at a chosen
+rate. It counts distinct client ports, i.e. TCP connections opened, which
+is what the per-call client pays a TLS handshake for in production.
+
+Usage (from backend/):
+    python benchmarks/bench_llm_client.py --requests 400 --concurrency 32
+    python benchmarks/bench_llm_client.py --error-rate 0.1 --tenants 4 --json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import statistics
+from typing import Any, Dict, List, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from llm_client import LLMClient
+
+MODEL = "gpt-4o"
+
+
+# ---------------------------------------------------------------------------
+# Stand-in server
+# ---------------------------------------------------------------------------
+
+def build_standin(latency_ms: float, error_rate: float, connections: Set[int]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        connections.add(request.client.port)
+        body = await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+        roll = random.random()
+        if roll < error_rate / 2:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status_code=429, headers={"retry-after": "0.05"},
+            )
+        if roll < error_rate:
+            return JSONResponse({"error": {"message": "Overloaded"}}, status_code=503)
+
+        created = int(time.time())
+        if body.get("stream"):
+            async def chunks():
+                for word in ("Spend", " is", " flat", "."):
+                    chunk = {
+                        "id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": created,
+                        "model": MODEL, "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+        return {
+            "id": "chatcmpl-standin", "object": "chat.completion", "created": created, "model": MODEL,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "SELECT 1"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        }
+
+    return app
+
+
+def start_standin(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Clients under test
+# ---------------------------------------------------------------------------
+
+MESSAGES = [{"role": "user", "content": "Question: top services last month"}]
+
+
+async def per_call(base_url: str, tenant_id: str) -> None:
+    """The old behaviour: a fresh client (and connection) for every request."""
+    import openai
+
+    client = openai.AsyncOpenAI(api_key="standin", base_url=base_url, max_retries=2)
+    try:
+        await client.chat.completions.create(model=MODEL, messages=MESSAGES, max_tokens=64)
+    finally:
+        await client.close()
+
+
+async def run_mode(mode: str, args: argparse.Namespace, base_url: str, connections: Set[int]) -> Dict[str, Any]:
+    connections.clear()
+    shared = LLMClient(
+        api_key="standin", base_url=base_url,
+        max_concurrency=args.concurrency, tenant_concurrency=args.tenant_concurrency,
+        requests_per_minute=args.rpm, tokens_per_minute=0,
+    )
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        tenant_id = f"tenant-{i % args.tenants}"
+        async with gate:
+            started = time.perf_counter()
+            try:
+                if mode == "per-call":
+                    await per_call(base_url, tenant_id)
+                elif i % 2:
+                    async for _ in shared.stream_chat(tenant_id, model=MODEL, messages=MESSAGES, max_tokens=64):
+                        pass
+                else:
+                    await shared.chat(tenant_id, model=MODEL, messages=MESSAGES, max_tokens=64)
+            except Exception:
+                failures += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    await shared.close()
+
+    latencies.sort()
+    result = {
+        "requests_per_s": round(args.requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1),
+        "connections": len(connections),
+        "failures": failures,
+    }
+    if mode == "shared":
+        stats = shared.snapshot()
+        result.update(retries=stats["retries"], rate_limited=stats["rate_limited"])
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared LLMClient vs. per-call AsyncOpenAI against a stand-in.")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--tenant-concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Stand-in response latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 429/503 responses.")
+    parser.add_argument("--rpm", type=float, default=0.0, help="Requests/minute bucket for the shared client.")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    connections: Set[int] = set()
+    server = start_standin(build_standin(args.latency_ms, args.error_rate, connections), args.port)
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+    try:
+        report = {mode: asyncio.run(run_mode(mode, args, base_url, connections)) for mode in ("per-call", "shared")}
+    finally:
+        server.should_exit = True
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'mode':<9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'conns':>6} {'failed':>7}")
+    for mode, row in report.items():
+        print(
+            f"{mode:<9} {row['requests_per_s']:>8.1f} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+            f"{row['connections']:>6} {row['failures']:>7}"
+        )
+    shared = report["shared"]
+    print(f"\nshared client: {shared['retries']} retries, {shared['rate_limited']} rate-limited responses")
+
+
+if __name__ == "__main__":
+    main()
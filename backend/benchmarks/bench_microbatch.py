@@ -0,0 +1,114 @@
+"""
+bench_microbatch.py
+===================
+TEJUSKA Cloud Intelligence
+Benchmark: concurrent single-resource ABACUS evaluations through the
+micro-batcher (AIEngine.evaluate_and_terminate, dry run) against a real
+tenant, including the graph-level GNN pass each micro-batch makes.
+
+Reports evaluations/second, the batcher's mean batch size and latency
+percentiles, then checks that the single-resource path returns the same
+graph-context GNN scores as evaluate_batch for the same resources.
+
+Needs DATABASE_URL and a tenant with billing rows (ingestion.py, or the
+tenant bench_analytics.py loads).
+
+Usage (from backend/):
+    python benchmarks/bench_microbatch.py --tenant <uuid> --requests 5000
+    python benchmarks/bench_microbatch.py --tenant <uuid> --max-wait-ms 2 --json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import ai_engine  # noqa: E402
+from ai_engine import AIEngine, MicroBatcher  # noqa: E402
+
+_RESOURCES_SQL = """
+SELECT DISTINCT resource_id FROM consolidated_billing
+WHERE tenant_id = $1::uuid AND resource_id IS NOT NULL
+LIMIT $2
+"""
+
+
+async def _skip_record(*_: Any) -> None:
+    return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    engine = AIEngine()
+    engine._batcher = MicroBatcher(
+        engine._score_microbatch, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms
+    )
+    # Results are not persisted; only the scoring path is measured.
+    engine._record_recommendations = _skip_record
+
+    pool = await database.get_pool()
+    resource_ids: List[str] = [
+        row["resource_id"] for row in await pool.fetch(_RESOURCES_SQL, args.tenant, args.resources)
+    ]
+    if not resource_ids:
+        raise SystemExit(f"No billing rows for tenant {args.tenant}.")
+    targets = [resource_ids[i % len(resource_ids)] for i in range(args.requests)]
+
+    # Warm the feature store, graph store and models before timing.
+    await engine.evaluate_batch(args.tenant, resource_ids[:16])
+
+    started = time.perf_counter()
+    single = await asyncio.gather(*(engine.evaluate_and_terminate(args.tenant, rid) for rid in targets))
+    elapsed = time.perf_counter() - started
+    batcher = engine._batcher.metrics()
+
+    batch = {row["resource_id"]: row["gnn_score"] for row in await engine.evaluate_batch(args.tenant, resource_ids)}
+    drift = max(abs(row["gnn_score"] - batch[row["resource_id"]]) for row in single)
+
+    engine.shutdown()
+    await database.close_pool()
+    return {
+        "requests": args.requests,
+        "distinct_resources": len(resource_ids),
+        "evals_per_s": round(args.requests / elapsed, 1),
+        "elapsed_s": round(elapsed, 3),
+        "batches": batcher["batches"],
+        "mean_batch_size": batcher["mean_batch_size"],
+        "latency_ms": batcher["latency"],
+        "max_gnn_score_diff_vs_batch": float(np.float32(drift)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent single-resource ABACUS evaluations.")
+    parser.add_argument("--tenant", required=True, help="Tenant UUID with billing rows.")
+    parser.add_argument("--requests", type=int, default=5000, help="Concurrent evaluate_and_terminate calls.")
+    parser.add_argument("--resources", type=int, default=1000, help="Distinct resources the calls cycle over.")
+    parser.add_argument("--max-batch-size", type=int, default=ai_engine.ABACUS_MICROBATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=ai_engine.ABACUS_MICROBATCH_WAIT_MS)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    if not database.is_configured():
+        raise SystemExit("Set DATABASE_URL to a database with billing rows.")
+    report = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['requests']} concurrent evaluations over {report['distinct_resources']} resources")
+    print(f"  {report['evals_per_s']:,.0f} evals/s ({report['elapsed_s']:.2f} s)")
+    print(f"  {report['batches']} batches, mean batch size {report['mean_batch_size']}")
+    print(f"  latency ms: {report['latency_ms']}")
+    print(f"  max |GNN score - evaluate_batch|: {report['max_gnn_score_diff_vs_batch']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
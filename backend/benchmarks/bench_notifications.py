@@ -0,0 +1,231 @@
+"""
+bench_notifications.py
+======================
+TEJUSKA Cloud Intelligence
+Benchmark: pooled NotificationService.send_many() vs. the old per-message
+dispatch, against local stand-ins for an SMTP relay, a Slack webhook and
+the Twilio Messages API.
+
+The SMTP stand-in speaks just enough ESMTP (EHLO with AUTH PLAIN, MAIL,
+RCPT, DATA, RSET, QUIT) and answers every command after --latency-ms, so
+the handshake a fresh connection pays is visible. The HTTP stand-in serves
+the webhook and Messages.json with the same latency. Both count the TCP
+connections opened. The old dispatch is reproduced as it was: a blocking
+smtplib connect, EHLO and login per email and a new HTTP client per Slack
+or SMS message, one message at a time. STARTTLS is off for the run.
+
+Usage (from backend/):
+    python benchmarks/bench_notifications.py --messages 600
+    python benchmarks/bench_notifications.py --latency-ms 5 --json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import smtplib
+import argparse
+import threading
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["SMTP_STARTTLS"] = "false"
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+import notifications
+from notifications import Notification, NotificationService
+
+CHANNELS = ("email", "slack", "sms")
+
+
+# ---------------------------------------------------------------------------
+# Stand-in servers
+# ---------------------------------------------------------------------------
+
+class SmtpStandin:
+    """Minimal ESMTP server on its own event loop thread."""
+
+    def __init__(self, port: int, latency_ms: float) -> None:
+        self.port, self.latency = port, latency_ms / 1000
+        self.connections = 0
+        self.messages = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(asyncio.start_server(self._session, "127.0.0.1", self.port))
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        async def reply(line: str) -> None:
+            await asyncio.sleep(self.latency)
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 standin ESMTP")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line.split(b" ", 1)[0].strip().upper()
+                if verb in (b"EHLO", b"HELO"):
+                    await reply("250-standin\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                elif verb == b"AUTH":
+                    await reply("235 2.7.0 Authentication successful")
+                elif verb == b"DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    await reply("250 2.0.0 Queued")
+                elif verb == b"QUIT":
+                    await reply("221 Bye")
+                    break
+                else:  # MAIL, RCPT, RSET, NOOP
+                    await reply("250 OK")
+        finally:
+            writer.close()
+
+
+def build_http_standin(latency_ms: float, connections: Set[int]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/slack")
+    async def slack(request: Request):
+        connections.add(request.client.port)
+        await asyncio.sleep(latency_ms / 1000)
+        return "ok"
+
+    @app.post("/2010-04-01/Accounts/{sid}/Messages.json", status_code=201)
+    async def messages(sid: str, request: Request):
+        connections.add(request.client.port)
+        await asyncio.sleep(latency_ms / 1000)
+        return {"sid": f"SM{request.client.port}", "status": "queued"}
+
+    return app
+
+
+def start_http_standin(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Dispatchers under test
+# ---------------------------------------------------------------------------
+
+def batch(count: int) -> List[Notification]:
+    return [
+        Notification(CHANNELS[i % 3], "ops@example.com" if i % 3 == 0 else "+15550100", f"Alert {i}", f"Alert {i}")
+        for i in range(count)
+    ]
+
+
+def per_message_send(service: NotificationService, note: Notification) -> None:
+    """The old behaviour: a fresh connection, handshake and login for every message."""
+    if note.channel == "email":
+        message = MIMEText(note.body, "plain", "utf-8")
+        message["Subject"], message["From"], message["To"] = note.subject, service._smtp_user, note.recipient
+        with smtplib.SMTP(service._smtp_host, service._smtp_port, timeout=15) as server:
+            server.ehlo()
+            server.login(service._smtp_user, service._smtp_password)
+            server.send_message(message)
+    elif note.channel == "slack":
+        with httpx.Client() as client:
+            client.post(service._slack_webhook_url, json={"text": note.body}).raise_for_status()
+    else:
+        with httpx.Client() as client:
+            client.post(
+                f"{notifications.TWILIO_API_BASE}/2010-04-01/Accounts/{service._twilio_account_sid}/Messages.json",
+                data={"To": note.recipient, "From": service._twilio_from_number, "Body": note.body},
+                auth=(service._twilio_account_sid, service._twilio_auth_token),
+            ).raise_for_status()
+
+
+async def run_mode(mode: str, count: int, smtp: SmtpStandin, connections: Set[int]) -> Dict[str, Any]:
+    smtp.connections = smtp.messages = 0
+    connections.clear()
+    service = NotificationService()
+    notes = batch(count)
+    failures = 0
+
+    started = time.perf_counter()
+    if mode == "per-message":
+        for note in notes:  # blocking calls, exactly as they ran inside async def send
+            try:
+                per_message_send(service, note)
+            except Exception:
+                failures += 1
+    else:
+        failures = sum(isinstance(r, BaseException) for r in await service.send_many(notes))
+    elapsed = time.perf_counter() - started
+    await service.close()
+    return {
+        "messages_per_s": round(count / elapsed, 1),
+        "elapsed_s": round(elapsed, 2),
+        "smtp_connections": smtp.connections,
+        "http_connections": len(connections),
+        "emails_accepted": smtp.messages,
+        "failures": failures,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pooled notification dispatch vs. per-message connections.")
+    parser.add_argument("--messages", type=int, default=600, help="Split evenly over email, Slack and SMS.")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Stand-in delay per SMTP reply / HTTP call.")
+    parser.add_argument("--smtp-port", type=int, default=8825)
+    parser.add_argument("--http-port", type=int, default=8792)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.http_port}"
+    os.environ.update(
+        SMTP_HOST="127.0.0.1", SMTP_PORT=str(args.smtp_port), SMTP_USER="alerts@example.com",
+        SMTP_PASSWORD="standin", SLACK_WEBHOOK_URL=f"{base}/slack", TWILIO_ACCOUNT_SID="ACstandin",
+        TWILIO_AUTH_TOKEN="standin", TWILIO_FROM_NUMBER="+15550199",
+    )
+    notifications.TWILIO_API_BASE = base
+
+    smtp = SmtpStandin(args.smtp_port, args.latency_ms)
+    smtp.start()
+    connections: Set[int] = set()
+    server = start_http_standin(build_http_standin(args.latency_ms, connections), args.http_port)
+    try:
+        report = {
+            mode: asyncio.run(run_mode(mode, args.messages, smtp, connections))
+            for mode in ("per-message", "pooled")
+        }
+    finally:
+        server.should_exit = True
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.messages} messages, {args.latency_ms} ms stand-in latency")
+    print(f"{'mode':<12} {'msgs/s':>8} {'secs':>7} {'smtp conns':>11} {'http conns':>11} {'failed':>7}")
+    for mode, row in report.items():
+        print(f"{mode:<12} {row['messages_per_s']:>8.1f} {row['elapsed_s']:>7.2f} {row['smtp_connections']:>11} "
+              f"{row['http_connections']:>11} {row['failures']:>7}")
+
+
+if __name__ == "__main__":
+    main()
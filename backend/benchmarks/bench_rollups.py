@@ -0,0 +1,209 @@
+"""
+bench_rollups.py
+================
+TEJUSKA Cloud Intelligence
+Benchmark: OPTIC template queries against raw consolidated_billing vs. the
+rollup tables (rollups.route), on synthetic FOCUS rows.
+
+Rows are generated server-side with generate_series in batches, spread over
+--months of charge periods, --tenants tenants and a realistic mix of
+providers, services, regions and tags. After the rollups are built, a small
+batch is ingested past the watermark so every routed query also exercises
+the raw tail. Each question is run --repeat times per path; results are
+compared so a routed answer that differs from the raw one is reported.
+
+DATABASE_URL must point at a disposable database initialised with
+database/init_db.sql. 100M rows need roughly 60 GB of disk.
+
+Usage (from backend/):
+    python benchmarks/bench_rollups.py --rows 1000000
+    python benchmarks/bench_rollups.py --rows 100000000 --batch 5000000 --repeat 3
+    python benchmarks/bench_rollups.py --skip-load --json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import optic_intents
+import rollups
+
+QUESTIONS = (
+    "total spend last month",
+    "how much did we spend on AWS this month",
+    "top 10 services last quarter",
+    "cost by region last month",
+    "spend by provider this year",
+    "daily spend for the last 30 days",
+    "monthly cost trend this year",
+    "month over month change by service",
+    "untagged cost last month",
+    "cost missing the env tag last quarter",
+    "cost by tag team last month",
+)
+
+_TENANTS_SQL = """
+INSERT INTO tenants (company_name, domain, admin_email, plan)
+SELECT 'Bench ' || n, 'bench-' || n || '.tejuska.test', 'finops@bench-' || n || '.tejuska.test', 'enterprise'
+FROM generate_series(1, $1) AS n
+ON CONFLICT (domain) DO UPDATE SET company_name = EXCLUDED.company_name
+RETURNING tenant_id
+"""
+
+# $1 tenants, $2 row count, $3 charge-period days, $4 ingested_at. Services
+# belong to one provider; costs, regions, tags and periods are random.
+_LOAD_SQL = """
+INSERT INTO consolidated_billing (
+    tenant_id, billing_account_id, billing_period_start, billing_period_end,
+    charge_period_start, charge_period_end, billed_cost, effective_cost,
+    provider_name, service_name, service_category, resource_id, region_id, region_name,
+    charge_type, tags, ingested_at, source_file
+)
+SELECT ($1::uuid[])[1 + floor(t * cardinality($1::uuid[]))::int],
+       'acct-' || floor(t * 100)::int,
+       DATE_TRUNC('month', cps), DATE_TRUNC('month', cps) + INTERVAL '1 month',
+       cps, cps + INTERVAL '1 hour',
+       cost, round(cost * 0.82, 6),
+       (ARRAY['AWS', 'Microsoft', 'Google Cloud'])[1 + s % 3],
+       'service-' || s,
+       (ARRAY['Compute', 'Storage', 'Network', 'Databases'])[1 + s % 4],
+       'res-' || floor(random() * 50000)::int,
+       'region-' || r,
+       CASE WHEN r = 7 THEN NULL ELSE 'Region ' || r END,
+       (ARRAY['Usage', 'Usage', 'Usage', 'Purchase', 'Tax', 'Credit'])[1 + floor(u * 6)::int],
+       CASE
+           WHEN u < 0.1 THEN '{}'::jsonb
+           WHEN u < 0.3 THEN jsonb_build_object('team', 'team-' || s)
+           ELSE jsonb_build_object('team', 'team-' || s, 'env', (ARRAY['prod', 'staging', 'dev'])[1 + r % 3])
+       END,
+       $4::timestamptz,
+       'bench.parquet'
+FROM (
+    SELECT random() AS t, random() AS u, floor(random() * 12)::int AS s, floor(random() * 8)::int AS r,
+           round((random() * 100)::numeric, 6) AS cost,
+           DATE_TRUNC('hour', NOW()) - make_interval(hours => floor(random() * $3 * 24)::int) AS cps
+    FROM generate_series(1, $2::bigint)
+) AS v
+"""
+
+
+def _median_ms(samples: List[float]) -> float:
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def _normalise(rows: List[Any], columns: Optional[int] = None) -> List[tuple]:
+    return sorted((tuple(row)[:columns] for row in rows), key=repr)
+
+
+async def _time_query(conn: Any, sql: str, args: tuple, repeat: int) -> Tuple[List[Any], List[float]]:
+    samples, rows = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = await conn.fetch(sql, *args)
+        samples.append(time.perf_counter() - started)
+    return rows, samples
+
+
+async def load(conn: Any, tenants: List[Any], rows: int, batch: int, days: int) -> float:
+    started = time.perf_counter()
+    ingested = datetime.now(timezone.utc).replace(microsecond=0)
+    done = 0
+    while done < rows:
+        size = min(batch, rows - done)
+        stamp = ingested - timedelta(minutes=(rows - done) // batch)  # one ingest run per batch
+        await conn.execute(_LOAD_SQL, tenants, size, days, stamp)
+        done += size
+        print(f"  loaded {done:,}/{rows:,} rows ({time.perf_counter() - started:.0f}s)", file=sys.stderr)
+    await conn.execute("ANALYZE consolidated_billing")
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"rows": args.rows, "tenants": args.tenants, "queries": {}}
+    pool = await database.get_pool()
+    refresher = rollups.RollupRefresher()
+    async with pool.acquire() as conn:
+        await conn.execute("SET timezone = 'UTC'")
+        tenants = [row["tenant_id"] for row in await conn.fetch(_TENANTS_SQL, args.tenants)]
+        if args.skip_load:
+            report["rows"] = await conn.fetchval("SELECT COUNT(*) FROM consolidated_billing")
+        else:
+            report["load_s"] = round(await load(conn, tenants, args.rows, args.batch, args.months * 31), 1)
+
+        # Backfill everything loaded so far, then ingest a tail past the watermark.
+        rollups.ROLLUP_SAFETY_LAG_SECONDS = 0
+        started = time.perf_counter()
+        await refresher.refresh()
+        report["refresh_s"] = round(time.perf_counter() - started, 2)
+        if not args.skip_load:
+            await conn.execute(_LOAD_SQL, tenants, args.tail, args.months * 31, datetime.now(timezone.utc))
+        report["rollup_rows"] = {
+            name: await conn.fetchval(f"SELECT COUNT(*) FROM {name}")
+            for name in (rollups.DAILY_ROLLUP, rollups.TAG_ROLLUP, rollups.RESOURCE_ROLLUP)
+        }
+
+        tenant_id = tenants[0]
+        today = datetime.now(timezone.utc).date()
+        for question in QUESTIONS:
+            match = optic_intents.parse(question, today)
+            routed = rollups.route(match) if match is not None else None
+            if routed is None:
+                report["queries"][question] = {"routed": False}
+                continue
+            raw_rows, raw_samples = await _time_query(conn, match.sql, (tenant_id, *match.params), args.repeat)
+            rollup_rows, rollup_samples = await _time_query(conn, routed.sql, (tenant_id, *routed.params), args.repeat)
+            raw_ms, rollup_ms = _median_ms(raw_samples), _median_ms(rollup_samples)
+            # The rollups keep no distinct resource counts (untagged_resources).
+            compared = 2 if match.intent == "untagged" else None
+            report["queries"][question] = {
+                "routed": True,
+                "intent": match.intent,
+                "raw_ms": raw_ms,
+                "rollup_ms": rollup_ms,
+                "speedup": round(raw_ms / rollup_ms, 1) if rollup_ms else None,
+                "matches": _normalise(raw_rows, compared) == _normalise(rollup_rows, compared),
+            }
+    await database.close_pool()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Raw-table vs rollup latency for OPTIC template queries.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic rows to load (100M for the full run).")
+    parser.add_argument("--batch", type=int, default=1_000_000, help="Rows per INSERT ... SELECT batch.")
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--months", type=int, default=12, help="Charge-period span of the synthetic rows.")
+    parser.add_argument("--tail", type=int, default=5000, help="Rows ingested after the watermark.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-load", action="store_true", help="Reuse rows from a previous run.")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+    if not database.is_configured():
+        sys.exit("DATABASE_URL environment variable is not set.")
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['rows']:,} rows, {args.tenants} tenants; rollup refresh {report['refresh_s']}s; "
+          f"rollup rows {report['rollup_rows']}")
+    print(f"{'question':<42} {'raw ms':>9} {'rollup ms':>10} {'speedup':>8} {'equal':>6}")
+    for question, row in report["queries"].items():
+        if not row["routed"]:
+            print(f"{question:<42} {'(not routed)':>9}")
+            continue
+        print(f"{question:<42} {row['raw_ms']:>9.2f} {row['rollup_ms']:>10.2f} "
+              f"{row['speedup']:>7.1f}x {'yes' if row['matches'] else 'NO':>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+bench_shield.py
+===============
+TEJUSKA Cloud Intelligence
+Benchmark: Agentic Shield rule evaluation (shield.py).
+
+For each rule count in --rules, arms that many (resource_id, threshold)
+rules over a pool of tenants and streams --batches batches of --batch
+per-resource costs (a --ruled share of them for ruled resources) through
+RuleIndex.add(), the evaluator's in-memory step. The same batches are
+also checked the naive way, recomputing every rule's spend from the
+resources in the batch, to show that the indexed path's cost follows the
+batch size, not the rule count. Both paths must flag the same resources.
+
+No database is needed.
+
+Usage (from backend/):
+    python benchmarks/bench_shield.py
+    python benchmarks/bench_shield.py --rules 1000 100000 --batch 50000 --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from shield import Rule, RuleIndex
+
+TENANTS = [f"tenant-{i:04d}" for i in range(100)]
+
+
+def make_rules(count: int, rng: np.random.Generator) -> List[Rule]:
+    now = datetime.now(timezone.utc)
+    thresholds = rng.uniform(50, 500, count)
+    return [
+        Rule(TENANTS[i % len(TENANTS)], f"i-{i:08d}", "AWS", float(thresholds[i]), "email", "ops@example.com",
+             True, now)
+        for i in range(count)
+    ]
+
+
+def make_batch(rules: int, size: int, ruled: float, rng: np.random.Generator) -> List[Tuple[str, str, float]]:
+    """(tenant, resource_id, cost) groups; ids at or above rules have no rule."""
+    ids = np.where(rng.random(size) < ruled, rng.integers(0, rules, size), rules + rng.integers(0, 10 * size, size))
+    costs = rng.exponential(2.0, size)
+    return [(TENANTS[i % len(TENANTS)], f"i-{i:08d}", float(c)) for i, c in zip(ids.tolist(), costs.tolist())]
+
+
+def naive(rules: List[Rule], spend: Dict[Tuple[str, str], float], batch: List[Tuple[str, str, float]]) -> List[Any]:
+    """Every rule checked against every batch: the cost the index avoids."""
+    delta: Dict[Tuple[str, str], float] = {}
+    for tenant_id, resource_id, cost in batch:
+        delta[(tenant_id, resource_id)] = delta.get((tenant_id, resource_id), 0.0) + cost
+    over = []
+    for rule in rules:
+        key = rule.key
+        if key in delta:
+            spend[key] += delta[key]
+        if spend[key] > rule.threshold:
+            over.append(key)
+    return over
+
+
+def run(count: int, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = np.random.default_rng(count)
+    rules = make_rules(count, rng)
+    index = RuleIndex()
+    for rule in rules:
+        index.put(rule, 0.0)
+    naive_spend = {rule.key: 0.0 for rule in rules}
+    batches = [make_batch(count, args.batch, args.ruled, rng) for _ in range(args.batches)]
+
+    indexed_s = naive_s = 0.0
+    matches = 0
+    same = True
+    for batch in batches:
+        started = time.perf_counter()
+        over = index.add(batch)
+        indexed_s += time.perf_counter() - started
+        started = time.perf_counter()
+        expected = naive(rules, naive_spend, batch)
+        naive_s += time.perf_counter() - started
+        triggered = set(over)
+        same &= triggered == set(expected)
+        matches += len(triggered)
+        for key in triggered:  # triggered rules disarm, as after a confirmed claim
+            index.remove(key)
+        rules = [rule for rule in rules if rule.key not in triggered]
+    return {
+        "rules": count,
+        "indexed_ms_per_batch": round(indexed_s / args.batches * 1000, 2),
+        "naive_ms_per_batch": round(naive_s / args.batches * 1000, 2),
+        "indexed_rows_per_s": round(args.batch * args.batches / indexed_s),
+        "triggered": matches,
+        "same_matches": same,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agentic Shield rule evaluation cost versus rule count.")
+    parser.add_argument("--rules", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--batch", type=int, default=20_000, help="Per-resource cost groups in a batch.")
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--ruled", type=float, default=0.05, help="Share of batch groups for ruled resources.")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    report = {"batch": args.batch, "batches": args.batches, "ruled": args.ruled,
+              "results": [run(count, args) for count in args.rules]}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.batches} batches of {args.batch:,} resource costs ({args.ruled:.0%} ruled)")
+    for result in report["results"]:
+        print(f"  {result['rules']:>8,} rules: indexed {result['indexed_ms_per_batch']:>7} ms/batch "
+              f"({result['indexed_rows_per_s']:,} rows/s), naive {result['naive_ms_per_batch']:>8} ms/batch, "
+              f"{result['triggered']} triggered, same matches: {result['same_matches']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+bench_startup.py
+================
+TEJUSKA Cloud Intelligence
+Benchmark: cold-start import time and RSS of the FastAPI app per TEJUSKA_ROLE.
+
+Each role is started in a fresh interpreter under `python -X importtime`.
+The child imports main (and, for roles that preload ABACUS, builds the
+AIEngine as the lifespan would), then reports wall time and peak RSS. The
+importtime trace is aggregated per top-level package to show which
+dependencies the cold start is spent in.
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py --roles api webhooks inference --repeat 3
+    python benchmarks/bench_startup.py --json > startup.json
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROLES = ("api", "webhooks", "inference", "all")
+
+_CHILD = r"""
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+if main.SERVES_ABACUS and main.ABACUS_PRELOAD:
+    main._create_ai_engine().shutdown()
+elapsed = time.perf_counter() - started
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_mb, "torch_loaded": "torch" in sys.modules}))
+"""
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)$")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int]]:
+    """Return (top-level package, self microseconds summed over its modules)."""
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            package = match.group(2).split(".")[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1))
+    return list(totals.items())
+
+
+def run_role(role: str) -> Dict[str, object]:
+    env = dict(os.environ, TEJUSKA_ROLE=role)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-start import time and RSS per startup role.")
+    parser.add_argument("--roles", nargs="+", default=list(ROLES), choices=ROLES)
+    parser.add_argument("--repeat", type=int, default=3, help="Cold starts per role; the median is reported.")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest packages to list.")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    report = {}
+    for role in args.roles:
+        runs = [run_role(role) for _ in range(args.repeat)]
+        fastest = min(runs, key=lambda run: run["seconds"])
+        report[role] = {
+            "seconds": round(statistics.median(run["seconds"] for run in runs), 3),
+            "peak_rss_mb": round(statistics.median(run["peak_rss_mb"] for run in runs), 1),
+            "torch_loaded": fastest["torch_loaded"],
+            "top_imports_ms": {
+                name: round(us / 1000, 1)
+                for name, us in sorted(fastest["imports"], key=lambda item: -item[1])[: args.top]
+            },
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'role':<10} {'seconds':>8} {'peak RSS MB':>12} {'torch':>6}")
+    for role, row in report.items():
+        print(f"{role:<10} {row['seconds']:>8.3f} {row['peak_rss_mb']:>12.1f} {str(row['torch_loaded']):>6}")
+    for role, row in report.items():
+        heaviest = ", ".join(f"{name} {ms}ms" for name, ms in row["top_imports_ms"].items())
+        print(f"\n{role}: {heaviest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+dashboard.py
+============
+TEJUSKA Cloud Intelligence
+Aggregates behind the FinOps dashboard page (GET /api/v1/dashboard/{tenant_id}).
+
+The panels run through optic_sql.QueryExecutor, concurrently. By default
+they read the rollups (rollups.py): whole days from billing_daily_rollup,
+whole months from the monthly tag and resource rollups, plus the raw rows
+for partial days and the rows ingested after each watermark, so the
+answers match the raw scans exactly. A partial month at either end of the
+tag window is added from raw rows or taken off the month's rollup,
+whichever spans fewer days; that statement reads only consolidated_billing.
+DASHBOARD_USE_ROLLUPS=false scans consolidated_billing for every panel.
+
+With an analytics store configured (analytics_store.py) the statements
+over consolidated_billing alone run on DuckDB over the Parquet mirror, off
+the Postgres row store; DASHBOARD_USE_ANALYTICS=false pins them to the
+read-only Postgres pool, which also serves anything the store declines.
+"""
+
+import os
+import asyncio
+import logging
+from contextlib import aclosing
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from analytics_store import AnalyticsStore
+from optic_intents import UNTAGGED_VALUE, Params
+from optic_sql import QueryExecutor
+from rollups import (
+    NO_TAGS_KEY, RESOURCE_ROLLUP, TAG_ROLLUP, TOTAL_TAG_KEY,
+    _daily_source, _in_ranges, _month_ceil, _month_floor, _utc, _watermark,
+)
+
+logger = logging.getLogger("tejuska.dashboard")
+
+DASHBOARD_USE_ROLLUPS: bool = os.environ.get("DASHBOARD_USE_ROLLUPS", "true").lower() == "true"
+DASHBOARD_USE_ANALYTICS: bool = os.environ.get("DASHBOARD_USE_ANALYTICS", "true").lower() == "true"
+DASHBOARD_TOP_SERVICES: int = int(os.environ.get("DASHBOARD_TOP_SERVICES", "10"))
+DASHBOARD_TOP_TAG_VALUES: int = int(os.environ.get("DASHBOARD_TOP_TAG_VALUES", "50"))
+
+# $2/$3: previous month up to the same day and time, $4/$5: month to date.
+_TOTALS_SQL = """
+SELECT COALESCE(SUM(billed_cost) FILTER (WHERE charge_period_start >= $4), 0) AS month_to_date,
+       COALESCE(SUM(billed_cost) FILTER (WHERE charge_period_start < $3), 0) AS previous_month_to_date,
+       COUNT(DISTINCT resource_id) FILTER (WHERE charge_period_start >= $4) AS active_resources
+FROM consolidated_billing
+WHERE tenant_id = $1
+  AND ((charge_period_start >= $2 AND charge_period_start < $3)
+       OR (charge_period_start >= $4 AND charge_period_start < $5))
+"""
+# $2/$3: the dashboard window.
+_PROVIDERS_SQL = """
+SELECT provider_name, SUM(billed_cost) AS billed_cost
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1 ORDER BY 2 DESC, 1
+"""
+_DAILY_SQL = """
+SELECT (charge_period_start AT TIME ZONE 'UTC')::date AS usage_date, SUM(billed_cost) AS billed_cost
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1 ORDER BY 1
+"""
+_SERVICES_SQL = """
+SELECT service_name, provider_name, SUM(billed_cost) AS billed_cost
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1, 2 ORDER BY 3 DESC, 1, 2 LIMIT $4
+"""
+_TAG_SQL = f"""
+SELECT COALESCE(tags ->> $4, '{UNTAGGED_VALUE}') AS tag_value, SUM(billed_cost) AS billed_cost
+FROM consolidated_billing
+WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3
+GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT $5
+"""
+
+# Rollup statements. {source} is rollups._daily_source() over the window.
+_ROLLUP_PROVIDERS_SQL = "SELECT provider_name, SUM(cost) AS billed_cost FROM {source} GROUP BY 1 ORDER BY 2 DESC, 1"
+_ROLLUP_DAILY_SQL = "SELECT usage_date, SUM(cost) AS billed_cost FROM {source} GROUP BY 1 ORDER BY 1"
+_ROLLUP_SERVICES_SQL = (
+    "SELECT service_name, provider_name, SUM(cost) AS billed_cost FROM {source} "
+    "GROUP BY 1, 2 ORDER BY 3 DESC, 1, 2 LIMIT {limit}"
+)
+
+
+def _plain(value: Any) -> Any:
+    """JSON-friendly value: NUMERIC as float, dates as ISO strings."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _tag_plan(start: date, end: date) -> Tuple[date, date, List[Tuple[date, date, int]]]:
+    """
+    Whole months [first, last) to read from the tag rollup for the days
+    [start, end), and the (from, to, sign) day spans of raw rows that turn
+    them into exactly that window: each partial edge month is either added
+    from raw rows or taken back off a whole month, whichever spans fewer
+    days. Reading no months at all (first == last == start) is the plain
+    raw scan.
+    """
+    candidates = [
+        (first, last)
+        for first in (_month_floor(start), _month_ceil(start))
+        for last in (_month_floor(end), _month_ceil(end))
+        if first <= last
+    ] + [(start, start)]
+    first, last = min(candidates, key=lambda months: abs((start - months[0]).days) + abs((end - months[1]).days))
+    spans = [
+        (min(start, first), max(start, first), 1 if start < first else -1),
+        (min(last, end), max(last, end), 1 if last < end else -1),
+    ]
+    return first, last, [span for span in spans if span[0] < span[1]]
+
+
+class DashboardService:
+    """Computes the dashboard panels for one tenant."""
+
+    def __init__(self, analytics: Optional[AnalyticsStore] = None) -> None:
+        self._executor = QueryExecutor(analytics=analytics, metrics_name="dashboard_sql")
+
+    async def _records(self, tenant_id: str, sql: str, *args: Any, analytics: bool = True) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        chunks = self._executor.stream(
+            tenant_id, sql, tenant_id, *args, analytics=analytics and DASHBOARD_USE_ANALYTICS
+        )
+        async with aclosing(chunks):
+            async for columns, chunk in chunks:
+                rows.extend(dict(zip(columns, row)) for row in chunk)
+        return rows
+
+    async def _rows(self, tenant_id: str, sql: str, *args: Any, analytics: bool = True) -> List[Dict[str, Any]]:
+        rows = await self._records(tenant_id, sql, *args, analytics=analytics)
+        return [{column: _plain(value) for column, value in row.items()} for row in rows]
+
+    async def summary(
+        self, tenant_id: str, days: int = 30, tag_key: str = "department", now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Month-to-date totals against the same span of the previous month,
+        and cost by provider, by UTC day, by service and by tag_key over
+        the last days days (up to the end of today, UTC). Raises
+        optic_sql.QueryExecutionError when a panel fails.
+        """
+        now = now or datetime.now(timezone.utc)
+        today = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+        end, start = today + timedelta(days=1), today - timedelta(days=days - 1)
+        month_start = today.replace(day=1)
+        previous_start = (month_start - timedelta(days=1)).replace(day=1)
+        # Clamped so March 31 compares against the whole of February.
+        previous_end = min(previous_start + (now - month_start), month_start)
+
+        if DASHBOARD_USE_ROLLUPS:
+            panels = [
+                self._rollup_totals(tenant_id, previous_start, previous_end, month_start, now),
+                *self._rollup_window(tenant_id, start, end),
+                self._rollup_tags(tenant_id, start, end, tag_key),
+            ]
+        else:
+            panels = [
+                self._rows(tenant_id, _TOTALS_SQL, previous_start, previous_end, month_start, now),
+                self._rows(tenant_id, _PROVIDERS_SQL, start, end),
+                self._rows(tenant_id, _DAILY_SQL, start, end),
+                self._rows(tenant_id, _SERVICES_SQL, start, end, DASHBOARD_TOP_SERVICES),
+                self._rows(tenant_id, _TAG_SQL, start, end, tag_key, DASHBOARD_TOP_TAG_VALUES),
+            ]
+        totals, providers, daily, services, tags = await asyncio.gather(*panels)
+        return {
+            "tenant_id": tenant_id,
+            "start": start,
+            "end": end,
+            **totals[0],
+            "by_provider": providers,
+            "daily": daily,
+            "top_services": services,
+            "tag_key": tag_key,
+            "by_tag": tags,
+        }
+
+    # The rollup statements run on Postgres: the analytics store only
+    # mirrors consolidated_billing.
+
+    async def _rollup_totals(
+        self, tenant_id: str, previous_start: datetime, previous_end: datetime, month_start: datetime, now: datetime
+    ) -> List[Dict[str, Any]]:
+        bind = Params()
+        previous_day = _utc(previous_end.date())
+        today = _utc(now.date())
+        source, _ = _daily_source(bind, [(previous_start, previous_day), (month_start, today)], None, "billed_cost")
+        partial = _in_ranges("charge_period_start", [(bind(previous_day), bind(previous_end)), (bind(today), bind(now))])
+        # The month's resources, less those whose only rows are charged after now.
+        month, month_from = bind(month_start.date()), bind(month_start)
+        month_to, after = bind(_utc(_month_ceil(month_start.date() + timedelta(days=1)))), bind(now)
+        sql = (
+            f"SELECT COALESCE(SUM(cost) FILTER (WHERE usage_date >= {month}), 0) AS month_to_date, "
+            f"COALESCE(SUM(cost) FILTER (WHERE usage_date < {month}), 0) AS previous_month_to_date, "
+            f"(SELECT COUNT(*) FROM ("
+            f"SELECT resource_id FROM ("
+            f"SELECT resource_id, row_count AS rows FROM billing_monthly_resource_rollup "
+            f"WHERE tenant_id = $1 AND usage_month = {month} "
+            f"UNION ALL "
+            f"SELECT resource_id, 1 FROM consolidated_billing "
+            f"WHERE tenant_id = $1 AND charge_period_start >= {month_from} AND charge_period_start < {month_to} "
+            f"AND resource_id IS NOT NULL AND ingested_at > {_watermark(RESOURCE_ROLLUP)} "
+            f"UNION ALL "
+            f"SELECT resource_id, -1 FROM consolidated_billing "
+            f"WHERE tenant_id = $1 AND charge_period_start >= {after} AND charge_period_start < {month_to} "
+            f"AND resource_id IS NOT NULL"
+            f") AS resources GROUP BY 1 HAVING SUM(rows) > 0) AS active) AS active_resources "
+            f"FROM (SELECT usage_date, cost FROM {source} "
+            f"UNION ALL "
+            f"SELECT (charge_period_start AT TIME ZONE 'UTC')::date, billed_cost FROM consolidated_billing "
+            f"WHERE tenant_id = $1 AND {partial}) AS days"
+        )
+        return await self._rows(tenant_id, sql, *bind.values, analytics=False)
+
+    def _rollup_window(self, tenant_id: str, start: datetime, end: datetime) -> List[Any]:
+        statements = []
+        for template in (_ROLLUP_PROVIDERS_SQL, _ROLLUP_DAILY_SQL, _ROLLUP_SERVICES_SQL):
+            bind = Params()
+            source, _ = _daily_source(bind, [(start, end)], None, "billed_cost")
+            sql = template.format(source=source, limit=DASHBOARD_TOP_SERVICES)
+            statements.append(self._rows(tenant_id, sql, *bind.values, analytics=False))
+        return statements
+
+    async def _rollup_tags(self, tenant_id: str, start: datetime, end: datetime, tag_key: str) -> List[Dict[str, Any]]:
+        if tag_key in (TOTAL_TAG_KEY, NO_TAGS_KEY):  # not tag keys in the rollup
+            return await self._rows(tenant_id, _TAG_SQL, start, end, tag_key, DASHBOARD_TOP_TAG_VALUES)
+        first, last, spans = _tag_plan(start.date(), end.date())
+        bind = Params()
+        key, months = bind(tag_key), f"usage_month >= {bind(first)} AND usage_month < {bind(last)}"
+        # Rows missing the key are the month total less every value of it.
+        less = f"CASE WHEN tag_key = '{TOTAL_TAG_KEY}' THEN 1 ELSE -1 END"
+        whole = (
+            f"SELECT tag_value, SUM(cost) AS cost, SUM(rows) AS rows FROM ("
+            f"SELECT tag_value, billed_cost AS cost, row_count AS rows FROM billing_monthly_tag_rollup "
+            f"WHERE tenant_id = $1 AND {months} AND tag_key = {key}::text "
+            f"UNION ALL "
+            f"SELECT '{UNTAGGED_VALUE}', SUM(billed_cost * {less}), SUM(row_count * {less}) "
+            f"FROM billing_monthly_tag_rollup "
+            f"WHERE tenant_id = $1 AND {months} AND tag_key IN ('{TOTAL_TAG_KEY}', {key}::text) "
+            f"UNION ALL "
+            f"SELECT COALESCE(tags ->> {key}::text, '{UNTAGGED_VALUE}'), billed_cost, 1 FROM consolidated_billing "
+            f"WHERE tenant_id = $1 AND charge_period_start >= {bind(_utc(first))} "
+            f"AND charge_period_start < {bind(_utc(last))} AND ingested_at > {_watermark(TAG_ROLLUP)}"
+            f") AS months GROUP BY 1"
+        )
+        statements = [self._records(tenant_id, whole, *bind.values, analytics=False)]
+        if spans:
+            # The partial months only read consolidated_billing, so the
+            # analytics store can serve them.
+            bind = Params()
+            key = bind(tag_key)
+            edges = " UNION ALL ".join(
+                f"SELECT COALESCE(tags ->> {key}::text, '{UNTAGGED_VALUE}') AS tag_value, "
+                f"billed_cost * {sign} AS cost, {sign} AS rows FROM consolidated_billing "
+                f"WHERE tenant_id = $1 AND charge_period_start >= {bind(_utc(low))} "
+                f"AND charge_period_start < {bind(_utc(high))}"
+                for low, high, sign in spans
+            )
+            sql = f"SELECT tag_value, SUM(cost) AS cost, SUM(rows) AS rows FROM ({edges}) AS edges GROUP BY 1"
+            statements.append(self._records(tenant_id, sql, *bind.values))
+
+        totals: Dict[str, List[Any]] = {}
+        for rows in await asyncio.gather(*statements):
+            for row in rows:
+                total = totals.setdefault(row["tag_value"], [Decimal(0), 0])
+                total[0] += row["cost"] or 0
+                total[1] += row["rows"] or 0
+        ranked = sorted(
+            ((value, cost) for value, (cost, count) in totals.items() if count > 0), key=lambda item: (-item[1], item[0])
+        )
+        return [{"tag_value": value, "billed_cost": _plain(cost)} for value, cost in ranked[:DASHBOARD_TOP_TAG_VALUES]]
@@ -0,0 +1,118 @@
+"""
+database.py
+===========
+TEJUSKA Cloud Intelligence
+Shared asyncpg connection pools for the backend services.
+Pools are created lazily on first use and closed by the FastAPI lifespan.
+
+The read-only pool serves OPTIC's generated SQL. Point READONLY_DATABASE_URL
+at a role with SELECT-only grants; every session is additionally forced
+into read-only transactions.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import asyncpg
+
+logger = logging.getLogger("tejuska.database")
+
+DATABASE_URL: str = os.environ.get("DATABASE_URL", "")
+DB_POOL_MIN_SIZE: int = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE: int = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+READONLY_DATABASE_URL: str = os.environ.get("READONLY_DATABASE_URL", "") or DATABASE_URL
+# Optional role to SET on each read-only connection (when the login role can assume it).
+READONLY_DB_ROLE: str = os.environ.get("READONLY_DB_ROLE", "")
+READONLY_POOL_MAX_SIZE: int = int(os.environ.get("READONLY_POOL_MAX_SIZE", "10"))
+
+# A user belongs to the tenant whose admin they are, else to the one owning their email domain.
+_FIND_TENANT_SQL = """
+SELECT tenant_id::text AS tenant_id, company_name, domain, plan
+FROM tenants
+WHERE is_active
+  AND (lower(admin_email) = lower($1) OR domain = lower(split_part($1, '@', 2)))
+ORDER BY lower(admin_email) = lower($1) DESC
+LIMIT 1
+"""
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+_readonly_pool: Optional[asyncpg.Pool] = None
+_readonly_pool_lock = asyncio.Lock()
+
+
+def is_configured() -> bool:
+    """Return True when a DATABASE_URL has been provided."""
+    return bool(DATABASE_URL)
+
+
+async def get_pool() -> asyncpg.Pool:
+    """Return the shared connection pool, creating it on first call."""
+    global _pool
+    if not DATABASE_URL:
+        raise EnvironmentError("DATABASE_URL environment variable is not set.")
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    dsn=DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                )
+                logger.info(
+                    "Database pool created (min=%d, max=%d).",
+                    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+                )
+    return _pool
+
+
+async def _init_readonly(conn: asyncpg.Connection) -> None:
+    if READONLY_DB_ROLE:
+        quoted = READONLY_DB_ROLE.replace('"', '""')
+        await conn.execute(f'SET ROLE "{quoted}"')
+
+
+async def get_readonly_pool() -> asyncpg.Pool:
+    """Return the read-only pool used to execute generated SQL."""
+    global _readonly_pool
+    if not READONLY_DATABASE_URL:
+        raise EnvironmentError("DATABASE_URL environment variable is not set.")
+    if _readonly_pool is None:
+        async with _readonly_pool_lock:
+            if _readonly_pool is None:
+                _readonly_pool = await asyncpg.create_pool(
+                    dsn=READONLY_DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=READONLY_POOL_MAX_SIZE,
+                    init=_init_readonly,
+                    server_settings={
+                        "default_transaction_read_only": "on",
+                        "application_name": "tejuska-optic",
+                        # Template and rollup queries bucket by UTC day.
+                        "timezone": "UTC",
+                    },
+                )
+                logger.info("Read-only database pool created (max=%d).", READONLY_POOL_MAX_SIZE)
+    return _readonly_pool
+
+
+async def find_tenant(email: str) -> Optional[Dict[str, Any]]:
+    """Return the active tenant a user's email belongs to, or None."""
+    pool = await get_pool()
+    row = await pool.fetchrow(_FIND_TENANT_SQL, email.strip())
+    return dict(row) if row else None
+
+
+async def close_pool() -> None:
+    """Close the shared pools if they were ever opened."""
+    global _pool, _readonly_pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.info("Database pool closed.")
+    if _readonly_pool is not None:
+        await _readonly_pool.close()
+        _readonly_pool = None
+        logger.info("Read-only database pool closed.")
@@ -0,0 +1,228 @@
+"""
+feature_store.py
+================
+TEJUSKA Cloud Intelligence
+ABACUS feature store: per-tenant resource feature matrices built with
+set-based aggregation over consolidated_billing.
+
+Each tenant's features live in one contiguous float32 matrix (N x 8) keyed
+by resource_id. The matrix is loaded once and then refreshed incrementally
+from the ingested_at watermark, so requests only ever gather rows.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import database
+
+logger = logging.getLogger("tejuska.feature_store")
+
+FEATURE_REFRESH_SECONDS: float = float(os.environ.get("FEATURE_REFRESH_SECONDS", "300"))
+# Rows are stamped with the ingesting transaction's start time, so a long
+# ingestion can commit rows older than the last watermark; re-read this window.
+FEATURE_WATERMARK_LAG_SECONDS: float = float(os.environ.get("FEATURE_WATERMARK_LAG_SECONDS", "600"))
+
+NUM_FEATURES = 8
+# Column positions, matching ai_engine.FEATURE_NAMES.
+# cpu_util, mem_util, net_in and net_out are monitoring metrics that FOCUS
+# billing data does not carry; they stay at zero until a metrics source is added.
+COL_COST_PER_HR = 4
+COL_AGE_DAYS    = 5
+COL_TAG_PROD    = 6
+COL_RESERVED    = 7
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_AGGREGATE_SQL = """
+WITH touched AS (
+    SELECT DISTINCT resource_id
+    FROM consolidated_billing
+    WHERE tenant_id = $1
+      AND resource_id IS NOT NULL
+      AND ingested_at > $2
+)
+SELECT
+    b.resource_id,
+    SUM(b.effective_cost)::float8
+        / GREATEST(
+            EXTRACT(EPOCH FROM MAX(b.charge_period_end) - MIN(b.charge_period_start)) / 3600.0,
+            1.0
+          )                                                     AS cost_per_hr,
+    EXTRACT(EPOCH FROM MIN(b.charge_period_start))::float8      AS first_seen,
+    BOOL_OR(
+        LOWER(COALESCE(b.tags->>'environment', b.tags->>'Environment', b.tags->>'env'))
+            IN ('prod', 'production')
+    )                                                           AS tag_prod,
+    BOOL_OR(b.commitment_discount_id IS NOT NULL)               AS reserved,
+    MAX(b.ingested_at)                                          AS last_ingested
+FROM consolidated_billing b
+JOIN touched t ON t.resource_id = b.resource_id
+WHERE b.tenant_id = $1
+GROUP BY b.resource_id
+"""
+
+
+class TenantFeatures:
+    """Contiguous feature matrix for one tenant, grown in place as resources appear."""
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.resource_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.matrix = np.zeros((capacity, NUM_FEATURES), dtype=np.float32)
+        self.first_seen = np.zeros(capacity, dtype=np.float64)
+        self.watermark: datetime = _EPOCH
+        self.refreshed_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.resource_ids)
+
+    def _reserve(self, needed: int) -> None:
+        """Grow the backing arrays geometrically so appends stay amortised O(1)."""
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, NUM_FEATURES), dtype=np.float32)
+        matrix[: self.size] = self.matrix[: self.size]
+        first_seen = np.zeros(capacity, dtype=np.float64)
+        first_seen[: self.size] = self.first_seen[: self.size]
+        self.matrix, self.first_seen = matrix, first_seen
+
+    def upsert(
+        self,
+        resource_ids: List[str],
+        cost_per_hr: np.ndarray,
+        first_seen: np.ndarray,
+        tag_prod: np.ndarray,
+        reserved: np.ndarray,
+    ) -> None:
+        """Write aggregated columns for the given resources, appending unknown ones."""
+        new_ids = [rid for rid in resource_ids if rid not in self.index]
+        if new_ids:
+            self._reserve(self.size + len(new_ids))
+            start = self.size
+            self.resource_ids.extend(new_ids)
+            self.index.update((rid, start + i) for i, rid in enumerate(new_ids))
+
+        rows = np.fromiter((self.index[rid] for rid in resource_ids), dtype=np.int64, count=len(resource_ids))
+        self.matrix[rows, COL_COST_PER_HR] = cost_per_hr
+        self.matrix[rows, COL_TAG_PROD] = tag_prod
+        self.matrix[rows, COL_RESERVED] = reserved
+        self.first_seen[rows] = first_seen
+
+    def update_age(self, now: float) -> None:
+        """Recompute age_days for every resource in one vectorised pass."""
+        n = self.size
+        self.matrix[:n, COL_AGE_DAYS] = (now - self.first_seen[:n]) / 86400.0
+
+    def gather(self, resource_ids: List[str]) -> Tuple[List[str], np.ndarray, List[str]]:
+        """Return (found_ids, features, missing_ids) for the requested resources."""
+        found: List[str] = []
+        rows: List[int] = []
+        missing: List[str] = []
+        for rid in resource_ids:
+            row = self.index.get(rid)
+            if row is None:
+                missing.append(rid)
+            else:
+                found.append(rid)
+                rows.append(row)
+        features = self.matrix[np.asarray(rows, dtype=np.int64)]
+        return found, features, missing
+
+
+class FeatureStore:
+    """
+    Per-tenant ABACUS feature cache.
+    A tenant is loaded on first access and refreshed incrementally at most
+    once every FEATURE_REFRESH_SECONDS.
+    """
+
+    def __init__(self, refresh_interval: float = FEATURE_REFRESH_SECONDS) -> None:
+        self._refresh_interval = refresh_interval
+        self._tenants: Dict[str, TenantFeatures] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def refresh(self, tenant_id: str) -> int:
+        """
+        Pull aggregates for every resource with rows ingested since the
+        tenant's watermark and merge them into the matrix.
+
+        Returns
+        -------
+        int: Number of resources updated.
+        """
+        tenant = self._tenants.setdefault(tenant_id, TenantFeatures())
+        since = tenant.watermark
+        if since > _EPOCH:
+            since -= timedelta(seconds=FEATURE_WATERMARK_LAG_SECONDS)
+
+        pool = await database.get_pool()
+        started = time.perf_counter()
+        rows = await pool.fetch(_AGGREGATE_SQL, tenant_id, since)
+
+        if rows:
+            n = len(rows)
+            tenant.upsert(
+                resource_ids=[row["resource_id"] for row in rows],
+                cost_per_hr=np.fromiter((row["cost_per_hr"] or 0.0 for row in rows), dtype=np.float32, count=n),
+                first_seen=np.fromiter((row["first_seen"] for row in rows), dtype=np.float64, count=n),
+                tag_prod=np.fromiter((bool(row["tag_prod"]) for row in rows), dtype=np.float32, count=n),
+                reserved=np.fromiter((bool(row["reserved"]) for row in rows), dtype=np.float32, count=n),
+            )
+            tenant.watermark = max(tenant.watermark, max(row["last_ingested"] for row in rows))
+
+        tenant.update_age(time.time())
+        tenant.refreshed_at = time.monotonic()
+        logger.info(
+            "Feature store refreshed for tenant=%s: %d resources updated, %d total (%.1f ms).",
+            tenant_id, len(rows), tenant.size, (time.perf_counter() - started) * 1000,
+        )
+        return len(rows)
+
+    async def _ensure_fresh(self, tenant_id: str) -> TenantFeatures:
+        """Refresh the tenant if it has never been loaded or has gone stale."""
+        lock = self._locks.setdefault(tenant_id, asyncio.Lock())
+        async with lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None or time.monotonic() - tenant.refreshed_at >= self._refresh_interval:
+                await self.refresh(tenant_id)
+        return self._tenants[tenant_id]
+
+    async def resource_ids(self, tenant_id: str) -> List[str]:
+        """Return every resource_id with billing rows for the tenant."""
+        tenant = await self._ensure_fresh(tenant_id)
+        return list(tenant.resource_ids)
+
+    async def view(self, tenant_id: str) -> TenantFeatures:
+        """
+        Return the tenant's live feature state without copying it. Row i of
+        view.matrix belongs to view.resource_ids[i], and rows are only ever
+        appended, so a row index stays valid across refreshes.
+        """
+        return await self._ensure_fresh(tenant_id)
+
+    async def get_features(
+        self, tenant_id: str, resource_ids: Optional[List[str]] = None
+    ) -> Tuple[List[str], np.ndarray, List[str]]:
+        """
+        Gather feature rows for the requested resources.
+
+        Returns
+        -------
+        Tuple[List[str], np.ndarray, List[str]]:
+            (found resource_ids, contiguous float32 matrix, missing resource_ids)
+        """
+        tenant = await self._ensure_fresh(tenant_id)
+        if resource_ids is None:
+            n = tenant.size
+            return list(tenant.resource_ids), tenant.matrix[:n].copy(), []
+        return tenant.gather(resource_ids)
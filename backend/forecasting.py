@@ -0,0 +1,583 @@
+"""
+forecasting.py
+==============
+TEJUSKA Cloud Intelligence
+Daily cost forecasts per (tenant, provider, service) series.
+
+History comes from billing_daily_rollup plus the raw rows ingested after
+its watermark, over the last FORECAST_HISTORY_DAYS settled UTC days. Every
+model is fitted to a whole batch of series at once, as numpy arrays of
+shape (series, days):
+
+  mean            flat mean, for series younger than one week
+  seasonal_naive  the same weekday of the last week
+  ets             additive Holt-Winters with damped trend and weekly
+                  seasonality, parameters picked per series from a grid
+  arima           ARIMA(p,1,0) with drift, by conditional least squares
+
+Each series keeps the model with the lowest error over the last
+FORECAST_BACKTEST_DAYS days; the models are then refitted on the full
+history. Forecasts run FORECAST_MAX_HORIZON days ahead with normal
+prediction intervals. They are cached per tenant until another day settles.
+Batches above FORECAST_POOL_MIN_SERIES series are sharded across a process
+pool.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from statistics import NormalDist
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import database
+import metrics
+import rollups
+
+logger = logging.getLogger("tejuska.forecasting")
+
+FORECAST_HISTORY_DAYS: int = int(os.environ.get("FORECAST_HISTORY_DAYS", "182"))
+FORECAST_MAX_HORIZON: int = int(os.environ.get("FORECAST_MAX_HORIZON", "90"))
+FORECAST_BACKTEST_DAYS: int = int(os.environ.get("FORECAST_BACKTEST_DAYS", "14"))
+# Days a provider export needs to complete; fresher days are left out of the fit.
+FORECAST_SETTLE_DAYS: int = int(os.environ.get("FORECAST_SETTLE_DAYS", "1"))
+FORECAST_ARIMA_LAGS: int = int(os.environ.get("FORECAST_ARIMA_LAGS", "7"))
+FORECAST_WORKERS: int = int(os.environ.get("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+# Smaller batches fit on a thread; shipping them to a worker costs more than it saves.
+FORECAST_POOL_MIN_SERIES: int = int(os.environ.get("FORECAST_POOL_MIN_SERIES", "512"))
+FORECAST_SHARD_SERIES: int = int(os.environ.get("FORECAST_SHARD_SERIES", "1024"))
+FORECAST_CACHE_TENANTS: int = int(os.environ.get("FORECAST_CACHE_TENANTS", "1024"))
+FORECAST_TENANT_BATCH: int = int(os.environ.get("FORECAST_TENANT_BATCH", "200"))
+FORECAST_REFRESH_SECONDS: float = float(os.environ.get("FORECAST_REFRESH_SECONDS", "900"))
+FORECAST_TOP_SERVICES: int = int(os.environ.get("FORECAST_TOP_SERVICES", "20"))
+FORECAST_HISTORY_SHOWN: int = int(os.environ.get("FORECAST_HISTORY_SHOWN", "90"))
+
+MODELS: Tuple[str, ...] = ("mean", "seasonal_naive", "ets", "arima")
+SEASON = 7
+# Series of a tenant are keyed (provider_name, service_name); this key is the tenant total.
+TOTAL_KEY: Tuple[str, str] = ("", "")
+# (alpha, beta, gamma, phi) in error-correction form, inside the usual
+# admissible region: beta <= alpha, gamma <= 1 - alpha.
+_ETS_GRID = np.array([
+    (alpha, beta, gamma, phi)
+    for alpha in (0.1, 0.3, 0.6, 0.9)
+    for beta in (0.0, 0.02, 0.1)
+    for gamma in (0.0, 0.05, 0.2)
+    for phi in (0.9, 0.98)
+    if beta <= alpha and gamma <= 1 - alpha
+])
+# Forecasts beyond this multiple of the largest observed day are treated as diverged.
+_DIVERGED = 10.0
+
+_SERIES_SQL = f"""
+SELECT tenant_id::text AS tenant_id, provider_name, service_name,
+       array_agg(usage_date ORDER BY usage_date) AS days,
+       array_agg(cost ORDER BY usage_date) AS costs
+FROM (
+    SELECT tenant_id, provider_name, service_name, usage_date, SUM(billed_cost)::float8 AS cost
+    FROM (
+        SELECT tenant_id, provider_name, service_name, usage_date, billed_cost
+        FROM billing_daily_rollup
+        WHERE tenant_id = ANY($1::uuid[]) AND usage_date >= $2 AND usage_date <= $3
+        UNION ALL
+        SELECT tenant_id, provider_name, service_name,
+               (charge_period_start AT TIME ZONE 'UTC')::date, billed_cost
+        FROM consolidated_billing
+        WHERE tenant_id = ANY($1::uuid[]) AND charge_period_start >= $4 AND charge_period_start < $5
+          AND ingested_at > COALESCE(
+              (SELECT high_watermark FROM rollup_watermarks WHERE rollup_name = '{rollups.DAILY_ROLLUP}'),
+              '-infinity')
+    ) AS source
+    GROUP BY 1, 2, 3, 4
+) AS daily
+GROUP BY 1, 2, 3
+"""
+_TENANTS_SQL = "SELECT tenant_id::text FROM tenants WHERE is_active ORDER BY tenant_id"
+_KNOWN_TENANTS_SQL = "SELECT tenant_id::text FROM tenants WHERE tenant_id = ANY($1::uuid[])"
+
+
+# ---------------------------------------------------------------------------
+# Vectorised models: every function takes Y (series, days) and returns
+# (mean, sd), each (series, horizon).
+# ---------------------------------------------------------------------------
+
+def _first_active(Y: np.ndarray) -> np.ndarray:
+    """Index of each series' first non-zero day (the day count for all-zero series)."""
+    nonzero = Y != 0
+    return np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), Y.shape[1])
+
+
+def _masked_sigma(errors: np.ndarray, mask: np.ndarray, dof: int = 0) -> np.ndarray:
+    count = mask.sum(axis=1)
+    return np.sqrt((errors * errors * mask).sum(axis=1) / np.maximum(count - dof, 1))
+
+
+def fit_mean(Y: np.ndarray, horizon: int, first: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    days = Y.shape[1]
+    mask = np.arange(days) >= first[:, None]
+    count = np.maximum(mask.sum(axis=1), 1)
+    level = (Y * mask).sum(axis=1) / count
+    sd = _masked_sigma(Y - level[:, None], mask, dof=1) * np.sqrt(1 + 1 / count)
+    return np.repeat(level[:, None], horizon, axis=1), np.repeat(sd[:, None], horizon, axis=1)
+
+
+def fit_seasonal_naive(Y: np.ndarray, horizon: int, first: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    days = Y.shape[1]
+    steps = np.arange(horizon)
+    mean = Y[:, days - SEASON + steps % SEASON]
+    mask = np.arange(SEASON, days) >= (first + SEASON)[:, None]
+    sigma = _masked_sigma(Y[:, SEASON:] - Y[:, :-SEASON], mask)
+    return mean, sigma[:, None] * np.sqrt(steps // SEASON + 1)
+
+
+def fit_ets(Y: np.ndarray, horizon: int, first: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Additive damped-trend Holt-Winters, run for every grid point and series
+    at once; each series keeps the grid point with the lowest one-step SSE.
+    """
+    series, days = Y.shape
+    alpha, beta, gamma, phi = (column[:, None] for column in _ETS_GRID.T)
+    level = np.broadcast_to(Y[:, :SEASON].mean(axis=1), (len(_ETS_GRID), series)).copy()
+    trend = np.broadcast_to(
+        (Y[:, SEASON:2 * SEASON].mean(axis=1) - Y[:, :SEASON].mean(axis=1)) / SEASON, level.shape
+    ).copy()
+    season = np.broadcast_to((Y[:, :SEASON] - Y[:, :SEASON].mean(axis=1, keepdims=True)).T[:, None, :],
+                             (SEASON,) + level.shape).copy()
+    sse = np.zeros(level.shape)
+    # The seed week is not scored, nor anything before the series starts.
+    scored = np.arange(days) >= first[:, None] + SEASON
+    for t in range(SEASON, days):
+        slot = t % SEASON
+        damped = phi * trend
+        error = Y[:, t] - (level + damped + season[slot])
+        sse += error * error * scored[:, t]
+        level = level + damped + alpha * error
+        trend = damped + beta * error
+        season[slot] += gamma * error
+
+    best = sse.argmin(axis=0)
+    pick = (best, np.arange(series))
+    a, b, g, p = (column[best] for column in _ETS_GRID.T)
+    sigma = np.sqrt(sse[pick] / np.maximum(scored[:, SEASON:].sum(axis=1), 1))
+
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(p[:, None] ** steps, axis=1)  # phi + phi^2 + ... + phi^h
+    slots = (days + steps - 1) % SEASON
+    mean = level[pick][:, None] + damping * trend[pick][:, None] + season[slots][:, best, np.arange(series)].T
+    # Var(h) = sigma^2 (1 + sum_{j<h} c_j^2), c_j = alpha + beta phi_j + gamma [j % m == 0].
+    c = a[:, None] + b[:, None] * damping[:, :-1] + g[:, None] * (steps[:-1] % SEASON == 0)
+    spread = np.concatenate([np.ones((series, 1)), 1 + np.cumsum(c * c, axis=1)], axis=1)
+    return mean, sigma[:, None] * np.sqrt(spread)
+
+
+def fit_arima(Y: np.ndarray, horizon: int, first: np.ndarray, lags: int = FORECAST_ARIMA_LAGS
+              ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ARIMA(lags,1,0) with drift: one batched least-squares solve of the
+    differenced series on their own lags, then psi weights for the intervals.
+    """
+    series, days = Y.shape
+    diffs = np.diff(Y, axis=1)
+    rows = diffs.shape[1] - lags
+    X = np.empty((series, rows, lags + 1))
+    X[:, :, 0] = 1.0
+    for lag in range(1, lags + 1):
+        X[:, :, lag] = diffs[:, lags - lag:lags - lag + rows]
+    target = diffs[:, lags:]
+    weight = (np.arange(lags + 1, days) >= (first + lags + 1)[:, None]).astype(float)
+    Xw = X * weight[:, :, None]
+    gram = np.einsum("snk,snl->skl", Xw, Xw)
+    ridge = 1e-6 * np.trace(gram, axis1=1, axis2=2)[:, None, None] + 1e-9
+    gram += ridge * np.eye(lags + 1)
+    coef = np.linalg.solve(gram, np.einsum("snk,sn->sk", Xw, target * weight)[..., None])[..., 0]
+    residual = target - np.einsum("snk,sk->sn", X, coef)
+    sigma = _masked_sigma(residual, weight.astype(bool), dof=lags + 1)
+
+    drift, ar = coef[:, 0], coef[:, 1:]
+    recent = diffs[:, -lags:][:, ::-1].copy()  # most recent first
+    level = Y[:, -1].copy()
+    mean = np.empty((series, horizon))
+    for step in range(horizon):
+        change = drift + (ar * recent).sum(axis=1)
+        level += change
+        mean[:, step] = level
+        recent = np.concatenate([change[:, None], recent[:, :-1]], axis=1)
+    psi = np.zeros((series, horizon))
+    psi[:, 0] = 1.0
+    for j in range(1, horizon):
+        span = min(j, lags)
+        psi[:, j] = (ar[:, :span] * psi[:, j - 1::-1][:, :span]).sum(axis=1)
+    integrated = np.cumsum(psi, axis=1)
+    return mean, sigma[:, None] * np.sqrt(np.cumsum(integrated * integrated, axis=1))
+
+
+_FITS = (fit_mean, fit_seasonal_naive, fit_ets, fit_arima)
+
+
+def _all_models(Y: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Means and sds of every model, each (models, series, horizon)."""
+    first = _first_active(Y)
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        fits = [fit(Y, horizon, first) for fit in _FITS]
+    means = np.stack([mean for mean, _ in fits])
+    sds = np.stack([sd for _, sd in fits])
+    ceiling = _DIVERGED * np.abs(Y).max(axis=1)[:, None] + 1.0
+    diverged = ~np.isfinite(means).all(axis=2) | (np.abs(means) > ceiling).any(axis=2)
+    diverged |= ~np.isfinite(sds).all(axis=2)
+    means[diverged] = np.inf
+    return means, sds
+
+
+def fit_forecast(Y: np.ndarray, horizon: int, backtest: int = FORECAST_BACKTEST_DAYS) -> Dict[str, np.ndarray]:
+    """
+    Pick a model per series by its error over the last backtest days, then
+    forecast horizon days from the full history. Returns "model" (index
+    into MODELS), "mean" and "sd" (series, horizon), float32.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    series, days = Y.shape
+    active = days - _first_active(Y)
+
+    allowed = np.ones((len(MODELS), series), dtype=bool)
+    allowed[1] = active >= SEASON
+    allowed[2:] = active >= 2 * SEASON + backtest + FORECAST_ARIMA_LAGS
+    errors = np.full((len(MODELS), series), np.inf)
+    if days > backtest + 2 * SEASON + FORECAST_ARIMA_LAGS + 1:
+        held_out, _ = _all_models(Y[:, :-backtest], backtest)
+        with np.errstate(invalid="ignore"):
+            errors = np.abs(held_out - Y[None, :, -backtest:]).mean(axis=2)
+    errors = np.where(allowed, np.nan_to_num(errors, nan=np.inf), np.inf)
+
+    means, sds = _all_models(Y, horizon)
+    errors[~np.isfinite(means).all(axis=2)] = np.inf
+    # The mean is always finite: it serves series younger than a week and
+    # those where every other model diverged.
+    errors[0, ~allowed[1] | ~np.isfinite(errors).any(axis=0)] = -1.0
+    model = errors.argmin(axis=0)
+    pick = (model, np.arange(series))
+    return {
+        "model": model.astype(np.int8),
+        "mean": np.maximum(means[pick], 0).astype(np.float32),
+        "sd": np.nan_to_num(sds[pick], nan=0.0, posinf=0.0).astype(np.float32),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Forecast service
+# ---------------------------------------------------------------------------
+
+class TenantForecast(NamedTuple):
+    through: date                   # last day of history
+    keys: List[Tuple[str, str]]     # (provider_name, service_name); TOTAL_KEY first
+    recent: np.ndarray              # billed cost of the last 30 days per series
+    history: np.ndarray             # tenant total for the last FORECAST_HISTORY_SHOWN days
+    model: np.ndarray               # (series,) index into MODELS
+    mean: np.ndarray                # (series, FORECAST_MAX_HORIZON)
+    sd: np.ndarray
+
+
+def settled_through(today: Optional[date] = None) -> date:
+    """The last UTC day whose costs are considered complete."""
+    today = today or datetime.now(timezone.utc).date()
+    return today - timedelta(days=1 + FORECAST_SETTLE_DAYS)
+
+
+class Forecaster:
+    """
+    Fits and caches per-tenant forecasts. forecast() serves one tenant,
+    fitting it on a cache miss; refit_all() refreshes every active tenant in
+    batches (run by the background loop when started).
+
+    Parameters
+    ----------
+    workers          : Process pool size for large batches; 0 fits on a thread.
+    interval_seconds : Background refit period; 0 disables the loop.
+    """
+
+    def __init__(
+        self, workers: int = FORECAST_WORKERS, interval_seconds: float = FORECAST_REFRESH_SECONDS
+    ) -> None:
+        self._workers = workers
+        self._interval = interval_seconds
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._cache: "OrderedDict[str, TenantForecast]" = OrderedDict()
+        self._fitting: Dict[str, asyncio.Future] = {}
+        self._fits = metrics.LatencyTracker()
+        self._series = metrics.Counter()
+        self._hits = metrics.Counter()
+        self._misses = metrics.Counter()
+        self._failures = metrics.Counter()
+        self._models = {name: metrics.Counter() for name in MODELS}
+        metrics.register("forecasting", self.snapshot)
+
+    async def start(self) -> None:
+        if self._interval <= 0:
+            logger.info("Forecast refits disabled (FORECAST_REFRESH_SECONDS=0).")
+            return
+        self._task = asyncio.create_task(self._loop(), name="forecast-refit")
+        logger.info("Forecast refits started (every %.0fs).", self._interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("Forecast refits stopped.")
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.refit_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._failures.inc()
+                logger.warning("Forecast refit failed: %s", exc)
+            await asyncio.sleep(self._interval)
+
+    # ------------------------------------------------------------------
+    # Fitting
+    # ------------------------------------------------------------------
+
+    async def _load(self, tenant_ids: Sequence[str], through: date) -> Dict[str, Tuple[List[Tuple[str, str]], np.ndarray]]:
+        """
+        Per tenant, the series keys (TOTAL_KEY first) and a (series, days)
+        cost matrix. Tenants that do not exist are left out.
+        """
+        start = through - timedelta(days=FORECAST_HISTORY_DAYS - 1)
+        end = through + timedelta(days=1)
+        pool = await database.get_readonly_pool()
+        known = {tenant_id for tenant_id, in await pool.fetch(_KNOWN_TENANTS_SQL, list(tenant_ids))}
+        tenant_ids = [tenant_id for tenant_id in tenant_ids if tenant_id in known]
+        if not tenant_ids:
+            return {}
+        records = await pool.fetch(
+            _SERIES_SQL, list(tenant_ids), start, through,
+            datetime(start.year, start.month, start.day, tzinfo=timezone.utc),
+            datetime(end.year, end.month, end.day, tzinfo=timezone.utc),
+        )
+        grouped: Dict[str, List[Any]] = {tenant_id: [] for tenant_id in tenant_ids}
+        for record in records:
+            grouped[record["tenant_id"]].append(record)
+
+        origin = np.datetime64(start, "D")
+        loaded = {}
+        for tenant_id, tenant_records in grouped.items():
+            Y = np.zeros((len(tenant_records) + 1, FORECAST_HISTORY_DAYS))
+            keys = [TOTAL_KEY]
+            for row, record in enumerate(tenant_records, start=1):
+                offsets = (np.array(record["days"], dtype="datetime64[D]") - origin).astype(np.int64)
+                Y[row, offsets] = record["costs"]
+                keys.append((record["provider_name"], record["service_name"]))
+            Y[0] = Y[1:].sum(axis=0)
+            loaded[tenant_id] = (keys, Y)
+        return loaded
+
+    async def _run(self, Y: np.ndarray) -> Dict[str, np.ndarray]:
+        """fit_forecast over Y, sharded across the process pool when large."""
+        if self._workers <= 0 or len(Y) < FORECAST_POOL_MIN_SERIES:
+            return await asyncio.to_thread(fit_forecast, Y, FORECAST_MAX_HORIZON)
+        if self._pool is None:
+            # spawn: the workers only need numpy, not a copy of the event loop and its sockets.
+            self._pool = ProcessPoolExecutor(self._workers, mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        shards = await asyncio.gather(*(
+            loop.run_in_executor(self._pool, fit_forecast, Y[offset:offset + FORECAST_SHARD_SERIES],
+                                 FORECAST_MAX_HORIZON)
+            for offset in range(0, len(Y), FORECAST_SHARD_SERIES)
+        ))
+        return {name: np.concatenate([shard[name] for shard in shards]) for name in shards[0]}
+
+    async def _fit(self, tenant_ids: Sequence[str], through: date) -> Dict[str, TenantForecast]:
+        started = time.perf_counter()
+        loaded = await self._load(tenant_ids, through)
+        if not loaded:
+            return {}
+        bounds, offset = {}, 0
+        for tenant_id, (keys, _) in loaded.items():
+            bounds[tenant_id] = (offset, offset + len(keys))
+            offset += len(keys)
+        Y = np.concatenate([Y for _, Y in loaded.values()])
+        fitted = await self._run(Y)
+
+        forecasts = {}
+        for tenant_id, (keys, tenant_Y) in loaded.items():
+            lo, hi = bounds[tenant_id]
+            forecasts[tenant_id] = TenantForecast(
+                through=through, keys=keys,
+                recent=tenant_Y[:, -30:].sum(axis=1),
+                history=tenant_Y[0, -FORECAST_HISTORY_SHOWN:],
+                model=fitted["model"][lo:hi], mean=fitted["mean"][lo:hi], sd=fitted["sd"][lo:hi],
+            )
+        self._fits.observe((time.perf_counter() - started) * 1000)
+        self._series.inc(len(Y))
+        for index, count in zip(*np.unique(fitted["model"], return_counts=True)):
+            self._models[MODELS[index]].inc(int(count))
+        return forecasts
+
+    async def _fit_and_remember(self, tenant_ids: Sequence[str], through: date) -> Dict[str, TenantForecast]:
+        forecasts = await self._fit(tenant_ids, through)
+        self._remember(forecasts)
+        return forecasts
+
+    def _remember(self, forecasts: Dict[str, TenantForecast]) -> None:
+        for tenant_id, forecast in forecasts.items():
+            self._cache[tenant_id] = forecast
+            self._cache.move_to_end(tenant_id)
+        while len(self._cache) > FORECAST_CACHE_TENANTS:
+            self._cache.popitem(last=False)
+
+    async def tenant_forecast(self, tenant_id: str, today: Optional[date] = None) -> Optional[TenantForecast]:
+        """
+        The cached forecast, refitted once per settled day; concurrent misses
+        share one fit. None when the tenant does not exist.
+        """
+        through = settled_through(today)
+        cached = self._cache.get(tenant_id)
+        if cached is not None and cached.through >= through:
+            self._cache.move_to_end(tenant_id)
+            self._hits.inc()
+            return cached
+        self._misses.inc()
+        pending = self._fitting.get(tenant_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fit_and_remember([tenant_id], through))
+            self._fitting[tenant_id] = pending
+            pending.add_done_callback(lambda _: self._fitting.pop(tenant_id, None))
+        # Shielded: a disconnecting caller must not cancel the fit others wait on.
+        return (await asyncio.shield(pending)).get(tenant_id)
+
+    async def refit_all(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Refit every active tenant whose cached forecast is older than the last settled day."""
+        through = settled_through(today)
+        pool = await database.get_readonly_pool()
+        tenant_ids = [
+            tenant_id for tenant_id, in await pool.fetch(_TENANTS_SQL)
+            if tenant_id not in self._cache or self._cache[tenant_id].through < through
+        ][:FORECAST_CACHE_TENANTS]
+        series = 0
+        for offset in range(0, len(tenant_ids), FORECAST_TENANT_BATCH):
+            forecasts = await self._fit_and_remember(tenant_ids[offset:offset + FORECAST_TENANT_BATCH], through)
+            series += sum(len(forecast.keys) for forecast in forecasts.values())
+        if tenant_ids:
+            logger.info("Refitted forecasts for %d tenants (%d series) through %s.", len(tenant_ids), series, through)
+        return {"tenants": len(tenant_ids), "series": series}
+
+    # ------------------------------------------------------------------
+    # Responses
+    # ------------------------------------------------------------------
+
+    async def forecast(
+        self,
+        tenant_id: str,
+        horizon: int = 30,
+        level: float = 80.0,
+        top_services: int = FORECAST_TOP_SERVICES,
+        today: Optional[date] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        The tenant total and its top_services services (by the last 30
+        days' spend), forecast horizon days ahead with level% intervals;
+        None when the tenant does not exist.
+        """
+        if not 1 <= horizon <= FORECAST_MAX_HORIZON:
+            raise ValueError(f"horizon must be between 1 and {FORECAST_MAX_HORIZON} days.")
+        fitted = await self.tenant_forecast(tenant_id, today)
+        if fitted is None:
+            return None
+        z = NormalDist().inv_cdf(0.5 + level / 200)
+        first_day = fitted.through + timedelta(days=1)
+        dates = [(first_day + timedelta(days=step)).isoformat() for step in range(horizon)]
+
+        def points(index: int) -> List[Dict[str, Any]]:
+            mean = fitted.mean[index, :horizon].astype(float)
+            spread = z * fitted.sd[index, :horizon].astype(float)
+            return [
+                {"date": day, "cost": round(cost, 2), "lower": round(max(cost - width, 0.0), 2),
+                 "upper": round(cost + width, 2)}
+                for day, cost, width in zip(dates, mean, spread)
+            ]
+
+        # Next calendar month after today, from the full-length total forecast.
+        today = today or datetime.now(timezone.utc).date()
+        month = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+        month_end = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+        window = slice((month - first_day).days, (month_end - first_day).days)
+        history_start = fitted.through - timedelta(days=len(fitted.history) - 1)
+
+        services = sorted(range(1, len(fitted.keys)), key=lambda index: -fitted.recent[index])[:top_services]
+        return {
+            "tenant_id": tenant_id,
+            "through": fitted.through,
+            "horizon": horizon,
+            "level": level,
+            "history": [
+                {"date": (history_start + timedelta(days=step)).isoformat(), "cost": round(float(cost), 6)}
+                for step, cost in enumerate(fitted.history)
+            ],
+            "total": {"model": MODELS[fitted.model[0]], "forecast": points(0)},
+            "next_month": {"month": month, "cost": round(float(fitted.mean[0, window].sum()), 2)},
+            "services": [
+                {
+                    "provider_name": fitted.keys[index][0],
+                    "service_name": fitted.keys[index][1],
+                    "model": MODELS[fitted.model[index]],
+                    "recent_cost": round(float(fitted.recent[index]), 6),
+                    "forecast": points(index),
+                }
+                for index in services
+            ],
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "cached_tenants": len(self._cache),
+            "fit": self._fits.snapshot(),
+            "series_fitted": self._series.value,
+            "models": {name: counter.value for name, counter in self._models.items()},
+            "cache_hits": self._hits.value,
+            "cache_misses": self._misses.value,
+            "failures": self._failures.value,
+        }
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def _main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Fit daily cost forecasts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("refit", help="Fit every active tenant.")
+    show = commands.add_parser("show", help="Print one tenant's forecast.")
+    show.add_argument("--tenant", required=True)
+    show.add_argument("--horizon", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    forecaster = Forecaster(interval_seconds=0)
+    try:
+        if args.command == "refit":
+            print(await forecaster.refit_all())
+        else:
+            print(json.dumps(await forecaster.forecast(args.tenant, args.horizon), indent=2, default=str))
+    finally:
+        await forecaster.stop()
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,160 @@
+"""
+gnn_sampling.py
+===============
+TEJUSKA Cloud Intelligence
+GraphSAGE-style neighbour-sampled mini-batch inference for ResourceGNN.
+
+Targets are scored in batches. For each batch a k-hop subgraph is sampled
+outward from the targets with a fixed fan-out per layer, and only the
+sampled nodes' features are gathered. Peak memory is therefore bounded by
+batch_size * prod(fanout + 1), independent of the tenant's graph size.
+The CSR arrays and feature matrix may be np.memmap views, in which case
+only the pages touched by sampled nodes are ever read.
+"""
+
+import os
+import logging
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+logger = logging.getLogger("tejuska.gnn_sampling")
+
+# Fan-out per GNN layer, first layer first (ResourceGNN has two layers).
+ABACUS_SAMPLER_FANOUTS: Tuple[int, ...] = tuple(
+    int(v) for v in os.environ.get("ABACUS_SAMPLER_FANOUTS", "10,10").split(",")
+)
+ABACUS_SAMPLER_BATCH_SIZE: int = int(os.environ.get("ABACUS_SAMPLER_BATCH_SIZE", "1024"))
+
+
+class SampledBatch(NamedTuple):
+    """One mini-batch: targets, the input nodes to gather and per-layer blocks."""
+    targets: np.ndarray        # global node ids being scored
+    input_nodes: np.ndarray    # global node ids whose features feed layer 1
+    blocks: List[torch.Tensor] # normalised sparse (n_dst x n_src) per layer
+
+
+class NeighbourSampler:
+    """
+    Samples message-flow blocks from a CSR graph.
+
+    Parameters
+    ----------
+    indptr, indices : CSR adjacency (may be memory-mapped).
+    fanouts         : Neighbours sampled per node for each layer, first layer first.
+    seed            : Seed for reproducible sampling.
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        fanouts: Sequence[int] = ABACUS_SAMPLER_FANOUTS,
+        seed: int = 0,
+    ) -> None:
+        self._indptr = indptr
+        self._indices = indices
+        self._fanouts = tuple(fanouts)
+        self._rng = np.random.default_rng(seed)
+
+    def _sample_layer(self, dst: np.ndarray, fanout: int) -> Tuple[np.ndarray, torch.Tensor]:
+        """
+        Sample up to `fanout` neighbours for each dst node.
+        Returns the src node ids (dst nodes first) and the normalised block.
+        """
+        starts = np.asarray(self._indptr[dst], dtype=np.int64)
+        degree = np.asarray(self._indptr[dst + 1], dtype=np.int64) - starts
+        take = np.minimum(degree, fanout)
+        total = int(take.sum())
+
+        row = np.repeat(np.arange(dst.size, dtype=np.int64), take)
+        position = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(take) - take, take)
+        # Low-degree nodes keep every neighbour; the rest draw with replacement.
+        drawn = (self._rng.random(total) * degree[row]).astype(np.int64)
+        offsets = np.where(degree[row] <= fanout, position, drawn)
+        neighbours = np.asarray(self._indices[starts[row] + offsets], dtype=np.int64)
+
+        # Local ids ordered by first appearance, so dst nodes occupy [0, len(dst)).
+        all_nodes = np.concatenate([dst, neighbours])
+        unique, first_seen, inverse = np.unique(all_nodes, return_index=True, return_inverse=True)
+        order = np.argsort(first_seen, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.size)
+        local = rank[inverse]
+        src = unique[order]
+
+        # Every dst node aggregates its own features too (self-loop), then dedupe.
+        rows = np.concatenate([np.arange(dst.size, dtype=np.int64), row])
+        cols = np.concatenate([local[: dst.size], local[dst.size:]])
+        keys = np.sort(rows * src.size + cols)
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        rows, cols = np.divmod(keys, src.size)
+
+        crow = np.zeros(dst.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=dst.size), out=crow[1:])
+        counts = np.diff(crow)
+        values = np.repeat(1.0 / np.maximum(counts, 1), counts).astype(np.float32)
+        block = torch.sparse_csr_tensor(
+            torch.from_numpy(crow),
+            torch.from_numpy(cols),
+            torch.from_numpy(values),
+            size=(dst.size, src.size),
+            check_invariants=False,
+        )
+        return src, block
+
+    def sample(self, targets: np.ndarray) -> SampledBatch:
+        """Sample the k-hop message-flow blocks needed to score `targets`."""
+        targets = np.asarray(targets, dtype=np.int64)
+        dst = targets
+        blocks: List[torch.Tensor] = []
+        # Walk outward from the targets: the last layer is sampled first.
+        for fanout in reversed(self._fanouts):
+            dst, block = self._sample_layer(dst, fanout)
+            blocks.append(block)
+        blocks.reverse()
+        return SampledBatch(targets=targets, input_nodes=dst, blocks=blocks)
+
+    def iter_batches(self, targets: np.ndarray, batch_size: int = ABACUS_SAMPLER_BATCH_SIZE) -> Iterator[SampledBatch]:
+        """Stream sampled mini-batches over the target nodes."""
+        targets = np.asarray(targets, dtype=np.int64)
+        for start in range(0, targets.size, batch_size):
+            yield self.sample(targets[start:start + batch_size])
+
+
+def iter_sampled_scores(
+    gnn: torch.nn.Module,
+    sampler: NeighbourSampler,
+    features: np.ndarray,
+    targets: np.ndarray,
+    batch_size: int = ABACUS_SAMPLER_BATCH_SIZE,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield (target node ids, termination probabilities) per mini-batch.
+    `features` is indexed by global node id and is only read at sampled rows.
+    """
+    with torch.no_grad():
+        for batch in sampler.iter_batches(targets, batch_size):
+            x = torch.from_numpy(np.ascontiguousarray(features[batch.input_nodes], dtype=np.float32))
+            logits = gnn.forward_blocks(x, batch.blocks)
+            yield batch.targets, torch.softmax(logits, dim=-1)[:, 1].numpy()
+
+
+def sampled_scores(
+    gnn: torch.nn.Module,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    features: np.ndarray,
+    targets: np.ndarray,
+    fanouts: Optional[Sequence[int]] = None,
+    batch_size: int = ABACUS_SAMPLER_BATCH_SIZE,
+) -> np.ndarray:
+    """Score `targets` with neighbour sampling and return probabilities in target order."""
+    sampler = NeighbourSampler(indptr, indices, fanouts or ABACUS_SAMPLER_FANOUTS)
+    scores = np.empty(len(targets), dtype=np.float32)
+    offset = 0
+    for batch_targets, batch_scores in iter_sampled_scores(gnn, sampler, features, targets, batch_size):
+        scores[offset:offset + batch_targets.size] = batch_scores
+        offset += batch_targets.size
+    return scores
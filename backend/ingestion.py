@@ -0,0 +1,1035 @@
+"""
+ingestion.py
+============
+TEJUSKA Cloud Intelligence
+Bulk loader for provider billing exports into consolidated_billing.
+
+Reads AWS Cost and Usage Reports (legacy and CUR 2.0), Azure cost exports,
+GCP BigQuery billing exports and native FOCUS files from local disk, as CSV,
+gzip CSV or Parquet. Files are streamed in record batches, mapped to FOCUS
+1.1 columns with pyarrow compute kernels and encoded straight into
+Postgres' binary COPY format, so no per-row Python runs and memory stays at
+a couple of batches whatever the file size. Encoding happens in a worker
+thread while the previous batch is on the wire.
+
+Each file loads in one transaction recorded in billing_ingestions under
+(tenant, source_file): an unchanged file (same SHA-256) is skipped, a
+changed one replaces the rows of its previous load. Rows being replaced are
+subtracted from the rollups in the same transaction (rollups.retract), and
+the load holds the rollup refresh off until it commits, so routed OPTIC
+answers never see half a file.
+
+Usage (from backend/):
+    python ingestion.py load --tenant <uuid> exports/2026-09/*.csv.gz
+    python ingestion.py load --tenant <uuid> --dialect gcp billing-2026-09.parquet
+"""
+
+import os
+import re
+import csv
+import gzip
+import hashlib
+import secrets
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import database
+import metrics
+import rollups
+
+logger = logging.getLogger("tejuska.ingestion")
+
+# Rows per Parquet batch and bytes per CSV block; one batch is one COPY chunk.
+INGEST_BATCH_ROWS: int = int(os.environ.get("INGEST_BATCH_ROWS", "131072"))
+INGEST_CSV_BLOCK_BYTES: int = int(os.environ.get("INGEST_CSV_BLOCK_BYTES", str(16 << 20)))
+
+DIALECTS = ("focus", "aws", "azure", "gcp")
+PROVIDER_NAMES = {"aws": "AWS", "azure": "Microsoft", "gcp": "Google Cloud"}
+
+
+class IngestionError(ValueError):
+    """The export cannot be loaded (unknown layout, missing or out-of-range values)."""
+
+
+# ---------------------------------------------------------------------------
+# Source layouts
+# ---------------------------------------------------------------------------
+
+def _snake(name: str) -> str:
+    """lineItem/UnblendedCost, line_item_unblended_cost -> line_item_unblended_cost."""
+    name = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", name)
+    return re.sub(r"[^0-9a-z]+", "_", name.lower()).strip("_")
+
+
+# Logical column -> source columns (snake_cased) tried in order. The derive
+# functions below only see logical names; the union of the candidates is
+# all that is read from the file.
+_SOURCES: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "focus": {
+        "billing_account_id": ("billing_account_id",),
+        "billing_account_name": ("billing_account_name",),
+        "billing_period_start": ("billing_period_start",),
+        "billing_period_end": ("billing_period_end",),
+        "charge_period_start": ("charge_period_start",),
+        "charge_period_end": ("charge_period_end",),
+        "billed_cost": ("billed_cost",),
+        "effective_cost": ("effective_cost",),
+        "list_cost": ("list_cost",),
+        "billing_currency": ("billing_currency",),
+        "provider_name": ("provider_name", "provider"),
+        "service_name": ("service_name",),
+        "service_category": ("service_category",),
+        "resource_id": ("resource_id",),
+        "resource_name": ("resource_name",),
+        "region_id": ("region_id",),
+        "region_name": ("region_name", "region"),
+        "availability_zone": ("availability_zone",),
+        "charge_category": ("charge_category",),
+        "charge_description": ("charge_description",),
+        "pricing_quantity": ("pricing_quantity",),
+        "pricing_unit": ("pricing_unit",),
+        "consumed_quantity": ("consumed_quantity",),
+        "consumed_unit": ("consumed_unit",),
+        "commitment_discount_id": ("commitment_discount_id",),
+        "tags": ("tags",),
+    },
+    "aws": {
+        "billing_account_id": ("bill_payer_account_id", "line_item_usage_account_id"),
+        "billing_account_name": ("bill_payer_account_name",),
+        "billing_period_start": ("bill_billing_period_start_date",),
+        "billing_period_end": ("bill_billing_period_end_date",),
+        "charge_period_start": ("line_item_usage_start_date",),
+        "charge_period_end": ("line_item_usage_end_date",),
+        "unblended_cost": ("line_item_unblended_cost",),
+        "net_unblended_cost": ("line_item_net_unblended_cost",),
+        "savings_plan_effective_cost": ("savings_plan_savings_plan_effective_cost",),
+        "reservation_effective_cost": ("reservation_effective_cost",),
+        "list_cost": ("pricing_public_on_demand_cost",),
+        "billing_currency": ("line_item_currency_code",),
+        "service_name": ("product_product_name", "product_servicecode", "line_item_product_code"),
+        "service_category": ("product_product_family",),
+        "resource_id": ("line_item_resource_id",),
+        "region_id": ("product_region_code", "product_region"),
+        "region_name": ("product_location",),
+        "availability_zone": ("line_item_availability_zone",),
+        "line_item_type": ("line_item_line_item_type",),
+        "charge_description": ("line_item_line_item_description",),
+        "pricing_quantity": ("line_item_usage_amount",),
+        "pricing_unit": ("pricing_unit",),
+        "consumed_quantity": ("line_item_usage_amount",),
+        "commitment_discount_id": (
+            "savings_plan_savings_plan_arn", "savings_plan_savings_plan_a_r_n",
+            "reservation_reservation_arn", "reservation_reservation_a_r_n",
+        ),
+        "tags": ("resource_tags",),
+    },
+    "azure": {
+        "billing_account_id": ("billing_account_id", "subscription_id", "subscription_guid"),
+        "billing_account_name": ("billing_account_name", "subscription_name"),
+        "billing_period_start": ("billing_period_start_date",),
+        "billing_period_end": ("billing_period_end_date",),
+        "charge_period_start": ("date", "usage_date_time", "usage_date"),
+        "billed_cost": ("cost_in_billing_currency", "pre_tax_cost", "cost"),
+        "billing_currency": ("billing_currency", "billing_currency_code", "currency"),
+        "service_name": ("meter_category", "consumed_service"),
+        "service_category": ("service_family",),
+        "resource_id": ("resource_id", "instance_id", "instance_name"),
+        "resource_name": ("resource_name",),
+        "region_id": ("resource_location", "resource_location_normalized", "location"),
+        "charge_type": ("charge_type",),
+        "charge_description": ("meter_name",),
+        "consumed_quantity": ("quantity", "consumed_quantity"),
+        "consumed_unit": ("unit_of_measure",),
+        "commitment_discount_id": ("benefit_id", "reservation_id"),
+        "tags": ("tags",),
+    },
+    "gcp": {
+        "billing_account_id": ("billing_account_id",),
+        "billing_account_name": ("project_name",),
+        "invoice_month": ("invoice_month",),
+        "charge_period_start": ("usage_start_time",),
+        "charge_period_end": ("usage_end_time",),
+        "billed_cost": ("cost",),
+        "credits": ("credits",),
+        "billing_currency": ("currency",),
+        "service_name": ("service_description",),
+        "service_category": ("sku_description",),
+        "resource_id": ("resource_global_name", "resource_name", "project_id"),
+        "resource_name": ("resource_name",),
+        "region_id": ("location_region", "location_location"),
+        "availability_zone": ("location_zone",),
+        "cost_type": ("cost_type",),
+        "pricing_quantity": ("usage_amount_in_pricing_units",),
+        "pricing_unit": ("usage_pricing_unit",),
+        "consumed_quantity": ("usage_amount",),
+        "consumed_unit": ("usage_unit",),
+        "tags": ("labels",),
+    },
+}
+
+# Columns whose presence identifies a layout, checked in this order.
+_SIGNATURES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("focus", ("billed_cost", "charge_period_start")),
+    ("aws", ("line_item_unblended_cost", "line_item_usage_start_date")),
+    ("azure", ("meter_category",)),
+    ("gcp", ("usage_start_time", "cost")),
+)
+
+_AWS_CHARGE_TYPES = {
+    "Usage": "Usage", "DiscountedUsage": "Usage", "SavingsPlanCoveredUsage": "Usage",
+    "SavingsPlanNegation": "Usage", "Fee": "Purchase", "RIFee": "Purchase",
+    "SavingsPlanUpfrontFee": "Purchase", "SavingsPlanRecurringFee": "Purchase",
+    "Tax": "Tax", "Credit": "Credit", "Refund": "Credit", "BundledDiscount": "Credit",
+    "EdpDiscount": "Credit", "PrivateRateDiscount": "Credit", "DistributorDiscount": "Credit",
+}
+_AZURE_CHARGE_TYPES = {
+    "Usage": "Usage", "UnusedReservation": "Usage", "UnusedSavingsPlan": "Usage",
+    "Purchase": "Purchase", "Refund": "Credit", "Tax": "Tax", "RoundingAdjustment": "Adjustment",
+}
+_GCP_CHARGE_TYPES = {"regular": "Usage", "tax": "Tax", "adjustment": "Adjustment", "rounding_error": "Adjustment"}
+_FOCUS_CHARGE_TYPES = {name: name for name in ("Usage", "Purchase", "Tax", "Adjustment", "Credit")}
+
+# Legacy CUR carries one column per cost-allocation tag.
+_AWS_TAG_PREFIX = "resourceTags/"
+
+
+def _aws_tag_key(column: str) -> str:
+    """resourceTags/user:CostCenter -> CostCenter; AWS-generated keys (aws:createdBy) stay whole."""
+    key = column[len(_AWS_TAG_PREFIX):]
+    return key[len("user:"):] if key.startswith("user:") else key
+
+
+def detect_dialect(columns: Sequence[str]) -> str:
+    """Name the layout of an export from its (snake_cased) column names."""
+    present = set(columns)
+    for dialect, required in _SIGNATURES:
+        if present.issuperset(required):
+            return dialect
+    raise IngestionError(f"unrecognised billing export layout ({len(present)} columns)")
+
+
+# ---------------------------------------------------------------------------
+# Vectorised column helpers (pyarrow arrays in, pyarrow arrays out)
+# ---------------------------------------------------------------------------
+
+_TIMESTAMP_FORMATS = ("%m/%d/%Y", "%m/%d/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S UTC", "%Y%m%d")
+
+
+def _timestamp_parsers() -> Iterator[Callable[[Any], Any]]:
+    """Text -> timestamp[us, UTC] parsers, most common layout first."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    yield lambda text: text.cast(pa.timestamp("us", tz="UTC"))  # ISO 8601 with a zone
+    yield lambda text: pc.assume_timezone(text.cast(pa.timestamp("us")), "UTC")
+    for fmt in _TIMESTAMP_FORMATS:
+        yield lambda text, fmt=fmt: pc.assume_timezone(pc.strptime(text, format=fmt, unit="us"), "UTC")
+
+
+def _timestamps(arr: Any) -> Any:
+    """Any date/time column -> timestamp[us, UTC]; naive values are taken as UTC."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    utc = pa.timestamp("us", tz="UTC")
+    if pa.types.is_timestamp(arr.type) or pa.types.is_date(arr.type):
+        if pa.types.is_timestamp(arr.type) and arr.type.tz is not None:
+            return arr.cast(utc)
+        return pc.assume_timezone(arr.cast(pa.timestamp("us")), "UTC")
+    arr = _text(arr)
+    # A failed parse scans the whole column, so pick the layout on a sample.
+    sample = pc.drop_null(arr)[:64]
+    if not len(sample):
+        return pa.nulls(len(arr), utc)
+    for parse in _timestamp_parsers():
+        try:
+            parse(sample)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        try:
+            return parse(arr)
+        except pa.ArrowInvalid as exc:
+            raise IngestionError(f"mixed timestamp layouts in one column: {exc}") from None
+    raise IngestionError(f"unparseable timestamps, e.g. {sample[:1].to_pylist()}")
+
+
+def _numbers(arr: Any) -> Any:
+    import pyarrow as pa
+
+    try:
+        return arr.cast(pa.float64())
+    except pa.ArrowInvalid as exc:
+        raise IngestionError(f"non-numeric value in a numeric column: {exc}") from None
+
+
+def _text(arr: Any) -> Any:
+    import pyarrow as pa
+
+    return arr if arr.type == pa.string() else arr.cast(pa.string())
+
+
+def _classify(arr: Any, mapping: Dict[str, str], default: str) -> Any:
+    """Map a low-cardinality text column through mapping (values are looked up once)."""
+    import pyarrow as pa
+
+    encoded = _text(arr).dictionary_encode()
+    labels = pa.array([mapping.get(value, default) for value in encoded.dictionary.to_pylist()], pa.string())
+    return labels.take(encoded.indices).fill_null(default)
+
+
+def _month_bounds(starts: Any) -> Tuple[Any, Any]:
+    """UTC calendar month around each timestamp, as (start, end) timestamp arrays."""
+    import numpy as np
+    import pyarrow as pa
+
+    months = starts.cast(pa.int64()).fill_null(0).to_numpy().astype("datetime64[us]").astype("datetime64[M]")
+    utc = pa.timestamp("us", tz="UTC")
+    bounds = [pa.array(m.astype("datetime64[us]").astype(np.int64), pa.int64()).cast(utc) for m in (months, months + 1)]
+    return bounds[0], bounds[1]
+
+
+def _shift(starts: Any, microseconds: int) -> Any:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    return pc.add(starts.cast(pa.int64()), microseconds).cast(starts.type)
+
+
+def _json_escape(arr: Any) -> Any:
+    import pyarrow.compute as pc
+
+    arr = _text(arr)
+    # Tags almost never need escaping; one scan avoids three rewrites.
+    if not pc.any(pc.match_substring_regex(arr, r'["\\\x00-\x1f]')).as_py():
+        return arr
+    arr = pc.replace_substring(arr, "\\", "\\\\")
+    arr = pc.replace_substring(arr, '"', '\\"')
+    # Control characters are not valid inside JSON strings; tags never need them.
+    return pc.replace_substring_regex(arr, r"[\x00-\x1f]", " ")
+
+
+def _json_from_columns(columns: Sequence[Tuple[str, Any]]) -> Any:
+    """One tag column per key (legacy CUR) -> JSON object text per row."""
+    import pyarrow.compute as pc
+
+    if not columns:
+        return "{}"
+    members = [
+        pc.fill_null(pc.binary_join_element_wise(f',"{key}":"', _json_escape(values), '"', ""), "")
+        for key, values in ((k.replace("\\", "\\\\").replace('"', '\\"'), v) for k, v in columns)
+    ]
+    joined = pc.binary_join_element_wise(*members, "") if len(members) > 1 else members[0]
+    return pc.binary_join_element_wise("{", pc.utf8_ltrim(joined, characters=","), "}", "")
+
+
+def _json_from_pairs(arr: Any) -> Any:
+    """list<struct<key, value>> or map<string, string> (GCP labels, CUR 2.0 tags) -> JSON text."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    entries = arr.values
+    keys, values = entries.field(0), entries.field(1)
+    keys = _json_escape(keys)
+    pairs = pc.binary_join_element_wise('"', keys, '":"', _json_escape(values), '"', "")
+    if values.null_count:
+        pairs = pc.coalesce(pairs, pc.binary_join_element_wise('"', keys, '":null', ""))
+    joined = pc.binary_join(pa.ListArray.from_arrays(arr.offsets, pairs), ",")
+    return pc.binary_join_element_wise("{", pc.fill_null(joined, ""), "}", "")
+
+
+def _tags(arr: Optional[Any]) -> Any:
+    """Tag column in any export shape -> JSON object text (or the '{}' scalar)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if arr is None:
+        return "{}"
+    if pa.types.is_list(arr.type) or pa.types.is_map(arr.type) or pa.types.is_large_list(arr.type):
+        return _json_from_pairs(arr)
+    text = pc.utf8_trim_whitespace(_text(arr))
+    # Azure EA exports write the members without the enclosing braces; a
+    # key/value list flattened to text (BigQuery CSV) cannot be kept.
+    braced = pc.if_else(
+        pc.starts_with(text, "{"), text, pc.binary_join_element_wise("{", text, "}", "")
+    )
+    empty = pc.or_(pc.equal(text, ""), pc.starts_with(text, "["))
+    return pc.fill_null(pc.if_else(empty, "{}", braced), "{}")
+
+
+# ---------------------------------------------------------------------------
+# Layout -> FOCUS mapping
+# ---------------------------------------------------------------------------
+
+def _sum_credits(arr: Any) -> Any:
+    """GCP credits (list<struct<..., amount>>) -> summed amount per row (0 when none)."""
+    import numpy as np
+    import pyarrow as pa
+
+    amounts = arr.values.field("amount").cast(pa.float64()).fill_null(0).to_numpy()
+    offsets = arr.offsets.to_numpy()
+    totals = np.add.reduceat(np.append(amounts, 0.0), offsets[:-1]) if len(amounts) else np.zeros(len(arr))
+    totals[offsets[:-1] == offsets[1:]] = 0.0  # reduceat repeats the next value for empty lists
+    return pa.array(totals, pa.float64())
+
+
+def _map_focus(cols: Dict[str, Any], n: int) -> Dict[str, Any]:
+    out = {name: cols.get(name) for name in _SOURCES["focus"]}
+    out["charge_type"] = _classify(cols["charge_category"], _FOCUS_CHARGE_TYPES, "Adjustment") \
+        if cols.get("charge_category") is not None else "Usage"
+    out["provider_name"] = cols.get("provider_name") if cols.get("provider_name") is not None else "Unknown"
+    out["tags"] = _tags(cols.get("tags"))
+    return out
+
+
+def _map_aws(cols: Dict[str, Any], n: int) -> Dict[str, Any]:
+    import pyarrow.compute as pc
+
+    out = {name: cols.get(name) for name in _SOURCES["aws"]}
+    line_type = cols.get("line_item_type")
+    billed = _numbers(cols["unblended_cost"])
+    effective = _numbers(cols["net_unblended_cost"]) if cols.get("net_unblended_cost") is not None else billed
+    if line_type is not None:
+        out["charge_type"] = _classify(line_type, _AWS_CHARGE_TYPES, "Adjustment")
+        # Amortise commitments the way FOCUS EffectiveCost does: covered usage
+        # carries its share of the commitment, negations and fees net out.
+        for kind, column in (
+            ("SavingsPlanCoveredUsage", "savings_plan_effective_cost"),
+            ("DiscountedUsage", "reservation_effective_cost"),
+        ):
+            if cols.get(column) is not None:
+                effective = pc.if_else(pc.equal(line_type, kind), _numbers(cols[column]), effective)
+        netted = pc.is_in(line_type, value_set=_pa_strings(("SavingsPlanNegation", "SavingsPlanRecurringFee", "RIFee")))
+        effective = pc.if_else(pc.fill_null(netted, False), 0.0, effective)
+    else:
+        out["charge_type"] = "Usage"
+    out["billed_cost"], out["effective_cost"] = billed, effective
+    out["provider_name"] = PROVIDER_NAMES["aws"]
+    out["tags"] = cols["_tag_columns"] if cols.get("_tag_columns") is not None else _tags(cols.get("tags"))
+    return out
+
+
+def _map_azure(cols: Dict[str, Any], n: int) -> Dict[str, Any]:
+    out = {name: cols.get(name) for name in _SOURCES["azure"]}
+    starts = _timestamps(cols["charge_period_start"])
+    out["charge_period_start"] = starts
+    out["charge_period_end"] = _shift(starts, 86_400_000_000)  # exports are daily
+    out["effective_cost"] = out["billed_cost"]  # actual and amortised exports use the same column
+    out["charge_type"] = _classify(cols["charge_type"], _AZURE_CHARGE_TYPES, "Adjustment") \
+        if cols.get("charge_type") is not None else "Usage"
+    out["provider_name"] = PROVIDER_NAMES["azure"]
+    out["tags"] = _tags(cols.get("tags"))
+    return out
+
+
+def _map_gcp(cols: Dict[str, Any], n: int) -> Dict[str, Any]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    out = {name: cols.get(name) for name in _SOURCES["gcp"]}
+    if cols.get("invoice_month") is not None:
+        starts = _timestamps(pc.binary_join_element_wise(_text(cols["invoice_month"]), "01", ""))
+        out["billing_period_start"], out["billing_period_end"] = _month_bounds(starts)
+    billed = _numbers(cols["billed_cost"])
+    credits = cols.get("credits")
+    # Credits only survive in Parquet exports; CSV exports cannot nest them.
+    if credits is not None and (pa.types.is_list(credits.type) or pa.types.is_large_list(credits.type)):
+        out["effective_cost"] = pc.add(billed, _sum_credits(credits))
+    else:
+        out["effective_cost"] = billed
+    out["billed_cost"] = billed
+    out["charge_type"] = _classify(cols["cost_type"], _GCP_CHARGE_TYPES, "Adjustment") \
+        if cols.get("cost_type") is not None else "Usage"
+    out["provider_name"] = PROVIDER_NAMES["gcp"]
+    out["tags"] = _tags(cols.get("tags"))
+    return out
+
+
+_MAPPERS: Dict[str, Callable[[Dict[str, Any], int], Dict[str, Any]]] = {
+    "focus": _map_focus, "aws": _map_aws, "azure": _map_azure, "gcp": _map_gcp,
+}
+
+
+def _pa_strings(values: Sequence[str]) -> Any:
+    import pyarrow as pa
+
+    return pa.array(values, pa.string())
+
+
+# ---------------------------------------------------------------------------
+# Binary COPY encoding
+# ---------------------------------------------------------------------------
+
+# (column, wire type) in COPY order; the encoder fills in _GENERATED. The
+# order does not matter to Postgres; fixed-width fields go first so each
+# row starts with one contiguous block (see _assemble).
+COPY_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("row_id", "uuid"),
+    ("tenant_id", "uuid"),
+    ("ingested_at", "timestamptz"),
+    ("billing_period_start", "timestamptz"),
+    ("billing_period_end", "timestamptz"),
+    ("charge_period_start", "timestamptz"),
+    ("charge_period_end", "timestamptz"),
+    ("billed_cost", "numeric"),
+    ("effective_cost", "numeric"),
+    ("list_cost", "numeric"),
+    ("pricing_quantity", "numeric"),
+    ("consumed_quantity", "numeric"),
+    ("source_file", "text"),
+    ("billing_account_id", "text"),
+    ("billing_account_name", "text"),
+    ("billing_currency", "text"),
+    ("provider_name", "text"),
+    ("service_name", "text"),
+    ("service_category", "text"),
+    ("resource_id", "text"),
+    ("resource_name", "text"),
+    ("region_id", "text"),
+    ("region_name", "text"),
+    ("availability_zone", "text"),
+    ("charge_type", "text"),
+    ("charge_description", "text"),
+    ("pricing_unit", "text"),
+    ("consumed_unit", "text"),
+    ("commitment_discount_id", "text"),
+    ("tags", "jsonb"),
+)
+_GENERATED = ("row_id", "tenant_id", "ingested_at", "source_file")
+# NOT NULL columns and the value used when an export leaves them empty.
+_REQUIRED_TEXT = {
+    "billing_account_id": "unknown", "billing_currency": "USD", "provider_name": "Unknown",
+    "service_name": "Unknown", "charge_type": "Usage",
+}
+_REQUIRED_NUMERIC = ("billed_cost", "effective_cost")
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+COPY_TRAILER = b"\xff\xff"
+
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+_PG_EPOCH_US = 946_684_800_000_000  # _PG_EPOCH in Unix microseconds
+_NUMERIC_SCALE = 1_000_000           # NUMERIC(18,6): values travel as integer micro-units
+_NUMERIC_LIMIT = 10 ** 12            # 12 integer digits
+_NULL_FIELD = b"\xff\xff\xff\xff"
+
+# A row is encoded as a list of pieces: bytes (the same for every row), an
+# (n, width) uint8 matrix (fixed width) or a binary array (variable width).
+
+
+def _field(payload: bytes) -> bytes:
+    return len(payload).to_bytes(4, "big") + payload
+
+
+def _binary_rows(block: Any) -> Any:
+    """(n, width) uint8 matrix -> binary array of its rows, without copying."""
+    import numpy as np
+    import pyarrow as pa
+
+    n, width = block.shape
+    offsets = np.arange(0, (n + 1) * width, width, dtype=np.int32)
+    return pa.Array.from_buffers(pa.binary(), n, [None, pa.py_buffer(offsets), pa.py_buffer(block)])
+
+
+def _fixed_pieces(payload: Any, valid: Optional[Any] = None) -> List[Any]:
+    """(n, width) payloads -> length-prefixed fields; rows not valid are sent as NULL."""
+    import numpy as np
+    import pyarrow as pa
+
+    n, width = payload.shape
+    if valid is None or valid.all():
+        return [width.to_bytes(4, "big"), payload]
+    fields = np.empty((n, 4 + width), np.uint8)
+    fields[:, :4] = np.frombuffer(width.to_bytes(4, "big"), np.uint8)
+    fields[:, 4:] = payload
+    fields[~valid, :4] = 0xFF
+    keep = np.ones(fields.shape, bool)
+    keep[~valid, 4:] = False
+    offsets = np.zeros(n + 1, np.int32)
+    np.cumsum(np.where(valid, 4 + width, 4), out=offsets[1:])
+    return [pa.Array.from_buffers(pa.binary(), n, [None, pa.py_buffer(offsets), pa.py_buffer(fields[keep])])]
+
+
+def _text_pieces(arr: Any, jsonb: bool = False) -> List[Any]:
+    """Text -> a length matrix and the payloads; jsonb adds its version byte (NULL becomes {})."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    payload = arr.cast(pa.binary())
+    if jsonb:
+        payload = payload.fill_null(b"{}")
+    # Columns such as the payer account or currency rarely change within a
+    # batch; a constant joins the fixed-width block instead of the row join.
+    if len(payload) and not payload.null_count and pc.all(pc.equal(payload, payload[0])).as_py():
+        first = payload[0].as_py()
+        return [_field(b"\x01" + first if jsonb else first)]
+    lengths = pc.binary_length(payload).fill_null(-1).to_numpy()
+    if jsonb:
+        header = np.empty((len(arr), 5), np.uint8)
+        header[:, :4] = (lengths + 1).astype(">i4").view(np.uint8).reshape(-1, 4)
+        header[:, 4] = 1
+    else:
+        header = lengths.astype(">i4").view(np.uint8).reshape(-1, 4)
+    return [header, payload.fill_null(b"")]
+
+
+def _timestamp_pieces(arr: Any) -> List[Any]:
+    import numpy as np
+
+    valid = arr.is_valid().to_numpy(zero_copy_only=False)
+    micros = arr.cast("int64").fill_null(0).to_numpy() - _PG_EPOCH_US
+    return _fixed_pieces(micros.astype(">i8").view(np.uint8).reshape(-1, 8), valid)
+
+
+def _numeric_pieces(arr: Any, column: str) -> Tuple[List[Any], Any]:
+    """
+    float64 -> NUMERIC fields plus the micro-unit values. Every value is
+    sent as the same five base-10000 digits (weight 2, dscale 6) and
+    Postgres normalises them on receipt, so no per-row layout is needed.
+    """
+    import numpy as np
+
+    values = arr.to_numpy(zero_copy_only=False)
+    valid = ~np.isnan(values)
+    micros = np.rint(np.where(valid, values, 0.0) * _NUMERIC_SCALE).astype(np.int64)
+    magnitude = np.abs(micros)
+    if (magnitude >= _NUMERIC_LIMIT * _NUMERIC_SCALE).any():
+        raise IngestionError(f"{column} has values beyond NUMERIC(18,6)")
+    whole, fraction = magnitude // _NUMERIC_SCALE, magnitude % _NUMERIC_SCALE
+    words = np.empty((len(values), 9), ">i2")
+    words[:, 0], words[:, 1], words[:, 3] = 5, 2, 6  # ndigits, weight, dscale
+    words[:, 2] = np.where(micros < 0, 0x4000, 0)
+    words[:, 4] = whole // 10 ** 8
+    words[:, 5] = whole // 10 ** 4 % 10 ** 4
+    words[:, 6] = whole % 10 ** 4
+    words[:, 7] = fraction // 100
+    words[:, 8] = fraction % 100 * 100
+    return _fixed_pieces(words.view(np.uint8).reshape(-1, 18), valid), micros
+
+
+def _scalar_piece(value: Optional[str], kind: str) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    payload = value.encode()
+    return _field(b"\x01" + payload if kind == "jsonb" else payload)
+
+
+def _assemble(pieces: Sequence[Any], n: int) -> Any:
+    """
+    Concatenate pieces row by row into one binary array. Runs of constant
+    and fixed-width pieces are first packed into a single matrix, so the
+    final join only interleaves them with the variable-width payloads.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    parts: List[Any] = []
+    run: List[Any] = []
+
+    def close_run() -> None:
+        if not run:
+            return
+        # A structured row type copies each piece as one opaque value per
+        # row, which is much faster than strided uint8 column slices.
+        widths = [p.shape[1] if isinstance(p, np.ndarray) else len(p) for p in run]
+        block = np.empty(n, np.dtype([(f"f{i}", f"V{w}") for i, w in enumerate(widths)]))
+        for i, (piece, width) in enumerate(zip(run, widths)):
+            block[f"f{i}"] = piece.view(f"V{width}").reshape(-1) if isinstance(piece, np.ndarray) else np.void(piece)
+        parts.append(_binary_rows(block.view(np.uint8).reshape(n, -1)))
+        run.clear()
+
+    for piece in pieces:
+        if isinstance(piece, (bytes, np.ndarray)):
+            run.append(piece)
+        else:
+            close_run()
+            parts.append(piece)
+    close_run()
+    return parts[0] if len(parts) == 1 else pc.binary_join_element_wise(*parts, pa.scalar(b"", pa.binary()))
+
+
+class ExportReader:
+    """
+    Streams one export file as FOCUS-mapped, COPY-encoded chunks.
+
+    Parameters
+    ----------
+    path       : CSV, gzip CSV (.csv.gz) or Parquet file.
+    dialect    : One of DIALECTS; detected from the columns when None.
+    batch_rows : Rows per Parquet batch (CSV batches follow INGEST_CSV_BLOCK_BYTES).
+    """
+
+    def __init__(self, path: str, dialect: Optional[str] = None, batch_rows: int = INGEST_BATCH_ROWS) -> None:
+        self.path = path
+        self._batch_rows = batch_rows
+        self._parquet = path.endswith(".parquet") or path.endswith(".parq")
+        raw_columns = self._parquet_columns() if self._parquet else self._csv_header()
+        self._names = {raw: _snake(raw) for raw in raw_columns}
+        if dialect is not None and dialect not in DIALECTS:
+            raise IngestionError(f"unknown dialect {dialect!r}; expected one of {', '.join(DIALECTS)}")
+        self.dialect = dialect or detect_dialect(list(self._names.values()))
+        sources = _SOURCES[self.dialect]
+        wanted = {column for candidates in sources.values() for column in candidates}
+        self._tag_columns = {
+            raw: _aws_tag_key(raw) for raw in raw_columns
+            if self.dialect == "aws" and raw.startswith(_AWS_TAG_PREFIX)
+        }
+        self._read = [
+            raw for raw, name in self._names.items()
+            if raw in self._tag_columns or any(w == name or w.startswith(name + "_") for w in wanted)
+        ]
+        self.stats: Dict[str, Any] = {"rows": 0, "skipped": 0, "billed_micros": 0, "first": None, "last": None}
+
+    # -- file access ----------------------------------------------------
+
+    def _csv_header(self) -> List[str]:
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", newline="", encoding="utf-8-sig") as handle:
+            try:
+                return next(csv.reader(handle))
+            except StopIteration:
+                raise IngestionError(f"{self.path} is empty") from None
+
+    def _parquet_columns(self) -> List[str]:
+        import pyarrow.parquet as pq
+
+        return list(pq.ParquetFile(self.path).schema_arrow.names)
+
+    def _record_batches(self) -> Iterator[Any]:
+        import pyarrow as pa
+
+        if self._parquet:
+            import pyarrow.parquet as pq
+
+            batches = pq.ParquetFile(self.path).iter_batches(batch_size=self._batch_rows, columns=self._read)
+        else:
+            import pyarrow.csv as pacsv
+
+            batches = pacsv.open_csv(
+                self.path,
+                read_options=pacsv.ReadOptions(block_size=INGEST_CSV_BLOCK_BYTES, encoding="utf8"),
+                # Everything arrives as text and is parsed per column below, so
+                # type inference on the first block cannot break later blocks.
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=self._read,
+                    column_types={raw: pa.string() for raw in self._read},
+                    strings_can_be_null=True,
+                ),
+            )
+        for batch in batches:
+            if batch.num_rows:
+                yield batch
+
+    def _columns(self, batch: Any) -> Dict[str, Any]:
+        """Logical name -> array for one batch (nested Parquet structs are flattened)."""
+        import pyarrow as pa
+
+        table = pa.Table.from_batches([batch])
+        while any(pa.types.is_struct(field.type) for field in table.schema):
+            table = table.flatten()
+        present = {_snake(name): column.combine_chunks() for name, column in zip(table.column_names, table.columns)}
+        cols: Dict[str, Any] = {}
+        for logical, candidates in _SOURCES[self.dialect].items():
+            cols[logical] = next((present[c] for c in candidates if c in present), None)
+        if self._tag_columns:
+            cols["_tag_columns"] = _json_from_columns(
+                [(key, table.column(raw).combine_chunks()) for raw, key in self._tag_columns.items()]
+            )
+        return cols
+
+    # -- mapping and encoding -------------------------------------------
+
+    def focus_batches(self) -> Iterator[Dict[str, Any]]:
+        """Yield each batch as FOCUS column -> array (or a constant for the whole batch)."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        for batch in self._record_batches():
+            mapped = _MAPPERS[self.dialect](self._columns(batch), batch.num_rows)
+            out: Dict[str, Any] = {}
+            for column, kind in COPY_COLUMNS:
+                if column in _GENERATED:
+                    continue
+                value = mapped.get(column)
+                if value is None or isinstance(value, str):
+                    out[column] = value
+                elif kind == "timestamptz":
+                    out[column] = _timestamps(value)
+                elif kind == "numeric":
+                    out[column] = _numbers(value)
+                else:
+                    out[column] = _text(value)
+            starts = out["charge_period_start"]
+            if starts is None:
+                raise IngestionError(f"{self.path} has no charge period column")
+            keep = starts.is_valid()
+            if not pc.all(keep).as_py():
+                self.stats["skipped"] += batch.num_rows - pc.sum(keep).as_py()
+                out = {k: v.filter(keep) if isinstance(v, (pa.Array, pa.ChunkedArray)) else v for k, v in out.items()}
+                starts = out["charge_period_start"]
+            if not len(starts):
+                continue
+            if out["charge_period_end"] is None:
+                out["charge_period_end"] = _shift(starts, 3_600_000_000)  # hourly when unstated
+            if out["billing_period_start"] is None or out["billing_period_end"] is None:
+                out["billing_period_start"], out["billing_period_end"] = _month_bounds(starts)
+            for column, default in _REQUIRED_TEXT.items():
+                if out[column] is None:
+                    out[column] = default
+                elif not isinstance(out[column], str):
+                    out[column] = out[column].fill_null(default)
+            for column in _REQUIRED_NUMERIC:
+                out[column] = out[column].fill_null(0.0) if out[column] is not None else None
+            yield out
+
+    def copy_chunks(self, tenant_id: str, source_file: str, ingested_at: datetime) -> Iterator[Any]:
+        """
+        Yield the binary COPY stream for COPY_COLUMNS: the header, one chunk
+        per batch and the trailer. stats is updated as batches are encoded.
+        """
+        import uuid
+        import numpy as np
+        import pyarrow.compute as pc
+
+        constants = {
+            "tenant_id": _field(uuid.UUID(str(tenant_id)).bytes),
+            "ingested_at": _field(
+                ((ingested_at - _PG_EPOCH) // timedelta(microseconds=1)).to_bytes(8, "big", signed=True)
+            ),
+            "source_file": _scalar_piece(source_file, "text"),
+        }
+        field_count = len(COPY_COLUMNS).to_bytes(2, "big")
+        # Time-ordered row ids (UUIDv7 layout: unix ms, then a counter from a
+        # random start) land at the right edge of the primary-key btree
+        # instead of dirtying a random leaf per row, roughly a fifth off the
+        # server-side COPY time on a populated table.
+        prefix = np.frombuffer(
+            (int(ingested_at.timestamp() * 1000) << 16 | 0x7000 | secrets.randbits(12)).to_bytes(8, "big"),
+            np.uint8,
+        )
+        sequence = secrets.randbits(61)
+        yield COPY_HEADER
+        for out in self.focus_batches():
+            n = len(out["charge_period_start"])
+            row_ids = np.empty((n, 16), np.uint8)
+            row_ids[:, :8] = prefix
+            counter = np.arange(sequence, sequence + n, dtype=np.uint64) | np.uint64(1 << 63)  # RFC 4122 variant
+            row_ids[:, 8:] = counter.astype(">u8").view(np.uint8).reshape(n, 8)
+            sequence += n
+            pieces: List[Any] = [field_count, *_fixed_pieces(row_ids)]
+            encoded: Dict[Tuple[int, str], List[Any]] = {}  # layouts often map one source twice
+            for column, kind in COPY_COLUMNS[1:]:
+                value = constants.get(column, out.get(column))
+                if isinstance(value, bytes):
+                    pieces.append(value)
+                elif value is None or isinstance(value, str):
+                    pieces.append(_scalar_piece(value, kind))
+                elif (id(value), kind) in encoded:
+                    pieces.extend(encoded[id(value), kind])
+                elif kind == "numeric":
+                    fields, micros = _numeric_pieces(value, column)
+                    pieces.extend(encoded.setdefault((id(value), kind), fields))
+                    if column == "billed_cost":
+                        self.stats["billed_micros"] += int(micros.sum())
+                else:
+                    fields = _timestamp_pieces(value) if kind == "timestamptz" \
+                        else _text_pieces(value, jsonb=kind == "jsonb")
+                    pieces.extend(encoded.setdefault((id(value), kind), fields))
+            rows = _assemble(pieces, n)
+            starts = out["charge_period_start"]
+            bounds = pc.min_max(starts)
+            first, last = bounds["min"].as_py(), bounds["max"].as_py()
+            self.stats["first"] = first if self.stats["first"] is None else min(first, self.stats["first"])
+            self.stats["last"] = last if self.stats["last"] is None else max(last, self.stats["last"])
+            self.stats["rows"] += n
+            offsets, data = rows.buffers()[1:3]
+            ends = np.frombuffer(offsets, np.int32, count=n + 1, offset=rows.offset * 4)
+            yield memoryview(data)[ends[0]:ends[-1]]
+        yield COPY_TRAILER
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+_LEDGER_SQL = """
+SELECT checksum, dialect, row_count, period_first, period_last
+FROM billing_ingestions WHERE tenant_id = $1 AND source_file = $2
+"""
+_RECORD_SQL = """
+INSERT INTO billing_ingestions
+    (tenant_id, source_file, checksum, dialect, row_count, billed_cost, period_first, period_last, ingested_at)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+ON CONFLICT (tenant_id, source_file) DO UPDATE
+SET checksum = EXCLUDED.checksum, dialect = EXCLUDED.dialect, row_count = EXCLUDED.row_count,
+    billed_cost = EXCLUDED.billed_cost, period_first = EXCLUDED.period_first,
+    period_last = EXCLUDED.period_last, ingested_at = EXCLUDED.ingested_at
+"""
+# The previous load's charge-period bounds keep the delete to its partitions.
+_PREVIOUS_LOAD = (
+    "b.tenant_id = $1 AND b.source_file = $2"
+    " AND b.charge_period_start >= $3 AND b.charge_period_start <= $4"
+)
+_DELETE_SQL = f"DELETE FROM consolidated_billing b WHERE {_PREVIOUS_LOAD}"
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def _prefetched(chunks: Iterator[Any]) -> Any:
+    """Encode the next chunk in a worker thread while the current one is sent."""
+    loop = asyncio.get_running_loop()
+    pending = loop.run_in_executor(None, next, chunks, None)
+    while True:
+        chunk = await pending
+        if chunk is None:
+            return
+        pending = loop.run_in_executor(None, next, chunks, None)
+        yield chunk
+
+
+class Ingestor:
+    """Loads export files into consolidated_billing, one transaction per file."""
+
+    def __init__(self) -> None:
+        self._files = metrics.Counter()
+        self._unchanged = metrics.Counter()
+        self._replaced = metrics.Counter()
+        self._rows = metrics.Counter()
+        self._failures = metrics.Counter()
+        self._latency = metrics.LatencyTracker()
+        self._rows_per_second: Optional[float] = None
+        metrics.register("ingestion", self.snapshot)
+
+    async def ingest_file(
+        self,
+        tenant_id: str,
+        path: str,
+        dialect: Optional[str] = None,
+        source_file: Optional[str] = None,
+        force: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Load one export for tenant_id and return a summary.
+
+        Parameters
+        ----------
+        tenant_id   : Owning tenant.
+        path        : Local CSV, gzip CSV or Parquet export.
+        dialect     : One of DIALECTS; detected from the columns when None.
+        source_file : Identity of the file across re-deliveries; defaults to
+                      the absolute path. Loading the same source_file again
+                      replaces its earlier rows.
+        force       : Reload even when the file is unchanged.
+        """
+        source_file = source_file or os.path.abspath(path)
+        checksum = await asyncio.to_thread(file_checksum, path)
+        reader = await asyncio.to_thread(ExportReader, path, dialect)
+        started = asyncio.get_running_loop().time()
+        pool = await database.get_pool()
+        try:
+            async with pool.acquire() as conn, conn.transaction():
+                # Serialise loads of the same file; other files load in parallel.
+                await conn.execute(
+                    "SELECT pg_advisory_xact_lock(hashtextextended($1::uuid::text || ':' || $2, 0))",
+                    tenant_id, source_file,
+                )
+                previous = await conn.fetchrow(_LEDGER_SQL, tenant_id, source_file)
+                if previous is not None and previous["checksum"] == checksum and not force:
+                    self._unchanged.inc()
+                    return {"source_file": source_file, "status": "unchanged", "rows": previous["row_count"]}
+                await rollups.hold_refresh(conn)
+                # Stamped after the lock, so no refresh can have passed it already.
+                ingested_at = await conn.fetchval("SELECT clock_timestamp()")
+                if previous is not None and previous["period_first"] is not None:
+                    bounds = (tenant_id, source_file, previous["period_first"], previous["period_last"])
+                    await rollups.retract(conn, _PREVIOUS_LOAD, [tenant_id], *bounds)
+                    await conn.execute(_DELETE_SQL, *bounds)
+                with self._latency.time():
+                    await conn.copy_to_table(
+                        "consolidated_billing",
+                        source=_prefetched(reader.copy_chunks(tenant_id, source_file, ingested_at)),
+                        columns=[column for column, _ in COPY_COLUMNS],
+                        format="binary",
+                    )
+                stats = reader.stats
+                await conn.execute(
+                    _RECORD_SQL, tenant_id, source_file, checksum, reader.dialect, stats["rows"],
+                    Decimal(stats["billed_micros"]).scaleb(-6), stats["first"], stats["last"], ingested_at,
+                )
+        except Exception:
+            self._failures.inc()
+            raise
+        elapsed = asyncio.get_running_loop().time() - started
+        self._files.inc()
+        self._rows.inc(stats["rows"])
+        if previous is not None:
+            self._replaced.inc()
+        self._rows_per_second = stats["rows"] / elapsed if elapsed else None
+        logger.info(
+            "Ingested %s (%s) for tenant=%s: %d rows, %d skipped, %.1fs%s.",
+            source_file, reader.dialect, tenant_id, stats["rows"], stats["skipped"], elapsed,
+            " (replaced previous load)" if previous is not None else "",
+        )
+        return {
+            "source_file": source_file,
+            "status": "replaced" if previous is not None else "loaded",
+            "dialect": reader.dialect,
+            "rows": stats["rows"],
+            "skipped": stats["skipped"],
+            "billed_cost": str(Decimal(stats["billed_micros"]).scaleb(-6)),
+            "seconds": round(elapsed, 3),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "files": self._files.value,
+            "unchanged": self._unchanged.value,
+            "replaced": self._replaced.value,
+            "rows": self._rows.value,
+            "failures": self._failures.value,
+            "copy": self._latency.snapshot(),
+            "last_rows_per_second": self._rows_per_second,
+        }
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def _main(argv: Optional[Sequence[str]] = None) -> None:
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load billing export files into consolidated_billing.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("load", help="Load CSV, gzip CSV or Parquet exports.")
+    load.add_argument("paths", nargs="+")
+    load.add_argument("--tenant", required=True)
+    load.add_argument("--dialect", choices=DIALECTS, default=None, help="Detected from the columns by default.")
+    load.add_argument("--source-file", default=None, help="Identity for a single file (default: absolute path).")
+    load.add_argument("--force", action="store_true", help="Reload files whose checksum is unchanged.")
+    args = parser.parse_args(argv)
+    if args.source_file and len(args.paths) > 1:
+        parser.error("--source-file needs exactly one path")
+
+    ingestor = Ingestor()
+    try:
+        for path in args.paths:
+            result = await ingestor.ingest_file(args.tenant, path, args.dialect, args.source_file, args.force)
+            print(json.dumps(result))
+    finally:
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
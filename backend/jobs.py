@@ -0,0 +1,384 @@
+"""
+jobs.py
+=======
+TEJUSKA Cloud Intelligence
+Durable ABACUS job queue backed by the abacus_jobs table.
+
+Enqueue requests are group-committed: everything that arrives within a few
+milliseconds is written in one INSERT, and duplicate (tenant, resource,
+dry_run) requests that are still queued coalesce onto the existing job.
+A pool of async workers claims jobs with FOR UPDATE SKIP LOCKED, so queued
+work survives restarts and is shared between API processes. The per-tenant
+concurrency limit is checked under a per-tenant advisory lock, so concurrent
+claims cannot overshoot it.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import database
+
+logger = logging.getLogger("tejuska.jobs")
+
+ABACUS_JOB_WORKERS: int = int(os.environ.get("ABACUS_JOB_WORKERS", "4"))
+ABACUS_JOB_TENANT_CONCURRENCY: int = int(os.environ.get("ABACUS_JOB_TENANT_CONCURRENCY", "2"))
+ABACUS_JOB_LEASE_SECONDS: float = float(os.environ.get("ABACUS_JOB_LEASE_SECONDS", "300"))
+ABACUS_JOB_MAX_ATTEMPTS: int = int(os.environ.get("ABACUS_JOB_MAX_ATTEMPTS", "3"))
+ABACUS_JOB_POLL_SECONDS: float = float(os.environ.get("ABACUS_JOB_POLL_SECONDS", "1.0"))
+# Runnable jobs considered per claim attempt.
+ABACUS_JOB_CLAIM_CANDIDATES: int = int(os.environ.get("ABACUS_JOB_CLAIM_CANDIDATES", "32"))
+# Group-commit window for enqueue requests.
+ABACUS_JOB_ENQUEUE_WINDOW_MS: float = float(os.environ.get("ABACUS_JOB_ENQUEUE_WINDOW_MS", "2"))
+ABACUS_JOB_ENQUEUE_MAX_BATCH: int = int(os.environ.get("ABACUS_JOB_ENQUEUE_MAX_BATCH", "2000"))
+# Attempts at writing a finished job's outcome before the worker moves on.
+ABACUS_JOB_FINISH_ATTEMPTS: int = int(os.environ.get("ABACUS_JOB_FINISH_ATTEMPTS", "3"))
+
+# Namespace (first key) of the per-tenant claim locks.
+_TENANT_LOCK_NAMESPACE = 0x7A6F
+
+JobKey = Tuple[str, str, bool]
+JobHandler = Callable[..., Awaitable[Dict[str, Any]]]
+
+_ENQUEUE_SQL = """
+WITH incoming AS (
+    SELECT DISTINCT tenant_id, resource_id, dry_run
+    FROM unnest($1::uuid[], $2::text[], $3::bool[]) AS t(tenant_id, resource_id, dry_run)
+),
+inserted AS (
+    INSERT INTO abacus_jobs (tenant_id, resource_id, dry_run)
+    SELECT tenant_id, resource_id, dry_run FROM incoming
+    ON CONFLICT (tenant_id, resource_id, dry_run) WHERE status = 'queued' DO NOTHING
+    RETURNING job_id, tenant_id, resource_id, dry_run
+)
+SELECT job_id, tenant_id, resource_id, dry_run, FALSE AS coalesced FROM inserted
+UNION ALL
+SELECT j.job_id, j.tenant_id, j.resource_id, j.dry_run, TRUE AS coalesced
+FROM abacus_jobs j
+JOIN incoming i
+  ON i.tenant_id = j.tenant_id AND i.resource_id = j.resource_id AND i.dry_run = j.dry_run
+WHERE j.status = 'queued'
+"""
+
+# Used when a concurrent enqueue in another process inserted the row after our snapshot.
+_LOOKUP_QUEUED_SQL = """
+SELECT j.job_id, j.tenant_id, j.resource_id, j.dry_run, TRUE AS coalesced
+FROM abacus_jobs j
+JOIN unnest($1::uuid[], $2::text[], $3::bool[]) AS i(tenant_id, resource_id, dry_run)
+  ON i.tenant_id = j.tenant_id AND i.resource_id = j.resource_id AND i.dry_run = j.dry_run
+WHERE j.status = 'queued'
+"""
+
+# Oldest runnable jobs of tenants below their concurrency limit. Jobs left
+# 'running' past their lease (e.g. by a crashed process) are reclaimed. The
+# running counts are computed once per claim, over running jobs only.
+_CANDIDATES_SQL = """
+WITH saturated AS (
+    SELECT tenant_id
+    FROM abacus_jobs
+    WHERE status = 'running' AND started_at >= NOW() - make_interval(secs => $2)
+    GROUP BY tenant_id
+    HAVING COUNT(*) >= $1
+)
+SELECT j.job_id, j.tenant_id
+FROM abacus_jobs j
+WHERE (
+        j.status = 'queued'
+        OR (j.status = 'running' AND j.started_at < NOW() - make_interval(secs => $2))
+      )
+  AND j.attempts < $3
+  AND j.tenant_id NOT IN (SELECT tenant_id FROM saturated)
+ORDER BY j.created_at
+LIMIT $4
+FOR UPDATE OF j SKIP LOCKED
+"""
+
+# Re-checked under the tenant's transaction-scoped advisory lock, so two
+# workers cannot both see a free slot and both take it.
+_TENANT_RUNNING_SQL = """
+SELECT COUNT(*)
+FROM abacus_jobs
+WHERE tenant_id = $1 AND status = 'running' AND started_at >= NOW() - make_interval(secs => $2)
+"""
+
+_START_SQL = """
+UPDATE abacus_jobs
+SET status = 'running', started_at = NOW(), attempts = attempts + 1
+WHERE job_id = $1
+RETURNING job_id, tenant_id, resource_id, dry_run, attempts
+"""
+
+_FINISH_SQL = """
+UPDATE abacus_jobs
+SET status = $2, result = $3::jsonb, error_message = $4, finished_at = NOW()
+WHERE job_id = $1
+"""
+
+_EXPIRE_SQL = """
+UPDATE abacus_jobs
+SET status = 'failed', error_message = 'Lease expired after maximum attempts.', finished_at = NOW()
+WHERE status = 'running'
+  AND started_at < NOW() - make_interval(secs => $1)
+  AND attempts >= $2
+"""
+
+_GET_SQL = """
+SELECT job_id, tenant_id, resource_id, dry_run, status, attempts, result,
+       error_message, created_at, started_at, finished_at
+FROM abacus_jobs
+WHERE job_id = $1
+"""
+
+
+class JobQueue:
+    """
+    Durable queue plus worker pool for ABACUS evaluations.
+
+    Parameters
+    ----------
+    handler            : Coroutine called as handler(tenant_id=, resource_id=, dry_run=)
+                         returning a JSON-serialisable result dict.
+    workers            : Number of concurrent worker coroutines in this process.
+    tenant_concurrency : Maximum running jobs per tenant across all processes.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        workers: int = ABACUS_JOB_WORKERS,
+        tenant_concurrency: int = ABACUS_JOB_TENANT_CONCURRENCY,
+    ) -> None:
+        self._handler = handler
+        self._worker_count = workers
+        self._tenant_concurrency = tenant_concurrency
+
+        self._pending: List[Tuple[JobKey, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._inflight_flushes: set = set()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def enqueue(self, tenant_id: str, resource_id: str, dry_run: bool = True) -> Tuple[str, bool]:
+        """
+        Queue an evaluation and return (job_id, coalesced).
+        coalesced is True when an identical job was already queued.
+        Raises ValueError if tenant_id is not a UUID.
+        """
+        tenant_id = str(uuid.UUID(tenant_id))
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending.append(((tenant_id, resource_id, dry_run), future))
+        if len(self._pending) >= ABACUS_JOB_ENQUEUE_MAX_BATCH:
+            self._flush_now()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(ABACUS_JOB_ENQUEUE_WINDOW_MS / 1000)
+        self._flush_task = None
+        await self._flush(self._take_pending())
+
+    def _flush_now(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        task = asyncio.create_task(self._flush(self._take_pending()))
+        self._inflight_flushes.add(task)
+        task.add_done_callback(self._inflight_flushes.discard)
+
+    def _take_pending(self) -> List[Tuple[JobKey, asyncio.Future]]:
+        pending, self._pending = self._pending, []
+        return pending
+
+    async def _flush(self, pending: List[Tuple[JobKey, asyncio.Future]]) -> None:
+        """Write one batch of enqueue requests and resolve their futures."""
+        if not pending:
+            return
+        keys = list(dict.fromkeys(key for key, _ in pending))
+        try:
+            pool = await database.get_pool()
+            columns = ([k[0] for k in keys], [k[1] for k in keys], [k[2] for k in keys])
+            rows = await pool.fetch(_ENQUEUE_SQL, *columns)
+            found = {self._row_key(row): row for row in rows}
+            missing = [k for k in keys if k not in found]
+            if missing:
+                columns = ([k[0] for k in missing], [k[1] for k in missing], [k[2] for k in missing])
+                for row in await pool.fetch(_LOOKUP_QUEUED_SQL, *columns):
+                    found[self._row_key(row)] = row
+        except Exception as exc:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        seen: set = set()
+        for key, future in pending:
+            row = found.get(key)
+            if future.done():
+                continue
+            if row is None:
+                future.set_exception(RuntimeError(f"Job for {key} could not be queued."))
+                continue
+            # Later duplicates within the same batch coalesce onto the first.
+            future.set_result((str(row["job_id"]), bool(row["coalesced"]) or key in seen))
+            seen.add(key)
+        self._wakeup.set()
+
+    @staticmethod
+    def _row_key(row: Any) -> JobKey:
+        return (str(row["tenant_id"]), row["resource_id"], row["dry_run"])
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job record, or None if it does not exist."""
+        pool = await database.get_pool()
+        row = await pool.fetchrow(_GET_SQL, job_id)
+        if row is None:
+            return None
+        job = dict(row)
+        job["job_id"] = str(job["job_id"])
+        job["tenant_id"] = str(job["tenant_id"])
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Start the worker pool and the lease-expiry sweeper."""
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"abacus-job-worker-{n}")
+            for n in range(self._worker_count)
+        ]
+        self._tasks.append(asyncio.create_task(self._sweeper(), name="abacus-job-sweeper"))
+        logger.info(
+            "Job queue started with %d workers (tenant concurrency=%d).",
+            self._worker_count, self._tenant_concurrency,
+        )
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs are reclaimed after their lease."""
+        self._stopping = True
+        await self._flush(self._take_pending())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Job queue stopped.")
+
+    async def _claim(self) -> Optional[Any]:
+        """
+        Start the oldest runnable job whose tenant has a free slot. Each
+        tenant's slot count is checked and taken under its advisory lock;
+        tenants whose lock is busy are skipped for this attempt.
+        """
+        pool = await database.get_pool()
+        async with pool.acquire() as conn, conn.transaction():
+            candidates = await conn.fetch(
+                _CANDIDATES_SQL,
+                self._tenant_concurrency,
+                ABACUS_JOB_LEASE_SECONDS,
+                ABACUS_JOB_MAX_ATTEMPTS,
+                ABACUS_JOB_CLAIM_CANDIDATES,
+            )
+            tried: set = set()
+            for candidate in candidates:
+                tenant_id = candidate["tenant_id"]
+                if tenant_id in tried:
+                    continue
+                tried.add(tenant_id)
+                locked = await conn.fetchval(
+                    "SELECT pg_try_advisory_xact_lock($1, hashtext($2::uuid::text))",
+                    _TENANT_LOCK_NAMESPACE, tenant_id,
+                )
+                if not locked:
+                    continue
+                running = await conn.fetchval(_TENANT_RUNNING_SQL, tenant_id, ABACUS_JOB_LEASE_SECONDS)
+                if running < self._tenant_concurrency:
+                    return await conn.fetchrow(_START_SQL, candidate["job_id"])
+        return None
+
+    async def _finish(self, job_id: Any, status: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        pool = await database.get_pool()
+        await pool.execute(
+            _FINISH_SQL,
+            job_id,
+            status,
+            json.dumps(result) if result is not None else None,
+            error,
+        )
+
+    async def _worker(self, n: int) -> None:
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except Exception as exc:
+                logger.warning("Job worker %d failed to claim: %s", n, exc)
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=ABACUS_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            started = time.perf_counter()
+            try:
+                result = await self._handler(
+                    tenant_id=str(job["tenant_id"]),
+                    resource_id=job["resource_id"],
+                    dry_run=job["dry_run"],
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception("Job %s failed: %s", job["job_id"], exc)
+                await self._record(n, job["job_id"], "failed", None, str(exc))
+                continue
+            logger.info("Job %s succeeded in %.1f ms.", job["job_id"], (time.perf_counter() - started) * 1000)
+            await self._record(n, job["job_id"], "succeeded", result, None)
+
+    async def _record(
+        self, n: int, job_id: Any, status: str, result: Optional[Dict[str, Any]], error: Optional[str]
+    ) -> None:
+        """
+        Write a job's outcome, retrying briefly. A job whose outcome cannot
+        be written stays 'running' and is reclaimed after its lease; the
+        worker logs it and carries on rather than dying.
+        """
+        for attempt in range(1, ABACUS_JOB_FINISH_ATTEMPTS + 1):
+            try:
+                await self._finish(job_id, status, result, error)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if attempt == ABACUS_JOB_FINISH_ATTEMPTS:
+                    logger.error(
+                        "Job worker %d could not record job %s as %s: %s", n, job_id, status, exc
+                    )
+                    return
+                await asyncio.sleep(ABACUS_JOB_POLL_SECONDS * attempt)
+
+    async def _sweeper(self) -> None:
+        """Fail jobs whose lease expired on their final attempt."""
+        while not self._stopping:
+            await asyncio.sleep(ABACUS_JOB_LEASE_SECONDS / 2)
+            try:
+                pool = await database.get_pool()
+                await pool.execute(_EXPIRE_SQL, ABACUS_JOB_LEASE_SECONDS, ABACUS_JOB_MAX_ATTEMPTS)
+            except Exception as exc:
+                logger.warning("Job sweeper failed: %s", exc)
@@ -0,0 +1,295 @@
+"""
+llm_client.py
+=============
+TEJUSKA Cloud Intelligence
+Long-lived OpenAI client shared by every OPTIC request.
+
+One AsyncOpenAI instance sits on a pooled httpx transport, so requests
+reuse keep-alive TLS connections instead of handshaking per query. Calls
+pass through, in order:
+  1. a per-tenant semaphore (one tenant cannot take every slot),
+  2. a global semaphore (bounded in-flight requests per process),
+  3. token buckets for the provider's requests/minute and tokens/minute
+     quota, so we slow down before the provider starts returning 429s,
+  4. retries with full-jitter exponential backoff on 429, 5xx and
+     connection errors, honouring Retry-After when the provider sends it.
+
+The client is created lazily and closed by the FastAPI lifespan. Point
+OPENAI_BASE_URL at a local OpenAI-compatible stand-in to exercise it
+without network access (see benchmarks/bench_llm_client.py).
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+
+import metrics
+
+logger = logging.getLogger("tejuska.llm_client")
+
+OPENAI_API_KEY: str = os.environ.get("OPENAI_API_KEY", "")
+OPENAI_BASE_URL: str = os.environ.get("OPENAI_BASE_URL", "")
+LLM_MAX_CONNECTIONS: int = int(os.environ.get("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE: int = int(os.environ.get("LLM_MAX_KEEPALIVE", "32"))
+LLM_TIMEOUT_SECONDS: float = float(os.environ.get("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_CONCURRENCY: int = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_TENANT_CONCURRENCY: int = int(os.environ.get("LLM_TENANT_CONCURRENCY", "4"))
+LLM_MAX_RETRIES: int = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS: float = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS: float = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", "8"))
+# Provider quota; 0 disables the corresponding bucket.
+LLM_REQUESTS_PER_MINUTE: float = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE: float = float(os.environ.get("LLM_TOKENS_PER_MINUTE", "150000"))
+
+_CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at rate_per_minute.
+    acquire() waits until the requested amount is available; requests
+    larger than the capacity are clamped so they can still proceed.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None) -> None:
+        self._rate = rate_per_minute / 60.0
+        self._capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take amount tokens, sleeping as needed; returns the seconds waited."""
+        amount = min(amount, self._capacity)
+        waited = 0.0
+        async with self._lock:  # FIFO: later callers queue behind the one waiting
+            self._refill()
+            while self._tokens < amount:
+                delay = (amount - self._tokens) / self._rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self._tokens -= amount
+        return waited
+
+
+def estimate_tokens(messages: Sequence[Dict[str, str]], max_tokens: int) -> int:
+    """Rough prompt + completion size used to charge the tokens/minute bucket."""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // _CHARS_PER_TOKEN + max_tokens
+
+
+class LLMClient:
+    """
+    Shared chat-completions client with pooling, concurrency limits, rate
+    limiting and retries.
+
+    Parameters
+    ----------
+    api_key             : Provider API key; without one `configured` is False.
+    base_url            : Alternative endpoint (e.g. a local stand-in server).
+    max_concurrency     : In-flight requests per process.
+    tenant_concurrency  : In-flight requests per tenant.
+    requests_per_minute : Request quota; 0 disables the bucket.
+    tokens_per_minute   : Token quota; 0 disables the bucket.
+    max_retries         : Retries after the first attempt on retryable errors.
+    """
+
+    def __init__(
+        self,
+        api_key: str = OPENAI_API_KEY,
+        base_url: str = OPENAI_BASE_URL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        tenant_concurrency: int = LLM_TENANT_CONCURRENCY,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_retries: int = LLM_MAX_RETRIES,
+    ) -> None:
+        self._api_key = api_key
+        self._base_url = base_url or None
+        self._tenant_concurrency = tenant_concurrency
+        self._max_retries = max_retries
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._tenants: Dict[str, asyncio.Semaphore] = {}
+        self._tenant_users: Dict[str, int] = {}
+        self._requests_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._client = None
+        self._http = None
+        self._client_lock = asyncio.Lock()
+
+        self._latency = metrics.LatencyTracker()
+        self._throttled = metrics.LatencyTracker()
+        self._requests = metrics.Counter()
+        self._retries = metrics.Counter()
+        self._rate_limited = metrics.Counter()
+        self._failures = metrics.Counter()
+        self._in_flight = 0
+        metrics.register("llm", self.snapshot)
+
+    @property
+    def configured(self) -> bool:
+        """True when an API key is available."""
+        return bool(self._api_key)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Create the pooled client (idempotent); returns the AsyncOpenAI instance."""
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    import openai  # imported lazily to avoid mandatory dep at test time
+
+                    self._http = httpx.AsyncClient(
+                        limits=httpx.Limits(
+                            max_connections=LLM_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                        ),
+                        timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=5.0),
+                    )
+                    self._client = openai.AsyncOpenAI(
+                        api_key=self._api_key,
+                        base_url=self._base_url,
+                        http_client=self._http,
+                        max_retries=0,  # retries are ours, so they respect the buckets
+                    )
+                    logger.info(
+                        "LLM client created (base_url=%s, max_connections=%d).",
+                        self._base_url or "default", LLM_MAX_CONNECTIONS,
+                    )
+        return self._client
+
+    async def close(self) -> None:
+        """Close the pooled transport if it was ever opened."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._client = None
+            logger.info("LLM client closed.")
+
+    # ------------------------------------------------------------------
+    # Admission: semaphores and quota buckets
+    # ------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def _slot(self, tenant_id: str) -> AsyncIterator[None]:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            tenant = self._tenants[tenant_id] = asyncio.Semaphore(self._tenant_concurrency)
+        self._tenant_users[tenant_id] = self._tenant_users.get(tenant_id, 0) + 1
+        try:
+            async with tenant, self._global:
+                self._in_flight += 1
+                try:
+                    yield
+                finally:
+                    self._in_flight -= 1
+        finally:
+            self._tenant_users[tenant_id] -= 1
+            if not self._tenant_users[tenant_id]:
+                del self._tenant_users[tenant_id]
+                del self._tenants[tenant_id]
+
+    async def _throttle(self, tokens: int) -> None:
+        waited = 0.0
+        if self._requests_bucket is not None:
+            waited += await self._requests_bucket.acquire(1)
+        if self._tokens_bucket is not None:
+            waited += await self._tokens_bucket.acquire(tokens)
+        if waited:
+            self._throttled.observe(waited * 1000)
+
+    # ------------------------------------------------------------------
+    # Retries
+    # ------------------------------------------------------------------
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying exc, or None when it must not be retried."""
+        import openai
+
+        if isinstance(exc, openai.APIStatusError):
+            if exc.status_code == 429:
+                self._rate_limited.inc()
+            elif exc.status_code < 500:
+                return None
+            retry_after = exc.response.headers.get("retry-after") if exc.response is not None else None
+            if retry_after:
+                try:
+                    return min(float(retry_after), LLM_BACKOFF_MAX_SECONDS)
+                except ValueError:
+                    pass
+        elif not isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+            return None
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)].
+        return random.uniform(0.0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    async def _create(self, tenant_id: str, **kwargs: Any) -> Any:
+        client = await self.start()
+        tokens = estimate_tokens(kwargs.get("messages", ()), kwargs.get("max_tokens") or 0)
+        attempt = 0
+        while True:
+            await self._throttle(tokens)
+            self._requests.inc()
+            try:
+                with self._latency.time():
+                    return await client.chat.completions.create(**kwargs)
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt) if attempt < self._max_retries else None
+                if delay is None:
+                    self._failures.inc()
+                    raise
+                attempt += 1
+                self._retries.inc()
+                logger.warning(
+                    "LLM request failed for tenant=%s (%s); retry %d/%d in %.2fs.",
+                    tenant_id, exc.__class__.__name__, attempt, self._max_retries, delay,
+                )
+                await asyncio.sleep(delay)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def chat(self, tenant_id: str, **kwargs: Any) -> Any:
+        """chat.completions.create() under the tenant's limits; returns the completion."""
+        async with self._slot(tenant_id):
+            return await self._create(tenant_id, **kwargs)
+
+    async def stream_chat(self, tenant_id: str, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Streamed chat completion; yields chunks. Retries cover opening the
+        stream only; the tenant's slot is held until the stream is consumed
+        or the generator is closed.
+        """
+        async with self._slot(tenant_id):
+            response = await self._create(tenant_id, stream=True, **kwargs)
+            try:
+                async for chunk in response:
+                    yield chunk
+            finally:
+                await response.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self._requests.value,
+            "retries": self._retries.value,
+            "rate_limited": self._rate_limited.value,
+            "failures": self._failures.value,
+            "in_flight": self._in_flight,
+            "active_tenants": len(self._tenants),
+            "latency": self._latency.snapshot(),
+            "throttle_wait": self._throttled.snapshot(),
+        }
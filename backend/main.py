@@ -3,21 +3,59 @@ main.py
 =======
 TEJUSKA Cloud Intelligence - FastAPI Backend
 Entry point for all API routes.
+
+TEJUSKA_ROLE selects which routes this process serves:
+  all        every route (default)
+  api        OPTIC queries, dashboard aggregates, cost forecasts, anomaly
+             settings, Agentic Shield rules, job enqueue/status and
+             notifications
+  webhooks   payment webhooks only
+  inference  ABACUS batch evaluation, model admin and the job workers
+Only roles that serve ABACUS import the ML stack (torch/numpy), and only on
+first use unless ABACUS_PRELOAD is set. The forecaster (numpy) is likewise
+loaded on the first forecast unless FORECAST_PRELOAD is set. The cost-anomaly
+detector runs only where ANOMALY_DETECTION is set.
 """
 
 import os
+import hmac
+import json
+import time
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from collections import defaultdict
+from contextlib import aclosing, asynccontextmanager
+
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Request, status
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
-from typing import Optional
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
 
-from notifications import NotificationService
-from ai_engine import AIEngine
+import database
+import metrics
+import shield
+from analytics_store import AnalyticsStore
+from dashboard import DashboardService
+from llm_client import LLMClient
+from notifications import Notification, NotificationService
+from optic import OpticEngine
+from optic_sql import QueryExecutionError, QueryTimeoutError
+from outbox import NotificationOutbox
+from jobs import JobQueue
+from partitions import PartitionManager
 from payment_webhooks import router as payments_router
+from rollups import RollupRefresher
+from shield import ShieldEvaluator
+
+if TYPE_CHECKING:
+    from anomalies import AnomalyDetector
+    from ai_engine import AIEngine
+    from forecasting import Forecaster
 
 # ---------------------------------------------------------------------------
 # Logging
@@ -29,13 +67,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger("tejuska.main")
 
+ADMIN_API_TOKEN: str = os.environ.get("ADMIN_API_TOKEN", "")
+
+ROLES = ("all", "api", "webhooks", "inference")
+TEJUSKA_ROLE: str = os.environ.get("TEJUSKA_ROLE", "all").strip().lower()
+if TEJUSKA_ROLE not in ROLES:
+    raise ValueError(f"Unknown TEJUSKA_ROLE '{TEJUSKA_ROLE}'; expected one of {ROLES}.")
+SERVES_API: bool = TEJUSKA_ROLE in ("all", "api")
+SERVES_WEBHOOKS: bool = TEJUSKA_ROLE in ("all", "webhooks")
+SERVES_ABACUS: bool = TEJUSKA_ROLE in ("all", "inference")
+# Load the ABACUS models during startup instead of on the first request.
+ABACUS_PRELOAD: bool = os.environ.get(
+    "ABACUS_PRELOAD", "true" if TEJUSKA_ROLE == "inference" else "false"
+).lower() == "true"
+# Load the forecaster at startup and keep every tenant's forecast warm.
+FORECAST_PRELOAD: bool = os.environ.get("FORECAST_PRELOAD", "false").lower() == "true"
+# Run the streaming cost-anomaly detector (one process per ANOMALY_STATE_DIR).
+ANOMALY_DETECTION: bool = os.environ.get("ANOMALY_DETECTION", "false").lower() == "true"
+
 # ---------------------------------------------------------------------------
 # Application lifespan
 # ---------------------------------------------------------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logger.info("TEJUSKA Cloud Intelligence backend starting.")
+    logger.info("TEJUSKA Cloud Intelligence backend starting (role=%s).", TEJUSKA_ROLE)
+    if SERVES_ABACUS and ABACUS_PRELOAD:
+        await get_ai_engine()
+    if SERVES_ABACUS and database.is_configured():
+        await job_queue.start()
+    elif SERVES_ABACUS:
+        logger.warning("DATABASE_URL not set; ABACUS job workers are disabled.")
+    if SERVES_API and llm_client.configured:
+        await llm_client.start()
+    if SERVES_API and database.is_configured():
+        await partition_manager.start()
+        await rollup_refresher.start()
+        await analytics_store.start()
+        await notification_outbox.start()
+        await shield_evaluator.start()
+        if FORECAST_PRELOAD:
+            await (await get_forecaster()).start()
+        if ANOMALY_DETECTION:
+            await _start_anomaly_detector()
     yield
+    if _anomaly_detector is not None:
+        await _anomaly_detector.stop()
+    if _forecaster is not None:
+        await _forecaster.stop()
+    await shield_evaluator.stop()
+    await analytics_store.stop()
+    await rollup_refresher.stop()
+    await partition_manager.stop()
+    await notification_outbox.stop()
+    await llm_client.close()
+    await notification_service.close()
+    if database.is_configured():
+        await job_queue.stop()
+    if _ai_engine is not None:
+        await _ai_engine.models.stop()
+        _ai_engine.shutdown()
+    await database.close_pool()
     logger.info("TEJUSKA Cloud Intelligence backend shutting down.")
 
 
@@ -57,13 +148,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(payments_router, prefix="/webhooks", tags=["Payments"])
+# ---------------------------------------------------------------------------
+# Request latency metrics (per route template)
+# ---------------------------------------------------------------------------
+_route_latency = defaultdict(metrics.LatencyTracker)
+metrics.register(
+    "http",
+    lambda: {path: tracker.snapshot() for path, tracker in list(_route_latency.items())},
+)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    _route_latency[path].observe((time.perf_counter() - started) * 1000)
+    return response
 
 # ---------------------------------------------------------------------------
 # Shared service instances
 # ---------------------------------------------------------------------------
 notification_service = NotificationService()
-ai_engine = AIEngine()
+notification_outbox = NotificationOutbox(notifier=notification_service)
+llm_client = LLMClient()
+rollup_refresher = RollupRefresher()
+partition_manager = PartitionManager()
+analytics_store = AnalyticsStore()
+optic_engine = OpticEngine(llm=llm_client, analytics=analytics_store)
+dashboard_service = DashboardService(analytics=analytics_store)
+
+_ai_engine: Optional["AIEngine"] = None
+_ai_engine_lock = asyncio.Lock()
+
+
+def _create_ai_engine() -> "AIEngine":
+    from ai_engine import AIEngine  # pulls in torch/numpy; only ABACUS roles pay for it
+
+    return AIEngine()
+
+
+async def get_ai_engine() -> "AIEngine":
+    """Return the ABACUS engine, importing the ML stack and loading models on first use."""
+    global _ai_engine
+    if _ai_engine is None:
+        async with _ai_engine_lock:
+            if _ai_engine is None:
+                engine = await asyncio.to_thread(_create_ai_engine)
+                await engine.models.start()
+                _ai_engine = engine
+    return _ai_engine
+
+
+_forecaster: Optional["Forecaster"] = None
+_forecaster_lock = asyncio.Lock()
+
+
+async def get_forecaster() -> "Forecaster":
+    """Return the cost forecaster, importing numpy on first use."""
+    global _forecaster
+    if _forecaster is None:
+        async with _forecaster_lock:
+            if _forecaster is None:
+                from forecasting import Forecaster  # numpy; API-only workers load it on demand
+
+                _forecaster = Forecaster()
+    return _forecaster
+
+
+_anomaly_detector: Optional["AnomalyDetector"] = None
+
+
+async def _start_anomaly_detector() -> None:
+    global _anomaly_detector
+    from anomalies import AnomalyDetector  # numpy; only detector processes load it at startup
+
+    _anomaly_detector = AnomalyDetector(outbox=notification_outbox)
+    await _anomaly_detector.start()
+
+
+async def _evaluate_job(**kwargs: Any) -> Dict[str, Any]:
+    engine = await get_ai_engine()
+    return await engine.evaluate_and_terminate(**kwargs)
+
+
+job_queue = JobQueue(handler=_evaluate_job)
+shield_evaluator = ShieldEvaluator(enqueue=job_queue.enqueue, outbox=notification_outbox)
+
+api_router = APIRouter()
+abacus_router = APIRouter()
 
 # ---------------------------------------------------------------------------
 # Request / Response schemas
@@ -74,6 +248,13 @@ class HealthResponse(BaseModel):
     version: str
 
 
+class TenantResponse(BaseModel):
+    tenant_id: str
+    company_name: str
+    domain: str
+    plan: str
+
+
 class NLPQueryRequest(BaseModel):
     tenant_id: str = Field(..., description="Unique tenant identifier.")
     query: str = Field(..., min_length=1, max_length=2000, description="Natural-language cost query.")
@@ -92,6 +273,194 @@ class AutoTerminationRequest(BaseModel):
     dry_run: bool = Field(True, description="If True, simulate without executing.")
 
 
+class JobAcceptedResponse(BaseModel):
+    message: str
+    job_id: str
+    coalesced: bool
+    tenant_id: str
+    resource_id: str
+    dry_run: bool
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    tenant_id: str
+    resource_id: str
+    dry_run: bool
+    status: str
+    attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error_message: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class BatchEvaluationRequest(BaseModel):
+    tenant_id: str = Field(..., description="Unique tenant identifier.")
+    resource_ids: Optional[List[str]] = Field(
+        None, max_length=100_000, description="Cloud resource IDs to evaluate."
+    )
+    all_resources: bool = Field(False, description="Evaluate every resource of the tenant.")
+    dry_run: bool = Field(True, description="If True, simulate without executing.")
+
+    @model_validator(mode="after")
+    def check_selector(self) -> "BatchEvaluationRequest":
+        if self.all_resources == bool(self.resource_ids):
+            raise ValueError("Provide either a non-empty resource_ids list or all_resources=true.")
+        return self
+
+
+class ResourceEvaluation(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    resource_id: str
+    action: str
+    probability: float
+    value: float
+    gnn_score: float
+    model_version: str
+
+
+class BatchEvaluationResponse(BaseModel):
+    tenant_id: str
+    dry_run: bool
+    count: int
+    results: List[ResourceEvaluation]
+
+
+class ModelVersionInfo(BaseModel):
+    version: str
+    feature_schema: Optional[List[str]] = None
+    trained_at: Optional[str] = None
+    metrics: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ModelListResponse(BaseModel):
+    active_version: str
+    active_backend: str
+    versions: List[ModelVersionInfo]
+
+
+class ModelActivateRequest(BaseModel):
+    version: str = Field(..., min_length=1, max_length=128)
+
+
+class ModelActivateResponse(BaseModel):
+    message: str
+    previous_version: str
+    active_version: str
+    active_backend: str
+
+
+class DashboardResponse(BaseModel):
+    tenant_id: str
+    start: datetime
+    end: datetime
+    month_to_date: float
+    previous_month_to_date: float
+    active_resources: int
+    by_provider: List[Dict[str, Any]]
+    daily: List[Dict[str, Any]]
+    top_services: List[Dict[str, Any]]
+    tag_key: str
+    by_tag: List[Dict[str, Any]]
+
+
+class ForecastPoint(BaseModel):
+    date: str
+    cost: float
+    lower: float
+    upper: float
+
+
+class SeriesForecast(BaseModel):
+    model: str
+    forecast: List[ForecastPoint]
+
+
+class ServiceForecast(SeriesForecast):
+    provider_name: str
+    service_name: str
+    recent_cost: float
+
+
+class ForecastResponse(BaseModel):
+    tenant_id: str
+    through: date
+    horizon: int
+    level: float
+    history: List[Dict[str, Any]]
+    total: SeriesForecast
+    next_month: Dict[str, Any]
+    services: List[ServiceForecast]
+
+
+class AnomalySettingsRequest(BaseModel):
+    spike_pct: float = Field(15.0, gt=0, le=1000, description="Alert when a day exceeds its expected cost by this percent.")
+    channel: str = Field(..., pattern="^(slack|email|sms)$")
+    recipient: str = Field(..., min_length=1)
+    enabled: bool = True
+
+
+class AnomalySettingsResponse(AnomalySettingsRequest):
+    tenant_id: str
+    updated_at: datetime
+
+
+class CostAnomaly(BaseModel):
+    provider_name: str
+    service_name: str
+    region: str
+    usage_date: date
+    billed_cost: float
+    expected_cost: float
+    spike_pct: float
+    detected_at: datetime
+
+
+class AnomalyListResponse(BaseModel):
+    tenant_id: str
+    anomalies: List[CostAnomaly]
+
+
+class ShieldRuleRequest(BaseModel):
+    resource_id: str = Field(..., min_length=1, description="Cloud resource ID to guard.")
+    provider_name: Optional[str] = None
+    threshold: float = Field(..., gt=0, description="Month-to-date billed cost limit in the billing currency.")
+    channel: str = Field("email", pattern="^(slack|email|sms)$")
+    recipient: str = Field(..., min_length=1)
+    dry_run: bool = Field(True, description="If True, ABACUS recommends without terminating.")
+
+
+class ShieldRule(ShieldRuleRequest):
+    tenant_id: str
+    status: str
+    triggered_at: Optional[datetime] = None
+    triggered_cost: Optional[float] = None
+    job_id: Optional[str] = None
+    updated_at: datetime
+
+
+class ShieldRuleListResponse(BaseModel):
+    tenant_id: str
+    rules: List[ShieldRule]
+
+
+class ShieldSimulationRequest(BaseModel):
+    resource_id: str = Field(..., min_length=1)
+    cost: float = Field(..., ge=0, description="Hypothetical month-to-date billed cost.")
+
+
+class ShieldSimulationResponse(BaseModel):
+    resource_id: str
+    threshold: float
+    cost: float
+    status: str
+    exceeded: bool
+    job_id: Optional[str] = None
+
+
 class NotificationRequest(BaseModel):
     tenant_id: str
     channel: str = Field(..., pattern="^(slack|email|sms)$")
@@ -100,6 +469,19 @@ class NotificationRequest(BaseModel):
     body: str
 
 
+class NotificationStatusResponse(BaseModel):
+    notification_id: str
+    tenant_id: Optional[str] = None
+    channel: str
+    recipient: str
+    status: str
+    attempts: Optional[int] = None
+    error_message: Optional[str] = None
+    created_at: Optional[datetime] = None
+    next_attempt_at: Optional[datetime] = None
+    sent_at: Optional[datetime] = None
+
+
 # ---------------------------------------------------------------------------
 # Routes
 # ---------------------------------------------------------------------------
@@ -110,7 +492,13 @@ async def health_check() -> HealthResponse:
     return HealthResponse(status="healthy", version="1.0.0")
 
 
-@app.post("/api/v1/query", response_model=NLPQueryResponse, tags=["OPTIC - NLP"])
+@app.get("/metrics", tags=["System"])
+async def get_metrics() -> JSONResponse:
+    """Return in-process metrics: request latency, inference executor and queues."""
+    return JSONResponse(content=metrics.snapshot())
+
+
+@api_router.post("/api/v1/query", response_model=NLPQueryResponse, tags=["OPTIC - NLP"])
 async def natural_language_query(request: NLPQueryRequest) -> NLPQueryResponse:
     """
     Accept a natural-language cloud cost question, translate it to SQL via
@@ -118,7 +506,7 @@ async def natural_language_query(request: NLPQueryRequest) -> NLPQueryResponse:
     """
     logger.info("NLP query received for tenant=%s", request.tenant_id)
     try:
-        sql, answer = await ai_engine.translate_and_execute(
+        sql, answer = await optic_engine.translate_and_execute(
             tenant_id=request.tenant_id,
             query=request.query,
         )
@@ -136,50 +524,448 @@ async def natural_language_query(request: NLPQueryRequest) -> NLPQueryResponse:
         )
 
 
-@app.post("/api/v1/auto-terminate", tags=["ABACUS - Automation"])
-async def auto_terminate(
-    request: AutoTerminationRequest,
-    background_tasks: BackgroundTasks,
-) -> JSONResponse:
+def _json_default(value: Any) -> Any:
+    """Encode database values (NUMERIC, timestamps, UUIDs) for NDJSON events."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+@api_router.post("/api/v1/query/stream", tags=["OPTIC - NLP"])
+async def natural_language_query_stream(request: NLPQueryRequest) -> StreamingResponse:
+    """
+    Streaming variant of /api/v1/query as newline-delimited JSON: the
+    generated SQL first, then result rows as they leave the database, then
+    answer tokens as the LLM produces them, then a final "done" event.
+    Failures after the stream has started arrive as an "error" event with
+    "fatal": true.
+    """
+    logger.info("Streaming NLP query received for tenant=%s", request.tenant_id)
+
+    async def events() -> AsyncIterator[bytes]:
+        stream = optic_engine.stream(tenant_id=request.tenant_id, query=request.query)
+        try:
+            async with aclosing(stream):
+                async for event in stream:
+                    yield (json.dumps(event, default=_json_default) + "\n").encode("utf-8")
+        except Exception as exc:
+            logger.exception("Streaming NLP query failed: %s", exc)
+            failure = {"event": "error", "detail": "Query processing failed. Please try again.", "fatal": True}
+            yield (json.dumps(failure) + "\n").encode("utf-8")
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        # Stop reverse proxies from buffering the stream and defeating the early bytes.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api_router.get("/api/v1/dashboard/{tenant_id}", response_model=DashboardResponse, tags=["Dashboard"])
+async def get_dashboard(
+    tenant_id: UUID,
+    days: int = Query(30, ge=1, le=366, description="Days of history in the window panels."),
+    tag_key: str = Query("department", min_length=1, max_length=128, description="Tag key for chargeback."),
+) -> DashboardResponse:
+    """
+    Return the FinOps dashboard aggregates: month-to-date spend, and cost by
+    provider, day, service and tag over the last days days, read from the
+    rollups. Raw scans run on the analytics store when one is configured.
+    """
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    try:
+        summary = await dashboard_service.summary(str(tenant_id), days=days, tag_key=tag_key)
+    except QueryTimeoutError as exc:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(exc))
+    except QueryExecutionError as exc:
+        logger.exception("Dashboard query failed: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Dashboard aggregates could not be computed. Please try again.",
+        )
+    return DashboardResponse(**summary)
+
+
+@api_router.get("/api/v1/forecast/{tenant_id}", response_model=ForecastResponse, tags=["Forecasting"])
+async def get_forecast(
+    tenant_id: UUID,
+    horizon: int = Query(30, ge=1, le=90, description="Days to forecast ahead."),
+    level: float = Query(80.0, ge=50.0, le=99.0, description="Prediction interval coverage in percent."),
+    services: int = Query(20, ge=0, le=200, description="Top services (by last 30 days' spend) to include."),
+) -> ForecastResponse:
+    """
+    Forecast daily spend for the tenant total and its top services, with
+    prediction intervals. Models are refitted once per settled day.
+    """
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    forecaster = await get_forecaster()
+    try:
+        forecast = await forecaster.forecast(str(tenant_id), horizon=horizon, level=level, top_services=services)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    except Exception as exc:
+        logger.exception("Forecast failed: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Forecast could not be computed. Please try again.",
+        )
+    if forecast is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found.")
+    return ForecastResponse(**forecast)
+
+
+@api_router.post(
+    "/api/v1/auto-terminate",
+    response_model=JobAcceptedResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["ABACUS - Automation"],
+)
+async def auto_terminate(request: AutoTerminationRequest) -> JobAcceptedResponse:
     """
-    Evaluate a cloud resource using GNN + PPO RL and, if the model recommends
-    termination, schedule the action as a background task.
+    Queue a GNN + PPO RL evaluation of a cloud resource on the durable job
+    queue. Poll GET /api/v1/jobs/{job_id} for the recommendation.
     """
     logger.info(
         "Auto-termination request: tenant=%s resource=%s dry_run=%s",
         request.tenant_id, request.resource_id, request.dry_run,
     )
-    background_tasks.add_task(
-        ai_engine.evaluate_and_terminate,
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    try:
+        job_id, coalesced = await job_queue.enqueue(
+            tenant_id=request.tenant_id,
+            resource_id=request.resource_id,
+            dry_run=request.dry_run,
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="tenant_id must be a UUID.",
+        )
+    except Exception as exc:
+        logger.exception("Failed to queue evaluation: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Evaluation could not be queued. Please try again.",
+        )
+    return JobAcceptedResponse(
+        message="Evaluation already queued." if coalesced else "Evaluation queued.",
+        job_id=job_id,
+        coalesced=coalesced,
         tenant_id=request.tenant_id,
         resource_id=request.resource_id,
         dry_run=request.dry_run,
     )
-    return JSONResponse(
-        content={
-            "message": "Evaluation scheduled.",
-            "tenant_id": request.tenant_id,
-            "resource_id": request.resource_id,
-            "dry_run": request.dry_run,
-        },
-        status_code=status.HTTP_202_ACCEPTED,
+
+
+@api_router.get("/api/v1/tenants/lookup", response_model=TenantResponse, tags=["Tenants"])
+async def lookup_tenant(email: str = Query(..., min_length=3, max_length=320, pattern="@")) -> TenantResponse:
+    """
+    Resolve the tenant a signed-in user belongs to: the tenant they administer,
+    else the one registered for their email domain. Every tenant-scoped
+    endpoint takes the returned tenant_id, not the email.
+    """
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    tenant = await database.find_tenant(email)
+    if tenant is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No tenant is registered for this email.")
+    return TenantResponse(**tenant)
+
+
+@api_router.put("/api/v1/shield-rules/{tenant_id}", response_model=ShieldRule, tags=["ABACUS - Automation"])
+async def put_shield_rule(tenant_id: UUID, request: ShieldRuleRequest) -> ShieldRule:
+    """
+    Create or replace the Agentic Shield rule for a resource and arm it.
+    When the resource's month-to-date billed cost exceeds the threshold, an
+    ABACUS evaluation is queued and the recipient is notified.
+    """
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    saved = await shield.save_rule(
+        str(tenant_id), request.resource_id, request.threshold, request.recipient,
+        channel=request.channel, provider_name=request.provider_name, dry_run=request.dry_run,
     )
+    if saved is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found.")
+    return ShieldRule(**saved)
 
 
-@app.post("/api/v1/notify", tags=["Notifications"])
-async def send_notification(request: NotificationRequest) -> JSONResponse:
-    """Send a notification via the requested channel (Slack, Email, or SMS)."""
+@api_router.get("/api/v1/shield-rules/{tenant_id}", response_model=ShieldRuleListResponse, tags=["ABACUS - Automation"])
+async def get_shield_rules(tenant_id: UUID) -> ShieldRuleListResponse:
+    """Return the tenant's Agentic Shield rules and their trigger state."""
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    rules = await shield.list_rules(str(tenant_id))
+    return ShieldRuleListResponse(tenant_id=str(tenant_id), rules=[ShieldRule(**rule) for rule in rules])
+
+
+@api_router.post(
+    "/api/v1/shield-rules/{tenant_id}/simulate",
+    response_model=ShieldSimulationResponse,
+    tags=["ABACUS - Automation"],
+)
+async def simulate_shield_rule(tenant_id: UUID, request: ShieldSimulationRequest) -> ShieldSimulationResponse:
+    """
+    Check a hypothetical cost against a resource's rule; over the threshold,
+    a dry-run ABACUS evaluation is queued (poll GET /api/v1/jobs/{job_id}).
+    """
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    result = await shield.simulate(str(tenant_id), request.resource_id, request.cost, job_queue.enqueue)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Agentic Shield rule for this resource.")
+    return ShieldSimulationResponse(**result)
+
+
+@api_router.delete(
+    "/api/v1/shield-rules/{tenant_id}/{resource_id:path}",
+    response_model=ShieldRule,
+    tags=["ABACUS - Automation"],
+)
+async def disable_shield_rule(tenant_id: UUID, resource_id: str) -> ShieldRule:
+    """Disarm a resource's Agentic Shield rule."""
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    disabled = await shield.disable_rule(str(tenant_id), resource_id)
+    if disabled is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Agentic Shield rule for this resource.")
+    return ShieldRule(**disabled)
+
+
+@api_router.get("/api/v1/jobs/{job_id}", response_model=JobStatusResponse, tags=["ABACUS - Automation"])
+async def get_job(job_id: UUID) -> JobStatusResponse:
+    """Return the status and, once finished, the result of an ABACUS job."""
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    job = await job_queue.get(str(job_id))
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    return JobStatusResponse(**job)
+
+
+@abacus_router.post(
+    "/api/v1/auto-terminate/batch",
+    response_model=BatchEvaluationResponse,
+    tags=["ABACUS - Automation"],
+)
+async def auto_terminate_batch(request: BatchEvaluationRequest) -> Response:
+    """
+    Evaluate many cloud resources in one batched GNN + PPO pass and return
+    the per-resource recommendation, probability and value estimate.
+    """
+    logger.info(
+        "Batch auto-termination request: tenant=%s resources=%s dry_run=%s",
+        request.tenant_id,
+        "all" if request.all_resources else len(request.resource_ids),
+        request.dry_run,
+    )
     try:
-        result = await notification_service.send(
-            channel=request.channel,
-            recipient=request.recipient,
-            subject=request.subject,
-            body=request.body,
+        engine = await get_ai_engine()
+        results = await engine.evaluate_batch(
+            tenant_id=request.tenant_id,
+            resource_ids=None if request.all_resources else request.resource_ids,
+            dry_run=request.dry_run,
+        )
+    except EnvironmentError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(exc),
         )
-        return JSONResponse(content={"success": True, "detail": result})
     except Exception as exc:
-        logger.exception("Notification failed: %s", exc)
+        logger.exception("Batch evaluation failed: %s", exc)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Notification delivery failed: {exc}",
+            detail="Batch evaluation failed. Please try again.",
+        )
+    # Validating and serialising tens of thousands of results is CPU work;
+    # keep it off the event loop like the inference itself.
+    body = await asyncio.to_thread(
+        lambda: BatchEvaluationResponse(
+            tenant_id=request.tenant_id,
+            dry_run=request.dry_run,
+            count=len(results),
+            results=results,
+        ).model_dump_json()
+    )
+    return Response(content=body, media_type="application/json")
+
+
+def _require_admin(token: Optional[str]) -> None:
+    """Check the X-Admin-Token header against ADMIN_API_TOKEN."""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="ADMIN_API_TOKEN is not configured.",
         )
+    if not token or not hmac.compare_digest(token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token.")
+
+
+@abacus_router.get("/api/v1/admin/models", response_model=ModelListResponse, tags=["Admin"])
+async def list_models(x_admin_token: Optional[str] = Header(None)) -> ModelListResponse:
+    """List the ABACUS model versions on disk and the one currently serving."""
+    _require_admin(x_admin_token)
+    registry = (await get_ai_engine()).models
+    versions = await asyncio.to_thread(registry.list_versions)
+    active = registry.active
+    return ModelListResponse(
+        active_version=active.version,
+        active_backend=active.backend,
+        versions=[ModelVersionInfo(**meta) for meta in versions],
+    )
+
+
+@abacus_router.post("/api/v1/admin/models/activate", response_model=ModelActivateResponse, tags=["Admin"])
+async def activate_model(
+    request: ModelActivateRequest, x_admin_token: Optional[str] = Header(None)
+) -> ModelActivateResponse:
+    """
+    Hot-swap the active ABACUS model version. The new version is loaded in
+    the background; evaluations already running finish on the old one.
+    """
+    _require_admin(x_admin_token)
+    registry = (await get_ai_engine()).models
+    previous = registry.active.version
+    try:
+        bundle = await registry.activate(request.version)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Model version '{request.version}' not found.",
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    except Exception as exc:
+        logger.exception("Model activation failed: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Model activation failed; the previous version is still active.",
+        )
+    return ModelActivateResponse(
+        message="Model version activated.",
+        previous_version=previous,
+        active_version=bundle.version,
+        active_backend=bundle.backend,
+    )
+
+
+@api_router.put("/api/v1/anomaly-settings/{tenant_id}", response_model=AnomalySettingsResponse, tags=["Anomalies"])
+async def put_anomaly_settings(tenant_id: UUID, request: AnomalySettingsRequest) -> AnomalySettingsResponse:
+    """Create or replace the tenant's cost-spike alert threshold and channel."""
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    import anomalies
+
+    saved = await anomalies.save_settings(
+        str(tenant_id), request.spike_pct, request.channel, request.recipient, request.enabled,
+    )
+    if saved is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found.")
+    return AnomalySettingsResponse(**saved)
+
+
+@api_router.get("/api/v1/anomalies/{tenant_id}", response_model=AnomalyListResponse, tags=["Anomalies"])
+async def get_anomalies(
+    tenant_id: UUID,
+    limit: int = Query(50, ge=1, le=500, description="Most recent anomalies to return."),
+) -> AnomalyListResponse:
+    """Return the tenant's most recently detected cost spikes."""
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    import anomalies
+
+    rows = await anomalies.recent_anomalies(str(tenant_id), limit=limit)
+    return AnomalyListResponse(tenant_id=str(tenant_id), anomalies=[CostAnomaly(**row) for row in rows])
+
+
+@api_router.post("/api/v1/notify", status_code=status.HTTP_202_ACCEPTED, tags=["Notifications"])
+async def send_notification(request: NotificationRequest) -> JSONResponse:
+    """
+    Queue a notification (Slack, Email, or SMS) on the durable outbox and
+    return at once. Poll GET /api/v1/notify/{notification_id} for delivery.
+    """
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    notification = Notification(request.channel, request.recipient, request.body, request.subject)
+    try:
+        [notification_id] = await notification_outbox.enqueue([(request.tenant_id, notification)])
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    except Exception as exc:
+        logger.exception("Failed to queue notification: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Notification could not be queued. Please try again.",
+        )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"success": True, "detail": "Notification queued.", "notification_id": notification_id},
+    )
+
+
+@api_router.get(
+    "/api/v1/notify/{notification_id}", response_model=NotificationStatusResponse, tags=["Notifications"],
+)
+async def get_notification(notification_id: UUID) -> NotificationStatusResponse:
+    """Return a queued notification's delivery state: pending, sending, sent or dead."""
+    if not database.is_configured():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DATABASE_URL environment variable is not set.",
+        )
+    record = await notification_outbox.get(str(notification_id))
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notification not found.")
+    return NotificationStatusResponse(**record)
+
+
+# ---------------------------------------------------------------------------
+# Role-based route registration
+# ---------------------------------------------------------------------------
+if SERVES_API:
+    app.include_router(api_router)
+if SERVES_ABACUS:
+    app.include_router(abacus_router)
+if SERVES_WEBHOOKS:
+    app.include_router(payments_router, prefix="/webhooks", tags=["Payments"])
@@ -0,0 +1,90 @@
+"""
+metrics.py
+==========
+TEJUSKA Cloud Intelligence
+Lightweight in-process metrics: latency trackers, counters and a registry
+of snapshot providers exposed through GET /metrics.
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict
+
+MetricsProvider = Callable[[], Dict[str, Any]]
+
+
+class LatencyTracker:
+    """
+    Thread-safe latency recorder.
+    Keeps exact count/total and a rolling window of recent samples for
+    percentile estimates.
+    """
+
+    def __init__(self, window: int = 2048) -> None:
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self._samples.append(elapsed_ms)
+            self.count += 1
+            self.total_ms += elapsed_ms
+
+    def time(self) -> "_Timer":
+        """Context manager that records the elapsed wall time of its block."""
+        return _Timer(self)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total = self.count, self.total_ms
+        if not samples:
+            return {"count": count, "mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": count,
+            "mean_ms": round(total / count, 3),
+            "p50_ms": round(samples[len(samples) // 2], 3),
+            "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+            "max_ms": round(samples[-1], 3),
+        }
+
+
+class _Timer:
+    def __init__(self, tracker: LatencyTracker) -> None:
+        self._tracker = tracker
+        self._started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._tracker.observe((time.perf_counter() - self._started) * 1000)
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+_providers: Dict[str, MetricsProvider] = {}
+
+
+def register(name: str, provider: MetricsProvider) -> None:
+    """Register (or replace) a named snapshot provider."""
+    _providers[name] = provider
+
+
+def snapshot() -> Dict[str, Any]:
+    """Collect the current values from every registered provider."""
+    return {name: provider() for name, provider in _providers.items()}
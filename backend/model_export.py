@@ -0,0 +1,273 @@
+"""
+model_export.py
+===============
+TEJUSKA Cloud Intelligence
+Export pipeline and compiled-artifact loaders for the ABACUS models.
+
+Artifacts written to the output directory:
+  ppo_policy.pt            PPOPolicy state_dict (eager weights)
+  resource_gnn.pt          ResourceGNN state_dict (eager / graph-mode weights)
+  ppo_policy.ts            TorchScript trace of PPOPolicy
+  gnn_node_scorer.ts       TorchScript trace of ResourceGNN without adjacency
+  ppo_policy.onnx          ONNX export with a dynamic batch axis
+  gnn_node_scorer.onnx     ONNX export of the GNN node scorer
+  *.int8.onnx              Dynamically int8-quantised ONNX models
+
+Graph-mode GNN inference (sparse adjacency, sampled blocks) stays on the
+eager module: torch.sparse kernels do not benefit from tracing and cannot be
+expressed in ONNX. Only the dense, adjacency-free paths are compiled.
+
+Each export is written to its own version directory together with a
+metadata.json consumed by model_registry.py.
+
+Usage (from backend/):
+    python model_export.py --out models/ --version 2024-06-01
+"""
+
+import os
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger("tejuska.model_export")
+
+NUM_FEATURES = 8
+ONNX_OPSET = 17
+
+POLICY_PT   = "ppo_policy.pt"
+GNN_PT      = "resource_gnn.pt"
+POLICY_TS   = "ppo_policy.ts"
+GNN_TS      = "gnn_node_scorer.ts"
+POLICY_ONNX = "ppo_policy.onnx"
+GNN_ONNX    = "gnn_node_scorer.onnx"
+METADATA_FILE = "metadata.json"
+
+BACKENDS = ("eager", "torchscript", "onnx", "onnx-int8")
+
+PolicyFn = Callable[[torch.Tensor], Tuple[torch.Tensor, torch.Tensor]]
+NodeScorerFn = Callable[[torch.Tensor], torch.Tensor]
+
+
+class GNNNodeScorer(nn.Module):
+    """ResourceGNN restricted to its adjacency-free path, for tracing/export."""
+
+    def __init__(self, gnn: nn.Module) -> None:
+        super().__init__()
+        self.gnn = gnn
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.gnn(x)
+
+
+def _quantized_name(filename: str) -> str:
+    return filename.replace(".onnx", ".int8.onnx")
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def export_weights(policy: nn.Module, gnn: nn.Module, out_dir: str) -> Dict[str, str]:
+    """Save eager state_dicts so graph-mode inference uses the exported weights."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {"policy": os.path.join(out_dir, POLICY_PT), "gnn": os.path.join(out_dir, GNN_PT)}
+    torch.save(policy.state_dict(), paths["policy"])
+    torch.save(gnn.state_dict(), paths["gnn"])
+    return paths
+
+
+def write_metadata(
+    out_dir: str, version: str, feature_schema, metrics: Optional[Dict[str, float]] = None
+) -> str:
+    """Write the metadata.json that identifies a versioned checkpoint."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, METADATA_FILE)
+    metadata = {
+        "version": version,
+        "feature_schema": list(feature_schema),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "metrics": metrics or {},
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(metadata, fh, indent=2)
+    return path
+
+
+def export_torchscript(policy: nn.Module, gnn: nn.Module, out_dir: str) -> Dict[str, str]:
+    """Trace both models to TorchScript and return the written paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    example = torch.zeros(4, NUM_FEATURES)
+    paths = {"policy": os.path.join(out_dir, POLICY_TS), "gnn": os.path.join(out_dir, GNN_TS)}
+    with torch.no_grad():
+        torch.jit.trace(policy.eval(), example).save(paths["policy"])
+        torch.jit.trace(GNNNodeScorer(gnn).eval(), example).save(paths["gnn"])
+    logger.info("TorchScript artifacts written to %s.", out_dir)
+    return paths
+
+
+def export_onnx(policy: nn.Module, gnn: nn.Module, out_dir: str, quantize: bool = True) -> Dict[str, str]:
+    """
+    Export both models to ONNX with a dynamic batch axis and, optionally,
+    write dynamically int8-quantised copies (requires onnx + onnxruntime).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    example = torch.zeros(4, NUM_FEATURES)
+    paths = {"policy": os.path.join(out_dir, POLICY_ONNX), "gnn": os.path.join(out_dir, GNN_ONNX)}
+    batch_axis = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            policy.eval(), (example,), paths["policy"],
+            input_names=["state"], output_names=["logits", "value"],
+            dynamic_axes={"state": batch_axis, "logits": batch_axis, "value": batch_axis},
+            opset_version=ONNX_OPSET,
+        )
+        torch.onnx.export(
+            GNNNodeScorer(gnn).eval(), (example,), paths["gnn"],
+            input_names=["x"], output_names=["logits"],
+            dynamic_axes={"x": batch_axis, "logits": batch_axis},
+            opset_version=ONNX_OPSET,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic  # optional dependency
+
+        for key in ("policy", "gnn"):
+            target = _quantized_name(paths[key])
+            quantize_dynamic(paths[key], target, weight_type=QuantType.QInt8)
+            paths[f"{key}_int8"] = target
+    logger.info("ONNX artifacts written to %s (quantised=%s).", out_dir, quantize)
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Loaders
+# ---------------------------------------------------------------------------
+
+class _OnnxModel:
+    """Wraps an onnxruntime session so it is called like the torch module."""
+
+    def __init__(self, path: str, threads: int) -> None:
+        import onnxruntime as ort  # optional dependency
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0].name
+
+    def run(self, x: torch.Tensor):
+        return [torch.from_numpy(out) for out in self._session.run(None, {self._input: x.numpy()})]
+
+
+class OnnxPolicy(_OnnxModel):
+    def __call__(self, state: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        logits, value = self.run(state)
+        return logits, value
+
+
+class OnnxNodeScorer(_OnnxModel):
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        return self.run(x)[0]
+
+
+def load_weights(model_dir: str, policy: nn.Module, gnn: nn.Module, mmap: bool = False) -> bool:
+    """
+    Load exported state_dicts into the eager modules; False if absent.
+    With mmap=True the tensors stay backed by the checkpoint files and are
+    assigned into the modules without an extra copy.
+    """
+    policy_path, gnn_path = os.path.join(model_dir, POLICY_PT), os.path.join(model_dir, GNN_PT)
+    if not (os.path.exists(policy_path) and os.path.exists(gnn_path)):
+        return False
+    for module, path in ((policy, policy_path), (gnn, gnn_path)):
+        state = torch.load(path, map_location="cpu", weights_only=True, mmap=mmap)
+        module.load_state_dict(state, assign=mmap)
+    return True
+
+
+def resolve_backend(model_dir: str, backend: str) -> str:
+    """Map 'auto' to torchscript when its artifacts exist, otherwise eager."""
+    if backend != "auto":
+        return backend
+    if os.path.exists(os.path.join(model_dir, POLICY_TS)) and os.path.exists(os.path.join(model_dir, GNN_TS)):
+        return "torchscript"
+    return "eager"
+
+
+def load_compiled(
+    model_dir: str, backend: str, threads: int = 1
+) -> Optional[Tuple[PolicyFn, NodeScorerFn]]:
+    """
+    Load (policy, gnn_node_scorer) callables for the requested backend.
+    Returns None for 'eager' or when the artifacts are missing.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ABACUS model backend '{backend}'; expected one of {BACKENDS}.")
+    if backend == "eager":
+        return None
+
+    if backend == "torchscript":
+        policy_path, gnn_path = os.path.join(model_dir, POLICY_TS), os.path.join(model_dir, GNN_TS)
+    else:
+        policy_path, gnn_path = os.path.join(model_dir, POLICY_ONNX), os.path.join(model_dir, GNN_ONNX)
+        if backend == "onnx-int8":
+            policy_path, gnn_path = _quantized_name(policy_path), _quantized_name(gnn_path)
+
+    if not (os.path.exists(policy_path) and os.path.exists(gnn_path)):
+        logger.warning("No %s artifacts in %s; falling back to eager models.", backend, model_dir)
+        return None
+
+    if backend == "torchscript":
+        policy = torch.jit.load(policy_path).eval()
+        gnn = torch.jit.load(gnn_path).eval()
+        return policy, gnn
+    return OnnxPolicy(policy_path, threads), OnnxNodeScorer(gnn_path, threads)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    from ai_engine import FEATURE_NAMES, PPOPolicy, ResourceGNN
+
+    parser = argparse.ArgumentParser(description="Export ABACUS models to TorchScript and ONNX.")
+    parser.add_argument("--out", default="models", help="Model registry root directory.")
+    parser.add_argument(
+        "--version", default=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
+        help="Version name; artifacts go to <out>/<version>/.",
+    )
+    parser.add_argument(
+        "--metric", action="append", default=[], metavar="NAME=VALUE",
+        help="Evaluation metric recorded in metadata.json (repeatable).",
+    )
+    parser.add_argument("--policy-weights", help="Optional PPOPolicy state_dict (.pt).")
+    parser.add_argument("--gnn-weights", help="Optional ResourceGNN state_dict (.pt).")
+    parser.add_argument("--no-onnx", action="store_true", help="Skip the ONNX exports.")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip int8 quantisation.")
+    args = parser.parse_args()
+
+    policy, gnn = PPOPolicy(), ResourceGNN()
+    if args.policy_weights:
+        policy.load_state_dict(torch.load(args.policy_weights, map_location="cpu", weights_only=True))
+    if args.gnn_weights:
+        gnn.load_state_dict(torch.load(args.gnn_weights, map_location="cpu", weights_only=True))
+
+    out_dir = os.path.join(args.out, args.version)
+    metrics = {name: float(value) for name, value in (m.split("=", 1) for m in args.metric)}
+    export_weights(policy, gnn, out_dir)
+    export_torchscript(policy, gnn, out_dir)
+    if not args.no_onnx:
+        export_onnx(policy, gnn, out_dir, quantize=not args.no_quantize)
+    write_metadata(out_dir, args.version, FEATURE_NAMES, metrics)
+    logger.info("Model version %s exported to %s.", args.version, out_dir)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,282 @@
+"""
+model_registry.py
+=================
+TEJUSKA Cloud Intelligence
+Versioned ABACUS model registry with atomic hot-swap.
+
+Layout under ABACUS_MODEL_DIR:
+  <version>/metadata.json      feature_schema, trained_at, metrics
+  <version>/ppo_policy.pt      state_dicts written by model_export.py
+  <version>/resource_gnn.pt
+  <version>/*.ts, *.onnx       optional compiled artifacts
+  ACTIVE                       name of the active version (survives restarts)
+
+A version is loaded into an immutable ModelBundle. Callers take a reference
+to the active bundle once per evaluation, so swapping the reference never
+disturbs in-flight requests; the previous bundle is freed when the last of
+them finishes.
+
+Activation goes through one worker; every other worker sharing the model
+directory polls the ACTIVE pointer and swaps to the version it names.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import torch.nn as nn
+
+import model_export
+
+logger = logging.getLogger("tejuska.model_registry")
+
+METADATA_FILE = model_export.METADATA_FILE
+ACTIVE_POINTER = "ACTIVE"
+UNTRAINED_VERSION = "untrained"
+
+
+class ModelBundle:
+    """One loaded model version: eager modules plus the dense scoring callables."""
+
+    def __init__(
+        self,
+        version: str,
+        metadata: Dict[str, Any],
+        policy: nn.Module,
+        gnn: nn.Module,
+        backend: str,
+        policy_fn: Callable,
+        gnn_node_fn: Callable,
+    ) -> None:
+        self.version = version
+        self.metadata = metadata
+        self.policy = policy
+        self.gnn = gnn
+        self.backend = backend
+        self.policy_fn = policy_fn
+        self.gnn_node_fn = gnn_node_fn
+        self.loaded_at = time.time()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "backend": self.backend,
+            "loaded_at": self.loaded_at,
+            "metadata": self.metadata,
+        }
+
+
+class ModelRegistry:
+    """
+    Loads versioned checkpoints and holds the active ModelBundle.
+
+    Parameters
+    ----------
+    model_dir      : Root directory of versioned checkpoints.
+    policy_factory : Builds an uninitialised PPOPolicy.
+    gnn_factory    : Builds an uninitialised ResourceGNN.
+    feature_schema : Feature names the serving code produces; checkpoints
+                     trained on a different schema are rejected.
+    backend        : Dense scoring backend ('auto', 'eager', 'torchscript', 'onnx', 'onnx-int8').
+    threads        : Intra-op threads for onnxruntime sessions.
+    poll_interval  : Seconds between checks of the ACTIVE pointer; 0 disables.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        policy_factory: Callable[[], nn.Module],
+        gnn_factory: Callable[[], nn.Module],
+        feature_schema: Sequence[str],
+        backend: str = "auto",
+        threads: int = 1,
+        poll_interval: float = 30.0,
+    ) -> None:
+        self._model_dir = model_dir
+        self._policy_factory = policy_factory
+        self._gnn_factory = gnn_factory
+        self._feature_schema = list(feature_schema)
+        self._backend = backend
+        self._threads = threads
+        self._poll_interval = poll_interval
+        self._swap_lock = threading.Lock()
+        self._active: Optional[ModelBundle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._failed_version: Optional[str] = None
+
+    @property
+    def active(self) -> ModelBundle:
+        """The bundle new evaluations should use."""
+        bundle = self._active
+        if bundle is None:
+            raise RuntimeError("No ABACUS model version is active.")
+        return bundle
+
+    # ------------------------------------------------------------------
+    # Discovery
+    # ------------------------------------------------------------------
+
+    def _version_dir(self, version: str) -> str:
+        if not version or os.sep in version or version.startswith("."):
+            raise ValueError(f"Invalid model version '{version}'.")
+        return os.path.join(self._model_dir, version)
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """Return metadata for every version directory, oldest first."""
+        if not os.path.isdir(self._model_dir):
+            return []
+        versions = []
+        for name in sorted(os.listdir(self._model_dir)):
+            path = os.path.join(self._model_dir, name, METADATA_FILE)
+            if os.path.isfile(path):
+                with open(path, encoding="utf-8") as fh:
+                    versions.append({**json.load(fh), "version": name})
+        versions.sort(key=lambda meta: (str(meta.get("trained_at", "")), meta["version"]))
+        return versions
+
+    def _read_pointer(self) -> Optional[str]:
+        """The version named by the ACTIVE pointer, or None."""
+        pointer = os.path.join(self._model_dir, ACTIVE_POINTER)
+        try:
+            with open(pointer, encoding="utf-8") as fh:
+                return fh.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _initial_version(self) -> Optional[str]:
+        """ABACUS_MODEL_VERSION, then the ACTIVE pointer, then the newest version."""
+        pinned = os.environ.get("ABACUS_MODEL_VERSION", "")
+        if pinned:
+            return pinned
+        version = self._read_pointer()
+        if version:
+            return version
+        versions = self.list_versions()
+        return versions[-1]["version"] if versions else None
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def load(self, version: str) -> ModelBundle:
+        """Load a version from disk; weight files are memory-mapped."""
+        version_dir = self._version_dir(version)
+        with open(os.path.join(version_dir, METADATA_FILE), encoding="utf-8") as fh:
+            metadata = json.load(fh)
+
+        schema = metadata.get("feature_schema")
+        if schema is not None and list(schema) != self._feature_schema:
+            raise ValueError(
+                f"Model version '{version}' was trained on feature schema {schema}, "
+                f"but the serving schema is {self._feature_schema}."
+            )
+
+        policy, gnn = self._policy_factory(), self._gnn_factory()
+        if not model_export.load_weights(version_dir, policy, gnn, mmap=True):
+            raise FileNotFoundError(f"Model version '{version}' has no weight files.")
+        policy.eval()
+        gnn.eval()
+
+        backend = model_export.resolve_backend(version_dir, self._backend)
+        compiled = model_export.load_compiled(version_dir, backend, threads=self._threads)
+        if compiled is None:
+            backend, policy_fn, gnn_node_fn = "eager", policy, gnn
+        else:
+            policy_fn, gnn_node_fn = compiled
+        return ModelBundle(version, metadata, policy, gnn, backend, policy_fn, gnn_node_fn)
+
+    def _untrained(self) -> ModelBundle:
+        policy, gnn = self._policy_factory().eval(), self._gnn_factory().eval()
+        metadata = {"feature_schema": self._feature_schema, "trained_at": None, "metrics": {}}
+        return ModelBundle(UNTRAINED_VERSION, metadata, policy, gnn, "eager", policy, gnn)
+
+    def load_initial(self) -> ModelBundle:
+        """Activate the startup version, falling back to untrained weights."""
+        version = self._initial_version()
+        if version is None:
+            logger.warning("No ABACUS checkpoints in %s; serving untrained weights.", self._model_dir)
+            self._active = self._untrained()
+        else:
+            self._active = self.load(version)
+        logger.info(
+            "ABACUS model version %s active (backend=%s).", self._active.version, self._active.backend
+        )
+        return self._active
+
+    async def activate(self, version: str) -> ModelBundle:
+        """
+        Load a version off the event loop, then swap it in atomically and
+        persist the choice in the ACTIVE pointer.
+        """
+        bundle = await asyncio.to_thread(self.load, version)
+        with self._swap_lock:
+            previous = self._active
+            self._active = bundle
+            pointer = os.path.join(self._model_dir, ACTIVE_POINTER)
+            tmp = f"{pointer}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(version)
+            os.replace(tmp, pointer)
+        logger.info(
+            "ABACUS model hot-swapped: %s -> %s (backend=%s).",
+            previous.version if previous else None, bundle.version, bundle.backend,
+        )
+        return bundle
+
+    async def sync(self) -> Optional[ModelBundle]:
+        """
+        Swap to the version in the ACTIVE pointer when another worker has
+        activated one. Returns the new bundle, or None when nothing changed.
+        """
+        version = await asyncio.to_thread(self._read_pointer)
+        if not version or version == self.active.version or version == self._failed_version:
+            return None
+        try:
+            bundle = await asyncio.to_thread(self.load, version)
+        except Exception:
+            self._failed_version = version  # retried once the pointer moves on
+            raise
+        with self._swap_lock:
+            # A local activate() may have moved the pointer while this loaded.
+            if self._read_pointer() != version:
+                return None
+            previous = self._active
+            self._active = bundle
+        logger.info(
+            "ABACUS model followed ACTIVE pointer: %s -> %s (backend=%s).",
+            previous.version if previous else None, bundle.version, bundle.backend,
+        )
+        return bundle
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        if os.environ.get("ABACUS_MODEL_VERSION", ""):
+            logger.info("ABACUS model pinned by ABACUS_MODEL_VERSION; ACTIVE pointer not watched.")
+            return
+        if self._poll_interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop(), name="model-pointer-watch")
+        logger.info("Watching the ABACUS ACTIVE pointer (every %.0fs).", self._poll_interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Could not follow the ABACUS ACTIVE pointer: %s", exc)
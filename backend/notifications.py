@@ -4,26 +4,152 @@ notifications.py
 TEJUSKA Cloud Intelligence
 Unified notification service: Slack, Email (SMTP), and Twilio SMS.
 All configuration is loaded from environment variables.
+
+Sends never block the event loop, and connections are reused:
+  - Slack webhooks and the Twilio REST API share one pooled httpx
+    AsyncClient (keep-alive TLS) instead of a new SDK client per message,
+  - email goes through up to SMTP_CONNECTIONS persistent SMTP sessions,
+    each connected and logged in once and driven from a dedicated thread;
+    a session the server dropped while idle is reopened transparently,
+  - every channel has its own concurrency limit, so an email storm cannot
+    hold up Slack or SMS, and send_many() fans a batch out across them.
+Clients are created on first use and closed by the FastAPI lifespan.
 """
 
 import os
+import ssl
+import asyncio
 import logging
 import smtplib
-import ssl
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
 
-from slack_sdk.webhook import WebhookClient
-from slack_sdk.errors import SlackApiError
-from twilio.rest import Client as TwilioClient
+import metrics
 
 logger = logging.getLogger("tejuska.notifications")
 
+NOTIFY_TIMEOUT_SECONDS: float = float(os.environ.get("NOTIFY_TIMEOUT_SECONDS", "15"))
+NOTIFY_HTTP_MAX_CONNECTIONS: int = int(os.environ.get("NOTIFY_HTTP_MAX_CONNECTIONS", "32"))
+# In-flight sends per channel and process; email is bounded by SMTP_CONNECTIONS.
+NOTIFY_SLACK_CONCURRENCY: int = int(os.environ.get("NOTIFY_SLACK_CONCURRENCY", "4"))
+NOTIFY_SMS_CONCURRENCY: int = int(os.environ.get("NOTIFY_SMS_CONCURRENCY", "16"))
+SMTP_CONNECTIONS: int = int(os.environ.get("SMTP_CONNECTIONS", "4"))
+# Disable only for relays on a trusted network that do not offer STARTTLS.
+SMTP_STARTTLS: bool = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+TWILIO_API_BASE: str = os.environ.get("TWILIO_API_BASE", "https://api.twilio.com")
+
+CHANNELS = ("slack", "email", "sms")
+
+# The server closed or broke an idle session: reconnect and resend once.
+_STALE_SESSION = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class Notification(NamedTuple):
+    channel: str
+    recipient: str
+    body: str
+    subject: Optional[str] = None
+
+
+# ---------------------------------------------------------------------------
+# SMTP session pool
+# ---------------------------------------------------------------------------
+
+class _SmtpPool:
+    """
+    Up to `size` logged-in SMTP sessions. Each send runs on one of `size`
+    dedicated threads and borrows an idle session, so sessions are never
+    shared and never outnumber the threads.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str, size: int) -> None:
+        self._host, self._port = host, port
+        self._user, self._password = user, password
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="smtp")
+        self._idle: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+        self.opened = metrics.Counter()
+        self.reconnects = metrics.Counter()
+
+    async def send(self, message: MIMEMultipart) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._send, message)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self._host, self._port, timeout=NOTIFY_TIMEOUT_SECONDS)
+        try:
+            server.ehlo()
+            if SMTP_STARTTLS:
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+            server.login(self._user, self._password)
+        except Exception:
+            server.close()
+            raise
+        self.opened.inc()
+        return server
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _stale(exc: Exception) -> bool:
+        """True when exc means the session is gone, not that this message was refused."""
+        if isinstance(exc, smtplib.SMTPResponseException):
+            return exc.smtp_code == 421  # the server is closing the session
+        return isinstance(exc, _STALE_SESSION)
+
+    def _send(self, message: MIMEMultipart) -> None:
+        with self._lock:
+            server = self._idle.pop() if self._idle else None
+        if server is not None:
+            try:
+                server.send_message(message)
+            except Exception as exc:
+                if not self._stale(exc):
+                    self._release(server)  # smtplib resets the session after a refusal
+                    raise
+                server.close()
+                self.reconnects.inc()
+            else:
+                self._release(server)
+                return
+        server = self._connect()
+        try:
+            server.send_message(message)
+        except Exception as exc:
+            if self._stale(exc):
+                server.close()
+            else:
+                self._release(server)
+            raise
+        self._release(server)
+
+    def _release(self, server: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append(server)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server in idle:
+            self._discard(server)
+
+
+# ---------------------------------------------------------------------------
+# Service
+# ---------------------------------------------------------------------------
 
 class NotificationService:
     """
-    Provides send() as a single dispatch point.
+    Provides send() as a single dispatch point and send_many() for batches.
     Channel must be one of: 'slack', 'email', 'sms'.
     """
 
@@ -42,6 +168,51 @@ class NotificationService:
         self._twilio_auth_token: str = os.environ.get("TWILIO_AUTH_TOKEN", "")
         self._twilio_from_number: str = os.environ.get("TWILIO_FROM_NUMBER", "")
 
+        self._http = None
+        self._smtp: Optional[_SmtpPool] = None
+        self._limits = {
+            "slack": asyncio.Semaphore(NOTIFY_SLACK_CONCURRENCY),
+            "email": asyncio.Semaphore(SMTP_CONNECTIONS),
+            "sms": asyncio.Semaphore(NOTIFY_SMS_CONCURRENCY),
+        }
+        self._latency = {channel: metrics.LatencyTracker() for channel in CHANNELS}
+        self._sent = {channel: metrics.Counter() for channel in CHANNELS}
+        self._failed = {channel: metrics.Counter() for channel in CHANNELS}
+        metrics.register("notifications", self.snapshot)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def _http_client(self) -> Any:
+        if self._http is None:
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=NOTIFY_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=NOTIFY_HTTP_MAX_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(NOTIFY_TIMEOUT_SECONDS, connect=5.0),
+            )
+        return self._http
+
+    def _smtp_pool(self) -> _SmtpPool:
+        if self._smtp is None:
+            self._smtp = _SmtpPool(
+                self._smtp_host, self._smtp_port, self._smtp_user, self._smtp_password, SMTP_CONNECTIONS,
+            )
+        return self._smtp
+
+    async def close(self) -> None:
+        """Close the HTTP client and SMTP sessions if they were ever opened."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._smtp is not None:
+            smtp, self._smtp = self._smtp, None
+            await asyncio.to_thread(smtp.close)
+
     # ------------------------------------------------------------------
     # Public interface
     # ------------------------------------------------------------------
@@ -59,7 +230,7 @@ class NotificationService:
         Parameters
         ----------
         channel   : 'slack' | 'email' | 'sms'
-        recipient : Slack webhook URL override, email address, or phone number.
+        recipient : Slack channel label (the webhook decides), email address, or phone number.
         body      : Notification body text.
         subject   : Subject line (required for email; ignored for Slack/SMS).
 
@@ -68,31 +239,48 @@ class NotificationService:
         str: Confirmation message.
         """
         channel = channel.lower().strip()
-        if channel == "slack":
-            return self._send_slack(body=body)
-        if channel == "email":
-            return self._send_email(
-                to_address=recipient,
-                subject=subject or "TEJUSKA Cloud Intelligence Alert",
-                body=body,
-            )
-        if channel == "sms":
-            return self._send_sms(to_number=recipient, body=body)
-        raise ValueError(f"Unsupported notification channel: '{channel}'")
+        if channel not in self._limits:
+            raise ValueError(f"Unsupported notification channel: '{channel}'")
+        async with self._limits[channel]:
+            try:
+                with self._latency[channel].time():
+                    if channel == "slack":
+                        result = await self._send_slack(body=body)
+                    elif channel == "email":
+                        result = await self._send_email(
+                            to_address=recipient,
+                            subject=subject or "TEJUSKA Cloud Intelligence Alert",
+                            body=body,
+                        )
+                    else:
+                        result = await self._send_sms(to_number=recipient, body=body)
+            except Exception:
+                self._failed[channel].inc()
+                raise
+        self._sent[channel].inc()
+        return result
+
+    async def send_many(self, notifications: Sequence[Notification]) -> List[Union[str, BaseException]]:
+        """
+        Send a batch concurrently within each channel's limit. Returns, in
+        order, each confirmation or the exception its send raised.
+        """
+        return await asyncio.gather(
+            *(self.send(*notification) for notification in notifications), return_exceptions=True,
+        )
 
     # ------------------------------------------------------------------
     # Slack
     # ------------------------------------------------------------------
 
-    def _send_slack(self, body: str) -> str:
+    async def _send_slack(self, body: str) -> str:
         """Post a message to the configured Slack webhook."""
         if not self._slack_webhook_url:
             raise EnvironmentError("SLACK_WEBHOOK_URL environment variable is not set.")
-        client = WebhookClient(url=self._slack_webhook_url)
-        response = client.send(text=body)
+        response = await self._http_client().post(self._slack_webhook_url, json={"text": body})
         if response.status_code != 200:
             raise RuntimeError(
-                f"Slack webhook returned HTTP {response.status_code}: {response.body}"
+                f"Slack webhook returned HTTP {response.status_code}: {response.text}"
             )
         logger.info("Slack notification delivered successfully.")
         return "Slack notification delivered."
@@ -101,8 +289,8 @@ class NotificationService:
     # Email via SMTP
     # ------------------------------------------------------------------
 
-    def _send_email(self, to_address: str, subject: str, body: str) -> str:
-        """Send a plain-text email via STARTTLS SMTP."""
+    async def _send_email(self, to_address: str, subject: str, body: str) -> str:
+        """Send a plain-text email over a pooled STARTTLS SMTP session."""
         if not self._smtp_user or not self._smtp_password:
             raise EnvironmentError("SMTP_USER or SMTP_PASSWORD environment variable is not set.")
 
@@ -112,12 +300,7 @@ class NotificationService:
         message["To"] = to_address
         message.attach(MIMEText(body, "plain", "utf-8"))
 
-        context = ssl.create_default_context()
-        with smtplib.SMTP(self._smtp_host, self._smtp_port) as server:
-            server.ehlo()
-            server.starttls(context=context)
-            server.login(self._smtp_user, self._smtp_password)
-            server.sendmail(self._smtp_user, to_address, message.as_string())
+        await self._smtp_pool().send(message)
 
         logger.info("Email notification delivered to %s.", to_address)
         return f"Email delivered to {to_address}."
@@ -126,18 +309,37 @@ class NotificationService:
     # SMS via Twilio
     # ------------------------------------------------------------------
 
-    def _send_sms(self, to_number: str, body: str) -> str:
+    async def _send_sms(self, to_number: str, body: str) -> str:
         """Send an SMS using the Twilio REST API."""
         if not self._twilio_account_sid or not self._twilio_auth_token:
             raise EnvironmentError("Twilio credentials are not set in environment variables.")
         if not self._twilio_from_number:
             raise EnvironmentError("TWILIO_FROM_NUMBER environment variable is not set.")
 
-        client = TwilioClient(self._twilio_account_sid, self._twilio_auth_token)
-        msg = client.messages.create(
-            body=body,
-            from_=self._twilio_from_number,
-            to=to_number,
+        response = await self._http_client().post(
+            f"{TWILIO_API_BASE}/2010-04-01/Accounts/{self._twilio_account_sid}/Messages.json",
+            data={"To": to_number, "From": self._twilio_from_number, "Body": body},
+            auth=(self._twilio_account_sid, self._twilio_auth_token),
         )
-        logger.info("SMS delivered to %s. SID: %s", to_number, msg.sid)
-        return f"SMS delivered to {to_number}. SID: {msg.sid}"
+        if response.status_code >= 300:
+            raise RuntimeError(
+                f"Twilio returned HTTP {response.status_code}: {response.text}"
+            )
+        sid = response.json().get("sid")
+        logger.info("SMS delivered to %s. SID: %s", to_number, sid)
+        return f"SMS delivered to {to_number}. SID: {sid}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        smtp = self._smtp
+        return {
+            **{
+                channel: {
+                    "sent": self._sent[channel].value,
+                    "failed": self._failed[channel].value,
+                    "latency": self._latency[channel].snapshot(),
+                }
+                for channel in CHANNELS
+            },
+            "smtp_sessions_opened": smtp.opened.value if smtp is not None else 0,
+            "smtp_reconnects": smtp.reconnects.value if smtp is not None else 0,
+        }
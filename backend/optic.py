@@ -0,0 +1,369 @@
+"""
+optic.py
+========
+TEJUSKA Cloud Intelligence
+OPTIC: Text-to-SQL NLP agent.
+Kept free of the ABACUS ML stack (torch/numpy) so API-only workers can
+serve natural-language queries without importing it.
+
+Two entry points share the pipeline (template intents -> cache -> LLM SQL
+-> guardrail -> read-only execution -> LLM answer). Template questions
+(optic_intents.py) never reach the LLM and read the pre-aggregated rollups
+(rollups.py) when their grain allows; other statements over
+consolidated_billing run on the Parquet analytics store
+(analytics_store.py) when one is configured. translate_and_execute() returns the
+finished (sql, answer), stream() yields each stage as it becomes available
+for the streaming /api/v1/query/stream endpoint.
+"""
+
+import os
+import time
+import logging
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import database
+import metrics
+import optic_intents
+import rollups
+from analytics_store import OPTIC_USE_ANALYTICS, AnalyticsStore
+from llm_client import LLMClient
+from optic_cache import TranslationCache
+from optic_intents import IntentMatch
+from optic_sql import QueryExecutionError, QueryExecutor, ResultSummary
+from sql_guard import OPTIC_MAX_PLAN_COST, GuardrailError, guard
+
+logger = logging.getLogger("tejuska.optic")
+
+# Bump when the billing schema or the prompts change so cached
+# translations produced against the old shape are not reused.
+OPTIC_SCHEMA_VERSION: str = os.environ.get("OPTIC_SCHEMA_VERSION", "2")
+
+
+OPTIC_LLM_MODEL = "gpt-4o"
+
+_SQL_SYSTEM_PROMPT = (
+    "You are a FinOps SQL expert. The user will ask a question about cloud costs. "
+    "You will generate a PostgreSQL query against the 'consolidated_billing' table. "
+    "Always filter by tenant_id = $1; the tenant is bound at execution time. "
+    "The table is partitioned by month of charge_period_start: filter time ranges with plain "
+    "comparisons on charge_period_start (e.g. charge_period_start >= '2025-01-01'). "
+    "Return ONLY the SQL statement, nothing else."
+)
+_ANSWER_SYSTEM_PROMPT = (
+    "The following SQL was run to answer the user's question. "
+    "Provide a concise, professional plain-English summary of the result. "
+    "If no result summary is given, describe what the query will return."
+)
+_STUB_SQL = (
+    "SELECT service_name, SUM(billed_cost) AS total_cost "
+    "FROM consolidated_billing "
+    "WHERE tenant_id = $1 "
+    "GROUP BY service_name ORDER BY total_cost DESC LIMIT 10;"
+)
+_STUB_ANSWER = (
+    "Your top 10 cloud services by billed cost for this period are listed. "
+    "Connect an OpenAI API key to enable live natural-language answers."
+)
+
+
+def _use_analytics(match: IntentMatch) -> bool:
+    """Rollup-routed templates are already cheap; the rest may run on the analytics store."""
+    return OPTIC_USE_ANALYTICS and "rollup" not in match.slots
+
+
+class OpticEngine:
+    """
+    Translates natural-language cost questions into SQL and answers them.
+    LLM-generated SQL is cached per tenant (see optic_cache.py); LLM calls
+    go through the shared, rate-limited LLMClient (see llm_client.py).
+    """
+
+    def __init__(self, llm: Optional[LLMClient] = None, analytics: Optional[AnalyticsStore] = None) -> None:
+        self._llm = llm if llm is not None else LLMClient()
+        self._cache = TranslationCache()
+        self._executor = QueryExecutor(analytics=analytics)
+        self._time_to_sql = metrics.LatencyTracker()
+        self._time_to_first_token = metrics.LatencyTracker()
+        self._streams = metrics.Counter()
+        self._intent_parse = metrics.LatencyTracker()
+        self._intent_hits = metrics.Counter()
+        self._intent_misses = metrics.Counter()
+        self._rollup_routed = metrics.Counter()
+        metrics.register("optic", self.snapshot)
+
+    # ------------------------------------------------------------------
+    # LLM calls
+    # ------------------------------------------------------------------
+
+    async def _generate_sql(self, tenant_id: str, query: str) -> str:
+        response = await self._llm.chat(
+            tenant_id,
+            model=OPTIC_LLM_MODEL,
+            messages=[
+                {"role": "system", "content": _SQL_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Question: {query}"},
+            ],
+            temperature=0.0,
+            max_tokens=512,
+        )
+        return response.choices[0].message.content.strip()
+
+    @staticmethod
+    def _answer_messages(query: str, sql: str, context: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": _ANSWER_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Question: {query}\nSQL: {sql}\n{context}"},
+        ]
+
+    # ------------------------------------------------------------------
+    # Guardrail + execution
+    # ------------------------------------------------------------------
+
+    async def _result_context(self, tenant_id: str, sql: str, guarded: bool = False) -> Tuple[str, str, bool]:
+        """
+        Guard (unless already guarded, as cached SQL is) and execute the SQL.
+        Returns (sql as run, prompt context, cacheable). When the guardrail
+        rejects the SQL, or execution fails, the context says so and the
+        answer describes the query instead of its data; such translations
+        are not cached.
+        """
+        if not guarded:
+            try:
+                sql = guard(sql).sql
+            except GuardrailError as exc:
+                logger.warning("OPTIC SQL rejected for tenant=%s: %s", tenant_id, exc)
+                return sql, f"The query was rejected by the SQL guardrail: {exc}", False
+        if not database.is_configured():
+            return sql, "The query was not executed (no database configured).", True
+        try:
+            summary = await self._executor.execute(
+                tenant_id, sql, tenant_id, max_cost=OPTIC_MAX_PLAN_COST, analytics=OPTIC_USE_ANALYTICS
+            )
+        except QueryExecutionError as exc:
+            logger.warning("OPTIC query execution failed for tenant=%s: %s", tenant_id, exc)
+            return sql, f"The query failed to execute: {exc}", False
+        return sql, f"Result summary:\n{summary.to_prompt()}", True
+
+    # ------------------------------------------------------------------
+    # Entry points
+    # ------------------------------------------------------------------
+
+    def _match_intent(self, query: str) -> Optional[IntentMatch]:
+        with self._intent_parse.time():
+            match = optic_intents.parse(query)
+        if match is None:
+            self._intent_misses.inc()
+            return None
+        self._intent_hits.inc()
+        routed = rollups.route(match)
+        if routed is not None:
+            self._rollup_routed.inc()
+            match = routed
+        logger.info(
+            "OPTIC intent '%s' matched; answering from %s without the LLM.",
+            match.intent, match.slots.get("rollup", "consolidated_billing"),
+        )
+        return match
+
+    async def translate_and_execute(
+        self, tenant_id: str, query: str
+    ) -> Tuple[str, str]:
+        """
+        Translate a natural-language query to SQL, execute it, and return
+        both the generated SQL and a plain-English answer.
+
+        Questions matching a template in optic_intents.py are answered
+        without any network call. Everything else goes to the OpenAI Chat
+        Completions API; without an API key a deterministic stub is
+        returned so that unit tests pass without network access. A cache
+        hit skips SQL generation only: the cached SQL is run again and the
+        answer is written from the fresh result.
+        """
+        match = self._match_intent(query)
+        if match is not None:
+            rows: Optional[List[Any]] = None
+            row_count = 0
+            if database.is_configured():
+                try:
+                    summary = await self._executor.execute(
+                        tenant_id, match.sql, tenant_id, *match.params, analytics=_use_analytics(match)
+                    )
+                    rows, row_count = summary.sample_rows, summary.row_count
+                except QueryExecutionError as exc:
+                    logger.warning("OPTIC template query failed for tenant=%s: %s", tenant_id, exc)
+            return match.sql, optic_intents.render_answer(match, rows, row_count)
+
+        if not self._llm.configured:
+            logger.warning("OPENAI_API_KEY not set; returning stub response.")
+            return _STUB_SQL, _STUB_ANSWER
+
+        cached = self._cache.get(tenant_id, OPTIC_SCHEMA_VERSION, query)
+        if cached is not None:
+            logger.info(
+                "OPTIC cache hit (%s, similarity=%.3f) for tenant=%s.",
+                cached.tier, cached.similarity, tenant_id,
+            )
+            generated_sql, llm_ms = cached.sql, 0.0
+        else:
+            started = time.perf_counter()
+            generated_sql = await self._generate_sql(tenant_id, query)
+            llm_ms = (time.perf_counter() - started) * 1000
+
+        generated_sql, context, cacheable = await self._result_context(
+            tenant_id, generated_sql, guarded=cached is not None
+        )
+
+        # Convert SQL result to natural language
+        answer_response = await self._llm.chat(
+            tenant_id,
+            model=OPTIC_LLM_MODEL,
+            messages=self._answer_messages(query, generated_sql, context),
+            temperature=0.3,
+            max_tokens=256,
+        )
+        answer: str = answer_response.choices[0].message.content.strip()
+        if cacheable and cached is None:
+            self._cache.put(tenant_id, OPTIC_SCHEMA_VERSION, query, generated_sql, llm_ms=llm_ms)
+        return generated_sql, answer
+
+    async def stream(self, tenant_id: str, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer a question as a sequence of events, each yielded as soon as
+        it is known:
+
+          {"event": "sql", "sql", "params", "intent", "cached"}
+                                                SQL as it will run, before execution
+          {"event": "columns", "columns"}       result column names
+          {"event": "rows", "rows"}             one chunk per cursor fetch
+          {"event": "error", "detail"}          guardrail or execution failure;
+                                                the answer still follows
+          {"event": "token", "text"}            answer fragments from the LLM
+          {"event": "done", "answer", "row_count", "truncated"}
+
+        Template questions (optic_intents.py) skip both LLM calls and
+        answer in a single token. A cache hit skips SQL generation only:
+        the cached SQL runs again and the answer streams from the fresh
+        result. Close the generator (contextlib.aclosing) when abandoning
+        it early so the database connection is released.
+        """
+        started = time.perf_counter()
+        self._streams.inc()
+
+        match = self._match_intent(query)
+        if match is None and not self._llm.configured:
+            logger.warning("OPENAI_API_KEY not set; returning stub response.")
+            self._time_to_sql.observe((time.perf_counter() - started) * 1000)
+            yield {"event": "sql", "sql": _STUB_SQL, "params": [], "intent": None, "cached": None}
+            self._time_to_first_token.observe((time.perf_counter() - started) * 1000)
+            yield {"event": "token", "text": _STUB_ANSWER}
+            yield {"event": "done", "answer": _STUB_ANSWER, "row_count": 0, "truncated": False}
+            return
+
+        rejection: Optional[str] = None
+        cached = None
+        llm_ms = 0.0
+        params: Tuple[Any, ...] = ()
+        max_cost: Optional[float] = OPTIC_MAX_PLAN_COST
+        analytics = OPTIC_USE_ANALYTICS
+        if match is not None:
+            # Fixed, reviewed templates: no guardrail rewrite or EXPLAIN round trip needed.
+            sql, params, max_cost = match.sql, match.params, None
+            analytics = _use_analytics(match)
+        else:
+            cached = self._cache.get(tenant_id, OPTIC_SCHEMA_VERSION, query)
+            if cached is not None:
+                logger.info(
+                    "OPTIC cache hit (%s, similarity=%.3f) for tenant=%s.",
+                    cached.tier, cached.similarity, tenant_id,
+                )
+                sql = cached.sql  # only guarded SQL is ever cached
+            else:
+                sql = await self._generate_sql(tenant_id, query)
+                llm_ms = (time.perf_counter() - started) * 1000
+                try:
+                    sql = guard(sql).sql
+                except GuardrailError as exc:
+                    logger.warning("OPTIC SQL rejected for tenant=%s: %s", tenant_id, exc)
+                    rejection = f"The query was rejected by the SQL guardrail: {exc}"
+
+        self._time_to_sql.observe((time.perf_counter() - started) * 1000)
+        yield {
+            "event": "sql",
+            "sql": sql,
+            "params": list(params),
+            "intent": match.intent if match is not None else None,
+            "cached": cached.tier if cached is not None else None,
+        }
+
+        summary = ResultSummary([])
+        executed = False
+        cacheable = rejection is None
+        if rejection is not None:
+            context = rejection
+            yield {"event": "error", "detail": rejection}
+        elif not database.is_configured():
+            context = "The query was not executed (no database configured)."
+        else:
+            try:
+                chunks = self._executor.summarize(
+                    tenant_id, sql, tenant_id, *params, max_cost=max_cost, analytics=analytics
+                )
+                async with aclosing(chunks):
+                    async for chunk_summary, rows in chunks:
+                        if chunk_summary is not summary:
+                            summary = chunk_summary
+                            yield {"event": "columns", "columns": summary.columns}
+                        if rows:
+                            yield {"event": "rows", "rows": [list(row) for row in rows]}
+                executed = True
+                context = f"Result summary:\n{summary.to_prompt()}"
+            except QueryExecutionError as exc:
+                logger.warning("OPTIC query execution failed for tenant=%s: %s", tenant_id, exc)
+                context = f"The query failed to execute: {exc}"
+                cacheable = False
+                yield {"event": "error", "detail": context}
+
+        if match is not None:
+            rows = summary.sample_rows if executed else None
+            answer = optic_intents.render_answer(match, rows, summary.row_count)
+            self._time_to_first_token.observe((time.perf_counter() - started) * 1000)
+            yield {"event": "token", "text": answer}
+        else:
+            parts: List[str] = []
+            response = self._llm.stream_chat(
+                tenant_id,
+                model=OPTIC_LLM_MODEL,
+                messages=self._answer_messages(query, sql, context),
+                temperature=0.3,
+                max_tokens=256,
+            )
+            async with aclosing(response):
+                async for chunk in response:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        if not parts:
+                            self._time_to_first_token.observe((time.perf_counter() - started) * 1000)
+                        parts.append(text)
+                        yield {"event": "token", "text": text}
+            answer = "".join(parts).strip()
+            if cacheable and cached is None:
+                self._cache.put(tenant_id, OPTIC_SCHEMA_VERSION, query, sql, llm_ms=llm_ms)
+
+        yield {
+            "event": "done",
+            "answer": answer,
+            "row_count": summary.row_count,
+            "truncated": summary.truncated,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "streams": self._streams.value,
+            "intent_hits": self._intent_hits.value,
+            "intent_misses": self._intent_misses.value,
+            "rollup_routed": self._rollup_routed.value,
+            "intent_parse": self._intent_parse.snapshot(),
+            "time_to_sql": self._time_to_sql.snapshot(),
+            "time_to_first_token": self._time_to_first_token.snapshot(),
+        }
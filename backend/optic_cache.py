@@ -0,0 +1,203 @@
+"""
+optic_cache.py
+==============
+TEJUSKA Cloud Intelligence
+Two-tier translation cache for OPTIC. Only the guarded SQL is cached;
+answers are always written from a fresh result.
+
+Tier 1 is an exact match on the normalised question. Tier 2 compares hashed
+character/word n-gram vectors by cosine similarity, so "what did we spend
+on AWS last month" and "AWS spend, last month?" can share one LLM
+translation. Questions only match across tier 2 when they differ by
+stopwords and generic cost wording alone: every other token (numbers,
+periods, providers, dimensions, tag keys and values, account names) must be
+identical, so "last month" never answers "this month" and "environment
+production" never answers "environment staging".
+
+Entries are scoped per tenant and per schema version, expire after a TTL
+and are evicted least-recently-used beyond a per-tenant cap. Pure Python so
+API-only workers stay free of numpy/torch.
+"""
+
+import os
+import re
+import math
+import time
+import zlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger("tejuska.optic_cache")
+
+OPTIC_CACHE_TTL_SECONDS: float = float(os.environ.get("OPTIC_CACHE_TTL_SECONDS", "3600"))
+OPTIC_CACHE_MAX_PER_TENANT: int = int(os.environ.get("OPTIC_CACHE_MAX_PER_TENANT", "256"))
+OPTIC_CACHE_SIMILARITY: float = float(os.environ.get("OPTIC_CACHE_SIMILARITY", "0.90"))
+OPTIC_CACHE_DIMENSIONS: int = int(os.environ.get("OPTIC_CACHE_DIMENSIONS", "4096"))
+
+# Words that never change what a question asks for: cost synonyms and
+# filler. Every other non-stopword token is part of a question's signature.
+_GENERIC = frozenset({
+    "cost", "costs", "spend", "spending", "spent", "amount", "total",
+    "how", "much", "did", "do", "does", "we", "was", "were", "have", "has", "been",
+    "i", "us", "you", "can", "give", "tell", "see", "get", "list", "and", "with",
+})
+_TOKEN = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = frozenset({"a", "an", "the", "of", "for", "in", "on", "by", "to", "my", "our", "me", "show", "what", "are", "is", "please"})
+
+SparseVector = Dict[int, float]
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, strip punctuation and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(_TOKEN.findall(text))
+
+
+def _signature(tokens) -> FrozenSet[str]:
+    return frozenset(t for t in tokens if t not in _STOPWORDS and t not in _GENERIC)
+
+
+def ngram_vector(normalized: str, dimensions: int = OPTIC_CACHE_DIMENSIONS) -> SparseVector:
+    """
+    L2-normalised hashed vector of word unigrams/bigrams and character
+    trigrams. Stable across processes (crc32, not hash()).
+    """
+    words = [w for w in normalized.split() if w not in _STOPWORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    joined = f" {' '.join(words)} "
+    features += [joined[i:i + 3] for i in range(len(joined) - 2)]
+
+    vector: SparseVector = {}
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        index = h % dimensions
+        vector[index] = vector.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+
+def cosine(a: SparseVector, b: SparseVector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class _Entry(NamedTuple):
+    vector: SparseVector
+    signature: FrozenSet[str]
+    sql: str
+    llm_ms: float
+    expires_at: float
+
+
+class CacheHit(NamedTuple):
+    sql: str
+    tier: str          # 'exact' | 'similar'
+    similarity: float
+
+
+class TranslationCache:
+    """
+    Per-tenant LRU + TTL cache of question -> SQL translations.
+
+    Parameters
+    ----------
+    ttl_seconds    : Lifetime of an entry.
+    max_per_tenant : LRU cap on entries per tenant.
+    similarity     : Minimum cosine similarity for a tier-2 hit.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = OPTIC_CACHE_TTL_SECONDS,
+        max_per_tenant: int = OPTIC_CACHE_MAX_PER_TENANT,
+        similarity: float = OPTIC_CACHE_SIMILARITY,
+    ) -> None:
+        self._ttl = ttl_seconds
+        self._max_per_tenant = max_per_tenant
+        self._similarity = similarity
+        self._tenants: Dict[Tuple[str, str], "OrderedDict[str, _Entry]"] = {}
+
+        self._lookups = metrics.Counter()
+        self._exact_hits = metrics.Counter()
+        self._similar_hits = metrics.Counter()
+        self._evictions = metrics.Counter()
+        self._saved_ms = 0.0
+        metrics.register("optic_cache", self.snapshot)
+
+    def get(self, tenant_id: str, schema_version: str, query: str) -> Optional[CacheHit]:
+        """Return a cached translation for the question, or None."""
+        self._lookups.inc()
+        entries = self._tenants.get((tenant_id, schema_version))
+        if not entries:
+            return None
+        now = time.monotonic()
+        normalized = normalize_query(query)
+
+        entry = entries.get(normalized)
+        if entry is not None and entry.expires_at > now:
+            entries.move_to_end(normalized)
+            self._exact_hits.inc()
+            self._saved_ms += entry.llm_ms
+            return CacheHit(entry.sql, "exact", 1.0)
+
+        vector = ngram_vector(normalized)
+        signature = _signature(normalized.split())
+        best_key, best_score = None, self._similarity
+        expired = []
+        for key, candidate in entries.items():
+            if candidate.expires_at <= now:
+                expired.append(key)
+            elif candidate.signature == signature:
+                score = cosine(vector, candidate.vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+        for key in expired:
+            del entries[key]
+
+        if best_key is None:
+            return None
+        entries.move_to_end(best_key)
+        entry = entries[best_key]
+        self._similar_hits.inc()
+        self._saved_ms += entry.llm_ms
+        return CacheHit(entry.sql, "similar", round(best_score, 4))
+
+    def put(self, tenant_id: str, schema_version: str, query: str, sql: str, llm_ms: float) -> None:
+        """Store a translation; llm_ms is the latency a future hit saves."""
+        normalized = normalize_query(query)
+        entries = self._tenants.setdefault((tenant_id, schema_version), OrderedDict())
+        entries[normalized] = _Entry(
+            vector=ngram_vector(normalized),
+            signature=_signature(normalized.split()),
+            sql=sql,
+            llm_ms=llm_ms,
+            expires_at=time.monotonic() + self._ttl,
+        )
+        entries.move_to_end(normalized)
+        while len(entries) > self._max_per_tenant:
+            entries.popitem(last=False)
+            self._evictions.inc()
+
+    def invalidate(self, tenant_id: str) -> None:
+        """Drop every cached translation for a tenant (all schema versions)."""
+        for key in [k for k in self._tenants if k[0] == tenant_id]:
+            del self._tenants[key]
+
+    def snapshot(self) -> Dict[str, float]:
+        lookups = self._lookups.value
+        hits = self._exact_hits.value + self._similar_hits.value
+        return {
+            "lookups": lookups,
+            "exact_hits": self._exact_hits.value,
+            "similar_hits": self._similar_hits.value,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "saved_llm_ms": round(self._saved_ms, 1),
+            "evictions": self._evictions.value,
+            "entries": sum(len(entries) for entries in self._tenants.values()),
+            "tenants": len(self._tenants),
+        }
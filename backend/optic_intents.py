@@ -0,0 +1,526 @@
+"""
+optic_intents.py
+================
+TEJUSKA Cloud Intelligence
+Deterministic Text-to-SQL for the common FinOps question shapes.
+
+Most OPTIC questions are one of a few templates:
+  top_n      "top 5 services last month", "most expensive regions on AWS"
+  breakdown  "spend by provider this quarter", "cost per region in March"
+  total      "how much did we spend on Azure yesterday?"
+  mom        "month over month change by service"
+  untagged   "untagged cost last month", "cost missing the CostCenter tag"
+             (breakdown also covers "cost by tag team")
+  trend      "daily spend for the last 14 days"
+parse() recognises them with regular expressions, extracts the slots
+(period, provider, N, tag key, dimension, cost column) and returns
+parameterised SQL against consolidated_billing, with $1 bound to the
+tenant. No network call is made; anything it does not recognise with
+confidence returns None and falls through to the LLM. That includes any
+question naming something the slots cannot hold ("spend on EC2", "top
+services in us-east-1"): every word must be template vocabulary, a
+number or the tag key.
+"""
+
+import re
+import calendar
+import unicodedata
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 100
+DEFAULT_PERIOD_DAYS = 30
+UNTAGGED_VALUE = "(untagged)"
+
+# dimension -> (SQL expression, output column)
+DIMENSIONS: Dict[str, Tuple[str, str]] = {
+    "service":  ("service_name", "service_name"),
+    "provider": ("provider_name", "provider_name"),
+    "region":   ("COALESCE(region_name, region_id, 'unknown')", "region"),
+    "account":  ("COALESCE(billing_account_name, billing_account_id)", "billing_account"),
+    "resource": ("COALESCE(resource_id, 'unassigned')", "resource_id"),
+    "category": ("COALESCE(service_category, 'Uncategorized')", "service_category"),
+}
+# canonical provider -> lower-cased provider_name values it covers
+PROVIDERS: Dict[str, List[str]] = {
+    "AWS":   ["aws", "amazon web services", "amazon"],
+    "Azure": ["azure", "microsoft", "microsoft azure"],
+    "GCP":   ["gcp", "google cloud", "google cloud platform", "google"],
+}
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20, "fifty": 50,
+}
+
+_RELATIVE_PERIOD = re.compile(
+    r"\b(?:last|past|previous|trailing)\s+(\d{1,3}|" + "|".join(_NUMBER_WORDS) + r")\s+(day|week|month)s?\b"
+)
+_DIMENSION_WORDS = (
+    r"(?P<dim>(?:service\s+)?categor(?:y|ies)|services?|providers?|clouds?|regions?|accounts?|resources?)"
+)
+_PROVIDER = re.compile(r"\b(aws|amazon(?: web services)?|azure|microsoft|gcp|google(?: cloud)?)\b")
+_TOP_N = re.compile(
+    r"\b(?:top|most expensive|highest|biggest|largest|costliest|priciest)\s+(?:(?P<n>\d{1,3}|"
+    + "|".join(_NUMBER_WORDS) + r")\s+)?(?:cost(?:ing)?\s+|spend(?:ing)?\s+)?" + _DIMENSION_WORDS + r"\b"
+)
+_WHICH_MOST = re.compile(r"\bwhich\s+" + _DIMENSION_WORDS + r"\s+(?:cost|spent?|used)\s+(?:the\s+)?most\b")
+_BY_TAG = re.compile(
+    r"\b(?:by|per|for each|grouped by|split by)\s+(?:the\s+)?(?:tag\s+(?:key\s+)?(?P<key>[\w:./-]+)|(?P<key2>[\w:./-]+)\s+tag)\b"
+)
+_BREAKDOWN = re.compile(r"\b(?:by|per|across|for each|breakdown of|split by|grouped by)\s+" + _DIMENSION_WORDS + r"\b")
+_MOM = re.compile(
+    r"\bmonth[\s-]*(?:over|on)[\s-]*month\b|\bmom\b"
+    r"|\b(?:compared?|vs|versus)\s+(?:to\s+|with\s+)?(?:the\s+)?(?:last|previous|prior)\s+month\b"
+    r"|\b(?:change|delta|difference|increase|decrease|growth)\s+(?:from|since|over|vs|versus)\s+(?:the\s+)?(?:last|previous|prior)\s+month\b"
+)
+_UNTAGGED = re.compile(
+    r"\buntagged\b|\bwithout\s+(?:any\s+)?tags\b|\bno\s+tags\b"
+    r"|\b(?:missing|without|lacking|no)\s+(?:an?\s+|the\s+)?(?P<key>[\w:./-]+)\s+tag\b"
+    r"|\b(?:missing|without|lacking)\s+(?:an?\s+|the\s+)?tag\s+(?P<key2>[\w:./-]+)"
+)
+_TREND = re.compile(
+    r"\b(?P<grain>daily|weekly|monthly)\s+(?:spend|cost|costs|bill|trend|breakdown)\b"
+    r"|\b(?:spend|cost|costs)\s+(?:per|by|each)\s+(?P<grain2>day|week|month)\b"
+    r"|\b(?:cost|spend)\s+trend\b|\btrend\s+(?:of|in)\s+(?:our\s+)?(?:cost|spend)\b"
+)
+_TOTAL = re.compile(
+    r"\b(?:how much|total|overall|what)\b.*\b(?:spend|spent|spending|cost|costs|bill|billed)\b"
+    r"|\bwhat did we spend\b"
+)
+# Shapes the templates would silently get wrong: leave them to the LLM.
+_UNSUPPORTED = re.compile(
+    r"\b(?:except|excluding|exclude|not|other than|besides|where|forecast|predict|will|next|average|avg|median"
+    r"|percentile|per hour|hourly|anomal\w*|why)\b"
+)
+_COST_EFFECTIVE = re.compile(r"\b(?:amorti[sz]ed|effective|net)\b")
+_TAG_KEY_QUOTED = re.compile(r"""tag\s+(?:key\s+)?["'`](?P<key>[^"'`]+)["'`]|["'`](?P<key2>[^"'`]+)["'`]\s+tag""", re.I)
+
+# Every word a template question may contain besides numbers and a tag key;
+# anything else names an entity the slots cannot express.
+_VOCABULARY = frozenset(
+    """
+    a an the of for in on at by to from over during within across per each so far up until since
+    we our us i my me you your it its is are was were be been do does did has have had
+    what whats which how much many show give list tell please can could would get see break down
+    total overall all sum spend spent spending cost costs costing bill bills billed billing
+    charges charged paid pay money amount usage
+    top most expensive highest biggest largest costliest priciest used
+    breakdown split grouped group change delta difference increase decrease growth
+    compare compared comparison vs versus mom
+    untagged tagged tag tags key missing without lacking no any
+    daily weekly monthly trend trends day days week weeks month months quarter quarters year years
+    today yesterday this current last past previous prior trailing date mtd qtd ytd wtd
+    amortized amortised effective net
+    service services category categories provider providers cloud clouds region regions
+    account accounts resource resources
+    aws amazon web azure microsoft gcp google platform
+    """.split()
+) | frozenset(_MONTHS) | frozenset(_NUMBER_WORDS)
+
+_GRAINS = {"day": "day", "daily": "day", "week": "week", "weekly": "week", "month": "month", "monthly": "month"}
+_GRAIN_LABELS = {"day": "Daily", "week": "Weekly", "month": "Monthly"}
+
+
+class Period(NamedTuple):
+    label: str
+    start: datetime   # inclusive, UTC midnight
+    end: datetime     # exclusive, UTC midnight
+
+    def describe(self) -> str:
+        last = (self.end - timedelta(days=1)).date()
+        first = self.start.date()
+        span = first.isoformat() if first == last else f"{first.isoformat()} to {last.isoformat()}"
+        return f"{self.label} ({span})"
+
+
+class IntentMatch(NamedTuple):
+    intent: str                 # top_n | breakdown | total | mom | untagged | trend
+    sql: str                    # $1 is the tenant; params bind $2..
+    params: Tuple[Any, ...]
+    slots: Dict[str, Any]
+    description: str
+
+
+# ---------------------------------------------------------------------------
+# Slot extraction
+# ---------------------------------------------------------------------------
+
+def _utc(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _span(label: str, first: date, end_exclusive: date) -> Period:
+    return Period(label, _utc(first), _utc(end_exclusive))
+
+
+def parse_period(text: str, today: date) -> Optional[Period]:
+    """Resolve the first period expression in normalised text, or None."""
+    tomorrow = today + timedelta(days=1)
+    month_start = today.replace(day=1)
+    quarter_start = date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+
+    match = _RELATIVE_PERIOD.search(text)
+    if match:
+        count = _count(match.group(1))
+        unit = match.group(2)
+        if count < 1:
+            return None
+        if unit == "month":
+            first = _add_months(tomorrow, -count)
+        else:
+            first = tomorrow - timedelta(days=count * (7 if unit == "week" else 1))
+        return _span(f"the last {count} {unit}{'s' if count > 1 else ''}", first, tomorrow)
+    if re.search(r"\btoday\b", text):
+        return _span("today", today, tomorrow)
+    if re.search(r"\byesterday\b", text):
+        return _span("yesterday", today - timedelta(days=1), today)
+    if re.search(r"\b(?:this|current)\s+week\b|\bweek to date\b|\bwtd\b", text):
+        return _span("this week", today - timedelta(days=today.weekday()), tomorrow)
+    if re.search(r"\b(?:last|previous|prior)\s+week\b", text):
+        monday = today - timedelta(days=today.weekday())
+        return _span("last week", monday - timedelta(days=7), monday)
+    if re.search(r"\b(?:this|current)\s+month\b|\bmonth to date\b|\bmtd\b", text):
+        return _span("this month", month_start, tomorrow)
+    if re.search(r"\b(?:last|previous|prior)\s+month\b", text):
+        return _span("last month", _add_months(month_start, -1), month_start)
+    if re.search(r"\b(?:this|current)\s+quarter\b|\bquarter to date\b|\bqtd\b", text):
+        return _span("this quarter", quarter_start, tomorrow)
+    if re.search(r"\b(?:last|previous|prior)\s+quarter\b", text):
+        return _span("last quarter", _add_months(quarter_start, -3), quarter_start)
+    if re.search(r"\b(?:this|current)\s+year\b|\byear to date\b|\bytd\b", text):
+        return _span("this year", date(today.year, 1, 1), tomorrow)
+    if re.search(r"\b(?:last|previous|prior)\s+year\b", text):
+        return _span("last year", date(today.year - 1, 1, 1), date(today.year, 1, 1))
+
+    match = re.search(r"\b(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\b(?:\s+(20\d{2}))?", text)
+    if match and not (match.group(1) == "may" and not match.group(2)):  # "may" is usually the verb
+        month = _MONTHS[match.group(1)]
+        year = int(match.group(2)) if match.group(2) else (today.year if month <= today.month else today.year - 1)
+        first = date(year, month, 1)
+        return _span(first.strftime("%B %Y"), first, _add_months(first, 1))
+    match = re.search(r"\b(20\d{2})\b", text)
+    if match:
+        year = int(match.group(1))
+        return _span(str(year), date(year, 1, 1), date(year + 1, 1, 1))
+    return None
+
+
+def parse_provider(text: str) -> Optional[str]:
+    match = _PROVIDER.search(text)
+    if match is None:
+        return None
+    word = match.group(1)
+    if word.startswith(("aws", "amazon")):
+        return "AWS"
+    if word in ("azure", "microsoft"):
+        return "Azure"
+    return "GCP"
+
+
+def _dimension(word: Optional[str]) -> Optional[str]:
+    if not word:
+        return None
+    word = word.split()[-1]
+    if word.startswith("categor"):
+        return "category"
+    if word.startswith("cloud"):
+        return "provider"
+    return word.rstrip("s")
+
+
+def _select(dimension: str) -> str:
+    expression, alias = DIMENSIONS[dimension]
+    return expression if expression == alias else f"{expression} AS {alias}"
+
+
+def _plural(dimension: str) -> str:
+    return "categories" if dimension == "category" else f"{dimension}s"
+
+
+def _count(word: str) -> int:
+    return int(word) if word.isdigit() else _NUMBER_WORDS[word]
+
+
+def _top_n(value: Optional[str]) -> int:
+    if not value:
+        return DEFAULT_TOP_N
+    return max(1, min(_count(value), MAX_TOP_N))
+
+
+def _tag_key(original: str, match: "re.Match[str]") -> Optional[str]:
+    quoted = _TAG_KEY_QUOTED.search(original)
+    if quoted:
+        return quoted.group("key") or quoted.group("key2")
+    key = match.group("key") or match.group("key2")
+    if not key or key in ("a", "any", "cost", "costs", "spend"):
+        return None
+    # Recover the original casing: tag keys are case-sensitive in JSONB.
+    original_key = re.search(re.escape(key), original, re.I)
+    return original_key.group(0) if original_key else key
+
+
+def normalize(query: str) -> str:
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = re.sub(r"[^\w:./\-\s]", " ", text)
+    text = re.sub(r"\bnot\s+tagged\b", "untagged", text)
+    return " ".join(text.split())
+
+
+# ---------------------------------------------------------------------------
+# SQL templates
+# ---------------------------------------------------------------------------
+
+class Params:
+    """
+    Collects bind values; $1 is reserved for the tenant. Shared by every
+    module that builds tenant-scoped SQL (rollups.py, dashboard.py).
+    """
+
+    def __init__(self) -> None:
+        self.values: List[Any] = []
+
+    def __call__(self, value: Any) -> str:
+        self.values.append(value)
+        return f"${len(self.values) + 1}"
+
+
+def _filters(bind: Params, period: Period, provider: Optional[str]) -> str:
+    clauses = ["tenant_id = $1", f"charge_period_start >= {bind(period.start)}", f"charge_period_start < {bind(period.end)}"]
+    if provider:
+        clauses.append(f"lower(provider_name) = ANY({bind(PROVIDERS[provider])}::text[])")
+    return " AND ".join(clauses)
+
+
+def _unparsed(text: str, tag_key: Optional[str]) -> List[str]:
+    """Words of the question no template slot accounts for."""
+    ignored = set(normalize(tag_key).split()) if tag_key else set()
+    return [
+        word for word in text.split()
+        if word not in _VOCABULARY and word not in ignored and not word.isdigit()
+    ]
+
+
+def parse(query: str, today: Optional[date] = None) -> Optional[IntentMatch]:
+    """
+    Match a question against the templates.
+    Returns an IntentMatch with parameterised SQL, or None to use the LLM.
+    """
+    text = normalize(query)
+    if not text or _UNSUPPORTED.search(text):
+        return None
+    relative = _RELATIVE_PERIOD.search(text)
+    if relative and _count(relative.group(1)) < 1:
+        return None  # "last 0 days" is empty, not the default period
+    if len(set(map(parse_provider, _PROVIDER.findall(text)))) > 1:
+        return None  # the provider slot holds one provider
+    match = _match(query, text, today or datetime.now(timezone.utc).date())
+    if match is None or _unparsed(text, match.slots.get("tag_key")):
+        return None
+    return match
+
+
+def _match(query: str, text: str, today: date) -> Optional[IntentMatch]:
+    provider = parse_provider(text)
+    cost = "effective_cost" if _COST_EFFECTIVE.search(text) else "billed_cost"
+    cost_label = "effective cost" if cost == "effective_cost" else "billed cost"
+    on = f" on {provider}" if provider else ""
+    bind = Params()
+
+    if _MOM.search(text):
+        dimension, top = None, _TOP_N.search(text)
+        for pattern in (_BREAKDOWN, _TOP_N, _WHICH_MOST):
+            found = pattern.search(text)
+            if found:
+                dimension = _dimension(found.group("dim"))
+                break
+        period = parse_period(text, today)
+        if period is None or period.label in ("today", "yesterday"):
+            month_start = today.replace(day=1)
+            period = _span("last month", _add_months(month_start, -1), month_start)
+        # Same span one month earlier, so month-to-date compares like for like.
+        previous = _span(
+            "the previous month",
+            _add_months(period.start.date(), -1),
+            _add_months(period.end.date(), -1),
+        )
+        current_from, current_to = bind(period.start), bind(period.end)
+        previous_from, previous_to = bind(previous.start), bind(previous.end)
+        in_current = f"charge_period_start >= {current_from} AND charge_period_start < {current_to}"
+        in_previous = f"charge_period_start >= {previous_from} AND charge_period_start < {previous_to}"
+        where = f"tenant_id = $1 AND (({in_current}) OR ({in_previous}))"
+        if provider:
+            where += f" AND lower(provider_name) = ANY({bind(PROVIDERS[provider])}::text[])"
+        sums = (
+            f"COALESCE(SUM({cost}) FILTER (WHERE {in_current}), 0) AS current_cost, "
+            f"COALESCE(SUM({cost}) FILTER (WHERE {in_previous}), 0) AS previous_cost"
+        )
+        versus = f"{period.describe()} vs {previous.describe()}"
+        if dimension:
+            n = _top_n(top.group("n") if top else None)
+            sql = (
+                f"SELECT {DIMENSIONS[dimension][1]}, current_cost, previous_cost, current_cost - previous_cost AS delta "
+                f"FROM (SELECT {_select(dimension)}, {sums} FROM consolidated_billing WHERE {where} GROUP BY 1) AS months "
+                f"ORDER BY ABS(current_cost - previous_cost) DESC LIMIT {n}"
+            )
+            description = f"Month-over-month change in {cost_label} by {dimension}{on}, {versus}"
+        else:
+            sql = (
+                f"SELECT current_cost, previous_cost, current_cost - previous_cost AS delta "
+                f"FROM (SELECT {sums} FROM consolidated_billing WHERE {where}) AS months"
+            )
+            description = f"Month-over-month change in {cost_label}{on}, {versus}"
+        slots = {
+            "period": period.label, "start": period.start, "end": period.end,
+            "previous_start": previous.start, "previous_end": previous.end,
+            "provider": provider, "dimension": dimension, "cost": cost,
+            "n": _top_n(top.group("n") if top else None) if dimension else None,
+        }
+        return IntentMatch("mom", sql, tuple(bind.values), slots, description)
+
+    period = parse_period(text, today)
+    if period is None:
+        tomorrow = today + timedelta(days=1)
+        period = _span(
+            f"the last {DEFAULT_PERIOD_DAYS} days", tomorrow - timedelta(days=DEFAULT_PERIOD_DAYS), tomorrow
+        )
+    slots: Dict[str, Any] = {
+        "period": period.label, "start": period.start, "end": period.end, "provider": provider, "cost": cost,
+    }
+
+    untagged = _UNTAGGED.search(text)
+    if untagged:
+        key = _tag_key(query, untagged)
+        where = _filters(bind, period, provider)
+        if key:
+            missing = f"tags ->> {bind(key)} IS NULL"
+            what = f"resources missing the '{key}' tag"
+        else:
+            missing = "(tags IS NULL OR tags = '{}'::jsonb)"
+            what = "untagged resources"
+        sql = (
+            f"SELECT COALESCE(SUM({cost}) FILTER (WHERE {missing}), 0) AS untagged_cost, "
+            f"COALESCE(SUM({cost}), 0) AS total_cost, "
+            f"COUNT(DISTINCT resource_id) FILTER (WHERE {missing}) AS untagged_resources "
+            f"FROM consolidated_billing WHERE {where}"
+        )
+        slots["tag_key"] = key
+        return IntentMatch("untagged", sql, tuple(bind.values), slots,
+                           f"{cost_label.capitalize()} of {what}{on} for {period.describe()}")
+
+    trend = _TREND.search(text)
+    if trend:
+        grain = _GRAINS[trend.group("grain") or trend.group("grain2") or "day"]
+        where = _filters(bind, period, provider)
+        sql = (
+            f"SELECT DATE_TRUNC('{grain}', charge_period_start) AS period_start, SUM({cost}) AS total_cost "
+            f"FROM consolidated_billing WHERE {where} GROUP BY 1 ORDER BY 1 LIMIT 1000"
+        )
+        slots["grain"] = grain
+        return IntentMatch("trend", sql, tuple(bind.values), slots,
+                           f"{_GRAIN_LABELS[grain]} {cost_label}{on} for {period.describe()}")
+
+    by_tag = _BY_TAG.search(text)
+    if by_tag:
+        key = _tag_key(query, by_tag)
+        if key is None:
+            return None
+        where = _filters(bind, period, provider)
+        sql = (
+            f"SELECT COALESCE(tags ->> {bind(key)}, '{UNTAGGED_VALUE}') AS tag_value, SUM({cost}) AS total_cost "
+            f"FROM consolidated_billing WHERE {where} GROUP BY 1 ORDER BY total_cost DESC LIMIT {MAX_TOP_N}"
+        )
+        slots.update(dimension="tag", tag_key=key, n=MAX_TOP_N)
+        return IntentMatch("breakdown", sql, tuple(bind.values), slots,
+                           f"{cost_label.capitalize()} by tag '{key}'{on} for {period.describe()}")
+
+    top = _TOP_N.search(text) or _WHICH_MOST.search(text)
+    breakdown = _BREAKDOWN.search(text)
+    if top or breakdown:
+        found = top or breakdown
+        dimension = _dimension(found.group("dim"))
+        if dimension == "provider" and provider:
+            return None  # "top providers on AWS" is not a question the template answers
+        n = _top_n(top.groupdict().get("n")) if top else MAX_TOP_N
+        where = _filters(bind, period, provider)
+        sql = (
+            f"SELECT {_select(dimension)}, SUM({cost}) AS total_cost "
+            f"FROM consolidated_billing WHERE {where} GROUP BY 1 ORDER BY total_cost DESC LIMIT {n}"
+        )
+        slots.update(dimension=dimension, n=n)
+        if top:
+            description = f"Top {n} {dimension if n == 1 else _plural(dimension)} by {cost_label}{on} for {period.describe()}"
+            return IntentMatch("top_n", sql, tuple(bind.values), slots, description)
+        description = f"{cost_label.capitalize()} by {dimension}{on} for {period.describe()}"
+        return IntentMatch("breakdown", sql, tuple(bind.values), slots, description)
+
+    if _TOTAL.search(text):
+        where = _filters(bind, period, provider)
+        sql = f"SELECT COALESCE(SUM({cost}), 0) AS total_cost FROM consolidated_billing WHERE {where}"
+        return IntentMatch("total", sql, tuple(bind.values), slots,
+                           f"Total {cost_label}{on} for {period.describe()}")
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Answers
+# ---------------------------------------------------------------------------
+
+def _money(value: Any) -> str:
+    return f"${float(value or 0):,.2f}"
+
+
+def render_answer(match: IntentMatch, rows: Optional[Sequence[Sequence[Any]]], row_count: int = 0) -> str:
+    """
+    Plain-English answer for a template result. rows is None when the query
+    was not executed; then the answer describes what it would return.
+    """
+    if rows is None:
+        return f"{match.description}."
+    if not rows:
+        return f"{match.description}: no matching costs were found."
+
+    if match.intent in ("top_n", "breakdown"):
+        listed = "; ".join(f"{name}: {_money(total)}" for name, total in rows[:10])
+        more = f" (and {row_count - 10} more)" if row_count > 10 else ""
+        return f"{match.description}: {listed}{more}."
+    if match.intent == "total":
+        return f"{match.description}: {_money(rows[0][0])}."
+    if match.intent == "untagged":
+        untagged, total, resources = rows[0]
+        share = float(untagged or 0) / float(total) * 100 if total else 0.0
+        # Rollup-served answers cannot count distinct resources.
+        across = f" across {resources} resources" if resources is not None else ""
+        return f"{match.description}: {_money(untagged)} of {_money(total)} ({share:.1f}%){across}."
+    if match.intent == "trend":
+        peak = max(rows, key=lambda row: float(row[1] or 0))
+        total = sum(float(row[1] or 0) for row in rows)
+        peak_at = peak[0].date().isoformat() if hasattr(peak[0], "date") else str(peak[0])
+        return (
+            f"{match.description}: {_money(total)} over {row_count} periods, "
+            f"peaking at {_money(peak[1])} on {peak_at}."
+        )
+    if match.intent == "mom":
+        if match.slots.get("dimension"):
+            listed = "; ".join(
+                f"{name}: {_money(current)} vs {_money(previous)} ({'+' if float(delta) >= 0 else '-'}{_money(abs(float(delta)))})"
+                for name, current, previous, delta in rows[:10]
+            )
+            return f"{match.description}. Largest movers: {listed}."
+        current, previous, delta = rows[0]
+        change = f" ({float(delta) / float(previous) * 100:+.1f}%)" if previous else ""
+        direction = "up" if float(delta) >= 0 else "down"
+        return (
+            f"{match.description}: {_money(current)} vs {_money(previous)}, "
+            f"{direction} {_money(abs(float(delta)))}{change}."
+        )
+    return f"{match.description}."
@@ -0,0 +1,268 @@
+"""
+optic_sql.py
+============
+TEJUSKA Cloud Intelligence
+Execution layer for OPTIC-generated SQL.
+
+Statements run on the read-only pool (database.get_readonly_pool) inside a
+read-only transaction with a per-tenant statement_timeout derived from the
+tenant's plan. Rows are streamed from a server-side cursor in chunks, so a
+large result never sits in memory; only a bounded ResultSummary (row count,
+numeric column stats and the first rows) is kept for the answer prompt.
+
+With analytics=True a statement is offered to the columnar analytics store
+(analytics_store.py) first; when the store cannot answer it, it raises
+QuerySourceUnavailable before producing rows and the statement runs here.
+"""
+
+import os
+import json
+import time
+import logging
+from contextlib import aclosing
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+import database
+import metrics
+
+logger = logging.getLogger("tejuska.optic_sql")
+
+OPTIC_STATEMENT_TIMEOUT_MS: int = int(os.environ.get("OPTIC_STATEMENT_TIMEOUT_MS", "5000"))
+# Per-plan overrides, e.g. "free=2000,pro=5000,enterprise=15000".
+OPTIC_PLAN_TIMEOUTS_MS: Dict[str, int] = {
+    plan.strip(): int(ms)
+    for plan, ms in (
+        item.split("=", 1)
+        for item in os.environ.get("OPTIC_PLAN_TIMEOUTS_MS", "free=2000,pro=5000,enterprise=15000").split(",")
+        if item.strip()
+    )
+}
+OPTIC_FETCH_CHUNK_ROWS: int = int(os.environ.get("OPTIC_FETCH_CHUNK_ROWS", "500"))
+OPTIC_MAX_ROWS: int = int(os.environ.get("OPTIC_MAX_ROWS", "50000"))
+OPTIC_SUMMARY_ROWS: int = int(os.environ.get("OPTIC_SUMMARY_ROWS", "20"))
+OPTIC_SUMMARY_MAX_CHARS: int = int(os.environ.get("OPTIC_SUMMARY_MAX_CHARS", "4000"))
+_PLAN_CACHE_SECONDS = 300.0
+
+_TENANT_PLAN_SQL = "SELECT plan FROM tenants WHERE tenant_id = $1::uuid"
+
+
+class QueryExecutionError(Exception):
+    """The generated statement could not be executed."""
+
+
+class QueryTimeoutError(QueryExecutionError):
+    """The statement exceeded the tenant's statement_timeout."""
+
+
+class QueryCostError(QueryExecutionError):
+    """EXPLAIN estimated a plan cost above the configured ceiling."""
+
+
+class QuerySourceUnavailable(Exception):
+    """An alternative query source cannot answer the statement; run it on Postgres."""
+
+
+class ResultSummary:
+    """Bounded description of a streamed result set for the answer prompt."""
+
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.columns = list(columns)
+        self.row_count = 0
+        self.truncated = False
+        self.sample_rows: List[Tuple[Any, ...]] = []
+        self._stats: Dict[str, List[float]] = {}  # column -> [sum, min, max]
+
+    def add(self, rows: Sequence[asyncpg.Record]) -> None:
+        for row in rows:
+            if len(self.sample_rows) < OPTIC_SUMMARY_ROWS:
+                self.sample_rows.append(tuple(row))
+            for column, value in zip(self.columns, row):
+                if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                    value = float(value)
+                    stats = self._stats.get(column)
+                    if stats is None:
+                        self._stats[column] = [value, value, value]
+                    else:
+                        stats[0] += value
+                        stats[1] = min(stats[1], value)
+                        stats[2] = max(stats[2], value)
+        self.row_count += len(rows)
+
+    @property
+    def numeric_stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            column: {"sum": round(s, 4), "min": round(lo, 4), "max": round(hi, 4)}
+            for column, (s, lo, hi) in self._stats.items()
+        }
+
+    def to_prompt(self, max_chars: int = OPTIC_SUMMARY_MAX_CHARS) -> str:
+        """Render the summary as compact text, never longer than max_chars."""
+        lines = [
+            f"Columns: {', '.join(self.columns)}",
+            f"Rows: {self.row_count}{' (truncated)' if self.truncated else ''}",
+        ]
+        for column, stats in self.numeric_stats.items():
+            lines.append(f"{column}: sum={stats['sum']} min={stats['min']} max={stats['max']}")
+        if self.sample_rows:
+            lines.append(f"First {len(self.sample_rows)} rows:")
+            lines.append(" | ".join(self.columns))
+            lines.extend(" | ".join("" if v is None else str(v) for v in row) for row in self.sample_rows)
+        text = "\n".join(lines)
+        return text if len(text) <= max_chars else text[: max_chars - 3] + "..."
+
+
+class QueryExecutor:
+    """
+    Runs tenant SQL on the read-only pool.
+    stream() yields row chunks as they arrive (wrap it in contextlib.aclosing
+    when breaking out early so the connection is released promptly);
+    summarize() yields the same chunks alongside a running ResultSummary;
+    execute() returns only the summary.
+    """
+
+    def __init__(self, analytics: Optional[Any] = None, metrics_name: str = "optic_sql") -> None:
+        self._analytics = analytics  # analytics_store.AnalyticsStore, optional
+        self._plans: Dict[str, Tuple[Optional[str], float]] = {}
+        self._acquire = metrics.LatencyTracker()
+        self._query = metrics.LatencyTracker()
+        self._rows = metrics.Counter()
+        self._timeouts = metrics.Counter()
+        self._errors = metrics.Counter()
+        self._truncated = metrics.Counter()
+        self._rejected = metrics.Counter()
+        self._analytics_fallbacks = metrics.Counter()
+        metrics.register(metrics_name, self.snapshot)
+
+    async def _statement_timeout_ms(self, pool: asyncpg.Pool, tenant_id: str) -> int:
+        """Timeout for the tenant's plan; plans are cached for a few minutes."""
+        cached = self._plans.get(tenant_id)
+        if cached is None or cached[1] < time.monotonic():
+            try:
+                plan = await pool.fetchval(_TENANT_PLAN_SQL, tenant_id)
+            except (asyncpg.DataError, ValueError):
+                plan = None  # not a UUID: no tenant row, use the default
+            cached = (plan, time.monotonic() + _PLAN_CACHE_SECONDS)
+            self._plans[tenant_id] = cached
+        return OPTIC_PLAN_TIMEOUTS_MS.get(cached[0] or "", OPTIC_STATEMENT_TIMEOUT_MS)
+
+    async def stream(
+        self,
+        tenant_id: str,
+        sql: str,
+        *args: Any,
+        max_rows: int = OPTIC_MAX_ROWS,
+        max_cost: Optional[float] = None,
+        analytics: bool = False,
+    ) -> AsyncIterator[Tuple[List[str], List[asyncpg.Record]]]:
+        """
+        Yield (columns, rows) chunks of at most OPTIC_FETCH_CHUNK_ROWS rows,
+        stopping after max_rows. With max_cost, the statement is EXPLAINed
+        first in the same transaction and refused above that planner cost.
+        With analytics, the analytics store answers it when it can (no
+        EXPLAIN ceiling there). Raises QueryTimeoutError / QueryCostError /
+        QueryExecutionError.
+        """
+        if analytics and self._analytics is not None:
+            chunks = self._analytics.stream(tenant_id, sql, *args, max_rows=max_rows)
+            try:
+                async with aclosing(chunks):
+                    async for chunk in chunks:
+                        yield chunk
+                return
+            except QuerySourceUnavailable as exc:
+                self._analytics_fallbacks.inc()
+                logger.debug("Analytics store declined the statement (%s); using Postgres.", exc)
+        pool = await database.get_readonly_pool()
+        timeout_ms = await self._statement_timeout_ms(pool, tenant_id)
+        started = time.perf_counter()
+        with self._acquire.time():
+            conn = await pool.acquire()
+        try:
+            async with conn.transaction(readonly=True):
+                await conn.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+                if max_cost is not None:
+                    plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *args))
+                    cost = float(plan[0]["Plan"]["Total Cost"])
+                    if cost > max_cost:
+                        self._rejected.inc()
+                        raise QueryCostError(
+                            f"Estimated plan cost {cost:.0f} exceeds the limit of {max_cost:.0f}."
+                        )
+                statement = await conn.prepare(sql)
+                columns = [attribute.name for attribute in statement.get_attributes()]
+                cursor = await statement.cursor(*args)
+                fetched = 0
+                while fetched < max_rows:
+                    rows = await cursor.fetch(min(OPTIC_FETCH_CHUNK_ROWS, max_rows - fetched))
+                    if not rows:
+                        break
+                    fetched += len(rows)
+                    self._rows.inc(len(rows))
+                    yield columns, rows
+                    if len(rows) < OPTIC_FETCH_CHUNK_ROWS:
+                        break
+                if not fetched:
+                    yield columns, []
+        except asyncpg.QueryCanceledError as exc:
+            self._timeouts.inc()
+            raise QueryTimeoutError(f"Query exceeded the {timeout_ms} ms statement timeout.") from exc
+        except (asyncpg.PostgresError, asyncpg.DataError) as exc:
+            self._errors.inc()
+            raise QueryExecutionError(str(exc)) from exc
+        finally:
+            await pool.release(conn)
+            self._query.observe((time.perf_counter() - started) * 1000)
+
+    async def summarize(
+        self, tenant_id: str, sql: str, *args: Any, max_cost: Optional[float] = None, analytics: bool = False
+    ) -> AsyncIterator[Tuple[ResultSummary, List[asyncpg.Record]]]:
+        """
+        Stream the statement as (summary, rows) chunks, updating one bounded
+        ResultSummary as rows arrive. Stops at OPTIC_MAX_ROWS and marks the
+        summary truncated; the first chunk may carry no rows.
+        """
+        summary: Optional[ResultSummary] = None
+        # One extra row tells a result of exactly OPTIC_MAX_ROWS from a truncated one.
+        chunks = self.stream(
+            tenant_id, sql, *args, max_rows=OPTIC_MAX_ROWS + 1, max_cost=max_cost, analytics=analytics
+        )
+        async with aclosing(chunks):
+            async for columns, rows in chunks:
+                if summary is None:
+                    summary = ResultSummary(columns)
+                remaining = OPTIC_MAX_ROWS - summary.row_count
+                if len(rows) > remaining:
+                    rows = rows[:remaining]
+                    summary.add(rows)
+                    summary.truncated = True
+                    self._truncated.inc()
+                    yield summary, rows
+                    break
+                summary.add(rows)
+                yield summary, rows
+
+    async def execute(
+        self, tenant_id: str, sql: str, *args: Any, max_cost: Optional[float] = None, analytics: bool = False
+    ) -> ResultSummary:
+        """Stream the statement's result into a bounded ResultSummary."""
+        summary: Optional[ResultSummary] = None
+        chunks = self.summarize(tenant_id, sql, *args, max_cost=max_cost, analytics=analytics)
+        async with aclosing(chunks):
+            async for summary, _ in chunks:
+                pass
+        return summary if summary is not None else ResultSummary([])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "acquire": self._acquire.snapshot(),
+            "query": self._query.snapshot(),
+            "rows_streamed": self._rows.value,
+            "timeouts": self._timeouts.value,
+            "errors": self._errors.value,
+            "truncated_results": self._truncated.value,
+            "rejected_by_cost": self._rejected.value,
+            "analytics_fallbacks": self._analytics_fallbacks.value,
+        }
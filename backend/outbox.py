@@ -0,0 +1,304 @@
+"""
+outbox.py
+=========
+TEJUSKA Cloud Intelligence
+Durable notification outbox backed by the notification_outbox table.
+
+Callers enqueue notifications, optionally on their own connection so the
+rows commit in the same transaction as the change that caused them (an
+anomaly, a triggered Agentic Shield rule), and return at once. A pool of
+async workers claims due rows in batches with FOR UPDATE SKIP LOCKED,
+delivers each batch through NotificationService.send_many() and writes
+the results back in bulk:
+  - delivered rows leave the outbox and land in notification_log as 'sent',
+  - failed rows are retried with jittered exponential backoff until
+    NOTIFY_MAX_ATTEMPTS, then kept in the outbox as 'dead' (the dead-letter
+    queue) and logged as 'failed',
+  - rows a crashed worker left 'sending' are reclaimed after their lease.
+Delivery is at least once; a reclaimed row may be sent twice.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+import smtplib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+import database
+import metrics
+from notifications import CHANNELS, Notification, NotificationService
+
+logger = logging.getLogger("tejuska.outbox")
+
+NOTIFY_OUTBOX_WORKERS: int = int(os.environ.get("NOTIFY_OUTBOX_WORKERS", "2"))
+NOTIFY_OUTBOX_BATCH: int = int(os.environ.get("NOTIFY_OUTBOX_BATCH", "50"))
+NOTIFY_OUTBOX_POLL_SECONDS: float = float(os.environ.get("NOTIFY_OUTBOX_POLL_SECONDS", "1.0"))
+# Must outlast the slowest batch; a row still 'sending' after it is claimed again.
+NOTIFY_OUTBOX_LEASE_SECONDS: float = float(os.environ.get("NOTIFY_OUTBOX_LEASE_SECONDS", "300"))
+NOTIFY_MAX_ATTEMPTS: int = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "6"))
+NOTIFY_RETRY_BASE_SECONDS: float = float(os.environ.get("NOTIFY_RETRY_BASE_SECONDS", "30"))
+NOTIFY_RETRY_MAX_SECONDS: float = float(os.environ.get("NOTIFY_RETRY_MAX_SECONDS", "3600"))
+
+# Retrying cannot help: the message itself is unacceptable.
+_PERMANENT = (ValueError, smtplib.SMTPRecipientsRefused)
+
+OutboxItem = Tuple[Optional[str], Notification]
+
+_ENQUEUE_SQL = """
+INSERT INTO notification_outbox (notification_id, tenant_id, channel, recipient, subject, body)
+SELECT * FROM unnest($1::uuid[], $2::uuid[], $3::text[], $4::text[], $5::text[], $6::text[])
+"""
+
+# Claims due rows, including 'sending' rows whose lease ran out. The new
+# attempts value identifies this claim when its results are written.
+_CLAIM_SQL = """
+UPDATE notification_outbox
+SET status = 'sending', attempts = attempts + 1, next_attempt_at = NOW() + make_interval(secs => $2)
+WHERE notification_id IN (
+    SELECT notification_id
+    FROM notification_outbox
+    WHERE status IN ('pending', 'sending') AND next_attempt_at <= NOW()
+    ORDER BY next_attempt_at
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING notification_id, channel, recipient, subject, body, attempts
+"""
+
+_SENT_SQL = """
+WITH delivered AS (
+    DELETE FROM notification_outbox o
+    USING unnest($1::uuid[], $2::int[]) AS d(notification_id, attempts)
+    WHERE o.notification_id = d.notification_id AND o.attempts = d.attempts AND o.status = 'sending'
+    RETURNING o.notification_id, o.tenant_id, o.channel, o.recipient, o.subject, o.body
+)
+INSERT INTO notification_log (notification_id, tenant_id, channel, recipient, subject, body, status)
+SELECT notification_id, tenant_id, channel, recipient, subject, body, 'sent' FROM delivered
+ON CONFLICT (notification_id) DO NOTHING
+"""
+
+_FAILED_SQL = """
+WITH updated AS (
+    UPDATE notification_outbox o
+    SET status = CASE WHEN f.permanent OR o.attempts >= $5 THEN 'dead' ELSE 'pending' END,
+        last_error = f.error,
+        next_attempt_at = NOW() + make_interval(
+            secs => LEAST($7, $6 * power(2, o.attempts - 1)) * (0.5 + random() / 2)
+        )
+    FROM unnest($1::uuid[], $2::int[], $3::text[], $4::bool[]) AS f(notification_id, attempts, error, permanent)
+    WHERE o.notification_id = f.notification_id AND o.attempts = f.attempts AND o.status = 'sending'
+    RETURNING o.notification_id, o.tenant_id, o.channel, o.recipient, o.subject, o.body, o.status, o.last_error
+)
+INSERT INTO notification_log (notification_id, tenant_id, channel, recipient, subject, body, status, error_message)
+SELECT notification_id, tenant_id, channel, recipient, subject, body, 'failed', last_error
+FROM updated
+WHERE status = 'dead'
+ON CONFLICT (notification_id) DO NOTHING
+"""
+
+_GET_OUTBOX_SQL = """
+SELECT notification_id, tenant_id, channel, recipient, status, attempts,
+       last_error AS error_message, created_at, next_attempt_at, NULL::timestamptz AS sent_at
+FROM notification_outbox
+WHERE notification_id = $1
+"""
+
+_GET_LOG_SQL = """
+SELECT notification_id, tenant_id, channel, recipient, status, NULL::int AS attempts,
+       error_message, NULL::timestamptz AS created_at, NULL::timestamptz AS next_attempt_at, sent_at
+FROM notification_log
+WHERE notification_id = $1
+"""
+
+
+class NotificationOutbox:
+    """
+    Durable queue plus worker pool for notifications.
+
+    Parameters
+    ----------
+    notifier     : Delivers claimed batches (NotificationService.send_many).
+    workers      : Number of concurrent worker coroutines in this process.
+    batch_size   : Rows claimed, sent and recorded together.
+    max_attempts : Deliveries tried before a row is dead-lettered.
+    """
+
+    def __init__(
+        self,
+        notifier: NotificationService,
+        workers: int = NOTIFY_OUTBOX_WORKERS,
+        batch_size: int = NOTIFY_OUTBOX_BATCH,
+        max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+    ) -> None:
+        self._notifier = notifier
+        self._worker_count = workers
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self._batches = metrics.LatencyTracker()
+        self._enqueued = metrics.Counter()
+        self._delivered = metrics.Counter()
+        self._retried = metrics.Counter()
+        self._dead = metrics.Counter()
+        metrics.register("outbox", self.snapshot)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def enqueue(self, items: Sequence[OutboxItem], conn: Optional[Any] = None) -> List[str]:
+        """
+        Queue (tenant_id, Notification) pairs and return their notification ids.
+        Pass conn to commit the rows with the caller's transaction.
+        Raises ValueError for an unknown channel, a malformed or unknown tenant_id.
+        """
+        if not items:
+            return []
+        ids = [uuid.uuid4() for _ in items]
+        columns: Tuple[List[Any], ...] = (ids, [], [], [], [], [])
+        for tenant_id, notification in items:
+            channel = notification.channel.lower().strip()
+            if channel not in CHANNELS:
+                raise ValueError(f"Unsupported notification channel: '{notification.channel}'")
+            try:
+                columns[1].append(uuid.UUID(str(tenant_id)) if tenant_id is not None else None)
+            except ValueError:
+                raise ValueError("tenant_id must be a UUID.") from None
+            columns[2].append(channel)
+            columns[3].append(notification.recipient)
+            columns[4].append(notification.subject)
+            columns[5].append(notification.body)
+        try:
+            if conn is None:
+                await (await database.get_pool()).execute(_ENQUEUE_SQL, *columns)
+            else:
+                await conn.execute(_ENQUEUE_SQL, *columns)
+        except asyncpg.ForeignKeyViolationError:
+            raise ValueError("Unknown tenant_id.") from None
+        self._enqueued.inc(len(ids))
+        self._wakeup.set()
+        return [str(notification_id) for notification_id in ids]
+
+    async def get(self, notification_id: str) -> Optional[Dict[str, Any]]:
+        """Return the notification's delivery state, or None if it does not exist."""
+        pool = await database.get_pool()
+        row = await pool.fetchrow(_GET_OUTBOX_SQL, notification_id)
+        if row is None:
+            row = await pool.fetchrow(_GET_LOG_SQL, notification_id)
+        if row is None:
+            return None
+        record = dict(row)
+        record["notification_id"] = str(record["notification_id"])
+        record["tenant_id"] = str(record["tenant_id"]) if record["tenant_id"] is not None else None
+        return record
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Start the worker pool."""
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"notification-outbox-worker-{n}")
+            for n in range(self._worker_count)
+        ]
+        logger.info("Notification outbox started with %d workers (batch=%d).", self._worker_count, self._batch_size)
+
+    async def stop(self) -> None:
+        """Let in-flight batches finish, then stop; unfinished rows are reclaimed after their lease."""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=NOTIFY_OUTBOX_POLL_SECONDS + 15)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Notification outbox stopped.")
+
+    async def _claim(self) -> List[Any]:
+        pool = await database.get_pool()
+        return await pool.fetch(_CLAIM_SQL, self._batch_size, NOTIFY_OUTBOX_LEASE_SECONDS)
+
+    async def _worker(self, n: int) -> None:
+        while not self._stopping:
+            try:
+                batch = await self._claim()
+            except Exception as exc:
+                logger.warning("Outbox worker %d failed to claim: %s", n, exc)
+                batch = []
+
+            if not batch:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=NOTIFY_OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.deliver(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Outbox worker %d could not record a batch of %d: %s", n, len(batch), exc)
+
+    async def deliver(self, batch: Sequence[Any]) -> Dict[str, int]:
+        """Send one claimed batch and write its results in two statements."""
+        started = time.perf_counter()
+        due = [row for row in batch if row["attempts"] <= self._max_attempts]
+        results = await self._notifier.send_many([
+            Notification(row["channel"], row["recipient"], row["body"], row["subject"]) for row in due
+        ])
+        sent: List[Any] = []
+        failed: List[Tuple[Any, str, bool]] = []
+        for row, result in zip(due, results):
+            if isinstance(result, BaseException):
+                failed.append((row, f"{type(result).__name__}: {result}", isinstance(result, _PERMANENT)))
+            else:
+                sent.append(row)
+        # Claimed again after a lease expired on the final attempt: do not send a further copy.
+        failed.extend((row, "Lease expired after the final attempt.", True)
+                      for row in batch if row["attempts"] > self._max_attempts)
+
+        pool = await database.get_pool()
+        async with pool.acquire() as conn, conn.transaction():
+            if sent:
+                await conn.execute(
+                    _SENT_SQL, [row["notification_id"] for row in sent], [row["attempts"] for row in sent],
+                )
+            if failed:
+                await conn.execute(
+                    _FAILED_SQL,
+                    [row["notification_id"] for row, _, _ in failed],
+                    [row["attempts"] for row, _, _ in failed],
+                    [error for _, error, _ in failed],
+                    [permanent for _, _, permanent in failed],
+                    self._max_attempts, NOTIFY_RETRY_BASE_SECONDS, NOTIFY_RETRY_MAX_SECONDS,
+                )
+
+        dead = sum(permanent or row["attempts"] >= self._max_attempts for row, _, permanent in failed)
+        self._delivered.inc(len(sent))
+        self._retried.inc(len(failed) - dead)
+        self._dead.inc(dead)
+        self._batches.observe((time.perf_counter() - started) * 1000)
+        for row, error, _ in failed:
+            logger.warning("Notification %s attempt %d failed: %s", row["notification_id"], row["attempts"], error)
+        return {"sent": len(sent), "retried": len(failed) - dead, "dead": dead}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self._enqueued.value,
+            "delivered": self._delivered.value,
+            "retried": self._retried.value,
+            "dead_lettered": self._dead.value,
+            "batch": self._batches.snapshot(),
+        }
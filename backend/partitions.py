@@ -0,0 +1,434 @@
+"""
+partitions.py
+=============
+TEJUSKA Cloud Intelligence
+Partition maintenance for consolidated_billing.
+
+The table is range-partitioned by month of charge_period_start (UTC), each
+month optionally hash-partitioned by tenant_id, with a default partition for
+stray rows (see init_db.sql). PartitionManager.maintain() runs periodically
+in one process at a time and:
+  1. creates partitions BILLING_PARTITION_MONTHS_AHEAD months ahead, and
+     for any retained month whose rows landed in the default partition
+     (e.g. a backfill), via the create_billing_partition() SQL function;
+  2. deletes rows of tenants whose plan retains less history than the
+     longest plan, in batches, from the partitions that hold them;
+  3. detaches whole months older than the longest retention and moves them
+     to BILLING_ARCHIVE_SCHEMA (or drops them when it is empty), so expired
+     history leaves the table without DELETE, VACUUM or index bloat, and
+     deletes expired rows left in the default partition;
+  4. drops rollup rows past the same cutoffs so routed answers keep
+     matching the raw table.
+
+Databases created before partitioning are migrated in two steps. Applying
+init_db.sql renames the plain table to consolidated_billing_unpartitioned
+(dropping its keys and indexes) and creates the partitioned table in its
+place, so ingestion continues into partitions straight away. migrate() then
+creates the monthly partitions the old rows need and moves them across in
+batches (each its own transaction, so an interrupted run resumes where it
+stopped), and drops the old table once it is empty. History is incomplete
+until it finishes; run it right after applying the schema.
+
+Usage (from backend/):
+    python partitions.py maintain
+    python partitions.py maintain --dry-run
+    python partitions.py migrate
+    python partitions.py migrate --dry-run
+"""
+
+import os
+import re
+import asyncio
+import logging
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import database
+import metrics
+import rollups
+
+logger = logging.getLogger("tejuska.partitions")
+
+# 0 disables the background loop (e.g. when a cron runs `partitions.py maintain`).
+BILLING_PARTITION_MAINTENANCE_SECONDS: float = float(
+    os.environ.get("BILLING_PARTITION_MAINTENANCE_SECONDS", "3600")
+)
+BILLING_PARTITION_MONTHS_AHEAD: int = int(os.environ.get("BILLING_PARTITION_MONTHS_AHEAD", "3"))
+# Sub-partitions per month by tenant hash for newly created months; 0 keeps months unsplit.
+BILLING_TENANT_HASH_PARTITIONS: int = int(os.environ.get("BILLING_TENANT_HASH_PARTITIONS", "0"))
+# Months of raw billing history kept per plan, e.g. "free=3,pro=13,enterprise=36".
+BILLING_RETENTION_MONTHS: Dict[str, int] = {
+    plan.strip(): int(months)
+    for plan, months in (
+        item.split("=", 1)
+        for item in os.environ.get("BILLING_RETENTION_MONTHS", "free=3,pro=13,enterprise=36").split(",")
+        if item.strip()
+    )
+}
+# Detached months are moved here; empty drops them instead.
+BILLING_ARCHIVE_SCHEMA: str = os.environ.get("BILLING_ARCHIVE_SCHEMA", "billing_archive")
+BILLING_RETENTION_DELETE_BATCH: int = int(os.environ.get("BILLING_RETENTION_DELETE_BATCH", "50000"))
+# Rows moved per transaction by migrate().
+BILLING_MIGRATE_BATCH: int = int(os.environ.get("BILLING_MIGRATE_BATCH", "50000"))
+# Bounds how long a detach may wait for (and so block behind) running queries.
+BILLING_DETACH_LOCK_TIMEOUT_MS: int = int(os.environ.get("BILLING_DETACH_LOCK_TIMEOUT_MS", "5000"))
+
+_LOCK_KEY = 0x7465_6A76  # pg advisory lock shared by every maintenance process
+_PARTITION_NAME = re.compile(r"^consolidated_billing_(\d{4})_(\d{2})$")
+
+_PARTITIONS_SQL = """
+SELECT c.relname
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'consolidated_billing'::regclass
+"""
+_CREATE_SQL = "SELECT create_billing_partition($1, $2)"
+_DEFAULT_MONTHS_SQL = """
+SELECT DISTINCT DATE_TRUNC('month', charge_period_start AT TIME ZONE 'UTC')::date AS month
+FROM consolidated_billing_default
+WHERE charge_period_start >= $1
+"""
+_EXPIRE_DEFAULT_SQL = """
+DELETE FROM consolidated_billing_default
+WHERE ctid IN (SELECT ctid FROM consolidated_billing_default WHERE charge_period_start < $1 LIMIT $2)
+"""
+_EXPIRE_BATCH_SQL = """
+DELETE FROM consolidated_billing
+WHERE row_id IN (
+    SELECT b.row_id
+    FROM consolidated_billing b
+    JOIN tenants t ON t.tenant_id = b.tenant_id
+    WHERE t.plan = $1 AND b.charge_period_start < $2
+    LIMIT $3
+)
+  AND charge_period_start < $2
+"""
+_PLAN_TENANTS_SQL = "SELECT tenant_id FROM tenants WHERE plan = $1"
+
+# Left behind by init_db.sql on databases created before partitioning.
+_LEGACY_TABLE = "consolidated_billing_unpartitioned"
+_RELKIND_SQL = "SELECT relkind FROM pg_class WHERE oid = TO_REGCLASS($1)"
+_LEGACY_MONTHS_SQL = f"""
+SELECT DISTINCT DATE_TRUNC('month', charge_period_start AT TIME ZONE 'UTC')::date AS month
+FROM {_LEGACY_TABLE}
+"""
+# Columns both tables have, in the partitioned table's order.
+_LEGACY_COLUMNS_SQL = """
+SELECT a.attname
+FROM pg_attribute a
+JOIN pg_attribute l
+  ON l.attrelid = TO_REGCLASS($1) AND l.attname = a.attname AND l.attnum > 0 AND NOT l.attisdropped
+WHERE a.attrelid = 'consolidated_billing'::regclass AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY a.attnum
+"""
+_MOVE_BATCH_SQL = """
+WITH moved AS (
+    DELETE FROM {legacy}
+    WHERE ctid IN (SELECT ctid FROM {legacy} LIMIT $1)
+    RETURNING {columns}
+)
+INSERT INTO consolidated_billing ({columns}) SELECT {columns} FROM moved
+"""
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _utc(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def retention_cutoffs(
+    today: Optional[date] = None, retention_months: Optional[Dict[str, int]] = None
+) -> Tuple[Dict[str, date], date]:
+    """
+    Per-plan retention cutoffs (rows charged before them expire) and the
+    cutoff before which whole months are detached.
+    """
+    retention = BILLING_RETENTION_MONTHS if retention_months is None else retention_months
+    month = (today or datetime.now(timezone.utc).date()).replace(day=1)
+    per_plan = {plan: _add_months(month, -months) for plan, months in retention.items()}
+    return per_plan, min(per_plan.values(), default=_add_months(month, -120))
+
+
+def partition_month(name: str) -> Optional[date]:
+    """First day of the month a monthly partition holds, or None for other partitions."""
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+class PartitionManager:
+    """
+    Creates, expires and archives consolidated_billing partitions.
+
+    Parameters
+    ----------
+    months_ahead     : Future months kept ready beyond the current one.
+    hash_partitions  : Tenant-hash sub-partitions for newly created months.
+    retention_months : Raw history kept per plan (months before the current one).
+    archive_schema   : Schema detached months move to; empty drops them.
+    """
+
+    def __init__(
+        self,
+        months_ahead: int = BILLING_PARTITION_MONTHS_AHEAD,
+        hash_partitions: int = BILLING_TENANT_HASH_PARTITIONS,
+        retention_months: Optional[Dict[str, int]] = None,
+        archive_schema: str = BILLING_ARCHIVE_SCHEMA,
+        interval_seconds: float = BILLING_PARTITION_MAINTENANCE_SECONDS,
+    ) -> None:
+        self._months_ahead = months_ahead
+        self._hash_partitions = hash_partitions
+        self._retention = dict(retention_months if retention_months is not None else BILLING_RETENTION_MONTHS)
+        self._archive_schema = archive_schema
+        self._interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._runs = metrics.LatencyTracker()
+        self._created = metrics.Counter()
+        self._detached = metrics.Counter()
+        self._expired_rows = metrics.Counter()
+        self._failures = metrics.Counter()
+        metrics.register("partitions", self.snapshot)
+
+    async def start(self) -> None:
+        if self._interval <= 0:
+            logger.info("Partition maintenance disabled (BILLING_PARTITION_MAINTENANCE_SECONDS=0).")
+            return
+        self._task = asyncio.create_task(self._loop(), name="billing-partition-maintenance")
+        logger.info("Partition maintenance started (every %.0fs).", self._interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("Partition maintenance stopped.")
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._failures.inc()
+                logger.warning("Partition maintenance failed: %s", exc)
+            await asyncio.sleep(self._interval)
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def cutoffs(self, today: Optional[date] = None) -> Tuple[Dict[str, date], date]:
+        """Retention cutoffs for this manager's plans (see retention_cutoffs)."""
+        return retention_cutoffs(today, self._retention)
+
+    async def maintain(self, dry_run: bool = False, today: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Run one maintenance pass. Returns what was (or, with dry_run, would
+        be) created, expired and detached; empty when another process holds
+        the maintenance lock.
+        """
+        report: Dict[str, Any] = {}
+        pool = await database.get_pool()
+        async with pool.acquire() as conn:
+            if await conn.fetchval(_RELKIND_SQL, "consolidated_billing") != b"p":
+                logger.warning(
+                    "consolidated_billing is not partitioned; apply init_db.sql and run"
+                    " `python partitions.py migrate`."
+                )
+                return report
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+                return report
+            try:
+                with self._runs.time():
+                    month = (today or datetime.now(timezone.utc).date()).replace(day=1)
+                    per_plan, detach_before = self.cutoffs(month)
+                    existing = {
+                        partition_month(row["relname"]): row["relname"]
+                        for row in await conn.fetch(_PARTITIONS_SQL)
+                    }
+                    existing.pop(None, None)
+                    report["created"] = await self._create_needed(conn, month, detach_before, existing, dry_run)
+                    report["expired_rows"] = await self._expire_plans(conn, per_plan, detach_before, dry_run)
+                    report["detached"] = await self._detach_before(conn, detach_before, existing, dry_run)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+        if any(report.values()):
+            logger.info("Partition maintenance%s: %s", " (dry run)" if dry_run else "", report)
+        return report
+
+    async def _create_needed(
+        self, conn: Any, month: date, keep_from: date, existing: Dict[date, str], dry_run: bool
+    ) -> List[str]:
+        needed = {_add_months(month, offset) for offset in range(self._months_ahead + 1)}
+        needed.update(row["month"] for row in await conn.fetch(_DEFAULT_MONTHS_SQL, _utc(keep_from)))
+        created = []
+        for first in sorted(needed - existing.keys()):
+            name = f"consolidated_billing_{first:%Y_%m}"
+            if not dry_run:
+                name = await conn.fetchval(_CREATE_SQL, first, self._hash_partitions)
+                self._created.inc()
+            created.append(name)
+        return created
+
+    async def _expire_plans(
+        self, conn: Any, per_plan: Dict[str, date], detach_before: date, dry_run: bool
+    ) -> Dict[str, int]:
+        """Delete rows of plans with shorter retention than the detach cutoff."""
+        expired: Dict[str, int] = {}
+        for plan, cutoff in per_plan.items():
+            if cutoff <= detach_before:
+                continue  # whole months are detached instead
+            if dry_run:
+                expired[plan] = await conn.fetchval(
+                    "SELECT COUNT(*) FROM consolidated_billing b JOIN tenants t ON t.tenant_id = b.tenant_id"
+                    " WHERE t.plan = $1 AND b.charge_period_start < $2",
+                    plan, _utc(cutoff),
+                )
+                continue
+            total = 0
+            while True:
+                status = await conn.execute(_EXPIRE_BATCH_SQL, plan, _utc(cutoff), BILLING_RETENTION_DELETE_BATCH)
+                deleted = int(status.split()[-1])
+                total += deleted
+                if deleted < BILLING_RETENTION_DELETE_BATCH:
+                    break
+            tenants = [row["tenant_id"] for row in await conn.fetch(_PLAN_TENANTS_SQL, plan)]
+            await rollups.purge(conn, cutoff, tenants)
+            self._expired_rows.inc(total)
+            expired[plan] = total
+        return expired
+
+    async def _detach_before(
+        self, conn: Any, cutoff: date, existing: Dict[date, str], dry_run: bool
+    ) -> List[str]:
+        detached = []
+        for first, name in sorted(existing.items()):
+            if _add_months(first, 1) > cutoff:
+                break
+            detached.append(name)
+            if dry_run:
+                continue
+            async with conn.transaction():
+                await conn.execute(f"SET LOCAL lock_timeout = {int(BILLING_DETACH_LOCK_TIMEOUT_MS)}")
+                await conn.execute(f"ALTER TABLE consolidated_billing DETACH PARTITION {_quote(name)}")
+                if self._archive_schema:
+                    await conn.execute(f"CREATE SCHEMA IF NOT EXISTS {_quote(self._archive_schema)}")
+                    await conn.execute(f"ALTER TABLE {_quote(name)} SET SCHEMA {_quote(self._archive_schema)}")
+                else:
+                    await conn.execute(f"DROP TABLE {_quote(name)}")
+            self._detached.inc()
+            logger.info(
+                "Detached billing partition %s%s.", name,
+                f" into schema {self._archive_schema}" if self._archive_schema else " and dropped it",
+            )
+        if not dry_run:
+            while True:
+                status = await conn.execute(_EXPIRE_DEFAULT_SQL, _utc(cutoff), BILLING_RETENTION_DELETE_BATCH)
+                deleted = int(status.split()[-1])
+                self._expired_rows.inc(deleted)
+                if deleted < BILLING_RETENTION_DELETE_BATCH:
+                    break
+            await rollups.purge(conn, cutoff)
+        return detached
+
+    # ------------------------------------------------------------------
+    # Migration from the unpartitioned table
+    # ------------------------------------------------------------------
+
+    async def migrate(self, dry_run: bool = False, batch_size: int = BILLING_MIGRATE_BATCH) -> Dict[str, Any]:
+        """
+        Move the rows of consolidated_billing_unpartitioned into the
+        partitioned table and drop it. Returns the partitions created and
+        rows moved (with dry_run, the partitions missing and rows waiting);
+        empty when there is nothing to migrate.
+        """
+        report: Dict[str, Any] = {}
+        pool = await database.get_pool()
+        async with pool.acquire() as conn:
+            if await conn.fetchval(_RELKIND_SQL, _LEGACY_TABLE) is None:
+                return report
+            if await conn.fetchval(_RELKIND_SQL, "consolidated_billing") != b"p":
+                raise RuntimeError("consolidated_billing is not partitioned; apply init_db.sql first.")
+            # Waits for a running maintenance pass rather than racing its partition creation.
+            await conn.execute("SELECT pg_advisory_lock($1)", _LOCK_KEY)
+            try:
+                existing = {partition_month(row["relname"]) for row in await conn.fetch(_PARTITIONS_SQL)}
+                months = [row["month"] for row in await conn.fetch(_LEGACY_MONTHS_SQL)]
+                report["created"] = []
+                for first in sorted(set(months) - existing):
+                    name = f"consolidated_billing_{first:%Y_%m}"
+                    if not dry_run:
+                        name = await conn.fetchval(_CREATE_SQL, first, self._hash_partitions)
+                        self._created.inc()
+                    report["created"].append(name)
+                if dry_run:
+                    report["rows"] = await conn.fetchval(f"SELECT COUNT(*) FROM {_LEGACY_TABLE}")
+                    return report
+                columns = ", ".join(
+                    _quote(row["attname"]) for row in await conn.fetch(_LEGACY_COLUMNS_SQL, _LEGACY_TABLE)
+                )
+                move = _MOVE_BATCH_SQL.format(legacy=_LEGACY_TABLE, columns=columns)
+                moved = 0
+                while True:
+                    status = await conn.execute(move, batch_size)
+                    count = int(status.split()[-1])
+                    moved += count
+                    if count < batch_size:
+                        break
+                    logger.info("Moved %d billing rows into partitions so far.", moved)
+                await conn.execute(f"DROP TABLE {_LEGACY_TABLE}")
+                await conn.execute("ANALYZE consolidated_billing")
+                report["rows"] = moved
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+        logger.info("Migrated %d billing rows into partitions; dropped %s.", report["rows"], _LEGACY_TABLE)
+        return report
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "runs": self._runs.snapshot(),
+            "partitions_created": self._created.value,
+            "partitions_detached": self._detached.value,
+            "rows_expired": self._expired_rows.value,
+            "failures": self._failures.value,
+        }
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def _main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain consolidated_billing partitions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    maintain = commands.add_parser("maintain", help="Create future partitions and apply retention.")
+    maintain.add_argument("--dry-run", action="store_true", help="Report without changing anything.")
+    migrate = commands.add_parser(
+        "migrate", help=f"Move rows from {_LEGACY_TABLE} (left by init_db.sql) into partitions."
+    )
+    migrate.add_argument("--dry-run", action="store_true", help="Report without changing anything.")
+    migrate.add_argument("--batch-size", type=int, default=BILLING_MIGRATE_BATCH, help="Rows per transaction.")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "migrate":
+            print(await PartitionManager().migrate(dry_run=args.dry_run, batch_size=args.batch_size))
+        else:
+            print(await PartitionManager().maintain(dry_run=args.dry_run))
+    finally:
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
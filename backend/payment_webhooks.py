@@ -8,7 +8,6 @@ Stripe and Razorpay payment webhook handlers.
 import os
 import logging
 
-import stripe
 from fastapi import APIRouter, Request, HTTPException, status
 from fastapi.responses import JSONResponse
 
@@ -21,8 +20,19 @@ STRIPE_WEBHOOK_SECRET: str = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
 RAZORPAY_KEY_ID: str       = os.environ.get("RAZORPAY_KEY_ID", "")
 RAZORPAY_KEY_SECRET: str   = os.environ.get("RAZORPAY_KEY_SECRET", "")
 
-if STRIPE_SECRET_KEY:
-    stripe.api_key = STRIPE_SECRET_KEY
+_stripe = None
+
+
+def _stripe_sdk():
+    """Import and configure the Stripe SDK on first use; it is slow to import."""
+    global _stripe
+    if _stripe is None:
+        import stripe
+
+        if STRIPE_SECRET_KEY:
+            stripe.api_key = STRIPE_SECRET_KEY
+        _stripe = stripe
+    return _stripe
 
 
 # ---------------------------------------------------------------------------
@@ -46,6 +56,7 @@ async def stripe_webhook(request: Request) -> JSONResponse:
             detail="STRIPE_WEBHOOK_SECRET is not configured.",
         )
 
+    stripe = _stripe_sdk()
     try:
         event = stripe.Webhook.construct_event(
             payload=payload,
@@ -0,0 +1,294 @@
+"""
+resource_graph.py
+=================
+TEJUSKA Cloud Intelligence
+Resource graph builder for ABACUS GNN inference.
+
+Nodes are the distinct resource_ids of a tenant (all billing rows sharing a
+resource_id collapse into one node, which also carries a self-loop). Edges
+connect resources that share an availability_zone or a
+commitment_discount_id. The graph is stored in CSR form and exposed to
+ResourceGNN as a pre-normalised (D^{-1} A) torch.sparse tensor, so memory
+grows with the number of edges rather than N^2.
+
+ResourceGraphStore writes each built graph under GRAPH_DIR and serves it
+memory-mapped, so neighbour-sampled inference only pages in the CSR rows of
+the nodes it samples; the in-memory arrays are dropped after the build.
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+import database
+
+logger = logging.getLogger("tejuska.resource_graph")
+
+# Groups larger than this are not turned into cliques; each member is linked
+# to GRAPH_MAX_GROUP_DEGREE random peers instead, keeping the degree bounded.
+GRAPH_MAX_GROUP_DEGREE: int = int(os.environ.get("GRAPH_MAX_GROUP_DEGREE", "16"))
+GRAPH_REFRESH_SECONDS: float = float(os.environ.get("GRAPH_REFRESH_SECONDS", "900"))
+# Where built graphs are written for memory-mapping; empty keeps them in memory.
+GRAPH_DIR: str = os.environ.get("GRAPH_DIR", "graphs")
+
+_NODE_ATTRS_SQL = """
+SELECT
+    resource_id,
+    MIN(availability_zone) AS availability_zone,
+    ARRAY_AGG(DISTINCT commitment_discount_id)
+        FILTER (WHERE commitment_discount_id IS NOT NULL) AS commitments
+FROM consolidated_billing
+WHERE tenant_id = $1
+  AND resource_id IS NOT NULL
+GROUP BY resource_id
+"""
+
+
+# ---------------------------------------------------------------------------
+# Edge construction (pure NumPy)
+# ---------------------------------------------------------------------------
+
+def group_edges(
+    node_idx: np.ndarray,
+    group_code: np.ndarray,
+    max_degree: int = GRAPH_MAX_GROUP_DEGREE,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Build directed edges between nodes that share a group.
+
+    Parameters
+    ----------
+    node_idx   : Node index of each (node, group) membership.
+    group_code : Integer group code of each membership.
+    max_degree : Small groups become cliques; larger ones are linked to
+                 max_degree random peers per member.
+    seed       : Seed for peer sampling, so builds are reproducible.
+
+    Returns
+    -------
+    np.ndarray: int64 array of shape (2, E).
+    """
+    if node_idx.size == 0:
+        return np.empty((2, 0), dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    order = np.argsort(group_code, kind="stable")
+    nodes_sorted = node_idx[order]
+    boundaries = np.flatnonzero(np.diff(group_code[order])) + 1
+
+    chunks: List[np.ndarray] = []
+    for members in np.split(nodes_sorted, boundaries):
+        m = members.size
+        if m < 2:
+            continue
+        if m <= max_degree + 1:
+            src, dst = np.meshgrid(members, members, indexing="ij")
+            mask = src != dst
+            chunks.append(np.stack([src[mask], dst[mask]]))
+        else:
+            # Offsets in [1, m) never map a member onto itself.
+            position = np.repeat(np.arange(m), max_degree)
+            offsets = rng.integers(1, m, size=position.size)
+            chunks.append(np.stack([members[position], members[(position + offsets) % m]]))
+
+    if not chunks:
+        return np.empty((2, 0), dtype=np.int64)
+    edges = np.concatenate(chunks, axis=1).astype(np.int64, copy=False)
+    # Relationships are symmetric.
+    return np.concatenate([edges, edges[::-1]], axis=1)
+
+
+def edges_to_csr(edges: np.ndarray, num_nodes: int, self_loops: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Deduplicate (2, E) edges and return CSR (indptr, indices) as int64 arrays."""
+    if self_loops:
+        loops = np.arange(num_nodes, dtype=np.int64)
+        edges = np.concatenate([edges, np.stack([loops, loops])], axis=1)
+    keys = np.sort(edges[0] * num_nodes + edges[1])
+    if keys.size:
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    src, indices = np.divmod(keys, num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+    return indptr, indices.astype(np.int64, copy=False)
+
+
+def normalized_adjacency(indptr: np.ndarray, indices: np.ndarray, num_nodes: int) -> torch.Tensor:
+    """Return D^{-1} A as a sparse CSR tensor with row-normalised float32 values."""
+    degree = np.diff(indptr)
+    values = np.repeat(1.0 / np.maximum(degree, 1), degree).astype(np.float32)
+    return torch.sparse_csr_tensor(
+        torch.from_numpy(_writable(indptr)),
+        torch.from_numpy(_writable(indices)),
+        torch.from_numpy(values),
+        size=(num_nodes, num_nodes),
+        check_invariants=False,
+    )
+
+
+def _writable(array: np.ndarray) -> np.ndarray:
+    """torch.from_numpy needs a writable array; read-only memory maps are copied."""
+    return array if array.flags.writeable else np.array(array)
+
+
+# ---------------------------------------------------------------------------
+# Graph container and builder
+# ---------------------------------------------------------------------------
+
+class ResourceGraph:
+    """CSR resource graph with a lazily built normalised sparse adjacency."""
+
+    def __init__(self, resource_ids: List[str], indptr: np.ndarray, indices: np.ndarray) -> None:
+        self.resource_ids = resource_ids
+        self.indptr = indptr
+        self.indices = indices
+        self._adjacency: Optional[torch.Tensor] = None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.resource_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return int(self.indices.size)
+
+    @property
+    def adjacency(self) -> torch.Tensor:
+        if self._adjacency is None:
+            self._adjacency = normalized_adjacency(self.indptr, self.indices, self.num_nodes)
+        return self._adjacency
+
+    def save(self, directory: str) -> None:
+        """Write the graph as .npy arrays so it can be memory-mapped later."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "indptr.npy"), self.indptr)
+        np.save(os.path.join(directory, "indices.npy"), self.indices)
+        with open(os.path.join(directory, "resource_ids.json"), "w", encoding="utf-8") as fh:
+            json.dump(self.resource_ids, fh)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ResourceGraph":
+        """Load a saved graph; with mmap=True the CSR arrays stay on disk."""
+        mode = "r" if mmap else None
+        indptr = np.load(os.path.join(directory, "indptr.npy"), mmap_mode=mode)
+        indices = np.load(os.path.join(directory, "indices.npy"), mmap_mode=mode)
+        with open(os.path.join(directory, "resource_ids.json"), encoding="utf-8") as fh:
+            resource_ids = json.load(fh)
+        return cls(resource_ids, indptr, indices)
+
+
+def build_graph(
+    resource_ids: List[str],
+    availability_zones: Sequence[Optional[str]],
+    commitments: Sequence[Optional[Sequence[str]]],
+    max_degree: int = GRAPH_MAX_GROUP_DEGREE,
+) -> ResourceGraph:
+    """
+    Build the resource graph for nodes in the given order.
+    availability_zones[i] and commitments[i] describe resource_ids[i].
+    """
+    group_codes: Dict[Tuple[str, str], int] = {}
+    node_idx: List[int] = []
+    group_code: List[int] = []
+
+    for i, (zone, discount_ids) in enumerate(zip(availability_zones, commitments)):
+        if zone:
+            node_idx.append(i)
+            group_code.append(group_codes.setdefault(("az", zone), len(group_codes)))
+        for discount_id in discount_ids or ():
+            node_idx.append(i)
+            group_code.append(group_codes.setdefault(("cd", discount_id), len(group_codes)))
+
+    edges = group_edges(
+        np.asarray(node_idx, dtype=np.int64),
+        np.asarray(group_code, dtype=np.int64),
+        max_degree=max_degree,
+    )
+    indptr, indices = edges_to_csr(edges, len(resource_ids))
+    return ResourceGraph(resource_ids, indptr, indices)
+
+
+class ResourceGraphStore:
+    """
+    Per-tenant cache of resource graphs.
+    A graph is rebuilt when the node set changes or it is older than
+    GRAPH_REFRESH_SECONDS. Built graphs are saved under directory and served
+    memory-mapped; an empty directory keeps them in memory.
+    """
+
+    def __init__(self, refresh_interval: float = GRAPH_REFRESH_SECONDS, directory: str = GRAPH_DIR) -> None:
+        self._refresh_interval = refresh_interval
+        self._directory = directory
+        self._graphs: Dict[str, Tuple[float, ResourceGraph]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, tenant_id: str, resource_ids: List[str]) -> ResourceGraph:
+        """Return the tenant graph with nodes ordered exactly as resource_ids."""
+        lock = self._locks.setdefault(tenant_id, asyncio.Lock())
+        async with lock:
+            cached = self._graphs.get(tenant_id)
+            if (
+                cached is not None
+                and time.monotonic() - cached[0] < self._refresh_interval
+                and cached[1].resource_ids == resource_ids
+            ):
+                return cached[1]
+
+            graph = await self._build(tenant_id, resource_ids)
+            self._graphs[tenant_id] = (time.monotonic(), graph)
+            return graph
+
+    async def _build(self, tenant_id: str, resource_ids: List[str]) -> ResourceGraph:
+        started = time.perf_counter()
+        resource_ids = list(resource_ids)  # the caller's list may keep growing
+        pool = await database.get_pool()
+        rows = await pool.fetch(_NODE_ATTRS_SQL, tenant_id)
+        attrs = {row["resource_id"]: row for row in rows}
+
+        zones: List[Optional[str]] = []
+        discount_ids: List[Optional[List[str]]] = []
+        for rid in resource_ids:
+            row = attrs.get(rid)
+            zones.append(row["availability_zone"] if row else None)
+            discount_ids.append(row["commitments"] if row else None)
+
+        graph = await asyncio.to_thread(self._build_mapped, tenant_id, resource_ids, zones, discount_ids)
+        logger.info(
+            "Resource graph built for tenant=%s: %d nodes, %d edges, %s (%.1f ms).",
+            tenant_id, graph.num_nodes, graph.num_edges,
+            "memory-mapped" if isinstance(graph.indices, np.memmap) else "in memory",
+            (time.perf_counter() - started) * 1000,
+        )
+        return graph
+
+    def _build_mapped(
+        self,
+        tenant_id: str,
+        resource_ids: List[str],
+        zones: List[Optional[str]],
+        discount_ids: List[Optional[List[str]]],
+    ) -> ResourceGraph:
+        """Build, save and reopen the graph memory-mapped, removing older builds."""
+        graph = build_graph(resource_ids, zones, discount_ids)
+        if not self._directory:
+            return graph
+        root = os.path.join(self._directory, tenant_id)
+        name = f"{time.time_ns()}-{os.getpid()}"
+        try:
+            graph.save(os.path.join(root, name))
+            mapped = ResourceGraph.load(os.path.join(root, name), mmap=True)
+        except OSError as exc:
+            logger.warning("Could not memory-map the graph for tenant=%s; keeping it in memory: %s", tenant_id, exc)
+            return graph
+        # Open maps of older builds stay readable after their files are removed.
+        for old in os.listdir(root):
+            if old != name:
+                shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+        return ResourceGraph(resource_ids, mapped.indptr, mapped.indices)
@@ -0,0 +1,542 @@
+"""
+rollups.py
+==========
+TEJUSKA Cloud Intelligence
+Pre-aggregated billing rollups and the OPTIC query router that uses them.
+
+Three rollup tables sit beside consolidated_billing (see init_db.sql):
+  billing_daily_rollup        (tenant, UTC day, provider, service, region,
+                               charge_type) -> billed/effective cost, rows
+  billing_monthly_tag_rollup  (tenant, UTC month, tag key, tag value) -> the
+                               same measures; tag_key '*' holds the month's
+                               total and '' the rows that carry no tags.
+  billing_monthly_resource_rollup  (tenant, UTC month, resource) -> the same
+                               measures, for distinct resource counts.
+
+RollupRefresher folds newly ingested rows in incrementally: each pass reads
+rows with ingested_at in (watermark, now() - lag], upserts their aggregates
+additively and advances the watermark in the same transaction, so a crash
+never double counts. The lag covers ingest transactions that were still open
+when the window was read (ingested_at is their start time).
+
+route() rewrites a template IntentMatch (optic_intents.py) to read the
+rollup when its grain allows. Rows ingested after the watermark are
+aggregated from the raw table in the same statement, so routed answers
+match the raw query exactly.
+
+Usage (from backend/):
+    python rollups.py refresh
+    python rollups.py rebuild --since 2026-01-01
+"""
+
+import os
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import database
+import metrics
+from optic_intents import DIMENSIONS, MAX_TOP_N, PROVIDERS, UNTAGGED_VALUE, IntentMatch, Params
+
+logger = logging.getLogger("tejuska.rollups")
+
+# 0 disables the background refresher (e.g. when a cron runs `rollups.py refresh`).
+ROLLUP_REFRESH_SECONDS: float = float(os.environ.get("ROLLUP_REFRESH_SECONDS", "60"))
+ROLLUP_SAFETY_LAG_SECONDS: float = float(os.environ.get("ROLLUP_SAFETY_LAG_SECONDS", "300"))
+OPTIC_USE_ROLLUPS: bool = os.environ.get("OPTIC_USE_ROLLUPS", "true").lower() == "true"
+
+DAILY_ROLLUP = "billing_daily_rollup"
+TAG_ROLLUP = "billing_monthly_tag_rollup"
+RESOURCE_ROLLUP = "billing_monthly_resource_rollup"
+TOTAL_TAG_KEY = "*"
+NO_TAGS_KEY = ""
+# Dimensions kept in billing_daily_rollup (optic_intents.DIMENSIONS keys).
+ROLLUP_DIMENSIONS = ("service", "provider", "region")
+
+_LOCK_KEY = 0x7465_6A75  # pg advisory lock shared by every refresher process
+
+# Each statement aggregates the raw rows selected by {where} and adds them
+# to the rollup; refresh() selects an ingested_at window, rebuild() a
+# charge-period range. retract() negates the measures ({sign}) to take rows
+# about to be deleted back out.
+_FOLD_SQL: Dict[str, str] = {
+    DAILY_ROLLUP: """
+INSERT INTO billing_daily_rollup AS r
+    (tenant_id, usage_date, provider_name, service_name, region, charge_type,
+     billed_cost, effective_cost, row_count)
+SELECT b.tenant_id,
+       (b.charge_period_start AT TIME ZONE 'UTC')::date,
+       b.provider_name,
+       b.service_name,
+       COALESCE(b.region_name, b.region_id, 'unknown'),
+       b.charge_type,
+       {sign}SUM(b.billed_cost), {sign}SUM(b.effective_cost), {sign}COUNT(*)
+FROM consolidated_billing b
+WHERE {where}
+GROUP BY 1, 2, 3, 4, 5, 6
+ON CONFLICT (tenant_id, usage_date, provider_name, service_name, region, charge_type) DO UPDATE
+SET billed_cost    = r.billed_cost + EXCLUDED.billed_cost,
+    effective_cost = r.effective_cost + EXCLUDED.effective_cost,
+    row_count      = r.row_count + EXCLUDED.row_count
+""",
+    TAG_ROLLUP: """
+INSERT INTO billing_monthly_tag_rollup AS r
+    (tenant_id, usage_month, tag_key, tag_value, billed_cost, effective_cost, row_count)
+SELECT b.tenant_id,
+       DATE_TRUNC('month', b.charge_period_start AT TIME ZONE 'UTC')::date,
+       t.tag_key,
+       t.tag_value,
+       {sign}SUM(b.billed_cost), {sign}SUM(b.effective_cost), {sign}COUNT(*)
+FROM consolidated_billing b
+CROSS JOIN LATERAL ({explode}) AS t(tag_key, tag_value)
+WHERE {where}
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (tenant_id, usage_month, tag_key, tag_value) DO UPDATE
+SET billed_cost    = r.billed_cost + EXCLUDED.billed_cost,
+    effective_cost = r.effective_cost + EXCLUDED.effective_cost,
+    row_count      = r.row_count + EXCLUDED.row_count
+""",
+    RESOURCE_ROLLUP: """
+INSERT INTO billing_monthly_resource_rollup AS r
+    (tenant_id, usage_month, resource_id, billed_cost, effective_cost, row_count)
+SELECT b.tenant_id,
+       DATE_TRUNC('month', b.charge_period_start AT TIME ZONE 'UTC')::date,
+       b.resource_id,
+       {sign}SUM(b.billed_cost), {sign}SUM(b.effective_cost), {sign}COUNT(*)
+FROM consolidated_billing b
+WHERE ({where}) AND b.resource_id IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (tenant_id, usage_month, resource_id) DO UPDATE
+SET billed_cost    = r.billed_cost + EXCLUDED.billed_cost,
+    effective_cost = r.effective_cost + EXCLUDED.effective_cost,
+    row_count      = r.row_count + EXCLUDED.row_count
+""",
+}
+# One row per tag (JSON null values count as missing, like tags ->> key),
+# plus the month-total row and, for rows without tags, the no-tags row.
+_EXPLODE_TAGS = (
+    f"SELECT '{TOTAL_TAG_KEY}'::text, ''::text"
+    f" UNION ALL SELECT '{NO_TAGS_KEY}', '' WHERE b.tags IS NULL OR b.tags = '{{}}'::jsonb"
+    " UNION ALL SELECT e.key, e.value"
+    " FROM jsonb_each_text(CASE WHEN jsonb_typeof(b.tags) = 'object' THEN b.tags END) AS e"
+    f" WHERE e.value IS NOT NULL AND e.key NOT IN ('{TOTAL_TAG_KEY}', '{NO_TAGS_KEY}')"
+)
+_FOLD_SQL[TAG_ROLLUP] = _FOLD_SQL[TAG_ROLLUP].replace("{explode}", _EXPLODE_TAGS)
+
+_WINDOW = "b.ingested_at > $1 AND b.ingested_at <= $2"
+# Rebuilds cover rows already below the watermark; later rows reach the
+# rollup through refresh().
+_RANGE = (
+    "b.charge_period_start >= $1 AND b.charge_period_start < $2"
+    " AND ($3::uuid IS NULL OR b.tenant_id = $3)"
+    " AND b.ingested_at <= (SELECT high_watermark FROM rollup_watermarks WHERE rollup_name = $4)"
+)
+_CLEAR_SQL: Dict[str, str] = {
+    DAILY_ROLLUP: (
+        "DELETE FROM billing_daily_rollup WHERE usage_date >= $1 AND usage_date < $2"
+        " AND ($3::uuid IS NULL OR tenant_id = $3)"
+    ),
+    TAG_ROLLUP: (
+        "DELETE FROM billing_monthly_tag_rollup WHERE usage_month >= $1 AND usage_month < $2"
+        " AND ($3::uuid IS NULL OR tenant_id = $3)"
+    ),
+    RESOURCE_ROLLUP: (
+        "DELETE FROM billing_monthly_resource_rollup WHERE usage_month >= $1 AND usage_month < $2"
+        " AND ($3::uuid IS NULL OR tenant_id = $3)"
+    ),
+}
+
+_WATERMARK_SQL = "SELECT high_watermark FROM rollup_watermarks WHERE rollup_name = $1"
+_ADVANCE_SQL = """
+INSERT INTO rollup_watermarks (rollup_name, high_watermark, refreshed_at)
+VALUES ($1, $2, NOW())
+ON CONFLICT (rollup_name) DO UPDATE SET high_watermark = EXCLUDED.high_watermark, refreshed_at = NOW()
+"""
+_FIRST_INGEST_SQL = "SELECT MIN(ingested_at) FROM consolidated_billing"
+# Groups whose rows were all retracted; the raw query would not return them.
+_EMPTY_GROUPS_SQL = (
+    "DELETE FROM billing_daily_rollup WHERE tenant_id = ANY($1::uuid[]) AND row_count = 0",
+    "DELETE FROM billing_monthly_tag_rollup WHERE tenant_id = ANY($1::uuid[]) AND row_count = 0",
+    "DELETE FROM billing_monthly_resource_rollup WHERE tenant_id = ANY($1::uuid[]) AND row_count = 0",
+)
+
+
+def _fold(name: str, where: str, sign: str = "") -> str:
+    return _FOLD_SQL[name].replace("{where}", where).replace("{sign}", sign)
+
+
+def _month_floor(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _month_ceil(day: date) -> date:
+    if day.day == 1:
+        return day
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _utc(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Incremental refresh
+# ---------------------------------------------------------------------------
+
+class RollupRefresher:
+    """
+    Keeps the rollup tables current. refresh() may run from any number of
+    processes; a session advisory lock lets one of them work at a time.
+    """
+
+    def __init__(self, interval_seconds: float = ROLLUP_REFRESH_SECONDS) -> None:
+        self._interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._refresh = metrics.LatencyTracker()
+        self._groups = metrics.Counter()
+        self._failures = metrics.Counter()
+        self._lag_seconds: Optional[float] = None
+        metrics.register("rollups", self.snapshot)
+
+    async def start(self) -> None:
+        if self._interval <= 0:
+            logger.info("Rollup refresher disabled (ROLLUP_REFRESH_SECONDS=0).")
+            return
+        self._task = asyncio.create_task(self._loop(), name="rollup-refresher")
+        logger.info("Rollup refresher started (every %.0fs).", self._interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("Rollup refresher stopped.")
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._failures.inc()
+                logger.warning("Rollup refresh failed: %s", exc)
+            await asyncio.sleep(self._interval)
+
+    async def refresh(self) -> Dict[str, int]:
+        """
+        Fold everything ingested up to now() - lag into every rollup.
+        Returns the rollup groups upserted per table; empty when another
+        process holds the refresh lock.
+        """
+        pool = await database.get_pool()
+        upserted: Dict[str, int] = {}
+        async with pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+                return upserted
+            try:
+                with self._refresh.time():
+                    cutoff = await conn.fetchval(
+                        "SELECT NOW() - make_interval(secs => $1)", ROLLUP_SAFETY_LAG_SECONDS
+                    )
+                    for name in _FOLD_SQL:
+                        upserted[name] = await self._catch_up(conn, name, cutoff)
+                self._lag_seconds = (datetime.now(timezone.utc) - cutoff).total_seconds()
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+        return upserted
+
+    async def _catch_up(self, conn: Any, name: str, cutoff: datetime) -> int:
+        """Fold (watermark, cutoff] into one rollup and advance its watermark."""
+        async with conn.transaction():
+            low = await conn.fetchval(_WATERMARK_SQL, name)
+            if low is None:
+                # First refresh: start just before the oldest row.
+                first = await conn.fetchval(_FIRST_INGEST_SQL)
+                if first is None:
+                    return 0
+                low = first - timedelta(microseconds=1)
+            if low >= cutoff:
+                return 0
+            status = await conn.execute(_fold(name, _WINDOW), low, cutoff)
+            await conn.execute(_ADVANCE_SQL, name, cutoff)
+        groups = int(status.split()[-1])
+        self._groups.inc(groups)
+        logger.debug("Rollup %s folded (%s, %s]: %d groups.", name, low, cutoff, groups)
+        return groups
+
+    async def rebuild(self, since: date, until: Optional[date] = None, tenant_id: Optional[str] = None) -> None:
+        """
+        Recompute the rollups for charge periods in [since, until) from the
+        raw table, optionally for one tenant. Needed after raw rows are
+        deleted or restated, which the additive refresh cannot see. The
+        monthly rollups are rebuilt for whole months around the range.
+        """
+        until = until or datetime.now(timezone.utc).date() + timedelta(days=1)
+        pool = await database.get_pool()
+        async with pool.acquire() as conn:
+            await conn.execute("SELECT pg_advisory_lock($1)", _LOCK_KEY)
+            try:
+                async with conn.transaction():
+                    months = (_month_floor(since), _month_ceil(until))
+                    for name, (first, last) in (
+                        (DAILY_ROLLUP, (since, until)),
+                        (TAG_ROLLUP, months),
+                        (RESOURCE_ROLLUP, months),
+                    ):
+                        await conn.execute(_CLEAR_SQL[name], first, last, tenant_id)
+                        await conn.execute(
+                            _fold(name, _RANGE), _utc(first), _utc(last), tenant_id, name
+                        )
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+        logger.info("Rollups rebuilt for %s to %s (tenant=%s).", since, until, tenant_id or "all")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "refresh": self._refresh.snapshot(),
+            "groups_upserted": self._groups.value,
+            "failures": self._failures.value,
+            "lag_seconds": self._lag_seconds,
+        }
+
+
+async def hold_refresh(conn: Any) -> None:
+    """
+    Keep refresh() and rebuild() out until conn's transaction ends. Writers
+    that delete raw rows take it before retract(), so the watermarks cannot
+    move underneath them; any number of writers may hold it at once.
+    """
+    await conn.execute("SELECT pg_advisory_xact_lock_shared($1)", _LOCK_KEY)
+
+
+async def ingest_horizon(conn: Any) -> Optional[datetime]:
+    """
+    A time by which every hold_refresh() writer that stamped rows at or
+    before it has committed, or None while one is still open (or a
+    refresh is running). Readers that copy raw rows by ingested_at use it
+    as their upper bound, as refresh() does with the lock held.
+    """
+    async with conn.transaction():
+        if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", _LOCK_KEY):
+            return None
+        return await conn.fetchval("SELECT clock_timestamp()")
+
+
+async def retract(conn: Any, where: str, tenant_ids: Sequence[Any], *args: Any) -> None:
+    """
+    Subtract the raw rows matching where (a predicate on consolidated_billing
+    b, with args bound from $1) from every rollup they were folded into, then
+    drop the groups left empty for tenant_ids. Run it in the transaction that
+    deletes those rows, after hold_refresh(), so routed answers stay exact
+    without a rebuild.
+    """
+    for name in _FOLD_SQL:
+        folded = f"({where}) AND b.ingested_at <= {_watermark(name)}"
+        await conn.execute(_fold(name, folded, sign="-"), *args)
+    for sql in _EMPTY_GROUPS_SQL:
+        await conn.execute(sql, list(tenant_ids))
+
+
+async def purge(conn: Any, before: date, tenant_ids: Optional[Sequence[Any]] = None) -> None:
+    """
+    Drop rollup rows for charge periods before the month-aligned date
+    before, for every tenant or only tenant_ids. Called when raw history
+    expires (partitions.py) so routed answers keep matching the raw table.
+    """
+    tenants = list(tenant_ids) if tenant_ids is not None else None
+    await conn.execute(
+        "DELETE FROM billing_daily_rollup WHERE usage_date < $1 AND ($2::uuid[] IS NULL OR tenant_id = ANY($2))",
+        before, tenants,
+    )
+    for table in (TAG_ROLLUP, RESOURCE_ROLLUP):
+        await conn.execute(
+            f"DELETE FROM {table} WHERE usage_month < $1 AND ($2::uuid[] IS NULL OR tenant_id = ANY($2))",
+            _month_floor(before), tenants,
+        )
+
+
+# ---------------------------------------------------------------------------
+# Query routing
+# ---------------------------------------------------------------------------
+
+def _watermark(name: str) -> str:
+    return f"COALESCE((SELECT high_watermark FROM rollup_watermarks WHERE rollup_name = '{name}'), '-infinity')"
+
+
+def _in_ranges(column: str, ranges: Sequence[Tuple[str, str]]) -> str:
+    clauses = [f"({column} >= {start} AND {column} < {end})" for start, end in ranges]
+    return clauses[0] if len(clauses) == 1 else f"({' OR '.join(clauses)})"
+
+
+def _daily_source(
+    bind: Params, spans: Sequence[Tuple[datetime, datetime]], provider: Optional[str], cost: str
+) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Rows (usage_date, provider_name, service_name, region, cost) from the
+    daily rollup plus the raw rows ingested after its watermark. Returns the
+    source and the bound date ranges for filters on usage_date.
+    """
+    days = [(bind(start.date()), bind(end.date())) for start, end in spans]
+    times = [(bind(start), bind(end)) for start, end in spans]
+    rollup_where = f"tenant_id = $1 AND {_in_ranges('usage_date', days)}"
+    raw_where = f"tenant_id = $1 AND {_in_ranges('charge_period_start', times)}"
+    if provider:
+        providers = bind(PROVIDERS[provider])
+        rollup_where += f" AND lower(provider_name) = ANY({providers}::text[])"
+        raw_where += f" AND lower(provider_name) = ANY({providers}::text[])"
+    source = (
+        f"(SELECT usage_date, provider_name, service_name, region, {cost} AS cost "
+        f"FROM billing_daily_rollup WHERE {rollup_where} "
+        f"UNION ALL "
+        f"SELECT (charge_period_start AT TIME ZONE 'UTC')::date, provider_name, service_name, "
+        f"{DIMENSIONS['region'][0]}, {cost} "
+        f"FROM consolidated_billing WHERE {raw_where} AND ingested_at > {_watermark(DAILY_ROLLUP)}) AS source"
+    )
+    return source, days
+
+
+def _tag_source(bind: Params, start: datetime, end: datetime, keys: Sequence[str], cost: str) -> str:
+    """Rows (tag_key, tag_value, cost, rows) for keys from the tag rollup plus its raw tail."""
+    wanted = bind(list(keys))
+    return (
+        f"SELECT tag_key, tag_value, {cost} AS cost, row_count AS rows FROM billing_monthly_tag_rollup "
+        f"WHERE tenant_id = $1 AND usage_month >= {bind(start.date())} AND usage_month < {bind(end.date())} "
+        f"AND tag_key = ANY({wanted}::text[]) "
+        f"UNION ALL "
+        f"SELECT t.tag_key, t.tag_value, b.{cost}, 1 FROM consolidated_billing b "
+        f"CROSS JOIN LATERAL ({_EXPLODE_TAGS}) AS t(tag_key, tag_value) "
+        f"WHERE b.tenant_id = $1 AND b.charge_period_start >= {bind(start)} AND b.charge_period_start < {bind(end)} "
+        f"AND b.ingested_at > {_watermark(TAG_ROLLUP)} AND t.tag_key = ANY({wanted}::text[])"
+    )
+
+
+def _whole_months(slots: Dict[str, Any]) -> bool:
+    return slots["start"].day == 1 and slots["end"].day == 1
+
+
+def _route_daily(match: IntentMatch, bind: Params) -> Optional[str]:
+    slots = match.slots
+    dimension = slots.get("dimension")
+    if dimension is not None and dimension not in ROLLUP_DIMENSIONS:
+        return None
+    cost, provider = slots["cost"], slots.get("provider")
+    column = DIMENSIONS[dimension][1] if dimension else None
+
+    if match.intent == "mom":
+        source, (current, previous) = _daily_source(
+            bind, [(slots["start"], slots["end"]), (slots["previous_start"], slots["previous_end"])], provider, cost
+        )
+        sums = (
+            f"COALESCE(SUM(cost) FILTER (WHERE {_in_ranges('usage_date', [current])}), 0) AS current_cost, "
+            f"COALESCE(SUM(cost) FILTER (WHERE {_in_ranges('usage_date', [previous])}), 0) AS previous_cost"
+        )
+        if column:
+            return (
+                f"SELECT {column}, current_cost, previous_cost, current_cost - previous_cost AS delta "
+                f"FROM (SELECT {column}, {sums} FROM {source} GROUP BY 1) AS months "
+                f"ORDER BY ABS(current_cost - previous_cost) DESC LIMIT {slots['n']}"
+            )
+        return (
+            f"SELECT current_cost, previous_cost, current_cost - previous_cost AS delta "
+            f"FROM (SELECT {sums} FROM {source}) AS months"
+        )
+
+    source, _ = _daily_source(bind, [(slots["start"], slots["end"])], provider, cost)
+    if match.intent == "total":
+        return f"SELECT COALESCE(SUM(cost), 0) AS total_cost FROM {source}"
+    if match.intent == "trend":
+        return (
+            f"SELECT DATE_TRUNC('{slots['grain']}', usage_date::timestamptz) AS period_start, SUM(cost) AS total_cost "
+            f"FROM {source} GROUP BY 1 ORDER BY 1 LIMIT 1000"
+        )
+    if match.intent in ("top_n", "breakdown") and column:
+        return (
+            f"SELECT {column}, SUM(cost) AS total_cost FROM {source} "
+            f"GROUP BY 1 ORDER BY total_cost DESC LIMIT {slots['n']}"
+        )
+    return None
+
+
+def _route_tags(match: IntentMatch, bind: Params) -> Optional[str]:
+    slots = match.slots
+    key = slots.get("tag_key")
+    if slots.get("provider") or not _whole_months(slots) or key in (TOTAL_TAG_KEY, NO_TAGS_KEY):
+        return None
+    cost = slots["cost"]
+
+    if match.intent == "untagged":
+        if key is None:
+            source = _tag_source(bind, slots["start"], slots["end"], [TOTAL_TAG_KEY, NO_TAGS_KEY], cost)
+            untagged = f"SUM(cost) FILTER (WHERE tag_key = '{NO_TAGS_KEY}')"
+        else:
+            source = _tag_source(bind, slots["start"], slots["end"], [TOTAL_TAG_KEY, key], cost)
+            untagged = f"SUM(CASE WHEN tag_key = '{TOTAL_TAG_KEY}' THEN cost ELSE -cost END)"
+        # Distinct resources are not kept in the rollup.
+        return (
+            f"SELECT COALESCE({untagged}, 0) AS untagged_cost, "
+            f"COALESCE(SUM(cost) FILTER (WHERE tag_key = '{TOTAL_TAG_KEY}'), 0) AS total_cost, "
+            f"NULL::bigint AS untagged_resources FROM ({source}) AS source"
+        )
+
+    # Tag breakdown: rows missing the key are the month total minus every value.
+    source = _tag_source(bind, slots["start"], slots["end"], [TOTAL_TAG_KEY, key], cost)
+    sign = f"CASE WHEN tag_key = '{TOTAL_TAG_KEY}' THEN 1 ELSE -1 END"
+    return (
+        f"WITH source AS ({source}) "
+        f"SELECT tag_value, SUM(cost) AS total_cost FROM ("
+        f"SELECT tag_value, cost, rows FROM source WHERE tag_key <> '{TOTAL_TAG_KEY}' "
+        f"UNION ALL "
+        f"SELECT '{UNTAGGED_VALUE}', SUM(cost * {sign}), SUM(rows * {sign}) FROM source"
+        f") AS tagged GROUP BY 1 HAVING SUM(rows) > 0 ORDER BY total_cost DESC LIMIT {MAX_TOP_N}"
+    )
+
+
+def route(match: IntentMatch) -> Optional[IntentMatch]:
+    """
+    Rewrite a template match to read the rollups, or return None when the
+    rollups cannot answer it at the requested grain (e.g. breakdowns by
+    account or resource, or tag questions over partial months).
+    """
+    if not OPTIC_USE_ROLLUPS:
+        return None
+    bind = Params()
+    if match.intent == "untagged" or match.slots.get("dimension") == "tag":
+        sql, rollup = _route_tags(match, bind), TAG_ROLLUP
+    else:
+        sql, rollup = _route_daily(match, bind), DAILY_ROLLUP
+    if sql is None:
+        return None
+    return match._replace(sql=sql, params=tuple(bind.values), slots={**match.slots, "rollup": rollup})
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def _main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh or rebuild the billing rollups.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("refresh", help="Fold rows ingested since the watermark.")
+    rebuild = commands.add_parser("rebuild", help="Recompute a charge-period range from raw rows.")
+    rebuild.add_argument("--since", type=date.fromisoformat, required=True)
+    rebuild.add_argument("--until", type=date.fromisoformat, default=None)
+    rebuild.add_argument("--tenant", default=None)
+    args = parser.parse_args(argv)
+
+    refresher = RollupRefresher()
+    try:
+        if args.command == "refresh":
+            print(await refresher.refresh())
+        else:
+            await refresher.rebuild(args.since, args.until, args.tenant)
+    finally:
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,434 @@
+"""
+shield.py
+=========
+TEJUSKA Cloud Intelligence
+Agentic Shield: per-resource cost thresholds that trigger ABACUS.
+
+A rule caps one resource's billed cost for the current UTC month. Rules
+live in shield_rules; the evaluator keeps every armed rule in memory,
+keyed by (tenant, resource_id), next to a running month-to-date sum for
+that resource. Each pass reads the billing rows ingested since its
+watermark, grouped by (tenant, resource), and adds them to the sums of
+the ruled resources they touch: one dict lookup per group, so a pass
+costs time proportional to the batch, not to the number of rules.
+
+Running sums can drift above the truth when an export is reloaded (its
+old rows are deleted), so a resource that crosses its threshold is
+confirmed with an exact query before anything happens. Confirmed rules are
+claimed (armed -> triggered, once across processes), an ABACUS evaluation
+is queued on the job queue (evaluate_and_terminate, honouring the rule's
+dry_run) and an alert for the rule's recipient is queued on the
+notification outbox together with the job id. Saving a rule again re-arms
+it.
+
+Sums are seeded exactly when the evaluator starts, when a rule is added or
+changed, and when the month rolls over; rule changes made by other
+processes are picked up each pass through shield_rules.updated_at.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import asyncpg
+
+import database
+import metrics
+import rollups
+from notifications import Notification
+from outbox import NotificationOutbox
+
+logger = logging.getLogger("tejuska.shield")
+
+SHIELD_POLL_SECONDS: float = float(os.environ.get("SHIELD_POLL_SECONDS", "30"))
+SHIELD_SAFETY_LAG_SECONDS: float = float(os.environ.get("SHIELD_SAFETY_LAG_SECONDS", "0"))
+# Rules updated this long before the last sync are read again, covering
+# transactions that committed after a later one was already seen.
+SHIELD_RULE_SYNC_OVERLAP_SECONDS: float = float(os.environ.get("SHIELD_RULE_SYNC_OVERLAP_SECONDS", "60"))
+
+_LOCK_KEY = 0x7368_6C64  # pg advisory lock: one evaluation pass at a time across nodes
+
+RuleKey = Tuple[str, str]
+Enqueue = Callable[[str, str, bool], Awaitable[Tuple[str, bool]]]
+
+_RULE_COLUMNS = """
+tenant_id::text AS tenant_id, resource_id, provider_name, threshold::float8 AS threshold, channel,
+recipient, dry_run, status, triggered_at, triggered_cost::float8 AS triggered_cost, job_id::text AS job_id,
+updated_at
+"""
+_CHANGED_RULES_SQL = f"SELECT {_RULE_COLUMNS} FROM shield_rules WHERE updated_at > $1"
+_SAVE_RULE_SQL = f"""
+INSERT INTO shield_rules (tenant_id, resource_id, provider_name, threshold, channel, recipient, dry_run)
+VALUES ($1, $2, $3, $4, $5, $6, $7)
+ON CONFLICT (tenant_id, resource_id) DO UPDATE
+SET provider_name = EXCLUDED.provider_name, threshold = EXCLUDED.threshold, channel = EXCLUDED.channel,
+    recipient = EXCLUDED.recipient, dry_run = EXCLUDED.dry_run, status = 'armed',
+    triggered_at = NULL, triggered_cost = NULL, job_id = NULL
+RETURNING {_RULE_COLUMNS}
+"""
+_GET_RULE_SQL = f"SELECT {_RULE_COLUMNS} FROM shield_rules WHERE tenant_id = $1 AND resource_id = $2"
+_LIST_RULES_SQL = f"SELECT {_RULE_COLUMNS} FROM shield_rules WHERE tenant_id = $1 ORDER BY resource_id"
+_DISABLE_RULE_SQL = f"""
+UPDATE shield_rules SET status = 'disabled' WHERE tenant_id = $1 AND resource_id = $2
+RETURNING {_RULE_COLUMNS}
+"""
+# $1/$2: the ingested_at window, $3/$4: the current month. Cost per touched resource.
+_BATCH_SQL = """
+SELECT tenant_id::text AS tenant_id, resource_id, SUM(billed_cost)::float8 AS billed_cost
+FROM consolidated_billing
+WHERE ingested_at > $1 AND ingested_at <= $2
+  AND charge_period_start >= $3 AND charge_period_start < $4
+  AND resource_id IS NOT NULL
+GROUP BY 1, 2
+"""
+# Exact month-to-date cost of the given resources, as of ingested_at <= $5.
+_SPEND_SQL = """
+SELECT k.tenant_id::text AS tenant_id, k.resource_id, COALESCE(SUM(b.billed_cost), 0)::float8 AS billed_cost
+FROM unnest($1::uuid[], $2::text[]) AS k(tenant_id, resource_id)
+LEFT JOIN consolidated_billing b
+       ON b.tenant_id = k.tenant_id AND b.resource_id = k.resource_id
+      AND b.charge_period_start >= $3 AND b.charge_period_start < $4
+      AND b.ingested_at <= $5
+GROUP BY 1, 2
+"""
+_CLAIM_SQL = """
+UPDATE shield_rules r
+SET status = 'triggered', triggered_at = NOW(), triggered_cost = c.cost
+FROM unnest($1::uuid[], $2::text[], $3::numeric[], $4::timestamptz[]) AS c(tenant_id, resource_id, cost, updated_at)
+WHERE r.tenant_id = c.tenant_id AND r.resource_id = c.resource_id
+  AND r.status = 'armed' AND r.updated_at = c.updated_at
+RETURNING r.tenant_id::text AS tenant_id, r.resource_id, r.provider_name, r.threshold::float8 AS threshold,
+          r.channel, r.recipient, r.dry_run, r.triggered_cost::float8 AS triggered_cost
+"""
+_RECORD_JOB_SQL = "UPDATE shield_rules SET job_id = $3 WHERE tenant_id = $1 AND resource_id = $2"
+_REARM_SQL = """
+UPDATE shield_rules SET status = 'armed', triggered_at = NULL, triggered_cost = NULL
+WHERE tenant_id = $1 AND resource_id = $2 AND status = 'triggered' AND job_id IS NULL
+"""
+
+
+class Rule(NamedTuple):
+    tenant_id: str
+    resource_id: str
+    provider_name: Optional[str]
+    threshold: float
+    channel: str
+    recipient: str
+    dry_run: bool
+    updated_at: datetime
+
+    @classmethod
+    def from_row(cls, row: Any) -> "Rule":
+        return cls(*(row[field] for field in cls._fields))
+
+    @property
+    def key(self) -> RuleKey:
+        return (self.tenant_id, self.resource_id)
+
+
+def month_bounds(moment: datetime) -> Tuple[datetime, datetime]:
+    """Start of moment's UTC month and of the next one."""
+    start = moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+# ---------------------------------------------------------------------------
+# In-memory rule index
+# ---------------------------------------------------------------------------
+
+class RuleIndex:
+    """Armed rules by (tenant, resource_id) with each resource's running spend."""
+
+    def __init__(self) -> None:
+        self.rules: Dict[RuleKey, Rule] = {}
+        self.spend: Dict[RuleKey, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def put(self, rule: Rule, spend: float) -> None:
+        self.rules[rule.key] = rule
+        self.spend[rule.key] = spend
+
+    def remove(self, key: RuleKey) -> None:
+        self.rules.pop(key, None)
+        self.spend.pop(key, None)
+
+    def add(self, costs: Iterable[Tuple[str, str, float]]) -> List[RuleKey]:
+        """Add batch costs to ruled resources; returns the keys now over their threshold."""
+        over: List[RuleKey] = []
+        rules, spend = self.rules, self.spend
+        for tenant_id, resource_id, cost in costs:
+            key = (tenant_id, resource_id)
+            rule = rules.get(key)
+            if rule is None:
+                continue
+            spend[key] += cost
+            if spend[key] > rule.threshold:
+                over.append(key)
+        return over
+
+    def over(self, keys: Iterable[RuleKey]) -> List[RuleKey]:
+        return [key for key in keys if key in self.rules and self.spend[key] > self.rules[key].threshold]
+
+
+# ---------------------------------------------------------------------------
+# Evaluator
+# ---------------------------------------------------------------------------
+
+class ShieldEvaluator:
+    """
+    Evaluates Agentic Shield rules against newly ingested billing rows.
+
+    Parameters
+    ----------
+    enqueue          : Coroutine enqueue(tenant_id, resource_id, dry_run) -> (job_id, coalesced)
+                       that queues an ABACUS evaluation (JobQueue.enqueue).
+    outbox           : Queues trigger alerts; None skips them.
+    interval_seconds : Poll period; 0 disables the background loop.
+    """
+
+    def __init__(
+        self,
+        enqueue: Enqueue,
+        outbox: Optional[NotificationOutbox] = None,
+        interval_seconds: float = SHIELD_POLL_SECONDS,
+    ) -> None:
+        self._enqueue = enqueue
+        self._outbox = outbox
+        self._interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.index = RuleIndex()
+        self.watermark: Optional[datetime] = None
+        self._month: Optional[datetime] = None
+        self._rules_synced: Optional[datetime] = None
+        self._passes = metrics.LatencyTracker()
+        self._rows = metrics.Counter()
+        self._confirmed = metrics.Counter()
+        self._rejected = metrics.Counter()
+        self._triggered = metrics.Counter()
+        self._failures = metrics.Counter()
+        metrics.register("shield", self.snapshot)
+
+    async def start(self) -> None:
+        if self._interval <= 0:
+            logger.info("Agentic Shield evaluation disabled (SHIELD_POLL_SECONDS=0).")
+            return
+        self._task = asyncio.create_task(self._loop(), name="shield-evaluator")
+        logger.info("Agentic Shield evaluator started (every %.0fs).", self._interval)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Agentic Shield evaluator stopped.")
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.evaluate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._failures.inc()
+                logger.warning("Agentic Shield pass failed: %s", exc)
+            await asyncio.sleep(self._interval)
+
+    async def _spend(self, conn: Any, keys: Sequence[RuleKey], as_of: datetime) -> Dict[RuleKey, float]:
+        """Exact month-to-date cost of keys from rows ingested by as_of."""
+        if not keys:
+            return {}
+        start, end = month_bounds(as_of)
+        rows = await conn.fetch(_SPEND_SQL, [k[0] for k in keys], [k[1] for k in keys], start, end, as_of)
+        return {(row["tenant_id"], row["resource_id"]): row["billed_cost"] for row in rows}
+
+    async def _sync_rules(self, conn: Any, as_of: datetime) -> List[RuleKey]:
+        """Apply rule changes since the last sync; returns keys added or changed."""
+        if self._rules_synced is None:
+            since = datetime.min.replace(tzinfo=timezone.utc)
+        else:
+            since = self._rules_synced - timedelta(seconds=SHIELD_RULE_SYNC_OVERLAP_SECONDS)
+        rows = await conn.fetch(_CHANGED_RULES_SQL, since)
+        changed: List[Rule] = []
+        for row in rows:
+            rule = Rule.from_row(row)
+            if row["status"] != "armed":
+                self.index.remove(rule.key)
+            elif self.index.rules.get(rule.key) != rule:
+                changed.append(rule)
+            if self._rules_synced is None or row["updated_at"] > self._rules_synced:
+                self._rules_synced = row["updated_at"]
+        spend = await self._spend(conn, [rule.key for rule in changed], as_of)
+        for rule in changed:
+            self.index.put(rule, spend.get(rule.key, 0.0))
+        return [rule.key for rule in changed]
+
+    async def evaluate(self) -> Dict[str, int]:
+        """
+        One pass over rows ingested since the watermark. Returns rows folded
+        and rules triggered; empty when another evaluator holds the lock or
+        an ingest is still open.
+        """
+        pool = await database.get_pool()
+        async with pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+                return {}
+            try:
+                horizon = await rollups.ingest_horizon(conn)
+                if horizon is None:
+                    return {}
+                started = time.perf_counter()
+                cutoff = horizon - timedelta(seconds=SHIELD_SAFETY_LAG_SECONDS)
+                month, month_end = month_bounds(cutoff)
+                if self.watermark is None or month != self._month:
+                    # First pass or a new month: every armed rule is seeded exactly as of cutoff.
+                    self.index, self._rules_synced, self._month = RuleIndex(), None, month
+                    candidates = await self._sync_rules(conn, cutoff)
+                    rows = []
+                else:
+                    candidates = await self._sync_rules(conn, self.watermark)
+                    rows = await conn.fetch(_BATCH_SQL, self.watermark, cutoff, month, month_end)
+                    candidates += self.index.add(
+                        (row["tenant_id"], row["resource_id"], row["billed_cost"]) for row in rows
+                    )
+                self.watermark = cutoff
+                over = self.index.over(dict.fromkeys(candidates))
+                if over:
+                    exact = await self._spend(conn, over, cutoff)
+                    for key in over:
+                        self.index.spend[key] = exact[key]
+                    confirmed = self.index.over(over)
+                    self._confirmed.inc(len(confirmed))
+                    self._rejected.inc(len(over) - len(confirmed))
+                    claimed = await self._claim(conn, confirmed)
+                else:
+                    claimed = []
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+
+        self._rows.inc(len(rows))
+        self._passes.observe((time.perf_counter() - started) * 1000)
+        await asyncio.gather(*(self._trigger(row) for row in claimed))  # enqueues share one group commit
+        return {"resources": len(rows), "triggered": len(claimed)}
+
+    async def _claim(self, conn: Any, keys: List[RuleKey]) -> List[Any]:
+        """Mark confirmed rules triggered; returns those this process won."""
+        if not keys:
+            return []
+        rules = [self.index.rules[key] for key in keys]
+        claimed = await conn.fetch(
+            _CLAIM_SQL,
+            [rule.tenant_id for rule in rules], [rule.resource_id for rule in rules],
+            [round(self.index.spend[rule.key], 6) for rule in rules], [rule.updated_at for rule in rules],
+        )
+        for key in keys:
+            self.index.remove(key)
+        return claimed
+
+    async def _trigger(self, row: Any) -> None:
+        """Queue the ABACUS evaluation for a claimed rule and an alert for its recipient."""
+        tenant_id, resource_id = row["tenant_id"], row["resource_id"]
+        pool = await database.get_pool()
+        try:
+            job_id, _ = await self._enqueue(tenant_id, resource_id, row["dry_run"])
+            async with pool.acquire() as conn, conn.transaction():
+                await conn.execute(_RECORD_JOB_SQL, tenant_id, resource_id, job_id)
+                if self._outbox is not None:
+                    await self._outbox.enqueue([(tenant_id, self._alert(row, job_id))], conn=conn)
+        except Exception as exc:
+            self._failures.inc()
+            logger.warning("Agentic Shield could not queue %s/%s; re-arming: %s", tenant_id, resource_id, exc)
+            await pool.execute(_REARM_SQL, tenant_id, resource_id)
+            return
+        self._triggered.inc()
+        logger.info("Agentic Shield triggered for %s/%s at $%.2f (job %s).",
+                    tenant_id, resource_id, row["triggered_cost"], job_id)
+
+    @staticmethod
+    def _alert(row: Any, job_id: str) -> Notification:
+        action = "A dry-run evaluation" if row["dry_run"] else "An auto-termination evaluation"
+        body = (
+            f"TEJUSKA Agentic Shield: {row['provider_name'] or 'cloud'} resource '{row['resource_id']}' has billed "
+            f"${row['triggered_cost']:,.2f} this month, above its ${row['threshold']:,.2f} limit. "
+            f"{action} was queued with ABACUS (job {job_id})."
+        )
+        return Notification(
+            row["channel"], row["recipient"], body,
+            f"TEJUSKA Agentic Shield: {row['resource_id']} exceeded its threshold",
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "armed_rules": len(self.index),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "pass": self._passes.snapshot(),
+            "resources_folded": self._rows.value,
+            "confirmed": self._confirmed.value,
+            "rejected_on_confirmation": self._rejected.value,
+            "triggered": self._triggered.value,
+            "failures": self._failures.value,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Rule store (used by the API)
+# ---------------------------------------------------------------------------
+
+async def save_rule(
+    tenant_id: str,
+    resource_id: str,
+    threshold: float,
+    recipient: str,
+    channel: str = "email",
+    provider_name: Optional[str] = None,
+    dry_run: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """Create or replace a resource's rule and arm it; None when the tenant does not exist."""
+    pool = await database.get_pool()
+    try:
+        row = await pool.fetchrow(
+            _SAVE_RULE_SQL, tenant_id, resource_id, provider_name, threshold, channel, recipient, dry_run,
+        )
+    except asyncpg.ForeignKeyViolationError:
+        return None
+    return dict(row)
+
+
+async def get_rule(tenant_id: str, resource_id: str) -> Optional[Dict[str, Any]]:
+    pool = await database.get_readonly_pool()
+    row = await pool.fetchrow(_GET_RULE_SQL, tenant_id, resource_id)
+    return dict(row) if row is not None else None
+
+
+async def list_rules(tenant_id: str) -> List[Dict[str, Any]]:
+    pool = await database.get_readonly_pool()
+    return [dict(row) for row in await pool.fetch(_LIST_RULES_SQL, tenant_id)]
+
+
+async def disable_rule(tenant_id: str, resource_id: str) -> Optional[Dict[str, Any]]:
+    """Disarm a rule (kept, so evaluators see the change); None when there is none."""
+    pool = await database.get_pool()
+    row = await pool.fetchrow(_DISABLE_RULE_SQL, tenant_id, resource_id)
+    return dict(row) if row is not None else None
+
+
+async def simulate(tenant_id: str, resource_id: str, cost: float, enqueue: Enqueue) -> Optional[Dict[str, Any]]:
+    """
+    Check a hypothetical month-to-date cost against the resource's rule. When
+    it is over the threshold a dry-run ABACUS evaluation is queued; running
+    sums and the rule's state are left alone. None when there is no rule.
+    """
+    rule = await get_rule(tenant_id, resource_id)
+    if rule is None:
+        return None
+    exceeded = rule["status"] != "disabled" and cost > rule["threshold"]
+    job_id = (await enqueue(tenant_id, resource_id, True))[0] if exceeded else None
+    return {
+        "resource_id": resource_id, "threshold": rule["threshold"], "cost": cost,
+        "status": rule["status"], "exceeded": exceeded, "job_id": job_id,
+    }
@@ -0,0 +1,181 @@
+"""
+sql_guard.py
+============
+TEJUSKA Cloud Intelligence
+Guardrail and rewrite stage for OPTIC-generated SQL (sqlglot-based).
+
+Runs between generation and execution:
+  1. Parse as PostgreSQL; exactly one SELECT (or set operation of SELECTs).
+  2. Reject writes, SELECT INTO, unknown tables and dangerous functions.
+  3. Scope every billing table to the tenant: each reference becomes
+     (SELECT * FROM <table> WHERE tenant_id = $1), so the filter sits on the
+     indexed tenant_id column no matter how the model joined or nested it.
+     Literal tenant_id comparisons are re-bound to $1.
+  4. Rewrite non-sargable period predicates (DATE_TRUNC / EXTRACT / ::date
+     on billing_period_* or charge_period_start) into ranges on the indexed
+     column, which also lets Postgres prune monthly partitions.
+  5. Force a LIMIT no larger than OPTIC_ROW_LIMIT.
+The plan-cost ceiling (EXPLAIN) is enforced by optic_sql.QueryExecutor.
+"""
+
+import os
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+logger = logging.getLogger("tejuska.sql_guard")
+
+OPTIC_ROW_LIMIT: int = int(os.environ.get("OPTIC_ROW_LIMIT", "1000"))
+OPTIC_MAX_PLAN_COST: float = float(os.environ.get("OPTIC_MAX_PLAN_COST", "1000000"))
+OPTIC_ALLOWED_TABLES: Tuple[str, ...] = tuple(
+    t.strip().lower()
+    for t in os.environ.get("OPTIC_ALLOWED_TABLES", "consolidated_billing,ai_recommendations").split(",")
+    if t.strip()
+)
+
+TENANT_COLUMN = "tenant_id"
+TENANT_PARAMETER = 1
+# Timestamp columns covered by the billing indexes in init_db.sql;
+# charge_period_start is also the partition key, so ranges on it prune months.
+RANGE_INDEXED_COLUMNS = frozenset({"billing_period_start", "billing_period_end", "charge_period_start"})
+
+_DENIED_FUNCTION_PREFIXES = (
+    "pg_", "lo_", "dblink", "set_config", "current_setting", "txid_",
+    "query_to_xml", "table_to_xml", "cursor_to_xml", "nextval", "setval",
+)
+_WRITE_NODES = tuple(
+    getattr(exp, name)
+    for name in ("Insert", "Update", "Delete", "Merge", "Create", "Drop", "Alter", "AlterTable",
+                 "Command", "Into", "Lock", "TruncateTable", "Copy", "Grant")
+    if hasattr(exp, name)
+)
+_QUERY_ROOTS = (exp.Select, exp.Union, exp.Intersect, exp.Except)
+
+
+class GuardrailError(ValueError):
+    """The generated SQL was rejected by the guardrail."""
+
+
+class GuardedQuery(NamedTuple):
+    sql: str               # rewritten statement; bind tenant_id as $1
+    tables: Tuple[str, ...]
+    limit: int
+    rewrites: List[str]    # human-readable notes on what was changed
+
+
+def _tenant_predicate() -> exp.Expression:
+    return exp.EQ(
+        this=exp.column(TENANT_COLUMN),
+        expression=exp.Parameter(this=exp.Literal.number(TENANT_PARAMETER)),
+    )
+
+
+def _literal_value(node: exp.Expression) -> Optional[exp.Literal]:
+    return node if isinstance(node, exp.Literal) else None
+
+
+def _range_for(predicate: exp.EQ) -> Optional[exp.Expression]:
+    """Sargable replacement for `f(indexed_col) = literal`, or None."""
+    left, right = predicate.this, predicate.expression
+    if _literal_value(left) is not None:
+        left, right = right, left
+    literal = _literal_value(right)
+    if literal is None:
+        return None
+
+    if isinstance(left, exp.TimestampTrunc) and isinstance(left.this, exp.Column):
+        column, unit = left.this, left.text("unit").lower()
+        if column.name.lower() not in RANGE_INDEXED_COLUMNS or unit not in ("day", "week", "month", "quarter", "year"):
+            return None
+        start = f"DATE_TRUNC('{unit}', CAST({exp.Literal.string(literal.this).sql()} AS TIMESTAMPTZ))"
+        sql = f"{column.sql()} >= {start} AND {column.sql()} < {start} + INTERVAL '1 {unit}'"
+    elif isinstance(left, exp.Extract) and isinstance(left.expression, exp.Column):
+        column, unit = left.expression, left.this.name.lower()
+        if column.name.lower() not in RANGE_INDEXED_COLUMNS or unit != "year" or literal.is_string:
+            return None
+        year = int(literal.this)
+        sql = f"{column.sql()} >= MAKE_DATE({year}, 1, 1) AND {column.sql()} < MAKE_DATE({year + 1}, 1, 1)"
+    elif isinstance(left, exp.Cast) and isinstance(left.this, exp.Column) and left.to.is_type("date"):
+        column = left.this
+        if column.name.lower() not in RANGE_INDEXED_COLUMNS:
+            return None
+        day = f"CAST({exp.Literal.string(literal.this).sql()} AS DATE)"
+        sql = f"{column.sql()} >= {day} AND {column.sql()} < {day} + 1"
+    else:
+        return None
+    return exp.paren(exp.condition(sql, dialect="postgres"), copy=False)
+
+
+def guard(sql: str, row_limit: int = OPTIC_ROW_LIMIT) -> GuardedQuery:
+    """
+    Validate and rewrite one generated statement.
+    Raises GuardrailError when the statement must not run.
+    """
+    try:
+        statements = [s for s in sqlglot.parse(sql.strip().rstrip(";"), read="postgres") if s is not None]
+    except ParseError as exc:
+        detail = exc.errors[0]["description"] if exc.errors else str(exc)
+        raise GuardrailError(f"SQL could not be parsed: {detail}") from exc
+    if len(statements) != 1:
+        raise GuardrailError("Exactly one SQL statement is allowed.")
+    root = statements[0]
+    if not isinstance(root, _QUERY_ROOTS):
+        raise GuardrailError(f"Only SELECT statements are allowed, got {root.key.upper()}.")
+
+    for node in root.walk():
+        if isinstance(node, _WRITE_NODES):
+            raise GuardrailError(f"{node.key.upper()} is not allowed in OPTIC queries.")
+        if isinstance(node, exp.Anonymous) and node.name.lower().startswith(_DENIED_FUNCTION_PREFIXES):
+            raise GuardrailError(f"Function {node.name} is not allowed in OPTIC queries.")
+
+    rewrites: List[str] = []
+    cte_names = {cte.alias_or_name.lower() for cte in root.find_all(exp.CTE)}
+
+    # Re-bind literal tenant filters (e.g. tenant_id = '<uuid>') to $1.
+    for predicate in list(root.find_all(exp.EQ)):
+        for side, other in ((predicate.this, predicate.expression), (predicate.expression, predicate.this)):
+            if isinstance(side, exp.Column) and side.name.lower() == TENANT_COLUMN and isinstance(other, exp.Literal):
+                other.replace(exp.Parameter(this=exp.Literal.number(TENANT_PARAMETER)))
+                rewrites.append("bound literal tenant_id filter to $1")
+                break
+
+    for predicate in list(root.find_all(exp.EQ)):
+        replacement = _range_for(predicate)
+        if replacement is not None:
+            rewrites.append(f"rewrote {predicate.sql(dialect='postgres')} as an indexed range")
+            predicate.replace(replacement)
+
+    tables = []
+    for table in list(root.find_all(exp.Table)):
+        name = table.name.lower()
+        if not table.args.get("db") and name in cte_names:
+            continue
+        if table.args.get("catalog") or table.db.lower() not in ("", "public") or name not in OPTIC_ALLOWED_TABLES:
+            raise GuardrailError(f"Table {table.sql(dialect='postgres')} is not available to OPTIC.")
+        scoped = (
+            exp.select("*")
+            .from_(exp.to_table(name))
+            .where(_tenant_predicate())
+            .subquery(table.alias_or_name, copy=False)
+        )
+        table.replace(scoped)
+        tables.append(name)
+    if not tables:
+        raise GuardrailError("The query does not read any tenant table.")
+
+    limit = root.args.get("limit")
+    limit_value = limit.expression if isinstance(limit, exp.Limit) else None
+    if not (isinstance(limit_value, exp.Literal) and not limit_value.is_string and int(limit_value.this) <= row_limit):
+        root = root.limit(row_limit, copy=False)
+        rewrites.append(f"limited to {row_limit} rows")
+        effective_limit = row_limit
+    else:
+        effective_limit = int(limit_value.this)
+
+    guarded = root.sql(dialect="postgres")
+    if rewrites:
+        logger.info("OPTIC SQL rewritten: %s.", "; ".join(rewrites))
+    return GuardedQuery(sql=guarded, tables=tuple(dict.fromkeys(tables)), limit=effective_limit, rewrites=rewrites)
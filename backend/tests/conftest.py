@@ -0,0 +1,15 @@
+"""
+conftest.py
+===========
+TEJUSKA Cloud Intelligence
+Puts backend/ on sys.path so tests import the modules the way main.py does.
+
+Usage (from backend/):
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
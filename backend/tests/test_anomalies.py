@@ -0,0 +1,154 @@
+"""
+test_anomalies.py
+=================
+TEJUSKA Cloud Intelligence
+Unit tests for the streaming series state and spike scoring (anomalies.py).
+"""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+import anomalies
+from anomalies import AnomalyDetector, SeriesState
+
+TENANT = "0b3c6a58-8d1f-4f0e-9a51-3f2d7c1e9b20"
+SERVICE = ("AWS", "Amazon EC2")
+REGION = "us-east-1"
+DAY = anomalies._day_number(date(2026, 9, 1))
+BASELINE = [100.0, 104.0, 97.0, 101.0, 99.0, 103.0, 96.0]
+
+
+def one(state: SeriesState, day: int, cost: float) -> bool:
+    """Apply one point for the test series; returns whether it updated the open day."""
+    rows = state.indices([TENANT], [SERVICE], [REGION])
+    return bool(state.apply(rows, np.array([day], dtype=np.int32), np.array([cost]))[0])
+
+
+def score(detector: AnomalyDetector, day: int, cost: float) -> list:
+    return detector.process(
+        [TENANT], [SERVICE], [REGION], np.array([day], dtype=np.int32), np.array([cost]),
+        {TENANT: 50.0}, alert_from=DAY,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Open day
+# ---------------------------------------------------------------------------
+
+def test_open_day_total_is_replaced_not_added_to():
+    state = SeriesState()
+    assert one(state, DAY, 10.0)
+    assert one(state, DAY, 12.5)
+    assert (state.open_day[0], state.open_cost[0], state.count[0]) == (DAY, 12.5, 0)
+
+
+def test_day_closes_only_when_a_later_day_arrives():
+    state = SeriesState()
+    one(state, DAY, 10.0)
+    one(state, DAY, 20.0)
+    assert state.count[0] == 0 and state.mean[0] == 0
+    one(state, DAY + 1, 5.0)
+    assert (state.count[0], state.mean[0], state.loc[0]) == (1, 20.0, 20.0)
+    assert (state.open_day[0], state.open_cost[0]) == (DAY + 1, 5.0)
+
+
+def test_late_point_is_ignored():
+    state = SeriesState()
+    one(state, DAY, 10.0)
+    one(state, DAY + 1, 5.0)
+    before = {name: array[:state.size].copy() for name, array in state._arrays.items()}
+    assert not one(state, DAY, 99.0)
+    for name, array in before.items():
+        np.testing.assert_array_equal(state._arrays[name][:state.size], array, err_msg=name)
+
+
+def test_apply_handles_many_series_at_once():
+    state = SeriesState()
+    rows = state.indices([TENANT] * 3, [SERVICE] * 3, ["a", "b", "c"])
+    state.apply(rows, np.array([DAY, DAY, DAY], dtype=np.int32), np.array([1.0, 2.0, 3.0]))
+    current = state.apply(rows, np.array([DAY + 1, DAY - 1, DAY], dtype=np.int32), np.array([4.0, 5.0, 6.0]))
+    assert current.tolist() == [True, False, True]
+    assert state.open_cost[rows].tolist() == [4.0, 2.0, 6.0]
+    assert state.count[rows].tolist() == [1, 0, 0]
+
+
+def test_rounds_number_repeats_in_input_order():
+    rows = np.array([5, 3, 5, 5, 3, 9])
+    assert anomalies._rounds(rows).tolist() == [0, 0, 1, 2, 1, 0]
+    assert anomalies._rounds(np.array([], dtype=np.int64)).tolist() == []
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def test_no_spike_during_warm_up():
+    detector = AnomalyDetector(interval_seconds=0)
+    last = anomalies.ANOMALY_WARMUP_DAYS - 1
+    for offset in range(last):
+        assert score(detector, DAY + offset, BASELINE[offset % 7]) == []
+    # One closed day short of the warm-up.
+    assert score(detector, DAY + last, 1000.0) == []
+    assert score(detector, DAY + last, BASELINE[last % 7]) == []
+    # Closing that day completes the warm-up.
+    assert len(score(detector, DAY + last + 1, 1000.0)) == 1
+
+
+def test_spike_on_a_clear_outlier_after_warm_up():
+    detector = AnomalyDetector(interval_seconds=0)
+    days = 3 * 7
+    for offset in range(days):
+        assert score(detector, DAY + offset, BASELINE[offset % 7]) == []
+    [(row, day, cost, expected)] = score(detector, DAY + days, 1000.0)
+    assert (row, day, cost) == (0, DAY + days, 1000.0)
+    assert expected == pytest.approx(BASELINE[days % 7], rel=0.05)
+    # Ordinary costs for the same open day are not spikes.
+    assert score(detector, DAY + days, BASELINE[days % 7] * 1.1) == []
+
+
+def test_spike_does_not_move_the_baseline_much():
+    detector = AnomalyDetector(interval_seconds=0)
+    for offset in range(3 * 7):
+        score(detector, DAY + offset, BASELINE[offset % 7])
+    score(detector, DAY + 21, 1000.0)
+    score(detector, DAY + 22, BASELINE[1])
+    expected, _ = detector.state.expected(np.array([0]), np.array([DAY + 28], dtype=np.int32))
+    assert expected[0] == pytest.approx(BASELINE[0], rel=0.2)
+
+
+def test_points_for_one_series_in_one_batch_apply_in_order():
+    detector = AnomalyDetector(interval_seconds=0)
+    n = 3 * 7
+    detector.process(
+        [TENANT] * n, [SERVICE] * n, [REGION] * n, np.arange(DAY, DAY + n, dtype=np.int32),
+        np.array([BASELINE[offset % 7] for offset in range(n)]), {TENANT: 50.0}, alert_from=DAY,
+    )
+    assert (detector.state.count[0], detector.state.open_day[0]) == (n - 1, DAY + n - 1)
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+def test_checkpoint_round_trip_keeps_the_key_index(tmp_path):
+    state = SeriesState(capacity=2)
+    tenants = [TENANT, TENANT, "other-tenant"]
+    services = [SERVICE, ("Azure", "Storage"), SERVICE]
+    regions = [REGION, "westeurope", REGION]
+    rows = state.indices(tenants, services, regions)
+    state.apply(rows, np.full(3, DAY, dtype=np.int32), np.array([1.0, 2.0, 3.0]))
+    state.apply(rows, np.full(3, DAY + 1, dtype=np.int32), np.array([4.0, 5.0, 6.0]))
+    path = str(tmp_path / "state.npz")
+    state.save(path, {"watermark": "2026-09-02T00:00:00+00:00"})
+
+    loaded, meta = SeriesState.load(path)
+    assert meta == {"watermark": "2026-09-02T00:00:00+00:00"}
+    assert loaded.size == 3 and loaded._index == state._index
+    assert loaded.services == state.services
+    for name, array in state._arrays.items():
+        np.testing.assert_array_equal(loaded._arrays[name][:3], array[:3], err_msg=name)
+    # Known keys find their rows; a new key gets the next one.
+    assert loaded.indices(tenants[::-1], services[::-1], regions[::-1]).tolist() == rows[::-1].tolist()
+    assert loaded.indices([TENANT], [SERVICE], ["eu-west-1"]).tolist() == [3]
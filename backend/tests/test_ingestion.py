@@ -0,0 +1,237 @@
+"""
+test_ingestion.py
+=================
+TEJUSKA Cloud Intelligence
+Unit tests for the binary COPY encoder and the export layout mapping
+(ingestion.py). Encoded streams are read back with an independent decoder
+of the PostgreSQL binary COPY format.
+"""
+
+import json
+import math
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pyarrow as pa
+import pytest
+
+import ingestion
+from ingestion import COPY_COLUMNS, COPY_HEADER, COPY_TRAILER, ExportReader, IngestionError
+
+TENANT = "0b3c6a58-8d1f-4f0e-9a51-3f2d7c1e9b20"
+INGESTED_AT = datetime(2026, 10, 18, 12, 30, 15, 250000, tzinfo=timezone.utc)
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Reference decoder
+# ---------------------------------------------------------------------------
+
+def decode_numeric(payload: bytes) -> Decimal:
+    ndigits, weight, sign, dscale = struct.unpack(">hhHh", payload[:8])
+    assert sign in (0x0000, 0x4000), f"unexpected numeric sign {sign:#x}"
+    digits = struct.unpack(f">{ndigits}H", payload[8:8 + 2 * ndigits])
+    assert all(d < 10000 for d in digits)
+    value = sum(Decimal(d) * Decimal(10000) ** (weight - i) for i, d in enumerate(digits))
+    value = value.quantize(Decimal(1).scaleb(-dscale))
+    return -value if sign == 0x4000 else value
+
+
+def decode_value(kind: str, payload: bytes):
+    if kind == "uuid":
+        return uuid.UUID(bytes=payload)
+    if kind == "timestamptz":
+        return PG_EPOCH + timedelta(microseconds=struct.unpack(">q", payload)[0])
+    if kind == "numeric":
+        return decode_numeric(payload)
+    if kind == "jsonb":
+        assert payload[:1] == b"\x01", "jsonb version byte"
+        return json.loads(payload[1:].decode())
+    return payload.decode()
+
+
+def decode_rows(stream: bytes, kinds):
+    """Binary COPY stream -> list of tuples of Python values (None for NULL)."""
+    assert stream.startswith(COPY_HEADER)
+    pos, rows = len(COPY_HEADER), []
+    while True:
+        (count,) = struct.unpack_from(">h", stream, pos)
+        pos += 2
+        if count == -1:
+            assert pos == len(stream), "bytes after the trailer"
+            return rows
+        assert count == len(kinds)
+        row = []
+        for kind in kinds:
+            (length,) = struct.unpack_from(">i", stream, pos)
+            pos += 4
+            if length == -1:
+                row.append(None)
+                continue
+            row.append(decode_value(kind, stream[pos:pos + length]))
+            pos += length
+        rows.append(tuple(row))
+
+
+def encode_column(pieces, n: int) -> bytes:
+    """One-column COPY stream from a column's encoded pieces."""
+    rows = ingestion._assemble([b"\x00\x01", *pieces], n)
+    return COPY_HEADER + b"".join(rows.to_pylist()) + COPY_TRAILER
+
+
+def column(stream_pieces, n: int, kind: str):
+    return [row[0] for row in decode_rows(encode_column(stream_pieces, n), [kind])]
+
+
+# ---------------------------------------------------------------------------
+# Field encoders
+# ---------------------------------------------------------------------------
+
+def test_numeric_values_round_trip():
+    values = [
+        -1234.5, 0.0, -0.0, 0.000001, -0.000001, 1.0, 10000.0, 123.4567891,
+        # Large values that float64 holds exactly to the micro-unit.
+        123456789012.5, -549755813888.0, 42.1, float("nan"),
+    ]
+    fields, micros = ingestion._numeric_pieces(pa.array(values, pa.float64()), "billed_cost")
+    decoded = column(fields, len(values), "numeric")
+    expected = [None if math.isnan(v) else Decimal(repr(v)).quantize(Decimal("0.000001")) for v in values]
+    assert decoded == expected
+    assert micros[0] == -1_234_500_000 and micros[-1] == 0
+
+
+def test_numeric_without_nulls_uses_the_fixed_block():
+    fields, _ = ingestion._numeric_pieces(pa.array([1.5, -2.25], pa.float64()), "billed_cost")
+    assert fields[0] == (18).to_bytes(4, "big")
+    assert column(fields, 2, "numeric") == [Decimal("1.500000"), Decimal("-2.250000")]
+
+
+def test_numeric_beyond_the_column_precision_is_rejected():
+    with pytest.raises(IngestionError, match="billed_cost"):
+        ingestion._numeric_pieces(pa.array([1e12], pa.float64()), "billed_cost")
+
+
+def test_timestamps_round_trip_across_the_pg_epoch():
+    values = [
+        datetime(2026, 10, 1, 13, 45, 30, 123456, tzinfo=timezone.utc),
+        datetime(1999, 12, 31, 23, 59, 59, 999999, tzinfo=timezone.utc),
+        PG_EPOCH,
+        None,
+    ]
+    arr = pa.array(values, pa.timestamp("us", tz="UTC"))
+    assert column(ingestion._timestamp_pieces(arr), len(values), "timestamptz") == values
+
+
+@pytest.mark.parametrize("values", [
+    ["EC2", None, "", "Région ünïcode", "x" * 300],
+    ["same", "same", "same"],
+])
+def test_text_round_trips(values):
+    pieces = ingestion._text_pieces(pa.array(values, pa.string()))
+    assert column(pieces, len(values), "text") == values
+
+
+def test_jsonb_adds_the_version_byte_and_fills_nulls():
+    values = ['{"team": "core"}', None, '{"a": "\\"q\\""}']
+    pieces = ingestion._text_pieces(pa.array(values, pa.string()), jsonb=True)
+    assert column(pieces, len(values), "jsonb") == [{"team": "core"}, {}, {"a": '"q"'}]
+    constant = ingestion._text_pieces(pa.array(["{}", "{}"], pa.string()), jsonb=True)
+    assert column(constant, 2, "jsonb") == [{}, {}]
+
+
+def test_scalar_pieces():
+    assert column([ingestion._scalar_piece(None, "text")], 2, "text") == [None, None]
+    assert column([ingestion._scalar_piece("{}", "jsonb")], 1, "jsonb") == [{}]
+
+
+# ---------------------------------------------------------------------------
+# Export layouts end to end
+# ---------------------------------------------------------------------------
+
+FIXTURES = {
+    "focus": (
+        "BillingAccountId,ChargePeriodStart,ChargePeriodEnd,BilledCost,EffectiveCost,BillingCurrency,"
+        "ProviderName,ServiceName,ResourceId,RegionId,ChargeCategory,Tags\n"
+        '111,2026-10-01T10:00:00Z,2026-10-01T11:00:00Z,-12.345678,-10.5,USD,AWS,Amazon EC2,i-1,us-east-1,'
+        'Credit,"{""team"": ""core""}"\n'
+    ),
+    "aws": (
+        "bill/PayerAccountId,lineItem/UsageStartDate,lineItem/UsageEndDate,lineItem/UnblendedCost,"
+        "lineItem/LineItemType,product/ProductName,lineItem/ResourceId,product/region,"
+        "lineItem/CurrencyCode,resourceTags/user:CostCenter\n"
+        "222,2026-10-02T00:00:00Z,2026-10-02T01:00:00Z,0.000001,Tax,Amazon S3,,eu-west-1,USD,finance\n"
+    ),
+    "azure": (
+        "SubscriptionId,Date,CostInBillingCurrency,BillingCurrency,MeterCategory,ResourceId,"
+        "ResourceLocation,ChargeType,Tags\n"
+        '333,10/03/2026,1234567.891011,EUR,Virtual Machines,/subs/333/vm1,westeurope,Purchase,'
+        '"""env"": ""prod"""\n'
+    ),
+    "gcp": (
+        "billing_account_id,usage_start_time,usage_end_time,cost,currency,service_description,"
+        "project_id,location_region,cost_type,invoice_month\n"
+        "444,2026-10-04 05:00:00 UTC,2026-10-04 06:00:00 UTC,0,USD,Compute Engine,proj-1,"
+        "us-central1,regular,202610\n"
+    ),
+}
+
+EXPECTED = {
+    "focus": {
+        "billing_account_id": "111", "provider_name": "AWS", "service_name": "Amazon EC2",
+        "resource_id": "i-1", "region_id": "us-east-1", "charge_type": "Credit",
+        "billed_cost": Decimal("-12.345678"), "effective_cost": Decimal("-10.500000"),
+        "charge_period_start": datetime(2026, 10, 1, 10, tzinfo=timezone.utc),
+        "charge_period_end": datetime(2026, 10, 1, 11, tzinfo=timezone.utc),
+        "billing_period_start": datetime(2026, 10, 1, tzinfo=timezone.utc),
+        "billing_period_end": datetime(2026, 11, 1, tzinfo=timezone.utc),
+        "list_cost": None, "tags": {"team": "core"},
+    },
+    "aws": {
+        "billing_account_id": "222", "provider_name": "AWS", "service_name": "Amazon S3",
+        "resource_id": None, "region_id": "eu-west-1", "charge_type": "Tax",
+        "billed_cost": Decimal("0.000001"), "effective_cost": Decimal("0.000001"),
+        "charge_period_start": datetime(2026, 10, 2, tzinfo=timezone.utc),
+        "tags": {"CostCenter": "finance"},
+    },
+    "azure": {
+        "billing_account_id": "333", "provider_name": "Microsoft", "service_name": "Virtual Machines",
+        "billing_currency": "EUR", "resource_id": "/subs/333/vm1", "region_id": "westeurope",
+        "charge_type": "Purchase", "billed_cost": Decimal("1234567.891011"),
+        "effective_cost": Decimal("1234567.891011"),
+        "charge_period_start": datetime(2026, 10, 3, tzinfo=timezone.utc),
+        "charge_period_end": datetime(2026, 10, 4, tzinfo=timezone.utc),
+        "tags": {"env": "prod"},
+    },
+    "gcp": {
+        "billing_account_id": "444", "provider_name": "Google Cloud", "service_name": "Compute Engine",
+        "resource_id": "proj-1", "region_id": "us-central1", "charge_type": "Usage",
+        "billed_cost": Decimal("0.000000"), "effective_cost": Decimal("0.000000"),
+        "charge_period_start": datetime(2026, 10, 4, 5, tzinfo=timezone.utc),
+        "billing_period_start": datetime(2026, 10, 1, tzinfo=timezone.utc),
+        "billing_period_end": datetime(2026, 11, 1, tzinfo=timezone.utc),
+        "tags": {},
+    },
+}
+
+
+@pytest.mark.parametrize("dialect", sorted(FIXTURES))
+def test_export_row_round_trips_per_dialect(tmp_path, dialect):
+    path = tmp_path / f"{dialect}.csv"
+    path.write_text(FIXTURES[dialect])
+    reader = ExportReader(str(path))
+    assert reader.dialect == dialect
+
+    stream = b"".join(bytes(chunk) for chunk in reader.copy_chunks(TENANT, "exports/file.csv", INGESTED_AT))
+    rows = decode_rows(stream, [kind for _, kind in COPY_COLUMNS])
+    assert len(rows) == 1 and reader.stats["rows"] == 1
+    row = dict(zip((name for name, _ in COPY_COLUMNS), rows[0]))
+
+    assert row["row_id"].version == 7
+    assert row["tenant_id"] == uuid.UUID(TENANT)
+    assert row["ingested_at"] == INGESTED_AT
+    assert row["source_file"] == "exports/file.csv"
+    for name, value in EXPECTED[dialect].items():
+        assert row[name] == value, name
+    assert reader.stats["billed_micros"] == int(EXPECTED[dialect]["billed_cost"] * 1_000_000)
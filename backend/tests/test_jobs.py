@@ -0,0 +1,83 @@
+"""
+test_jobs.py
+============
+TEJUSKA Cloud Intelligence
+Unit tests for the ABACUS job queue worker loop (jobs.py).
+"""
+
+import asyncio
+
+import jobs
+from jobs import JobQueue
+
+
+def job(job_id: str) -> dict:
+    return {"job_id": job_id, "tenant_id": "t", "resource_id": f"r-{job_id}", "dry_run": False}
+
+
+def run_worker(queue: JobQueue, claims: list) -> None:
+    """Run one worker until every claim has been handed out."""
+    async def claim():
+        if claims:
+            return claims.pop(0)
+        queue._stopping = True
+        return None
+
+    queue._claim = claim
+    asyncio.run(queue._worker(0))
+
+
+def test_worker_survives_when_recording_fails(monkeypatch):
+    monkeypatch.setattr(jobs, "ABACUS_JOB_POLL_SECONDS", 0)
+    handled, recorded = [], []
+
+    async def handler(tenant_id, resource_id, dry_run):
+        handled.append(resource_id)
+        return {"action": "terminate"}
+
+    async def finish(job_id, status, result, error):
+        recorded.append((job_id, status))
+        raise ConnectionError("connection dropped")
+
+    queue = JobQueue(handler, workers=1)
+    queue._finish = finish
+    run_worker(queue, [job("1"), job("2")])
+
+    # Both jobs ran, and a job that ran is never recorded as failed.
+    assert handled == ["r-1", "r-2"]
+    assert {status for _, status in recorded} == {"succeeded"}
+    assert len(recorded) == 2 * jobs.ABACUS_JOB_FINISH_ATTEMPTS
+
+
+def test_recording_is_retried_until_it_succeeds(monkeypatch):
+    monkeypatch.setattr(jobs, "ABACUS_JOB_POLL_SECONDS", 0)
+    attempts = []
+
+    async def handler(tenant_id, resource_id, dry_run):
+        return {"action": "keep"}
+
+    async def finish(job_id, status, result, error):
+        attempts.append(status)
+        if len(attempts) == 1:
+            raise ConnectionError("connection dropped")
+
+    queue = JobQueue(handler, workers=1)
+    queue._finish = finish
+    run_worker(queue, [job("1")])
+    assert attempts == ["succeeded", "succeeded"]
+
+
+def test_handler_failure_is_recorded_as_failed(monkeypatch):
+    monkeypatch.setattr(jobs, "ABACUS_JOB_POLL_SECONDS", 0)
+    recorded = []
+
+    async def handler(tenant_id, resource_id, dry_run):
+        raise RuntimeError("model unavailable")
+
+    async def finish(job_id, status, result, error):
+        recorded.append((job_id, status, error))
+
+    queue = JobQueue(handler, workers=1)
+    queue._finish = finish
+    run_worker(queue, [job("1")])
+    assert recorded == [("1", "failed", "model unavailable")]
@@ -0,0 +1,66 @@
+"""
+test_optic_cache.py
+===================
+TEJUSKA Cloud Intelligence
+Unit tests for the OPTIC translation cache (optic_cache.py).
+"""
+
+import pytest
+
+from optic_cache import TranslationCache, cosine, ngram_vector, normalize_query
+
+TENANT = "00000000-0000-0000-0000-000000000001"
+SCHEMA = "v1"
+PREFIX = "show me the total monthly cost by service for the last three months for"
+
+
+def similarity(a: str, b: str) -> float:
+    return cosine(ngram_vector(normalize_query(a)), ngram_vector(normalize_query(b)))
+
+
+@pytest.mark.parametrize("cached, asked", [
+    (f"{PREFIX} resources tagged with environment production", f"{PREFIX} resources tagged with environment staging"),
+    (f"{PREFIX} and region for cost center finance", f"{PREFIX} and region for cost center marketing"),
+    (
+        "what was our total spend by service and region last quarter for account prod-payments",
+        "what was our total spend by service and region last quarter for account dev-payments",
+    ),
+])
+def test_filter_values_never_share_a_translation(cached, asked):
+    # Close enough to pass the similarity threshold on n-grams alone.
+    assert similarity(cached, asked) >= 0.90
+    cache = TranslationCache()
+    cache.put(TENANT, SCHEMA, cached, "SELECT 1", llm_ms=100.0)
+    assert cache.get(TENANT, SCHEMA, asked) is None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("what did we spend on AWS last month", "AWS spend, last month?"),
+    ("show me the total cost by region this month", "cost by region this month"),
+])
+def test_rewordings_share_a_translation(cached, asked):
+    cache = TranslationCache(similarity=0.5)
+    cache.put(TENANT, SCHEMA, cached, "SELECT 1", llm_ms=100.0)
+    hit = cache.get(TENANT, SCHEMA, asked)
+    assert hit is not None
+    assert (hit.sql, hit.tier) == ("SELECT 1", "similar")
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("cost by service last month", "cost by service this month"),
+    ("cost by service last month", "cost by region last month"),
+    ("top 5 services last month", "top 10 services last month"),
+    ("AWS spend last month", "Azure spend last month"),
+])
+def test_discriminating_tokens_never_share_a_translation(cached, asked):
+    cache = TranslationCache(similarity=0.0)
+    cache.put(TENANT, SCHEMA, cached, "SELECT 1", llm_ms=100.0)
+    assert cache.get(TENANT, SCHEMA, asked) is None
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = TranslationCache()
+    cache.put(TENANT, SCHEMA, "Cost by service, last month?", "SELECT 1", llm_ms=100.0)
+    hit = cache.get(TENANT, SCHEMA, "cost by service last month")
+    assert (hit.tier, hit.similarity) == ("exact", 1.0)
+    assert cache.get(TENANT, "v2", "cost by service last month") is None
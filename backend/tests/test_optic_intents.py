@@ -0,0 +1,152 @@
+"""
+test_optic_intents.py
+=====================
+TEJUSKA Cloud Intelligence
+Unit tests for the OPTIC template parser (optic_intents.py).
+"""
+
+from datetime import date, datetime, timezone
+
+import pytest
+
+import optic_intents
+from optic_intents import parse
+
+TODAY = date(2025, 6, 15)
+
+
+def utc(year: int, month: int, day: int) -> datetime:
+    return datetime(year, month, day, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("total spend last month", "total"),
+    ("how much did we spend on AWS this month", "total"),
+    ("What did we spend last week?", "total"),
+    ("top 10 services last quarter", "top_n"),
+    ("Top 5 services, last month?", "top_n"),
+    ("most expensive regions on AWS", "top_n"),
+    ("which service cost the most this month", "top_n"),
+    ("cost by region last month", "breakdown"),
+    ("spend by provider this year", "breakdown"),
+    ("cost by tag team last month", "breakdown"),
+    ("month over month change by service", "mom"),
+    ("untagged cost last month", "untagged"),
+    ("cost missing the CostCenter tag", "untagged"),
+    ("daily spend for the last 14 days", "trend"),
+    ("monthly cost trend this year", "trend"),
+])
+def test_template_questions_match(question, intent):
+    match = parse(question, TODAY)
+    assert match is not None
+    assert match.intent == intent
+
+
+@pytest.mark.parametrize("question", [
+    "how much did we spend on EC2 last week",
+    "what was the cost of Amazon S3 in March",
+    "top 5 services in us-east-1 last month",
+    "cost by region for the payments team last month",
+    "how much did we spend on aws and azure",
+])
+def test_unparsed_entities_fall_through_to_the_llm(question):
+    assert parse(question, TODAY) is None
+
+
+@pytest.mark.parametrize("question", [
+    "forecast next month's spend",
+    "average daily cost last month",
+    "spend excluding AWS last month",
+    "why did costs go up",
+])
+def test_unsupported_shapes_fall_through_to_the_llm(question):
+    assert parse(question, TODAY) is None
+
+
+@pytest.mark.parametrize("question", ["spend for the last 0 days", "top services for the past 0 weeks"])
+def test_empty_relative_period_is_rejected(question):
+    assert parse(question, TODAY) is None
+
+
+def test_total_binds_tenant_period_and_provider():
+    match = parse("how much did we spend on Azure yesterday?", TODAY)
+    assert match.sql == (
+        "SELECT COALESCE(SUM(billed_cost), 0) AS total_cost FROM consolidated_billing "
+        "WHERE tenant_id = $1 AND charge_period_start >= $2 AND charge_period_start < $3 "
+        "AND lower(provider_name) = ANY($4::text[])"
+    )
+    assert match.params == (utc(2025, 6, 14), utc(2025, 6, 15), optic_intents.PROVIDERS["Azure"])
+    assert match.slots["provider"] == "Azure"
+
+
+def test_top_n_takes_count_and_dimension():
+    match = parse("top 5 services last month", TODAY)
+    assert match.slots["dimension"] == "service"
+    assert match.slots["n"] == 5
+    assert match.sql.endswith("GROUP BY 1 ORDER BY total_cost DESC LIMIT 5")
+    assert match.params == (utc(2025, 5, 1), utc(2025, 6, 1))
+
+
+def test_top_n_is_capped():
+    match = parse("top 500 services last month", TODAY)
+    assert match.slots["n"] == optic_intents.MAX_TOP_N
+    assert match.sql.endswith(f"LIMIT {optic_intents.MAX_TOP_N}")
+
+
+def test_effective_cost_column():
+    match = parse("effective cost by service last month", TODAY)
+    assert match.slots["cost"] == "effective_cost"
+    assert "SUM(effective_cost)" in match.sql
+
+
+def test_missing_period_defaults_to_last_30_days():
+    match = parse("most expensive regions on AWS", TODAY)
+    assert match.slots["period"] == f"the last {optic_intents.DEFAULT_PERIOD_DAYS} days"
+    assert match.slots["end"] == utc(2025, 6, 16)
+
+
+def test_tag_key_keeps_its_casing_and_is_bound():
+    match = parse("cost missing the CostCenter tag last quarter", TODAY)
+    assert match.slots["tag_key"] == "CostCenter"
+    assert "CostCenter" in match.params
+    assert "CostCenter" not in match.sql
+
+
+def test_quoted_tag_key_with_spaces():
+    match = parse("cost by tag 'cost center' last month", TODAY)
+    assert match.intent == "breakdown"
+    assert match.slots["tag_key"] == "cost center"
+
+
+def test_month_over_month_compares_like_for_like():
+    match = parse("month over month change this month", TODAY)
+    assert (match.slots["start"], match.slots["end"]) == (utc(2025, 6, 1), utc(2025, 6, 16))
+    assert (match.slots["previous_start"], match.slots["previous_end"]) == (utc(2025, 5, 1), utc(2025, 5, 16))
+
+
+@pytest.mark.parametrize("text, label, start, end", [
+    ("last 7 days", "the last 7 days", date(2025, 6, 9), date(2025, 6, 16)),
+    ("past two weeks", "the last 2 weeks", date(2025, 6, 2), date(2025, 6, 16)),
+    ("last week", "last week", date(2025, 6, 2), date(2025, 6, 9)),
+    ("last quarter", "last quarter", date(2025, 1, 1), date(2025, 4, 1)),
+    ("march", "March 2025", date(2025, 3, 1), date(2025, 4, 1)),
+    ("september", "September 2024", date(2024, 9, 1), date(2024, 10, 1)),
+    ("2024", "2024", date(2024, 1, 1), date(2025, 1, 1)),
+])
+def test_parse_period(text, label, start, end):
+    period = optic_intents.parse_period(text, TODAY)
+    assert period.label == label
+    assert (period.start.date(), period.end.date()) == (start, end)
+
+
+def test_parse_period_rejects_zero_length():
+    assert optic_intents.parse_period("last 0 days", TODAY) is None
+
+
+def test_render_answer():
+    match = parse("top 2 services last month", TODAY)
+    assert optic_intents.render_answer(match, [("EC2", 12.5), ("S3", 3)], 2) == (
+        f"{match.description}: EC2: $12.50; S3: $3.00."
+    )
+    assert optic_intents.render_answer(match, []) == f"{match.description}: no matching costs were found."
+    assert optic_intents.render_answer(match, None) == f"{match.description}."
@@ -0,0 +1,263 @@
+"""
+test_rollups.py
+===============
+TEJUSKA Cloud Intelligence
+Unit tests for OPTIC query routing onto the billing rollups (rollups.py).
+The tag arithmetic is evaluated on an in-memory SQLite table standing in
+for the rollup source rows.
+"""
+
+import sqlite3
+from collections import defaultdict
+from datetime import date, datetime, timezone
+
+import pytest
+
+import rollups
+from optic_intents import PROVIDERS, UNTAGGED_VALUE, parse
+
+TODAY = date(2025, 6, 15)
+
+# Raw billing rows: (cost, tags).
+BILLING = [
+    (40.0, {"team": "core", "env": "prod"}),
+    (20.0, {"team": "core"}),
+    (25.0, {"team": "web"}),
+    (10.0, {"env": "dev"}),
+    (5.0, None),
+    (3.0, {}),
+]
+
+
+def utc(year: int, month: int, day: int) -> datetime:
+    return datetime(year, month, day, tzinfo=timezone.utc)
+
+
+def routed(question: str):
+    match = parse(question, TODAY)
+    assert match is not None
+    return match, rollups.route(match)
+
+
+def output_columns(sql: str) -> list:
+    """Names of the outermost SELECT list."""
+    start = sql.index(") SELECT ") + 2 if sql.startswith("WITH") else 0
+    head = sql[start + len("SELECT "):]
+    depth, columns, current = 0, [], ""
+    for char in head:
+        depth += (char == "(") - (char == ")")
+        if depth == 0 and current.endswith(" FROM"):
+            break
+        if depth == 0 and char == ",":
+            columns.append(current.strip())
+            current = ""
+            continue
+        current += char
+    columns.append(current[:-len(" FROM")].strip())
+    return [column.rsplit(" AS ", 1)[-1] for column in columns]
+
+
+def source_rows(key: str) -> list:
+    """(tag_key, tag_value, cost, rows) the tag rollup holds for the keys '*' and key."""
+    rows = []
+    for cost, tags in BILLING:
+        pairs = list(tags.items()) if tags else [(rollups.NO_TAGS_KEY, "")]
+        for tag_key, tag_value in [(rollups.TOTAL_TAG_KEY, ""), *pairs]:
+            if tag_key in (rollups.TOTAL_TAG_KEY, key):
+                rows.append((tag_key, tag_value, cost, 1))
+    return rows
+
+
+def evaluate(outer_sql: str, rows: list) -> list:
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE source (tag_key TEXT, tag_value TEXT, cost REAL, rows INTEGER)")
+    db.executemany("INSERT INTO source VALUES (?, ?, ?, ?)", rows)
+    return db.execute(outer_sql).fetchall()
+
+
+# ---------------------------------------------------------------------------
+# Route or refuse
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("question, rollup", [
+    ("total spend last month", rollups.DAILY_ROLLUP),
+    ("how much did we spend on AWS this month", rollups.DAILY_ROLLUP),
+    ("top 5 services last month", rollups.DAILY_ROLLUP),
+    ("spend by provider this year", rollups.DAILY_ROLLUP),
+    ("cost by region on AWS last month", rollups.DAILY_ROLLUP),
+    ("daily spend for the last 14 days", rollups.DAILY_ROLLUP),
+    ("monthly cost trend this year", rollups.DAILY_ROLLUP),
+    ("month over month change by service", rollups.DAILY_ROLLUP),
+    ("month over month change this month", rollups.DAILY_ROLLUP),
+    ("cost by tag team last month", rollups.TAG_ROLLUP),
+    ("cost by tag team last quarter", rollups.TAG_ROLLUP),
+    ("untagged cost last month", rollups.TAG_ROLLUP),
+    ("cost missing the CostCenter tag last month", rollups.TAG_ROLLUP),
+])
+def test_rollup_grain_questions_are_routed(question, rollup):
+    match, result = routed(question)
+    assert result is not None
+    assert result.slots["rollup"] == rollup
+    assert result.intent == match.intent and result.description == match.description
+    assert "$1" in result.sql and not any(isinstance(value, str) and value in result.sql for value in result.params)
+
+
+@pytest.mark.parametrize("question", [
+    # Accounts and resources are not kept in the daily rollup.
+    "top 5 accounts last month",
+    "top 5 resources last month",
+    "month over month change by account",
+    # Tag rollups are monthly: partial months fall back to the raw table.
+    "cost by tag team for the last 7 days",
+    "untagged cost this month",
+    "cost missing the CostCenter tag last week",
+    # The tag rollup has no provider column.
+    "untagged cost on AWS last month",
+    # The reserved keys would read the rollup's own bookkeeping rows.
+    "cost by tag '*' last month",
+])
+def test_finer_than_rollup_questions_are_refused(question):
+    match, result = routed(question)
+    assert result is None
+
+
+def test_whole_months():
+    assert rollups._whole_months({"start": utc(2025, 5, 1), "end": utc(2025, 6, 1)})
+    assert not rollups._whole_months({"start": utc(2025, 5, 1), "end": utc(2025, 6, 16)})
+    assert not rollups._whole_months({"start": utc(2025, 6, 9), "end": utc(2025, 7, 1)})
+
+
+def test_disabled_routing_keeps_the_raw_template(monkeypatch):
+    monkeypatch.setattr(rollups, "OPTIC_USE_ROLLUPS", False)
+    assert routed("total spend last month")[1] is None
+
+
+# ---------------------------------------------------------------------------
+# Generated SQL
+# ---------------------------------------------------------------------------
+
+def test_total_reads_the_daily_rollup_and_its_raw_tail():
+    _, result = routed("how much did we spend on AWS last month")
+    tail = (
+        "COALESCE((SELECT high_watermark FROM rollup_watermarks "
+        "WHERE rollup_name = 'billing_daily_rollup'), '-infinity')"
+    )
+    assert result.sql == (
+        "SELECT COALESCE(SUM(cost), 0) AS total_cost FROM ("
+        "SELECT usage_date, provider_name, service_name, region, billed_cost AS cost "
+        "FROM billing_daily_rollup WHERE tenant_id = $1 AND (usage_date >= $2 AND usage_date < $3) "
+        "AND lower(provider_name) = ANY($6::text[]) "
+        "UNION ALL "
+        "SELECT (charge_period_start AT TIME ZONE 'UTC')::date, provider_name, service_name, "
+        "COALESCE(region_name, region_id, 'unknown'), billed_cost "
+        "FROM consolidated_billing WHERE tenant_id = $1 "
+        "AND (charge_period_start >= $4 AND charge_period_start < $5) "
+        f"AND lower(provider_name) = ANY($6::text[]) AND ingested_at > {tail}) AS source"
+    )
+    assert result.params == (
+        date(2025, 5, 1), date(2025, 6, 1), utc(2025, 5, 1), utc(2025, 6, 1), PROVIDERS["AWS"],
+    )
+
+
+def test_month_over_month_binds_both_periods_on_each_side():
+    _, result = routed("month over month change by service")
+    assert result.params == (
+        date(2025, 5, 1), date(2025, 6, 1), date(2025, 4, 1), date(2025, 5, 1),
+        utc(2025, 5, 1), utc(2025, 6, 1), utc(2025, 4, 1), utc(2025, 5, 1),
+    )
+    assert "SUM(cost) FILTER (WHERE (usage_date >= $2 AND usage_date < $3))" in result.sql
+    assert "SUM(cost) FILTER (WHERE (usage_date >= $4 AND usage_date < $5))" in result.sql
+    assert "((usage_date >= $2 AND usage_date < $3) OR (usage_date >= $4 AND usage_date < $5))" in result.sql
+    assert (
+        "((charge_period_start >= $6 AND charge_period_start < $7) "
+        "OR (charge_period_start >= $8 AND charge_period_start < $9))"
+    ) in result.sql
+
+
+def test_tag_breakdown_reads_the_total_and_the_key():
+    _, result = routed("effective cost by tag team last quarter")
+    assert result.params == (
+        [rollups.TOTAL_TAG_KEY, "team"], date(2025, 1, 1), date(2025, 4, 1), utc(2025, 1, 1), utc(2025, 4, 1),
+    )
+    assert result.sql.startswith(
+        "WITH source AS (SELECT tag_key, tag_value, effective_cost AS cost, row_count AS rows "
+        "FROM billing_monthly_tag_rollup WHERE tenant_id = $1 AND usage_month >= $3 AND usage_month < $4 "
+        "AND tag_key = ANY($2::text[]) UNION ALL SELECT t.tag_key, t.tag_value, b.effective_cost, 1 "
+    )
+    assert "WHERE rollup_name = 'billing_monthly_tag_rollup'" in result.sql
+    assert result.sql.endswith(
+        f"SELECT '{UNTAGGED_VALUE}', SUM(cost * CASE WHEN tag_key = '*' THEN 1 ELSE -1 END), "
+        "SUM(rows * CASE WHEN tag_key = '*' THEN 1 ELSE -1 END) FROM source) AS tagged "
+        "GROUP BY 1 HAVING SUM(rows) > 0 ORDER BY total_cost DESC LIMIT 100"
+    )
+
+
+def test_untagged_resources_are_not_counted_from_the_rollup():
+    _, result = routed("untagged cost last month")
+    assert result.params[0] == [rollups.TOTAL_TAG_KEY, rollups.NO_TAGS_KEY]
+    assert result.sql.startswith(
+        "SELECT COALESCE(SUM(cost) FILTER (WHERE tag_key = ''), 0) AS untagged_cost, "
+        "COALESCE(SUM(cost) FILTER (WHERE tag_key = '*'), 0) AS total_cost, "
+        "NULL::bigint AS untagged_resources FROM ("
+    )
+
+
+# ---------------------------------------------------------------------------
+# Same answer as the raw template
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("question", [
+    "total spend last month",
+    "top 5 services last month",
+    "cost by region on AWS last month",
+    "daily spend for the last 14 days",
+    "monthly cost trend this year",
+    "month over month change by service",
+    "month over month change this month",
+    "cost by tag team last month",
+    "untagged cost last month",
+    "cost missing the CostCenter tag last month",
+])
+def test_routed_result_has_the_raw_template_shape(question):
+    match, result = routed(question)
+    assert output_columns(result.sql) == output_columns(match.sql)
+    if " ORDER BY " in match.sql:
+        assert result.sql.endswith(match.sql[match.sql.rindex(" ORDER BY "):])
+    # Same period, bound as dates for the rollup and as timestamps for its raw tail.
+    periods = [value for value in match.params if isinstance(value, datetime)]
+    assert [value for value in result.params if isinstance(value, datetime)] == periods
+    assert [value for value in result.params if type(value) is date] == [value.date() for value in periods]
+
+
+@pytest.mark.parametrize("key", ["team", "env", "owner"])
+def test_tag_breakdown_untagged_is_the_total_minus_every_value(key):
+    _, result = routed(f"cost by tag {key} last month")
+    outer = result.sql[result.sql.index(") SELECT ") + 2:]
+
+    expected = defaultdict(float)
+    for cost, tags in BILLING:
+        expected[(tags or {}).get(key, UNTAGGED_VALUE)] += cost
+    assert evaluate(outer, source_rows(key)) == sorted(expected.items(), key=lambda item: -item[1])
+
+
+def test_tag_breakdown_omits_untagged_when_every_row_has_the_key():
+    _, result = routed("cost by tag team last month")
+    outer = result.sql[result.sql.index(") SELECT ") + 2:]
+    rows = [row for row in source_rows("team") if row[0] == "team"] + [(rollups.TOTAL_TAG_KEY, "", 85.0, 3)]
+    assert evaluate(outer, rows) == [("core", 60.0), ("web", 25.0)]
+
+
+@pytest.mark.parametrize("question, key", [
+    ("untagged cost last month", None),
+    ("cost missing the team tag last month", "team"),
+])
+def test_untagged_cost_matches_the_raw_definition(question, key):
+    _, result = routed(question)
+    outer = result.sql[:result.sql.index(" FROM (")].replace("NULL::bigint", "NULL") + " FROM source"
+
+    total = sum(cost for cost, _ in BILLING)
+    if key is None:
+        untagged = sum(cost for cost, tags in BILLING if not tags)
+    else:
+        untagged = sum(cost for cost, tags in BILLING if key not in (tags or {}))
+    assert evaluate(outer, source_rows(key or "")) == [(untagged, total, None)]
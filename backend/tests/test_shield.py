@@ -0,0 +1,100 @@
+"""
+test_shield.py
+==============
+TEJUSKA Cloud Intelligence
+Unit tests for the Agentic Shield rule index (shield.py).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from shield import Rule, RuleIndex, month_bounds
+
+TENANT = "0b3c6a58-8d1f-4f0e-9a51-3f2d7c1e9b20"
+OTHER = "6f1d2c3b-4a59-4e87-b0c1-d2e3f4a5b6c7"
+KEY = (TENANT, "i-1")
+
+
+def rule(resource_id: str = "i-1", threshold: float = 100.0, tenant_id: str = TENANT) -> Rule:
+    return Rule(tenant_id, resource_id, "AWS", threshold, "email", "ops@example.com", False,
+                datetime(2026, 10, 1, tzinfo=timezone.utc))
+
+
+def test_threshold_is_crossed_only_on_the_batch_that_exceeds_it():
+    index = RuleIndex()
+    index.put(rule(), 60.0)
+    assert index.add([(TENANT, "i-1", 30.0)]) == []
+    assert index.add([(TENANT, "i-1", 10.0)]) == []   # exactly at the threshold is not over it
+    assert index.add([(TENANT, "i-1", 0.01)]) == [KEY]
+    assert index.spend[KEY] == pytest.approx(100.01)
+
+
+def test_claimed_rule_does_not_trigger_again():
+    index = RuleIndex()
+    index.put(rule(), 90.0)
+    assert index.add([(TENANT, "i-1", 20.0)]) == [KEY]
+    index.remove(KEY)
+    assert index.add([(TENANT, "i-1", 20.0)]) == []
+    assert index.over([KEY]) == []
+    assert len(index) == 0
+
+
+def test_only_ruled_resources_are_summed():
+    index = RuleIndex()
+    index.put(rule(), 0.0)
+    over = index.add([
+        (TENANT, "i-2", 500.0),
+        (OTHER, "i-1", 500.0),     # same resource id, another tenant
+        (TENANT, "i-1", 40.0),
+    ])
+    assert over == []
+    assert index.spend == {KEY: 40.0}
+
+
+def test_rows_of_one_batch_accumulate():
+    index = RuleIndex()
+    index.put(rule(), 0.0)
+    index.put(rule("i-2", threshold=10.0), 0.0)
+    over = index.add([(TENANT, "i-1", 60.0), (TENANT, "i-2", 5.0), (TENANT, "i-1", 60.0)])
+    assert over == [KEY]
+    assert index.spend == {KEY: 120.0, (TENANT, "i-2"): 5.0}
+
+
+def test_credits_bring_spend_back_under():
+    index = RuleIndex()
+    index.put(rule(), 95.0)
+    assert index.add([(TENANT, "i-1", 10.0), (TENANT, "i-1", -10.0)]) == [KEY]
+    assert index.over([KEY]) == []
+
+
+def test_over_rechecks_against_corrected_spend():
+    index = RuleIndex()
+    index.put(rule(), 0.0)
+    index.put(rule("i-2"), 0.0)
+    index.add([(TENANT, "i-1", 150.0), (TENANT, "i-2", 150.0)])
+    # An exact query found a reloaded export had double counted i-2.
+    index.spend[(TENANT, "i-2")] = 75.0
+    assert index.over([KEY, (TENANT, "i-2"), (TENANT, "missing")]) == [KEY]
+
+
+def test_putting_a_rule_again_reseeds_its_spend():
+    index = RuleIndex()
+    index.put(rule(), 80.0)
+    index.put(rule(threshold=200.0), 150.0)
+    assert len(index) == 1
+    assert index.add([(TENANT, "i-1", 40.0)]) == []
+    assert index.add([(TENANT, "i-1", 20.0)]) == [KEY]
+
+
+@pytest.mark.parametrize("moment, start, end", [
+    (datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc),
+     datetime(2026, 10, 1, tzinfo=timezone.utc), datetime(2026, 11, 1, tzinfo=timezone.utc)),
+    (datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc),
+     datetime(2026, 12, 1, tzinfo=timezone.utc), datetime(2027, 1, 1, tzinfo=timezone.utc)),
+    # 01:00 on 1 March at UTC+2 is still February in UTC.
+    (datetime(2026, 3, 1, 1, tzinfo=timezone(timedelta(hours=2))),
+     datetime(2026, 2, 1, tzinfo=timezone.utc), datetime(2026, 3, 1, tzinfo=timezone.utc)),
+])
+def test_month_bounds_are_utc(moment, start, end):
+    assert month_bounds(moment) == (start, end)
@@ -0,0 +1,98 @@
+"""
+test_sql_guard.py
+=================
+TEJUSKA Cloud Intelligence
+Unit tests for the OPTIC SQL guardrail (sql_guard.py).
+"""
+
+import pytest
+
+from sql_guard import GuardrailError, guard
+
+SCOPED = "(SELECT * FROM consolidated_billing WHERE tenant_id = $1) AS consolidated_billing"
+
+
+def test_billing_table_is_scoped_to_the_tenant():
+    guarded = guard("SELECT service_name, SUM(billed_cost) FROM consolidated_billing GROUP BY 1")
+    assert guarded.sql == f"SELECT service_name, SUM(billed_cost) FROM {SCOPED} GROUP BY 1 LIMIT 1000"
+    assert guarded.tables == ("consolidated_billing",)
+
+
+def test_every_reference_is_scoped():
+    guarded = guard(
+        "SELECT a.service_name FROM consolidated_billing a "
+        "JOIN (SELECT resource_id FROM consolidated_billing) b ON a.resource_id = b.resource_id"
+    )
+    assert guarded.sql.count("WHERE tenant_id = $1") == 2
+    assert guarded.tables == ("consolidated_billing",)
+
+
+def test_cte_names_are_not_treated_as_tables():
+    guarded = guard("WITH t AS (SELECT * FROM consolidated_billing) SELECT * FROM t LIMIT 10")
+    assert guarded.sql == f"WITH t AS (SELECT * FROM {SCOPED}) SELECT * FROM t LIMIT 10"
+
+
+def test_literal_tenant_filter_is_rebound():
+    guarded = guard("SELECT * FROM consolidated_billing WHERE tenant_id = '00000000-0000-0000-0000-000000000000'")
+    assert "'00000000" not in guarded.sql
+    assert guarded.sql.endswith("WHERE tenant_id = $1 LIMIT 1000")
+    assert "bound literal tenant_id filter to $1" in guarded.rewrites
+
+
+@pytest.mark.parametrize("sql, expected", [
+    (
+        "SELECT 1 FROM consolidated_billing WHERE DATE_TRUNC('month', charge_period_start) = '2025-03-01'",
+        "(charge_period_start >= DATE_TRUNC('MONTH', CAST('2025-03-01' AS TIMESTAMPTZ)) "
+        "AND charge_period_start < DATE_TRUNC('MONTH', CAST('2025-03-01' AS TIMESTAMPTZ)) + INTERVAL '1 MONTH')",
+    ),
+    (
+        "SELECT 1 FROM consolidated_billing WHERE EXTRACT(YEAR FROM charge_period_start) = 2024",
+        "(charge_period_start >= MAKE_DATE(2024, 1, 1) AND charge_period_start < MAKE_DATE(2025, 1, 1))",
+    ),
+    (
+        "SELECT 1 FROM consolidated_billing WHERE CAST(billing_period_start AS DATE) = '2025-03-05'",
+        "(billing_period_start >= CAST('2025-03-05' AS DATE) AND billing_period_start < CAST('2025-03-05' AS DATE) + 1)",
+    ),
+])
+def test_period_predicates_become_indexed_ranges(sql, expected):
+    guarded = guard(sql)
+    assert f"WHERE {expected} LIMIT" in guarded.sql
+    assert any(note.startswith("rewrote") for note in guarded.rewrites)
+
+
+def test_unindexed_columns_are_not_rewritten():
+    guarded = guard("SELECT 1 FROM consolidated_billing WHERE DATE_TRUNC('month', created_at) = '2025-03-01'")
+    assert not any(note.startswith("rewrote") for note in guarded.rewrites)
+
+
+@pytest.mark.parametrize("sql, limit, rewritten", [
+    ("SELECT * FROM consolidated_billing", 1000, True),
+    ("SELECT * FROM consolidated_billing LIMIT 50", 50, False),
+    ("SELECT * FROM consolidated_billing LIMIT 5000", 1000, True),
+])
+def test_row_limit_is_enforced(sql, limit, rewritten):
+    guarded = guard(sql)
+    assert guarded.limit == limit
+    assert guarded.sql.endswith(f"LIMIT {limit}")
+    assert ("limited to 1000 rows" in guarded.rewrites) is rewritten
+
+
+def test_custom_row_limit():
+    assert guard("SELECT * FROM consolidated_billing", row_limit=10).limit == 10
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("DELETE FROM consolidated_billing", "Only SELECT statements"),
+    ("UPDATE consolidated_billing SET billed_cost = 0", "Only SELECT statements"),
+    ("SELECT 1 FROM consolidated_billing; SELECT 2 FROM consolidated_billing", "Exactly one SQL statement"),
+    ("SELECT * INTO copy FROM consolidated_billing", "INTO is not allowed"),
+    ("SELECT * FROM tenants", "Table tenants is not available"),
+    ("SELECT * FROM other.consolidated_billing", "is not available"),
+    ("SELECT pg_sleep(10) FROM consolidated_billing", "Function pg_sleep is not allowed"),
+    ("SELECT current_setting('role') FROM consolidated_billing", "is not allowed"),
+    ("SELECT 1", "does not read any tenant table"),
+    ("SELECT FROM WHERE (", "could not be parsed"),
+])
+def test_rejected_statements(sql, message):
+    with pytest.raises(GuardrailError, match=message):
+        guard(sql)
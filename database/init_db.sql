@@ -46,10 +46,45 @@ CREATE TABLE IF NOT EXISTS subscriptions (
 -- ---------------------------------------------------------------------------
 -- FOCUS 1.1 Consolidated Billing Table
 -- Reference: https://focus.finops.org
+-- Range-partitioned by month of charge_period_start (see "Billing partitions"
+-- below and backend/partitions.py); the primary key includes the partition key.
 -- ---------------------------------------------------------------------------
+-- Databases created before partitioning hold a plain consolidated_billing.
+-- It is renamed to consolidated_billing_unpartitioned with its rows intact and
+-- stripped of its constraints and indexes, so the partitioned table below is
+-- created in its place and can take their names; `python partitions.py migrate`
+-- then moves the rows across and drops it.
+DO $$
+DECLARE
+    v_name TEXT;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE oid = TO_REGCLASS('consolidated_billing') AND relkind = 'r'
+    ) THEN
+        RETURN;
+    END IF;
+    ALTER TABLE consolidated_billing RENAME TO consolidated_billing_unpartitioned;
+    FOR v_name IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'consolidated_billing_unpartitioned'::regclass AND contype <> 'n'
+    LOOP
+        EXECUTE format('ALTER TABLE consolidated_billing_unpartitioned DROP CONSTRAINT %I', v_name);
+    END LOOP;
+    FOR v_name IN
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'consolidated_billing_unpartitioned'::regclass
+    LOOP
+        EXECUTE format('DROP INDEX %I', v_name);
+    END LOOP;
+    RAISE NOTICE 'consolidated_billing renamed to consolidated_billing_unpartitioned; '
+                 'run `python partitions.py migrate` to move its rows.';
+END;
+$$;
+
 CREATE TABLE IF NOT EXISTS consolidated_billing (
     -- Identity
-    row_id                  UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    row_id                  UUID NOT NULL DEFAULT uuid_generate_v4(),
     tenant_id               UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
 
     -- FOCUS 1.1 Required Columns
@@ -111,7 +146,80 @@ CREATE TABLE IF NOT EXISTS consolidated_billing (
 
     -- Ingestion metadata
     ingested_at              TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    source_file              TEXT
+    source_file              TEXT,
+
+    -- Unique keys must cover the partition keys (tenant hash sub-partitions too).
+    PRIMARY KEY (row_id, charge_period_start, tenant_id)
+) PARTITION BY RANGE (charge_period_start);
+
+-- Catches rows outside every monthly partition; create_billing_partition()
+-- moves them out when their month's partition is created.
+CREATE TABLE IF NOT EXISTS consolidated_billing_default
+    PARTITION OF consolidated_billing DEFAULT;
+
+-- ---------------------------------------------------------------------------
+-- Billing rollups (maintained incrementally by backend/rollups.py)
+-- ---------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS billing_daily_rollup (
+    tenant_id       UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    usage_date      DATE NOT NULL,                 -- UTC day of charge_period_start
+    provider_name   TEXT NOT NULL,
+    service_name    TEXT NOT NULL,
+    region          TEXT NOT NULL,                 -- COALESCE(region_name, region_id, 'unknown')
+    charge_type     TEXT NOT NULL,
+    billed_cost     NUMERIC(24,6) NOT NULL DEFAULT 0,
+    effective_cost  NUMERIC(24,6) NOT NULL DEFAULT 0,
+    row_count       BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, usage_date, provider_name, service_name, region, charge_type)
+);
+
+-- tag_key '*' carries the month total and '' the rows without any tags.
+CREATE TABLE IF NOT EXISTS billing_monthly_tag_rollup (
+    tenant_id       UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    usage_month     DATE NOT NULL,                 -- first UTC day of the month
+    tag_key         TEXT NOT NULL,
+    tag_value       TEXT NOT NULL,
+    billed_cost     NUMERIC(24,6) NOT NULL DEFAULT 0,
+    effective_cost  NUMERIC(24,6) NOT NULL DEFAULT 0,
+    row_count       BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, usage_month, tag_key, tag_value)
+);
+
+-- Rows without a resource_id are left out, as COUNT(DISTINCT resource_id) does.
+CREATE TABLE IF NOT EXISTS billing_monthly_resource_rollup (
+    tenant_id       UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    usage_month     DATE NOT NULL,                 -- first UTC day of the month
+    resource_id     TEXT NOT NULL,
+    billed_cost     NUMERIC(24,6) NOT NULL DEFAULT 0,
+    effective_cost  NUMERIC(24,6) NOT NULL DEFAULT 0,
+    row_count       BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, usage_month, resource_id)
+);
+
+-- Rows with ingested_at <= high_watermark are included in the rollup.
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    rollup_name     TEXT PRIMARY KEY,
+    high_watermark  TIMESTAMPTZ NOT NULL,
+    refreshed_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- ---------------------------------------------------------------------------
+-- Billing export loads (backend/ingestion.py)
+-- ---------------------------------------------------------------------------
+-- One row per (tenant, source_file); loading the same source_file again
+-- replaces the rows of its previous load, or is skipped when unchanged.
+CREATE TABLE IF NOT EXISTS billing_ingestions (
+    tenant_id       UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    source_file     TEXT NOT NULL,
+    checksum        TEXT NOT NULL,                 -- SHA-256 of the file bytes
+    dialect         TEXT NOT NULL,                 -- focus, aws, azure, gcp
+    row_count       BIGINT NOT NULL,
+    billed_cost     NUMERIC(24,6) NOT NULL,
+    -- MIN/MAX charge_period_start of the load; bounds the replace to its partitions.
+    period_first    TIMESTAMPTZ,
+    period_last     TIMESTAMPTZ,
+    ingested_at     TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (tenant_id, source_file)
 );
 
 -- ---------------------------------------------------------------------------
@@ -127,9 +235,12 @@ CREATE TABLE IF NOT EXISTS ai_recommendations (
     status              TEXT NOT NULL DEFAULT 'pending'
                             CHECK (status IN ('pending', 'approved', 'rejected', 'executed')),
     reasoning           TEXT,
+    model_version       TEXT,            -- ABACUS model version that produced it
     created_at          TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     executed_at         TIMESTAMPTZ
 );
+-- Databases created before model versioning lack the column.
+ALTER TABLE ai_recommendations ADD COLUMN IF NOT EXISTS model_version TEXT;
 
 -- ---------------------------------------------------------------------------
 -- Notification Log
@@ -147,17 +258,126 @@ CREATE TABLE IF NOT EXISTS notification_log (
     sent_at           TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+-- ---------------------------------------------------------------------------
+-- Notification Outbox (backend/outbox.py)
+-- ---------------------------------------------------------------------------
+-- Notifications waiting for delivery. Delivered rows move to notification_log;
+-- rows out of attempts stay here as 'dead' and are logged as 'failed'.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    notification_id   UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenant_id         UUID REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    channel           TEXT NOT NULL CHECK (channel IN ('slack', 'email', 'sms')),
+    recipient         TEXT NOT NULL,
+    subject           TEXT,
+    body              TEXT NOT NULL,
+    status            TEXT NOT NULL DEFAULT 'pending'
+                          CHECK (status IN ('pending', 'sending', 'dead')),
+    attempts          INTEGER NOT NULL DEFAULT 0,
+    last_error        TEXT,
+    created_at        TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    next_attempt_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()   -- retry time, or lease end while 'sending'
+);
+
+-- ---------------------------------------------------------------------------
+-- Cost Anomaly Detection (backend/anomalies.py)
+-- ---------------------------------------------------------------------------
+-- Per-tenant alerting: a day's cost for one (provider, service, region) is a
+-- spike when it exceeds its expected cost by more than spike_pct percent.
+CREATE TABLE IF NOT EXISTS anomaly_settings (
+    tenant_id        UUID PRIMARY KEY REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    spike_pct        NUMERIC(6,2) NOT NULL DEFAULT 15 CHECK (spike_pct > 0),
+    channel          TEXT NOT NULL CHECK (channel IN ('slack', 'email', 'sms')),
+    recipient        TEXT NOT NULL,
+    enabled          BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at       TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- One row per detected spike; the key keeps a (series, day) to one alert.
+CREATE TABLE IF NOT EXISTS cost_anomalies (
+    tenant_id        UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    provider_name    TEXT NOT NULL,
+    service_name     TEXT NOT NULL,
+    region           TEXT NOT NULL,
+    usage_date       DATE NOT NULL,
+    billed_cost      NUMERIC(18,6) NOT NULL,
+    expected_cost    NUMERIC(18,6) NOT NULL,
+    spike_pct        NUMERIC(6,2) NOT NULL,
+    detected_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (tenant_id, usage_date, provider_name, service_name, region)
+);
+
+-- ---------------------------------------------------------------------------
+-- Agentic Shield Rules (backend/shield.py)
+-- ---------------------------------------------------------------------------
+-- A resource whose month-to-date billed cost exceeds threshold is handed to
+-- ABACUS once (status armed -> triggered); saving the rule again re-arms it.
+CREATE TABLE IF NOT EXISTS shield_rules (
+    tenant_id        UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    resource_id      TEXT NOT NULL,
+    provider_name    TEXT,
+    threshold        NUMERIC(18,6) NOT NULL CHECK (threshold > 0),
+    channel          TEXT NOT NULL DEFAULT 'email' CHECK (channel IN ('slack', 'email', 'sms')),
+    recipient        TEXT NOT NULL,
+    dry_run          BOOLEAN NOT NULL DEFAULT TRUE,
+    status           TEXT NOT NULL DEFAULT 'armed'
+                         CHECK (status IN ('armed', 'triggered', 'disabled')),
+    triggered_at     TIMESTAMPTZ,
+    triggered_cost   NUMERIC(18,6),
+    job_id           UUID,             -- abacus_jobs row queued when triggered
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (tenant_id, resource_id)
+);
+
+-- ---------------------------------------------------------------------------
+-- ABACUS Job Queue (durable auto-termination evaluations)
+-- ---------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS abacus_jobs (
+    job_id              UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    tenant_id           UUID NOT NULL REFERENCES tenants(tenant_id) ON DELETE CASCADE,
+    resource_id         TEXT NOT NULL,
+    dry_run             BOOLEAN NOT NULL DEFAULT TRUE,
+    status              TEXT NOT NULL DEFAULT 'queued'
+                            CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    attempts            INTEGER NOT NULL DEFAULT 0,
+    result              JSONB,
+    error_message       TEXT,
+    created_at          TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at          TIMESTAMPTZ,
+    finished_at         TIMESTAMPTZ
+);
+
 -- ---------------------------------------------------------------------------
 -- Indexes for performance
 -- ---------------------------------------------------------------------------
-CREATE INDEX IF NOT EXISTS idx_billing_tenant         ON consolidated_billing(tenant_id);
-CREATE INDEX IF NOT EXISTS idx_billing_period         ON consolidated_billing(billing_period_start, billing_period_end);
-CREATE INDEX IF NOT EXISTS idx_billing_provider       ON consolidated_billing(provider_name);
-CREATE INDEX IF NOT EXISTS idx_billing_service        ON consolidated_billing(service_name);
-CREATE INDEX IF NOT EXISTS idx_billing_resource       ON consolidated_billing(resource_id);
-CREATE INDEX IF NOT EXISTS idx_billing_charge_type    ON consolidated_billing(charge_type);
+-- Billing indexes are declared on the partitioned parent and created on every
+-- partition. Each leads with tenant_id, which every query filters on; the
+-- month is already chosen by partition pruning.
+CREATE INDEX IF NOT EXISTS idx_billing_tenant_charge_service
+    ON consolidated_billing(tenant_id, charge_period_start, service_name);
+CREATE INDEX IF NOT EXISTS idx_billing_tenant_billing_period
+    ON consolidated_billing(tenant_id, billing_period_start, billing_period_end);
+CREATE INDEX IF NOT EXISTS idx_billing_tenant_resource
+    ON consolidated_billing(tenant_id, resource_id);
+-- ingested_at follows insertion order, so a BRIN index finds rollup windows
+-- and post-watermark rows without the write cost of a B-tree.
+CREATE INDEX IF NOT EXISTS idx_billing_ingested_brin  ON consolidated_billing USING BRIN (ingested_at);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_tenant   ON subscriptions(tenant_id);
 CREATE INDEX IF NOT EXISTS idx_recommendations_tenant ON ai_recommendations(tenant_id);
+-- Coalesces duplicate queued evaluations and serves the worker claim query.
+CREATE UNIQUE INDEX IF NOT EXISTS uq_abacus_jobs_queued
+    ON abacus_jobs(tenant_id, resource_id, dry_run) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_abacus_jobs_claim
+    ON abacus_jobs(created_at) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_abacus_jobs_running
+    ON abacus_jobs(tenant_id, started_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+    ON notification_outbox(next_attempt_at) WHERE status IN ('pending', 'sending');
+CREATE INDEX IF NOT EXISTS idx_cost_anomalies_recent
+    ON cost_anomalies(tenant_id, detected_at DESC);
+-- Evaluators pick up rule changes by updated_at.
+CREATE INDEX IF NOT EXISTS idx_shield_rules_updated ON shield_rules(updated_at);
 
 -- ---------------------------------------------------------------------------
 -- Updated-at trigger function
@@ -177,3 +397,58 @@ CREATE OR REPLACE TRIGGER set_updated_at_tenants
 CREATE OR REPLACE TRIGGER set_updated_at_subscriptions
     BEFORE UPDATE ON subscriptions
     FOR EACH ROW EXECUTE FUNCTION trigger_set_updated_at();
+
+CREATE OR REPLACE TRIGGER set_updated_at_anomaly_settings
+    BEFORE UPDATE ON anomaly_settings
+    FOR EACH ROW EXECUTE FUNCTION trigger_set_updated_at();
+
+CREATE OR REPLACE TRIGGER set_updated_at_shield_rules
+    BEFORE UPDATE ON shield_rules
+    FOR EACH ROW EXECUTE FUNCTION trigger_set_updated_at();
+
+-- ---------------------------------------------------------------------------
+-- Billing partitions
+-- ---------------------------------------------------------------------------
+-- Creates the monthly partition holding p_month (UTC), optionally split into
+-- p_hash_partitions sub-partitions by tenant_id. Rows already parked in the
+-- default partition for that month are moved in before it is attached.
+-- Idempotent; backend/partitions.py calls it ahead of time and applies
+-- retention.
+CREATE OR REPLACE FUNCTION create_billing_partition(p_month DATE, p_hash_partitions INTEGER DEFAULT 0)
+RETURNS TEXT LANGUAGE plpgsql AS $$
+DECLARE
+    v_first DATE        := DATE_TRUNC('month', p_month)::date;
+    v_from  TIMESTAMPTZ := v_first::timestamp AT TIME ZONE 'UTC';
+    v_to    TIMESTAMPTZ := (v_first + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+    v_name  TEXT        := 'consolidated_billing_' || TO_CHAR(v_first, 'YYYY_MM');
+BEGIN
+    IF TO_REGCLASS(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+    EXECUTE FORMAT(
+        'CREATE TABLE %I (LIKE consolidated_billing INCLUDING DEFAULTS INCLUDING CONSTRAINTS)%s',
+        v_name, CASE WHEN p_hash_partitions > 0 THEN ' PARTITION BY HASH (tenant_id)' ELSE '' END
+    );
+    FOR i IN 0 .. p_hash_partitions - 1 LOOP
+        EXECUTE FORMAT(
+            'CREATE TABLE %I PARTITION OF %I FOR VALUES WITH (MODULUS %s, REMAINDER %s)',
+            v_name || '_h' || i, v_name, p_hash_partitions, i
+        );
+    END LOOP;
+    EXECUTE FORMAT(
+        'WITH moved AS (DELETE FROM consolidated_billing_default'
+        ' WHERE charge_period_start >= %L AND charge_period_start < %L RETURNING *)'
+        ' INSERT INTO %I SELECT * FROM moved',
+        v_from, v_to, v_name
+    );
+    EXECUTE FORMAT(
+        'ALTER TABLE consolidated_billing ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        v_name, v_from, v_to
+    );
+    RETURN v_name;
+END;
+$$;
+
+-- The last year and the next three months; partitions.py keeps it rolling.
+SELECT create_billing_partition((DATE_TRUNC('month', NOW() AT TIME ZONE 'UTC') + make_interval(months => m))::date)
+FROM generate_series(-12, 3) AS m;
@@ -1,4 +1,7 @@
+import requests
 import streamlit as st
+from utils.api_client import TejuskaAPIClient
+from utils.backend import error_detail, get_backend_url
 from utils.ui_components import inject_tailwind, get_theme_css
 from utils.sidebar import render_bottom_profile
 
@@ -29,9 +32,32 @@ st.markdown(get_theme_css(st.session_state.theme), unsafe_allow_html=True)
 # Ensure all required keys exist
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
+    st.session_state.user_email = ""
     st.session_state.tenant_id = ""
     st.session_state.role = None
 
+
+def sign_in(email, role):
+    """
+    Start a session for email. With a backend configured, the user's tenant
+    UUID is resolved first (every tenant endpoint takes it, not the email);
+    returns False, after showing why, when it cannot be.
+    """
+    tenant_id = ""
+    backend_url = get_backend_url()
+    if backend_url:
+        try:
+            tenant_id = TejuskaAPIClient(backend_url).lookup_tenant(email)["tenant_id"]
+        except requests.RequestException as exc:
+            st.error(f"Could not find your organisation's workspace: {error_detail(exc)}")
+            return False
+    st.session_state.authenticated = True
+    st.session_state.user_email = email
+    st.session_state.tenant_id = tenant_id
+    st.session_state.role = role
+    return True
+
+
 # Initialize forgot_password_step separately (even if authenticated exists)
 if "forgot_password_step" not in st.session_state:
     st.session_state.forgot_password_step = None  # None, 'otp', 'reset'
@@ -79,10 +105,8 @@ if not st.session_state.authenticated:
                     forgot_clicked = st.form_submit_button("Forgot Password?", type="secondary")
                 if st.form_submit_button("Sign In", type="primary", use_container_width=True):
                     if email and password and "@" in email:
-                        st.session_state.authenticated = True
-                        st.session_state.tenant_id = email
-                        st.session_state.role = "Admin"  # Default role for demo
-                        st.rerun()
+                        if sign_in(email, "Admin"):  # Default role for demo
+                            st.rerun()
                     else:
                         st.error("Please enter a valid email and password.")
                 if forgot_clicked:
@@ -132,20 +156,18 @@ if not st.session_state.authenticated:
                     st.error("Please enter a valid email address.")
                 elif set_password != retype_password:
                     st.error("Passwords do not match!")
-                else:
-                    st.session_state.authenticated = True
-                    st.session_state.tenant_id = email
-                    st.session_state.role = role
+                elif sign_in(email, role):
                     st.rerun()
 
 else:
     # Already authenticated
     st.markdown(
-        f'<div class="text-center py-8"><p class="text-xl text-slate-900 dark:text-slate-50">Authenticated as: {st.session_state.tenant_id}</p><p class="opacity-70 text-slate-700 dark:text-slate-300">Expand the sidebar to access the FinOps Dashboard, Cloud Connect, and other tools.</p></div>',
+        f'<div class="text-center py-8"><p class="text-xl text-slate-900 dark:text-slate-50">Authenticated as: {st.session_state.user_email}</p><p class="opacity-70 text-slate-700 dark:text-slate-300">Expand the sidebar to access the FinOps Dashboard, Cloud Connect, and other tools.</p></div>',
         unsafe_allow_html=True,
     )
     if st.button("Sign Out", type="secondary"):
         st.session_state.authenticated = False
+        st.session_state.user_email = ""
         st.session_state.tenant_id = ""
         st.session_state.role = None
         st.session_state.forgot_password_step = None
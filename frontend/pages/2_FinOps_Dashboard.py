@@ -1,6 +1,10 @@
+import calendar
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import requests
+from utils.api_client import TejuskaAPIClient
+from utils.backend import error_detail, get_backend_url
 from utils.ui_components import inject_tailwind, get_theme_css, metric_card
 from utils.sidebar import render_bottom_profile
 
@@ -26,6 +30,27 @@ if not st.session_state.get("authenticated"):
     st.warning("Please sign in from the Home page to access this section.")
     st.stop()
 
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_dashboard(backend_url, tenant_id):
+    """Live aggregates from /api/v1/dashboard; failures raise and are not cached."""
+    return TejuskaAPIClient(backend_url).dashboard(tenant_id)
+
+
+# Sample data is shown only when no backend is configured; a failing
+# backend is reported instead of being papered over.
+backend_url = get_backend_url()
+live = None
+if backend_url:
+    if not st.session_state.get("tenant_id"):
+        st.error("Your session has no workspace; sign out and sign in again to see your dashboard.")
+        st.stop()
+    try:
+        live = load_dashboard(backend_url, st.session_state["tenant_id"])
+    except requests.RequestException as exc:
+        st.error(f"The dashboard could not be loaded: {error_detail(exc)}")
+        st.stop()
+
 # Premium report generation button
 col_btn, col_badge = st.columns([3, 1])
 with col_btn:
@@ -33,9 +58,9 @@ with col_btn:
         st.success("Your report is being generated. Download will start shortly.")
 with col_badge:
     st.markdown(
-        """
+        f"""
         <div class="bg-emerald-100 text-emerald-800 dark:bg-emerald-900 dark:text-emerald-200 text-sm font-medium px-3 py-1 rounded-full text-center">
-            Data: Live Sync Active
+            {"Data: Live Sync Active" if live else "Data: Sample"}
         </div>
         """,
         unsafe_allow_html=True,
@@ -43,42 +68,74 @@ with col_badge:
 
 st.markdown('<h1 class="text-3xl font-bold text-slate-900 dark:text-slate-50">FinOps Dashboard</h1>', unsafe_allow_html=True)
 st.markdown('<p class="opacity-70 text-slate-700 dark:text-slate-300">Real-time multi-cloud cost visibility across AWS, GCP, and Azure — standardised to the FOCUS 1.1 specification.</p>', unsafe_allow_html=True)
+if not backend_url:
+    st.caption("Showing sample data: no backend is configured.")
+
+if live:
+    end = pd.Timestamp(live["end"])
+    elapsed = (end - end.normalize().replace(day=1)) / pd.Timedelta(days=1)
+    days_in_month = calendar.monthrange(end.year, end.month)[1]
+    mtd, previous = live["month_to_date"], live["previous_month_to_date"]
+    spend_mtd = f"${mtd:,.2f}"
+    spend_delta = f"{(mtd - previous) / previous * 100:+.1f}% vs last month" if previous else None
+    projected = f"${mtd / elapsed * days_in_month:,.2f}" if elapsed > 0 else spend_mtd
+    active_resources = f"{live['active_resources']:,}"
+else:
+    spend_mtd, spend_delta, projected, active_resources = "$12,340.50", "-8.2% vs last month", "$15,200.00", "148"
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    st.markdown(metric_card("Total Spend MTD", "$12,340.50", "-8.2% vs last month", st.session_state.theme), unsafe_allow_html=True)
+    st.markdown(metric_card("Total Spend MTD", spend_mtd, spend_delta, st.session_state.theme), unsafe_allow_html=True)
 with col2:
-    st.markdown(metric_card("Projected Month-End", "$15,200.00", None, st.session_state.theme), unsafe_allow_html=True)
+    st.markdown(metric_card("Projected Month-End", projected, None, st.session_state.theme), unsafe_allow_html=True)
 with col3:
     st.markdown(metric_card("Potential Savings", "$2,100.00", "Identified by ABACUS", st.session_state.theme), unsafe_allow_html=True)
 with col4:
-    st.markdown(metric_card("Active Resources", "148", None, st.session_state.theme), unsafe_allow_html=True)
+    st.markdown(metric_card("Active Resources", active_resources, None, st.session_state.theme), unsafe_allow_html=True)
 
 st.markdown('<hr class="my-6 border-slate-300 dark:border-slate-700">', unsafe_allow_html=True)
 
 st.markdown('<h2 class="text-xl font-semibold text-slate-900 dark:text-slate-50">Cost by Cloud Provider</h2>', unsafe_allow_html=True)
-sample_data = pd.DataFrame({
-    "Provider": ["AWS", "GCP", "Azure"],
-    "Billed Cost": [7800.25, 2900.10, 1640.15],
-})
+if live:
+    sample_data = pd.DataFrame(live["by_provider"], columns=["provider_name", "billed_cost"]).rename(
+        columns={"provider_name": "Provider", "billed_cost": "Billed Cost"})
+else:
+    sample_data = pd.DataFrame({
+        "Provider": ["AWS", "GCP", "Azure"],
+        "Billed Cost": [7800.25, 2900.10, 1640.15],
+    })
 fig = px.bar(sample_data, x="Provider", y="Billed Cost", color="Provider", labels={"Billed Cost": "Billed Cost (USD)"}, template="plotly_white")
 fig.update_layout(showlegend=False)
 st.plotly_chart(fig, use_container_width=True)
 
 st.markdown('<h2 class="text-xl font-semibold mt-6 text-slate-900 dark:text-slate-50">Daily Spend Trend (Last 30 Days)</h2>', unsafe_allow_html=True)
-dates = pd.date_range(end=pd.Timestamp.today(), periods=30, freq="D")
-costs = (pd.Series(range(30)).apply(lambda x: 380 + (x % 7) * 45 + (x % 3) * 20))
-trend_df = pd.DataFrame({"Date": dates, "Cost (USD)": costs})
+if live:
+    trend_df = pd.DataFrame(live["daily"], columns=["usage_date", "billed_cost"]).rename(
+        columns={"usage_date": "Date", "billed_cost": "Cost (USD)"})
+    trend_df["Date"] = pd.to_datetime(trend_df["Date"])
+else:
+    dates = pd.date_range(end=pd.Timestamp.today(), periods=30, freq="D")
+    costs = (pd.Series(range(30)).apply(lambda x: 380 + (x % 7) * 45 + (x % 3) * 20))
+    trend_df = pd.DataFrame({"Date": dates, "Cost (USD)": costs})
 fig2 = px.line(trend_df, x="Date", y="Cost (USD)", template="plotly_white")
 st.plotly_chart(fig2, use_container_width=True)
 
 st.markdown('<h2 class="text-xl font-semibold mt-6 text-slate-900 dark:text-slate-50">Top Services by Spend</h2>', unsafe_allow_html=True)
-services_df = pd.DataFrame({
-    "Service": ["Amazon EC2", "Amazon S3", "Cloud Run", "Cloud SQL", "Azure VMs"],
-    "Provider": ["AWS", "AWS", "GCP", "GCP", "Azure"],
-    "Billed Cost ($)": [4200.10, 1200.50, 980.30, 760.20, 640.15],
-    "% of Total": ["34.1%", "9.7%", "7.9%", "6.2%", "5.2%"],
-})
+if live:
+    window_total = sum(row["billed_cost"] for row in live["by_provider"]) or 1.0
+    services_df = pd.DataFrame({
+        "Service": [row["service_name"] for row in live["top_services"]],
+        "Provider": [row["provider_name"] for row in live["top_services"]],
+        "Billed Cost ($)": [round(row["billed_cost"], 2) for row in live["top_services"]],
+        "% of Total": [f"{row['billed_cost'] / window_total:.1%}" for row in live["top_services"]],
+    })
+else:
+    services_df = pd.DataFrame({
+        "Service": ["Amazon EC2", "Amazon S3", "Cloud Run", "Cloud SQL", "Azure VMs"],
+        "Provider": ["AWS", "AWS", "GCP", "GCP", "Azure"],
+        "Billed Cost ($)": [4200.10, 1200.50, 980.30, 760.20, 640.15],
+        "% of Total": ["34.1%", "9.7%", "7.9%", "6.2%", "5.2%"],
+    })
 st.dataframe(services_df, use_container_width=True, hide_index=True)
 
 # ---------- NEW: Chargeback / Showback ----------
@@ -86,12 +143,18 @@ st.markdown('<hr class="my-6 border-slate-300 dark:border-slate-700">', unsafe_a
 st.markdown('<h2 class="text-xl font-semibold text-slate-900 dark:text-slate-50">Cost Allocation (Chargeback / Showback)</h2>', unsafe_allow_html=True)
 st.markdown('<p class="opacity-70 text-slate-700 dark:text-slate-300 mb-4">Department‑wise cost distribution for the current month.</p>', unsafe_allow_html=True)
 
-# Dummy department data
-dept_data = pd.DataFrame({
-    "Department": ["Engineering", "QA/Testing", "Marketing", "Data Science"],
-    "Cost": [6250, 3400, 1850, 920],
-    "Color": ["#6366F1", "#F59E0B", "#10B981", "#EF4444"]
-})
+if live:
+    dept_data = pd.DataFrame(live["by_tag"], columns=["tag_value", "billed_cost"]).rename(
+        columns={"tag_value": "Department", "billed_cost": "Cost"})
+    palette = ["#6366F1", "#F59E0B", "#10B981", "#EF4444"]
+    dept_data["Color"] = [palette[i % len(palette)] for i in range(len(dept_data))]
+else:
+    # Dummy department data
+    dept_data = pd.DataFrame({
+        "Department": ["Engineering", "QA/Testing", "Marketing", "Data Science"],
+        "Cost": [6250, 3400, 1850, 920],
+        "Color": ["#6366F1", "#F59E0B", "#10B981", "#EF4444"]
+    })
 
 # Plotly bar chart
 fig3 = px.bar(dept_data, x="Department", y="Cost", color="Department",
@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
+import requests
+from utils.api_client import TejuskaAPIClient
+from utils.backend import error_detail, get_backend_url
 from utils.ui_components import inject_tailwind, get_theme_css, metric_card
 from utils.sidebar import render_bottom_profile
 
@@ -24,7 +27,14 @@ if not st.session_state.get("authenticated"):
     st.warning("Please sign in from the Home page to access this section.")
     st.stop()
 
-st.markdown('<h1 class="text-3xl font-bold text-slate-900 dark:text-slate-50">Predictive Cost Analytics (ARIMA/LSTM)</h1>', unsafe_allow_html=True)
+
+@st.cache_data(ttl=900, show_spinner=False)
+def load_forecast(backend_url, tenant_id, horizon):
+    """Live forecast from /api/v1/forecast; failures raise and are not cached."""
+    return TejuskaAPIClient(backend_url).forecast(tenant_id, horizon=horizon)
+
+
+st.markdown('<h1 class="text-3xl font-bold text-slate-900 dark:text-slate-50">Predictive Cost Analytics (ETS/ARIMA)</h1>', unsafe_allow_html=True)
 st.markdown('<p class="opacity-70 text-slate-700 dark:text-slate-300">ML‑based forecasting of future cloud spend.</p>', unsafe_allow_html=True)
 
 # Forecast horizon slider
@@ -35,27 +45,51 @@ horizon = st.select_slider(
     help="Number of days to forecast ahead"
 )
 
+# Sample data is shown only when no backend is configured; a failing
+# backend is reported instead of being papered over.
+backend_url = get_backend_url()
+live = None
+if backend_url:
+    if not st.session_state.get("tenant_id"):
+        st.error("Your session has no workspace; sign out and sign in again to see your forecast.")
+        st.stop()
+    try:
+        live = load_forecast(backend_url, st.session_state["tenant_id"], horizon)
+    except requests.RequestException as exc:
+        st.error(f"The forecast could not be loaded: {error_detail(exc)}")
+        st.stop()
+else:
+    st.caption("Showing sample data: no backend is configured.")
+
 # Metric cards
 col1, col2 = st.columns(2)
 with col1:
-    st.markdown(metric_card("Predicted Next Month Bill", "$18,450", None, st.session_state.theme), unsafe_allow_html=True)
+    next_month = f"${live['next_month']['cost']:,.0f}" if live else "$18,450"
+    st.markdown(metric_card("Predicted Next Month Bill", next_month, None, st.session_state.theme), unsafe_allow_html=True)
 with col2:
     st.markdown(metric_card("Est. Savings Opportunity", "$1,230", "via rightsizing", st.session_state.theme), unsafe_allow_html=True)
 
-# Mock historical + forecasted data
-np.random.seed(42)
-dates_hist = pd.date_range(end=pd.Timestamp.today(), periods=90, freq="D")
-historical = 10000 + np.cumsum(np.random.randn(90) * 200) + np.linspace(0, 5000, 90)
+if live:
+    df_hist = pd.DataFrame(live["history"]).rename(columns={"date": "Date", "cost": "Cost"})
+    df_fore = pd.DataFrame(live["total"]["forecast"]).rename(
+        columns={"date": "Date", "cost": "Cost", "lower": "Lower", "upper": "Upper"})
+    df_hist["Date"] = pd.to_datetime(df_hist["Date"])
+    df_fore["Date"] = pd.to_datetime(df_fore["Date"])
+else:
+    # Mock historical + forecasted data
+    np.random.seed(42)
+    dates_hist = pd.date_range(end=pd.Timestamp.today(), periods=90, freq="D")
+    historical = 10000 + np.cumsum(np.random.randn(90) * 200) + np.linspace(0, 5000, 90)
 
-# Forecast: simple linear trend + noise
-future_dates = pd.date_range(start=dates_hist[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
-trend = np.linspace(historical[-1], historical[-1] * 1.2, horizon)
-forecast = trend + np.random.randn(horizon) * 300
+    # Forecast: simple linear trend + noise
+    future_dates = pd.date_range(start=dates_hist[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+    trend = np.linspace(historical[-1], historical[-1] * 1.2, horizon)
+    forecast = trend + np.random.randn(horizon) * 300
+    spread = 300 * 1.2816 * np.sqrt(np.arange(1, horizon + 1))
 
-# Combine for plotting
-df_hist = pd.DataFrame({"Date": dates_hist, "Cost": historical, "Type": "Historical"})
-df_fore = pd.DataFrame({"Date": future_dates, "Cost": forecast, "Type": "Forecast"})
-df_all = pd.concat([df_hist, df_fore], ignore_index=True)
+    df_hist = pd.DataFrame({"Date": dates_hist, "Cost": historical})
+    df_fore = pd.DataFrame({"Date": future_dates, "Cost": forecast,
+                            "Lower": np.maximum(forecast - spread, 0), "Upper": forecast + spread})
 
 # Plotly line chart with two colors
 fig = go.Figure()
@@ -64,6 +98,12 @@ fig.add_trace(go.Scatter(
     mode="lines", name="Historical",
     line=dict(color="#6366F1", width=2)
 ))
+fig.add_trace(go.Scatter(
+    x=pd.concat([df_fore["Date"], df_fore["Date"][::-1]]),
+    y=pd.concat([df_fore["Upper"], df_fore["Lower"][::-1]]),
+    fill="toself", fillcolor="rgba(245, 158, 11, 0.15)", line=dict(width=0),
+    hoverinfo="skip", name="80% interval"
+))
 fig.add_trace(go.Scatter(
     x=df_fore["Date"], y=df_fore["Cost"],
     mode="lines", name="Forecast",
@@ -81,3 +121,22 @@ st.plotly_chart(fig, use_container_width=True)
 # Optional: show data table
 with st.expander("View Raw Forecast Data"):
     st.dataframe(df_fore, use_container_width=True)
+
+if live and live["services"]:
+    st.markdown('<h2 class="text-xl font-semibold mt-6 text-slate-900 dark:text-slate-50">Forecast by Service</h2>', unsafe_allow_html=True)
+    services_df = pd.DataFrame({
+        "Service": [row["service_name"] for row in live["services"]],
+        "Provider": [row["provider_name"] for row in live["services"]],
+        "Model": [row["model"] for row in live["services"]],
+        "Last 30 Days ($)": [row["recent_cost"] for row in live["services"]],
+        f"Next {horizon} Days ($)": [sum(point["cost"] for point in row["forecast"]) for row in live["services"]],
+    })
+    st.dataframe(
+        services_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Last 30 Days ($)": st.column_config.NumberColumn(format="$%.2f"),
+            f"Next {horizon} Days ($)": st.column_config.NumberColumn(format="$%.2f"),
+        },
+    )
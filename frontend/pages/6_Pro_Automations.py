@@ -1,4 +1,8 @@
+import time
 import streamlit as st
+import requests
+from utils.api_client import TejuskaAPIClient
+from utils.backend import error_detail, get_backend_url
 from utils.ui_components import inject_tailwind, get_theme_css
 from utils.sidebar import render_bottom_profile
 
@@ -33,6 +37,10 @@ if st.session_state.get("role") == "Developer":
     )
     st.stop()
 
+
+# Without a backend, settings are kept in this session only.
+backend_url = get_backend_url()
+
 st.markdown('<h1 class="text-3xl font-bold text-slate-900 dark:text-slate-50">Agentic Auto-Kill & Thresholds</h1>', unsafe_allow_html=True)
 st.markdown('<p class="opacity-70 text-slate-700 dark:text-slate-300">Set custom budget limits. The Agentic AI will automatically terminate resources and send email alerts if costs exceed your threshold.</p>', unsafe_allow_html=True)
 
@@ -57,15 +65,37 @@ with col1:
         provider = st.selectbox("", ["AWS", "Azure", "GCP", "Other"], label_visibility="collapsed")
         resource_id = st.text_input("Resource ID", placeholder="e.g., i-09ca51ce7bcd242ed")
         threshold = st.number_input("Cost Threshold Limit ($)", min_value=0.01, value=1.00, step=0.50)
-        current_email = st.session_state.get("tenant_id", "")
+        current_email = st.session_state.get("user_email", "")
         user_email = st.text_input("Alert Email ID", value=current_email)
+        shield_dry_run = st.checkbox("Dry run (recommend only, do not terminate)", value=False)
 
         submit_threshold = st.form_submit_button("Activate Agentic Shield", type="primary")
         if submit_threshold:
             if not resource_id:
                 st.error("Please enter a valid Resource ID.")
+            elif backend_url and not st.session_state.get("tenant_id"):
+                st.error("Your session has no workspace; sign out and sign in again to save Shield rules.")
             else:
-                st.success(f"Shield Activated! If {provider} resource '{resource_id}' exceeds ${threshold:.2f}, it will be TERMINATED immediately and an alert will be sent to {user_email}.")
+                saved = True
+                if backend_url:
+                    try:
+                        TejuskaAPIClient(backend_url).save_shield_rule(
+                            st.session_state["tenant_id"],
+                            resource_id=resource_id,
+                            threshold=threshold,
+                            recipient=user_email,
+                            provider_name=provider,
+                            dry_run=shield_dry_run,
+                        )
+                    except requests.RequestException as exc:
+                        saved = False
+                        st.error(f"Agentic Shield rule could not be saved: {error_detail(exc)}")
+                if saved:
+                    st.session_state.setdefault("shield_thresholds", {})[resource_id] = threshold
+                    action = "evaluated by ABACUS (dry run)" if shield_dry_run else "terminated"
+                    st.success(f"Shield Activated! If {provider} resource '{resource_id}' exceeds ${threshold:.2f} this month, it will be {action} and an alert will be sent to {user_email}.")
+                    if backend_url:
+                        st.caption("The Shield evaluator checks newly ingested billing about every 30 seconds, so it acts shortly after the bill that crosses the threshold is ingested, not the instant the cost is incurred.")
 
 with col2:
     st.markdown('<h2 class="text-xl font-semibold text-slate-900 dark:text-slate-50">2. Simulate Cloud Billing (Test)</h2>', unsafe_allow_html=True)
@@ -84,13 +114,43 @@ with col2:
         submit_sim = st.form_submit_button("Run AI Evaluation", type="secondary")
         if submit_sim:
             st.info(f"ABACUS Engine analyzing resource {sim_resource_id}...")
-            threshold_limit = 1.00
-            if sim_cost > threshold_limit:
-                st.error(f"Cost (${sim_cost}) exceeds threshold! Triggering termination...")
-                st.success(f"Resource '{sim_resource_id}' successfully terminated by AI.")
-                st.success("Email notification dispatched via SMTP.")
+            if backend_url and not st.session_state.get("tenant_id"):
+                st.error("Your session has no workspace; sign out and sign in again to run a simulation.")
+            elif backend_url:
+                client = TejuskaAPIClient(backend_url)
+                try:
+                    result = client.simulate_shield_rule(st.session_state["tenant_id"], sim_resource_id, sim_cost)
+                except requests.RequestException as exc:
+                    result = None
+                    st.error(f"Simulation failed (is there a Shield rule for '{sim_resource_id}'?): {error_detail(exc)}")
+                if result and result["exceeded"]:
+                    st.error(f"Cost (${sim_cost}) exceeds the ${result['threshold']:.2f} threshold! Dry-run evaluation queued as job {result['job_id']}.")
+                    job = {"status": "queued"}
+                    try:
+                        for _ in range(10):
+                            job = client.job_status(result["job_id"])
+                            if job["status"] in ("succeeded", "failed"):
+                                break
+                            time.sleep(1)
+                    except requests.RequestException as exc:
+                        st.warning(f"Could not check ABACUS job {result['job_id']}: {error_detail(exc)}")
+                    else:
+                        if job["status"] == "succeeded":
+                            st.success(f"ABACUS recommends '{job['result']['action']}' for '{sim_resource_id}' (dry run, nothing terminated).")
+                        elif job["status"] == "failed":
+                            st.error(f"ABACUS evaluation failed: {job.get('error_message')}")
+                        else:
+                            st.info(f"ABACUS evaluation is still {job['status']}; check job {result['job_id']} later.")
+                elif result:
+                    st.success(f"Cost is within the ${result['threshold']:.2f} limit. No action taken.")
             else:
-                st.success("Cost is within limits. No action taken.")
+                threshold_limit = st.session_state.get("shield_thresholds", {}).get(sim_resource_id, 1.00)
+                if sim_cost > threshold_limit:
+                    st.error(f"Cost (${sim_cost}) exceeds threshold! Triggering termination...")
+                    st.success(f"Resource '{sim_resource_id}' successfully terminated by AI.")
+                    st.success("Email notification dispatched via SMTP.")
+                else:
+                    st.success("Cost is within limits. No action taken.")
 
 # ---------- New Real-Time Anomaly Detection Section ----------
 st.markdown('<hr class="my-6 border-slate-300 dark:border-slate-700">', unsafe_allow_html=True)
@@ -98,15 +158,38 @@ st.markdown('<h2 class="text-xl font-semibold text-slate-900 dark:text-slate-50"
 st.markdown('<p class="opacity-70 text-slate-700 dark:text-slate-300 mb-4">Configure automatic alerts for cost spikes.</p>', unsafe_allow_html=True)
 
 with st.form("anomaly_form"):
-    col_a, col_b, col_c = st.columns(3)
+    col_a, col_b, col_c, col_d = st.columns(4)
     with col_a:
         spike_threshold = st.number_input("Cost Spike Threshold (%)", min_value=1, max_value=100, value=15)
     with col_b:
-        alert_channel = st.selectbox("Alert Channel", ["Email", "Telegram", "Slack"])
+        alert_channel = st.selectbox("Alert Channel", ["Email", "Slack", "SMS"])
     with col_c:
+        alert_recipient = st.text_input(
+            "Recipient", placeholder="Email address, Slack channel or phone number"
+        )
+    with col_d:
         monitoring_enabled = st.checkbox("Enable 24/7 Monitoring", value=True)
 
     submit_anomaly = st.form_submit_button("Save Anomaly Settings", type="primary", use_container_width=True)
 
 if submit_anomaly:
-    st.success(f"Anomaly detection enabled with {spike_threshold}% spike threshold via {alert_channel}. 24/7 monitoring: {'ON' if monitoring_enabled else 'OFF'}")
+    if not alert_recipient:
+        st.error("Please enter where alerts should be sent.")
+    elif backend_url and not st.session_state.get("tenant_id"):
+        st.error("Your session has no workspace; sign out and sign in again to save anomaly settings.")
+    else:
+        saved = True
+        if backend_url:
+            try:
+                TejuskaAPIClient(backend_url).save_anomaly_settings(
+                    st.session_state["tenant_id"],
+                    spike_pct=spike_threshold,
+                    channel=alert_channel.lower(),
+                    recipient=alert_recipient,
+                    enabled=monitoring_enabled,
+                )
+            except requests.RequestException as exc:
+                saved = False
+                st.error(f"Anomaly settings could not be saved: {error_detail(exc)}")
+        if saved:
+            st.success(f"Anomaly detection enabled with {spike_threshold}% spike threshold via {alert_channel} to {alert_recipient}. 24/7 monitoring: {'ON' if monitoring_enabled else 'OFF'}")
@@ -1,5 +1,9 @@
 import streamlit as st
 import time
+import pandas as pd
+import requests
+from utils.api_client import TejuskaAPIClient
+from utils.backend import error_detail, get_backend_url
 from utils.ui_components import inject_tailwind, get_theme_css
 from utils.sidebar import render_bottom_profile
 
@@ -22,6 +26,39 @@ if not st.session_state.get("authenticated"):
     st.warning("Please sign in from the Home page.")
     st.stop()
 
+
+
+def get_api_client():
+    """OPTIC client for the configured backend, or None to use canned replies."""
+    backend_url = get_backend_url()
+    return TejuskaAPIClient(backend_url) if backend_url else None
+
+
+def stream_optic_answer(client, prompt):
+    """Render SQL, rows and answer tokens as the backend streams them; return the final message."""
+    sql_box, table_box, answer_box = st.empty(), st.empty(), st.empty()
+    sql, columns, rows, answer = "", [], [], ""
+    for event in client.nlp_query_stream(st.session_state["tenant_id"], prompt):
+        kind = event.get("event")
+        if kind == "sql":
+            sql = event["sql"]
+            sql_box.code(sql, language="sql")
+        elif kind == "columns":
+            columns = event["columns"]
+        elif kind == "rows":
+            rows.extend(event["rows"])
+            table_box.dataframe(pd.DataFrame(rows, columns=columns), use_container_width=True)
+        elif kind == "error":
+            st.caption(event["detail"])
+        elif kind == "token":
+            answer += event["text"]
+            answer_box.markdown(answer + "▌")
+        elif kind == "done":
+            answer = event["answer"]
+            answer_box.markdown(answer)
+    return f"{answer}\n\n```sql\n{sql}\n```" if sql else answer
+
+
 # Initialize chat history
 if "chat_messages" not in st.session_state:
     st.session_state.chat_messages = [
@@ -76,9 +113,23 @@ if prompt := st.chat_input("Ask me anything about your cloud costs..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            time.sleep(1.5)
-        # Simulate varied response
-        response = f"Regarding '{prompt}': I've analyzed your recent usage. Consider reviewing your DevOps pipelines for rightsizing opportunities. Would you like a detailed report?"
-        st.markdown(response)
+        client = get_api_client()
+        if client is not None and not st.session_state.get("tenant_id"):
+            response = "Your session has no workspace; sign out and sign in again to ask OPTIC."
+            st.error(response)
+        elif client is not None:
+            try:
+                response = stream_optic_answer(client, prompt)
+            except requests.RequestException as exc:
+                response = f"Sorry, the OPTIC query failed: {error_detail(exc)}"
+                st.error(response)
+            except RuntimeError as exc:
+                response = f"Sorry, the OPTIC query failed: {exc}"
+                st.error(response)
+        else:
+            with st.spinner("Thinking..."):
+                time.sleep(1.5)
+            # Simulate varied response
+            response = f"Regarding '{prompt}': I've analyzed your recent usage. Consider reviewing your DevOps pipelines for rightsizing opportunities. Would you like a detailed report?"
+            st.markdown(response)
         st.session_state.chat_messages.append({"role": "assistant", "content": response})
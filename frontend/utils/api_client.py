@@ -5,8 +5,9 @@ TEJUSKA Cloud Intelligence
 Thin HTTP client for communicating with the FastAPI backend.
 """
 
+import json
 import requests
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 
 class TejuskaAPIClient:
@@ -22,11 +23,153 @@ class TejuskaAPIClient:
         response.raise_for_status()
         return response.json()
 
+    def lookup_tenant(self, email: str) -> Dict[str, Any]:
+        """Resolve the tenant a user's email belongs to; tenant endpoints take its tenant_id."""
+        response = requests.get(
+            f"{self._base_url}/api/v1/tenants/lookup",
+            params={"email": email},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def nlp_query_stream(self, tenant_id: str, query: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream an OPTIC answer event by event: "sql", then "columns"/"rows",
+        then "token" fragments, then "done" (see /api/v1/query/stream).
+        A fatal "error" event raises RuntimeError.
+        """
+        with requests.post(
+            f"{self._base_url}/api/v1/query/stream",
+            json={"tenant_id": tenant_id, "query": query},
+            timeout=self._timeout,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("event") == "error" and event.get("fatal"):
+                    raise RuntimeError(event.get("detail", "Query processing failed."))
+                yield event
+
     def nlp_query(self, tenant_id: str, query: str) -> Dict[str, Any]:
-        """Submit a natural-language cost query to OPTIC."""
+        """Submit a natural-language cost query to OPTIC; consumes the streaming endpoint."""
+        result: Dict[str, Any] = {
+            "tenant_id": tenant_id, "query": query, "sql": "", "answer": "",
+            "columns": [], "rows": [], "errors": [],
+        }
+        for event in self.nlp_query_stream(tenant_id, query):
+            kind = event.get("event")
+            if kind == "sql":
+                result["sql"] = event["sql"]
+            elif kind == "columns":
+                result["columns"] = event["columns"]
+            elif kind == "rows":
+                result["rows"].extend(event["rows"])
+            elif kind == "error":
+                result["errors"].append(event["detail"])
+            elif kind == "done":
+                result["answer"] = event["answer"]
+        return result
+
+    def dashboard(
+        self, tenant_id: str, days: int = 30, tag_key: str = "department"
+    ) -> Dict[str, Any]:
+        """Fetch the FinOps dashboard aggregates for a tenant."""
+        response = requests.get(
+            f"{self._base_url}/api/v1/dashboard/{tenant_id}",
+            params={"days": days, "tag_key": tag_key},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def forecast(
+        self, tenant_id: str, horizon: int = 30, level: float = 80.0, services: int = 20
+    ) -> Dict[str, Any]:
+        """Fetch daily spend forecasts with prediction intervals for a tenant."""
+        response = requests.get(
+            f"{self._base_url}/api/v1/forecast/{tenant_id}",
+            params={"horizon": horizon, "level": level, "services": services},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def save_anomaly_settings(
+        self,
+        tenant_id: str,
+        spike_pct: float,
+        channel: str,
+        recipient: str,
+        enabled: bool = True,
+    ) -> Dict[str, Any]:
+        """Create or replace the tenant's cost-spike alert settings."""
+        response = requests.put(
+            f"{self._base_url}/api/v1/anomaly-settings/{tenant_id}",
+            json={
+                "spike_pct": spike_pct,
+                "channel":   channel,
+                "recipient": recipient,
+                "enabled":   enabled,
+            },
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def anomalies(self, tenant_id: str, limit: int = 50) -> Dict[str, Any]:
+        """Fetch the tenant's most recently detected cost spikes."""
+        response = requests.get(
+            f"{self._base_url}/api/v1/anomalies/{tenant_id}",
+            params={"limit": limit},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def save_shield_rule(
+        self,
+        tenant_id: str,
+        resource_id: str,
+        threshold: float,
+        recipient: str,
+        provider_name: Optional[str] = None,
+        channel: str = "email",
+        dry_run: bool = True,
+    ) -> Dict[str, Any]:
+        """Create or replace the Agentic Shield rule for a resource and arm it."""
+        response = requests.put(
+            f"{self._base_url}/api/v1/shield-rules/{tenant_id}",
+            json={
+                "resource_id":   resource_id,
+                "provider_name": provider_name,
+                "threshold":     threshold,
+                "channel":       channel,
+                "recipient":     recipient,
+                "dry_run":       dry_run,
+            },
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def shield_rules(self, tenant_id: str) -> Dict[str, Any]:
+        """Fetch the tenant's Agentic Shield rules and their trigger state."""
+        response = requests.get(
+            f"{self._base_url}/api/v1/shield-rules/{tenant_id}",
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def simulate_shield_rule(self, tenant_id: str, resource_id: str, cost: float) -> Dict[str, Any]:
+        """Check a hypothetical cost against a rule; queues a dry-run evaluation when over."""
         response = requests.post(
-            f"{self._base_url}/api/v1/query",
-            json={"tenant_id": tenant_id, "query": query},
+            f"{self._base_url}/api/v1/shield-rules/{tenant_id}/simulate",
+            json={"resource_id": resource_id, "cost": cost},
             timeout=self._timeout,
         )
         response.raise_for_status()
@@ -35,7 +178,7 @@ class TejuskaAPIClient:
     def auto_terminate(
         self, tenant_id: str, resource_id: str, dry_run: bool = True
     ) -> Dict[str, Any]:
-        """Trigger ABACUS evaluation for a cloud resource."""
+        """Queue an ABACUS evaluation for a cloud resource; returns the job ID."""
         response = requests.post(
             f"{self._base_url}/api/v1/auto-terminate",
             json={
@@ -48,6 +191,35 @@ class TejuskaAPIClient:
         response.raise_for_status()
         return response.json()
 
+    def job_status(self, job_id: str) -> Dict[str, Any]:
+        """Poll the status and result of a queued ABACUS job."""
+        response = requests.get(
+            f"{self._base_url}/api/v1/jobs/{job_id}",
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def auto_terminate_batch(
+        self,
+        tenant_id: str,
+        resource_ids: Optional[List[str]] = None,
+        dry_run: bool = True,
+    ) -> Dict[str, Any]:
+        """Score many resources with ABACUS; None evaluates every tenant resource."""
+        response = requests.post(
+            f"{self._base_url}/api/v1/auto-terminate/batch",
+            json={
+                "tenant_id":     tenant_id,
+                "resource_ids":  resource_ids,
+                "all_resources": resource_ids is None,
+                "dry_run":       dry_run,
+            },
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
     def send_notification(
         self,
         tenant_id: str,
@@ -56,7 +228,7 @@ class TejuskaAPIClient:
         body: str,
         subject: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Dispatch a notification via the backend service."""
+        """Queue a notification on the backend outbox; returns its notification_id."""
         response = requests.post(
             f"{self._base_url}/api/v1/notify",
             json={
@@ -70,3 +242,12 @@ class TejuskaAPIClient:
         )
         response.raise_for_status()
         return response.json()
+
+    def notification_status(self, notification_id: str) -> Dict[str, Any]:
+        """Poll the delivery state of a queued notification."""
+        response = requests.get(
+            f"{self._base_url}/api/v1/notify/{notification_id}",
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,32 @@
+"""
+backend.py
+==========
+TEJUSKA Cloud Intelligence
+Backend connection helpers shared by the Streamlit pages.
+"""
+
+import requests
+import streamlit as st
+
+
+def get_backend_url() -> str:
+    """Configured backend URL, or "" when the app runs on sample data."""
+    try:
+        return st.secrets.get("BACKEND_URL", "")
+    except Exception:  # no secrets.toml when running locally
+        return ""
+
+
+def error_detail(exc: requests.RequestException) -> str:
+    """The backend's error detail for a failed call, else the transport error."""
+    response = getattr(exc, "response", None)
+    if response is not None:
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = None
+        if isinstance(detail, list):  # FastAPI request validation errors
+            detail = "; ".join(str(item.get("msg", item)) for item in detail)
+        if detail:
+            return f"{detail} (HTTP {response.status_code})"
+    return str(exc)
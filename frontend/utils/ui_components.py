@@ -181,7 +181,7 @@ def render_profile_menu(theme: str):
         )
 
         # Popover content
-        st.markdown(f"**Signed in as**  \n{st.session_state.tenant_id}")
+        st.markdown(f"**Signed in as**  \n{st.session_state.user_email}")
         st.divider()
         if st.button("Profile", key="profile_btn", use_container_width=True):
             st.info("Profile page – under construction")
@@ -189,6 +189,7 @@ def render_profile_menu(theme: str):
             st.info("Settings – under construction")
         if st.button("Sign out", key="signout_btn", use_container_width=True):
             st.session_state.authenticated = False
+            st.session_state.user_email = ""
             st.session_state.tenant_id = ""
             st.rerun()
 